@@ -2,6 +2,8 @@
 
 import os
 import re
+import json
+import hashlib
 import pandas as pd
 from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
 import warnings
@@ -117,7 +119,36 @@ def process_single_hocr(hocr_file_path, full_image_path, cropped_images_dir):
         
     return line_data
 
-def create_line_labels_csv(image_dir, hocr_dir, output_csv_path, num_workers=None):
+def parse_shard(spec):
+    """'i/N' -> (i, N), for --shard."""
+    index, _, count = spec.partition('/')
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}': expected i/N with 0 <= i < N")
+    return index, count
+
+
+def page_shard(relative_page_path, num_shards):
+    """Shard of a page: a stable hash of its path relative to image_dir, so every node agrees whatever its mount point."""
+    digest = hashlib.sha1(relative_page_path.replace(os.sep, '/').encode('utf-8')).hexdigest()
+    return int(digest[:16], 16) % num_shards
+
+
+def shard_output_paths(output_csv_path, shard):
+    """<csv>.shard-<i>-of-<N>.csv and its .manifest.json, next to the unsharded output."""
+    base, ext = os.path.splitext(output_csv_path)
+    shard_csv = f"{base}.shard-{shard[0]:03d}-of-{shard[1]:03d}{ext or '.csv'}"
+    return shard_csv, shard_csv + '.manifest.json'
+
+
+def create_line_labels_csv(image_dir, hocr_dir, output_csv_path, num_workers=None, shard=None):
+    """
+    Crops every HOCR line and writes the labels CSV, ordered by page path and line index.
+
+    With shard=(i, N) only the pages hashed to shard i are processed; the rows go to
+    shard_output_paths(output_csv_path, shard) with their page and line index, plus a manifest
+    that merge_line_label_shards() checks before combining the shards into one CSV.
+    """
     all_line_data = []
     image_files = []
     
@@ -138,57 +169,155 @@ def create_line_labels_csv(image_dir, hocr_dir, output_csv_path, num_workers=Non
         logging.error(f"No image files found in {image_dir}")
         return False
 
+    relative_pages = [os.path.relpath(path, image_dir).replace(os.sep, '/') for path in image_files]
+    all_pages_sha256 = hashlib.sha256('\n'.join(relative_pages).encode('utf-8')).hexdigest()
+    total_pages = len(image_files)
+    if shard:
+        selected = [i for i, page in enumerate(relative_pages) if page_shard(page, shard[1]) == shard[0]]
+        image_files = [image_files[i] for i in selected]
+        relative_pages = [relative_pages[i] for i in selected]
+        logging.info(f"Shard {shard[0]}/{shard[1]}: {len(image_files)} of {total_pages} pages")
+
     tasks = []
-    for image_file_path in image_files:
+    task_pages = []
+    for image_file_path, relative_page in zip(image_files, relative_pages):
         base_name = os.path.splitext(os.path.basename(image_file_path))[0]
         hocr_file_name = base_name + ".hocr"
         hocr_file_path = os.path.join(hocr_dir, hocr_file_name)
 
         if os.path.exists(hocr_file_path):
             tasks.append((hocr_file_path, image_file_path, cropped_images_output_dir))
+            task_pages.append(relative_page)
         else:
             hocr_file_name_alt = os.path.basename(image_file_path) + ".hocr" # Alternative: image.png.hocr
             hocr_file_path_alt = os.path.join(hocr_dir, hocr_file_name_alt)
             if os.path.exists(hocr_file_path_alt):
                  tasks.append((hocr_file_path_alt, image_file_path, cropped_images_output_dir))
+                 task_pages.append(relative_page)
             else:
                 logging.warning(f"HOCR file not found for image {image_file_path} (tried {hocr_file_name}, {hocr_file_name_alt})")
 
-    if not tasks:
+    if not tasks and not shard:
         logging.error("No HOCR files found to process with associated images.")
         return False
 
+    page_results = [[] for _ in tasks]
     with ProcessPoolExecutor(max_workers=num_workers) as executor:
-        futures = [executor.submit(process_single_hocr, hfp, ifp, ciod) for hfp, ifp, ciod in tasks]
+        futures = {executor.submit(process_single_hocr, hfp, ifp, ciod): i for i, (hfp, ifp, ciod) in enumerate(tasks)}
         
         for future in tqdm(as_completed(futures), total=len(tasks), desc="Processing HOCR files"):
             try:
                 result = future.result()
                 if result: 
-                    all_line_data.extend(result)
+                    page_results[futures[future]] = result
             except Exception as e:
                 logging.error(f"A HOCR processing task generated an exception: {e}", exc_info=False)
 
-    if not all_line_data:
+    # page order, then line order within the page, whatever order the workers finished in
+    for relative_page, result in zip(task_pages, page_results):
+        for line_index, row in enumerate(result):
+            all_line_data.append(dict(row, page=relative_page, line=line_index) if shard else row)
+
+    if not all_line_data and not shard:
         logging.error("No line data extracted from any HOCR file after processing.")
         return False
 
-    df = pd.DataFrame(all_line_data)
+    if shard:
+        output_csv_path, manifest_path = shard_output_paths(output_csv_path, shard)
+    df = pd.DataFrame(all_line_data, columns=['image_path', 'text', 'page', 'line'] if shard else None)
     try:
         df.to_csv(output_csv_path, index=False, encoding='utf-8')
         logging.info(f"Successfully created line-level labels CSV: {output_csv_path} with {len(df)} entries.")
     except Exception as e:
         logging.error(f"Failed to write CSV to {output_csv_path}: {e}")
         return False
+
+    if shard:
+        manifest = {'shard': shard[0], 'num_shards': shard[1], 'csv': os.path.abspath(output_csv_path),
+                    'image_dir': os.path.abspath(image_dir), 'crops_dir': cropped_images_output_dir,
+                    'all_pages': total_pages, 'all_pages_sha256': all_pages_sha256,
+                    'pages': len(image_files), 'pages_with_hocr': len(tasks), 'lines': len(df)}
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        logging.info(f"Shard manifest: {manifest_path}")
         
     return True
 
+
+def merge_line_label_shards(manifest_paths, output_csv_path, relocate_dir=None):
+    """
+    Combines shard outputs into one labels CSV in the same global order as an unsharded run.
+
+    The manifests must come from one archive (same page list fingerprint) and cover shards
+    0..N-1 exactly once, with CSVs matching their recorded line counts. Pages and crop paths
+    must not repeat across shards; with relocate_dir (crops gathered from several nodes into
+    one folder) image paths are rewritten to that folder and crop file names must be unique.
+    """
+    manifests = []
+    for path in manifest_paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifests.append(json.load(f))
+
+    errors = []
+    num_shards = {m['num_shards'] for m in manifests}
+    page_lists = {m['all_pages_sha256'] for m in manifests}
+    if len(num_shards) != 1:
+        errors.append(f"manifests disagree on the shard count: {sorted(num_shards)}")
+    if len(page_lists) != 1:
+        errors.append("manifests were produced from different page lists (image_dir contents differ between shards)")
+    if not errors:
+        shard_ids = sorted(m['shard'] for m in manifests)
+        expected = list(range(num_shards.pop()))
+        missing = sorted(set(expected) - set(shard_ids))
+        repeated = sorted({i for i in shard_ids if shard_ids.count(i) > 1})
+        if missing:
+            errors.append(f"missing shards: {missing}")
+        if repeated:
+            errors.append(f"shards given more than once: {repeated}")
+
+    frames = []
+    for m in manifests:
+        df = pd.read_csv(m['csv'], dtype={'image_path': str, 'text': str, 'page': str}, keep_default_na=False)
+        if len(df) != m['lines']:
+            errors.append(f"{m['csv']} has {len(df)} rows, its manifest says {m['lines']}")
+        frames.append(df.assign(shard=m['shard']))
+    if errors:
+        for error in errors:
+            logging.error(f"Merge check failed: {error}")
+        return False
+
+    merged = pd.concat(frames, ignore_index=True)
+    pages_per_shard = merged.groupby('page')['shard'].nunique()
+    if (pages_per_shard > 1).any():
+        errors.append(f"{int((pages_per_shard > 1).sum())} pages appear in more than one shard, "
+                      f"e.g. {pages_per_shard[pages_per_shard > 1].index[0]}")
+    if relocate_dir:
+        merged['image_path'] = [os.path.join(relocate_dir, os.path.basename(p)) for p in merged['image_path']]
+    duplicated = merged['image_path'].duplicated(keep=False)
+    if duplicated.any():
+        errors.append(f"{int(duplicated.sum())} rows share a crop path, e.g. {merged.loc[duplicated, 'image_path'].iloc[0]} "
+                      f"(pages with the same file name in different folders?)")
+    if errors:
+        for error in errors:
+            logging.error(f"Merge check failed: {error}")
+        return False
+
+    merged = merged.sort_values(['page', 'line'], kind='stable')
+    merged[['image_path', 'text']].to_csv(output_csv_path, index=False, encoding='utf-8')
+    logging.info(f"Merged {len(manifests)} shards ({merged['page'].nunique()} pages, {len(merged)} lines) into {output_csv_path}")
+    if relocate_dir:
+        absent = sum(not os.path.exists(p) for p in merged['image_path'])
+        if absent:
+            logging.warning(f"{absent} crops are not (yet) in {relocate_dir}")
+    return True
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Create line-level labels and cropped images from HOCR files for OCR training.")
     parser.add_argument("image_directory", help="Directory containing the original full-page image files.")
     parser.add_argument("hocr_directory", help="Directory containing the HOCR files.")
     parser.add_argument("output_csv", help="Path to save the output CSV file (e.g., /path/to/ocr_output/line_labels.csv).")
     parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to CPU count if None.")
+    parser.add_argument("--shard", type=parse_shard, default=None, help="Process only shard i of N (i/N, pages assigned by path hash); merge the shards with `ocrprep merge-shards`.")
     args = parser.parse_args()
 
     # Ensure the directory for the output CSV exists
@@ -197,7 +326,7 @@ if __name__ == "__main__":
         output_csv_dir = "."
     os.makedirs(output_csv_dir, exist_ok=True)
 
-    if create_line_labels_csv(args.image_directory, args.hocr_directory, args.output_csv, args.workers):
+    if create_line_labels_csv(args.image_directory, args.hocr_directory, args.output_csv, args.workers, args.shard):
         print(f"data_preprocess.py completed. Output CSV: {args.output_csv}")
     else:
         print("data_preprocess.py failed.")
\ No newline at end of file
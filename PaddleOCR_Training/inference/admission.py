@@ -0,0 +1,274 @@
+# inference/admission.py
+
+import io
+import time
+import random
+import argparse
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+
+class Lane:
+    """
+    A priority lane: requests up to max_megapixels (all pages together) land here. At most
+    max_requests admitted requests may be unfinished at once, and slo_seconds is the
+    queue wait its pages should stay under. Lower priority values run first.
+    """
+
+    def __init__(self, name, priority, max_megapixels, max_requests, slo_seconds):
+        self.name = name
+        self.priority = priority
+        self.max_megapixels = max_megapixels
+        self.max_requests = max_requests
+        self.slo_seconds = slo_seconds
+
+
+# interactive: single lines and small snippets; page: one or two scanned pages; bulk: documents.
+DEFAULT_LANES = (
+    Lane('interactive', 0, 1.0, 64, 0.5),
+    Lane('page', 1, 20.0, 16, 3.0),
+    Lane('bulk', 2, float('inf'), 2, 30.0),
+)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, lane, reason, retry_after):
+        super().__init__(f"{lane}: {reason}")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    def __init__(self, lane, megapixels, pages, degrade):
+        self.lane = lane
+        self.megapixels = megapixels
+        self.pages = pages
+        self.degrade = degrade
+        self.released = False
+
+
+def image_megapixels(data):
+    """Pixel count of an encoded image from its header only (PIL does not decode until asked)."""
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+        return width * height / 1e6
+    except Exception:
+        return 0.0
+
+
+class AdmissionController:
+    """
+    Admission control and priority scheduling in front of one worker's OCR pipeline.
+
+    admit() classifies a request by its estimated cost into a lane and checks the lane's budget
+    and the queue wait predicted for it (work queued ahead of it in the same or higher-priority
+    lanes, from a running estimate of seconds per megapixel). Over budget, or predicted past
+    reject_factor x the lane SLO, it raises AdmissionRejected; past the SLO it admits the request
+    degraded (no layout stage, lower detection resolution).
+
+    page() then replaces the plain pipeline lock: waiting pages get the pipeline in lane
+    priority order (FIFO within a lane), so a one-line request never waits behind all pages of
+    a 50-page document, only behind the page that is running. A page that has waited more than
+    max_wait_factor x its SLO jumps ahead of the priorities, so bulk work is not starved, and a
+    page that actually waited past its SLO is degraded even if its request was not.
+    """
+
+    def __init__(self, lanes=DEFAULT_LANES, reject_factor=2.0, degrade_limit_side_len=640,
+                 max_wait_factor=4.0, seconds_per_megapixel=0.1, metrics=None):
+        self.lanes = sorted(lanes, key=lambda lane: lane.max_megapixels)
+        self.reject_factor = reject_factor
+        self.degrade_limit_side_len = degrade_limit_side_len
+        self.max_wait_factor = max_wait_factor
+        self.seconds_per_megapixel = seconds_per_megapixel
+        self.metrics = metrics
+        self._cond = threading.Condition()
+        self._waiting = []  # [priority, seq, enqueued_at, lane, estimated_seconds]
+        self._running = None  # (started_at, estimated_seconds)
+        self._requests = {lane.name: 0 for lane in self.lanes}
+        self._seq = itertools.count()
+
+    def classify(self, megapixels):
+        for lane in self.lanes:
+            if megapixels <= lane.max_megapixels:
+                return lane
+        return self.lanes[-1]
+
+    def _predicted_wait(self, lane, now):
+        wait = sum(entry[4] for entry in self._waiting if entry[0] <= lane.priority)
+        if self._running is not None:
+            started_at, estimated = self._running
+            wait += max(0.0, estimated - (now - started_at))
+        return wait
+
+    def _record(self, lane, decision):
+        if self.metrics is not None:
+            self.metrics.admissions.inc(lane=lane.name, decision=decision)
+
+    def admit(self, megapixels, pages=1):
+        lane = self.classify(megapixels)
+        with self._cond:
+            if self._requests[lane.name] >= lane.max_requests:
+                self._record(lane, 'rejected')
+                raise AdmissionRejected(lane.name, f"lane budget of {lane.max_requests} requests exhausted",
+                                        retry_after=lane.slo_seconds)
+            wait = self._predicted_wait(lane, time.perf_counter())
+            if wait > lane.slo_seconds * self.reject_factor:
+                self._record(lane, 'rejected')
+                raise AdmissionRejected(lane.name, f"predicted queue wait {wait:.1f}s exceeds the {lane.slo_seconds}s SLO",
+                                        retry_after=wait)
+            degrade = wait > lane.slo_seconds
+            self._requests[lane.name] += 1
+        self._record(lane, 'degraded' if degrade else 'admitted')
+        if self.metrics is not None:
+            self.metrics.lane_requests.inc(lane=lane.name)
+        return Ticket(lane, megapixels, pages, degrade)
+
+    def release(self, ticket):
+        """Returns the ticket's lane budget; safe to call more than once."""
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._requests[ticket.lane.name] -= 1
+        if self.metrics is not None:
+            self.metrics.lane_requests.dec(lane=ticket.lane.name)
+
+    def _next(self, now):
+        def key(entry):
+            priority, seq, enqueued_at, lane, _ = entry
+            starved = now - enqueued_at > lane.slo_seconds * self.max_wait_factor
+            return (-1 if starved else priority, seq)
+        return min(self._waiting, key=key)
+
+    @contextmanager
+    def page(self, ticket, megapixels):
+        """Holds the pipeline for one page; yields True if this page should run degraded."""
+        lane = ticket.lane
+        enqueued_at = time.perf_counter()
+        entry = [lane.priority, next(self._seq), enqueued_at, lane, megapixels * self.seconds_per_megapixel]
+        if self.metrics is not None:
+            self.metrics.queue_depth.inc(lane=lane.name)
+        with self._cond:
+            self._waiting.append(entry)
+            while self._running is not None or self._next(time.perf_counter()) is not entry:
+                self._cond.wait()
+            self._waiting.remove(entry)
+            started_at = time.perf_counter()
+            self._running = (started_at, entry[4])
+        waited = started_at - enqueued_at
+        degrade = ticket.degrade or waited > lane.slo_seconds
+        if self.metrics is not None:
+            self.metrics.queue_depth.dec(lane=lane.name)
+            self.metrics.queue_wait_seconds.observe(waited, lane=lane.name)
+            self.metrics.in_flight.inc()
+        try:
+            yield degrade
+        finally:
+            elapsed = time.perf_counter() - started_at
+            with self._cond:
+                self._running = None
+                if not degrade and megapixels > 0:
+                    # exponential moving average of the cost model, from full-quality pages only
+                    self.seconds_per_megapixel += 0.1 * (elapsed / megapixels - self.seconds_per_megapixel)
+                self._cond.notify_all()
+            if self.metrics is not None:
+                self.metrics.in_flight.dec()
+
+
+FIFO_LANES = (Lane('fifo', 0, float('inf'), 10 ** 9, float('inf')),)
+
+
+def simulate(controller, duration, rates, page_megapixels, doc_pages, time_scale, seed=0):
+    """
+    Open-loop synthetic mixed workload against a controller, with a simulated pipeline whose
+    page cost is 20 ms + 30 ms per megapixel (halved when degraded), all scaled by time_scale.
+    Returns {request_class: {'latencies': [...], 'rejected': n, 'degraded': n, 'total': n}}.
+    """
+    rng = random.Random(seed)
+    classes = {
+        'line': (1, 0.3),                              # (pages, megapixels per page)
+        'page': (1, page_megapixels),
+        'document': (doc_pages, page_megapixels),
+    }
+    results = {name: {'latencies': [], 'rejected': 0, 'degraded': 0, 'total': 0} for name in classes}
+    lock = threading.Lock()
+    threads = []
+
+    def client(name, pages, mp):
+        start = time.perf_counter()
+        try:
+            ticket = controller.admit(mp * pages, pages)
+        except AdmissionRejected:
+            with lock:
+                results[name]['rejected'] += 1
+            return
+        degraded = False
+        try:
+            for _ in range(pages):
+                with controller.page(ticket, mp) as degrade:
+                    degraded |= degrade
+                    time.sleep((0.02 + 0.03 * mp) * (0.5 if degrade else 1.0) * time_scale)
+        finally:
+            controller.release(ticket)
+        with lock:
+            results[name]['latencies'].append((time.perf_counter() - start) / time_scale)
+            results[name]['degraded'] += int(degraded)
+
+    arrivals = []
+    for name, rate in rates.items():
+        t = rng.expovariate(rate) if rate > 0 else duration
+        while t < duration:
+            arrivals.append((t, name))
+            t += rng.expovariate(rate)
+    arrivals.sort()
+
+    start = time.perf_counter()
+    for t, name in arrivals:
+        delay = t * time_scale - (time.perf_counter() - start)
+        if delay > 0:
+            time.sleep(delay)
+        pages, mp = classes[name]
+        results[name]['total'] += 1
+        thread = threading.Thread(target=client, args=(name, pages, mp), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare FIFO queueing against lane-based admission control under a synthetic mixed OCR workload.")
+    parser.add_argument("--duration", type=float, default=60.0, help="Simulated seconds of arrivals (default: 60)")
+    parser.add_argument("--line_rate", type=float, default=8.0, help="Single-line requests per second (default: 8)")
+    parser.add_argument("--page_rate", type=float, default=1.5, help="Single-page requests per second (default: 1.5)")
+    parser.add_argument("--doc_rate", type=float, default=0.1, help="Multi-page documents per second (default: 0.1)")
+    parser.add_argument("--doc_pages", type=int, default=50, help="Pages per document (default: 50)")
+    parser.add_argument("--page_megapixels", type=float, default=4.0, help="Megapixels per scanned page (default: 4)")
+    parser.add_argument("--time_scale", type=float, default=0.25, help="Wall-clock seconds per simulated second (default: 0.25)")
+    args = parser.parse_args()
+
+    rates = {'line': args.line_rate, 'page': args.page_rate, 'document': args.doc_rate}
+    # SLOs and the cost model are in wall-clock time, so they are scaled like the simulated pipeline.
+    scaled_lanes = [Lane(lane.name, lane.priority, lane.max_megapixels, lane.max_requests, lane.slo_seconds * args.time_scale)
+                    for lane in DEFAULT_LANES]
+    seconds_per_megapixel = 0.03 * args.time_scale
+    for name, controller in (("FIFO", AdmissionController(FIFO_LANES, seconds_per_megapixel=seconds_per_megapixel)),
+                             ("Admission", AdmissionController(scaled_lanes, seconds_per_megapixel=seconds_per_megapixel))):
+        logging.info(f"{name}:")
+        results = simulate(controller, args.duration, rates, args.page_megapixels, args.doc_pages, args.time_scale)
+        for request_class, r in results.items():
+            lat = np.array(r['latencies']) if r['latencies'] else np.zeros(1)
+            logging.info(f"  {request_class:>8}: {r['total']:4d} requests, p50 {np.percentile(lat, 50):7.2f}s, "
+                         f"p99 {np.percentile(lat, 99):7.2f}s, rejected {r['rejected'] / max(r['total'], 1):.0%}, "
+                         f"degraded {r['degraded'] / max(r['total'], 1):.0%}")
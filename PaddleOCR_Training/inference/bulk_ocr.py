@@ -0,0 +1,251 @@
+# inference/bulk_ocr.py
+#
+# Re-OCRs a whole archive: python inference/bulk_ocr.py /data/archive /data/archive_ocr.jsonl --det_model_dir ... --rec_model_dir ...
+# Re-running the same command resumes from the journal instead of starting over; files that
+# failed stay failed unless --retry_errors is given.
+
+import os
+import json
+import time
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+from ocr_pipeline import IMAGE_EXTENSIONS, add_pipeline_args, build_pipeline_from_args, list_image_files
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+# Set once per worker process by init_worker(); the models are loaded there, not per task.
+_worker_pipeline = None
+
+
+def init_worker(pipeline_args):
+    global _worker_pipeline
+    _worker_pipeline = build_pipeline_from_args(argparse.Namespace(**pipeline_args))
+    logging.info(f"Worker {os.getpid()} loaded its models.")
+
+
+def process_shard(image_paths):
+    """
+    Runs the pipeline over one shard of files inside a worker. Multi-page TIFF/PDF files
+    produce one record per page; a file that fails partway produces only its error record,
+    so a retry does not write its first pages twice. Returns (worker_pid, records, pages, busy_seconds).
+    """
+    from document_stream import iter_document_pages
+
+    records = []
+    pages = 0
+    start = time.perf_counter()
+    for image_path in image_paths:
+        file_records = []
+        try:
+            with open(image_path, 'rb') as f:
+                for page, img in iter_document_pages(f):
+                    result = _worker_pipeline(img)
+                    file_records.append({'image_path': image_path, 'page': page, **result})
+        except Exception as e:
+            logging.error(f"Failed to OCR {image_path}: {e}")
+            file_records = [{'image_path': image_path, 'error': str(e)}]
+        else:
+            pages += len(file_records)
+        records.extend(file_records)
+    return os.getpid(), records, pages, time.perf_counter() - start
+
+
+class ResumeJournal:
+    """
+    Append-only journal next to the output: one JSON line per committed shard, listing its
+    files and where the output stood after it was written. Output is written first and the
+    journal entry second, so anything past the last journaled point is an interrupted shard
+    that gets discarded on resume and redone. Each entry also lists the shard's files that
+    failed, so a resume can re-queue them.
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.entries = []
+        if os.path.exists(journal_path):
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # a torn last line from a crash mid-write: that shard is redone
+                        break
+
+    def done_files(self, retry_failed=False):
+        """Files of every committed shard; with retry_failed, minus those whose last attempt failed."""
+        done = {path for entry in self.entries for path in entry['files']}
+        return done - self.failed_files() if retry_failed else done
+
+    def failed_files(self):
+        failed = set()
+        for entry in self.entries:
+            errors = set(entry.get('failed', ()))
+            for path in entry['files']:
+                if path in errors:
+                    failed.add(path)
+                else:
+                    failed.discard(path)
+        return failed
+
+    def last(self, field, default):
+        return self.entries[-1][field] if self.entries else default
+
+    def commit(self, files, **fields):
+        entry = {'files': files, **fields}
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries.append(entry)
+
+
+class JsonlSink:
+    JOURNAL_FIELD = 'output_offset'
+
+    def __init__(self, output_path, journal):
+        self.output_path = output_path
+        committed = journal.last('output_offset', 0)
+        if os.path.exists(output_path) and os.path.getsize(output_path) > committed:
+            logging.warning(f"Dropping {os.path.getsize(output_path) - committed} bytes of uncommitted output from an interrupted run.")
+        self.f_out = open(output_path, 'a+b')
+        self.f_out.truncate(committed)
+        self.f_out.seek(committed)
+
+    def write(self, records):
+        for record in records:
+            self.f_out.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+        self.f_out.flush()
+        os.fsync(self.f_out.fileno())
+        return {'output_offset': self.f_out.tell()}
+
+    def close(self):
+        self.f_out.close()
+
+
+class ParquetSink:
+    """One part file per shard in the output directory (needs pandas with pyarrow or fastparquet)."""
+
+    JOURNAL_FIELD = 'part'
+
+    def __init__(self, output_dir, journal):
+        import pandas as pd
+
+        self.pd = pd
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        committed = {entry['part'] for entry in journal.entries}
+        for name in os.listdir(output_dir):
+            if name.endswith('.parquet') and name not in committed:
+                logging.warning(f"Removing uncommitted part file from an interrupted run: {name}")
+                os.remove(os.path.join(output_dir, name))
+        self.next_part = len(journal.entries)
+
+    def write(self, records):
+        part = f"part-{self.next_part:06d}.parquet"
+        rows = [{'image_path': r['image_path'], 'page': r.get('page'), 'error': r.get('error'),
+                 'text': "\n".join(line['text'] for line in r.get('lines', [])),
+                 'result': json.dumps({k: r[k] for k in ('lines', 'layout') if k in r}, ensure_ascii=False)}
+                for r in records]
+        self.pd.DataFrame(rows).to_parquet(os.path.join(self.output_dir, part), index=False)
+        self.next_part += 1
+        return {'part': part}
+
+    def close(self):
+        pass
+
+
+def make_shards(image_files, shard_size):
+    return [image_files[i:i + shard_size] for i in range(0, len(image_files), shard_size)]
+
+
+def bulk_ocr(image_dir, output_path, pipeline_args, num_workers=None, shard_size=32, output_format='jsonl',
+             retry_errors=False):
+    # multi-page PDFs are split into pages by the workers, like TIFFs
+    image_files = list_image_files(image_dir, IMAGE_EXTENSIONS + ('.pdf',))
+    if not image_files:
+        logging.error(f"No image files found in {image_dir}")
+        return False
+
+    journal = ResumeJournal(output_path.rstrip('/') + ".journal")
+    done = journal.done_files(retry_failed=retry_errors)
+    pending = [path for path in image_files if path not in done]
+    if journal.entries:
+        logging.info(f"Resuming: {len(image_files) - len(pending)} of {len(image_files)} files already done.")
+        failed = journal.failed_files()
+        if failed and retry_errors:
+            # their earlier error records stay in the output; the retry's records follow them
+            logging.info(f"Retrying {len(failed)} files that failed in an earlier run.")
+        elif failed:
+            logging.warning(f"{len(failed)} files failed in an earlier run and are skipped; pass --retry_errors to retry them.")
+    if not pending:
+        logging.info("Nothing left to do.")
+        return True
+
+    sink_class = ParquetSink if output_format == 'parquet' else JsonlSink
+    if any(sink_class.JOURNAL_FIELD not in entry for entry in journal.entries):
+        logging.error(f"{journal.journal_path} was written by a run with another --format; "
+                      f"resume with that format or write to a new output path.")
+        return False
+    sink = sink_class(output_path, journal)
+    num_workers = num_workers or os.cpu_count()
+    shards = make_shards(pending, shard_size)
+    worker_stats = {}
+    failed_shards = 0
+
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker, initargs=(pipeline_args,)) as executor:
+            futures = {executor.submit(process_shard, shard): shard for shard in shards}
+
+            for future in tqdm(as_completed(futures), total=len(shards), desc="OCR shards"):
+                shard = futures[future]
+                try:
+                    pid, records, pages, busy = future.result()
+                except Exception as e:
+                    # the shard is not journaled, so a later run retries it
+                    logging.error(f"A shard of {len(shard)} files failed: {e}", exc_info=False)
+                    failed_shards += 1
+                    continue
+                failed = sorted({record['image_path'] for record in records if 'error' in record})
+                journal.commit(shard, failed=failed, **sink.write(records))
+                stats = worker_stats.setdefault(pid, {'pages': 0, 'seconds': 0.0})
+                stats['pages'] += pages
+                stats['seconds'] += busy
+    finally:
+        sink.close()
+
+    elapsed = time.perf_counter() - start
+    total_pages = sum(s['pages'] for s in worker_stats.values())
+    for pid, s in sorted(worker_stats.items()):
+        logging.info(f"Worker {pid}: {s['pages']} pages, {s['pages'] / max(s['seconds'], 1e-9):.2f} pages/s while busy")
+    logging.info(f"Processed {total_pages} pages in {elapsed:.1f}s ({total_pages / max(elapsed, 1e-9):.2f} pages/s overall, "
+                 f"{len(worker_stats)} workers)")
+    if failed_shards:
+        logging.error(f"{failed_shards} of {len(shards)} shards failed and were not written; re-run the same command to retry them.")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk OCR of an archive of page images with one model-loaded pipeline per worker process; resumable.")
+    parser.add_argument("image_directory", help="Directory containing the page images (searched recursively).")
+    parser.add_argument("output", help="Output JSONL file, or output directory for --format parquet. A .journal file is kept next to it.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to CPU count if None.")
+    parser.add_argument("--shard_size", type=int, default=32, help="Files per task handed to a worker (default: 32)")
+    parser.add_argument("--format", choices=['jsonl', 'parquet'], default='jsonl', help="Output format (default: jsonl)")
+    parser.add_argument("--retry_errors", action='store_true', help="On resume, re-queue files whose last attempt failed (their error records stay in the output).")
+    add_pipeline_args(parser)
+    parser.set_defaults(cpu_threads=2)
+    args = parser.parse_args()
+
+    pipeline_args = {k: v for k, v in vars(args).items() if k not in ('image_directory', 'output', 'workers', 'shard_size', 'format', 'retry_errors')}
+    if bulk_ocr(args.image_directory, args.output, pipeline_args, args.workers, args.shard_size, args.format,
+                args.retry_errors):
+        print(f"bulk_ocr.py completed. Output: {args.output}")
+    else:
+        print("bulk_ocr.py failed. Check logs for errors.")
+        exit(1)
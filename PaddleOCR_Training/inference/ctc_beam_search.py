@@ -0,0 +1,460 @@
+# inference/ctc_beam_search.py
+#
+# python inference/ctc_beam_search.py --lexicon ocr_output/lexicon.txt --beam_width 8 --lexicon_weight 2.0 --budget_ms 1.0
+
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from ctc_decoder import BatchCTCDecoder, load_char_dict, random_ctc_batch
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+NEG_INF = np.float32(-np.inf)
+HASH_MULT = np.uint64(0x100000001B3)  # prefix hashes are rolled with the FNV prime, wrapping modulo 2**64
+DEAD_HASH = np.uint64(0xFFFFFFFFFFFFFFFF)  # prefix hash of empty beam slots
+NO_PARENT = np.uint64(0xFFFFFFFFFFFFFFFE)  # parent hash of the empty prefix and of empty slots
+
+
+def load_lexicon(lexicon_path):
+    """Words from a text file: one or more whitespace-separated words per line."""
+    words = []
+    with open(lexicon_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            words.extend(line.split())
+    return words
+
+
+class LexiconTrie:
+    """
+    Prefix trie over a word list, built once in dictionary class indices.
+
+    The transitions of a whole batch of beams are looked up in one array operation: in a
+    dense [nodes, classes] child table while that has at most dense_limit entries, otherwise
+    with one np.searchsorted over the sorted (node * num_classes + class) edge keys. Node 0
+    is the root; -1 means "left the lexicon".
+
+    Only runs of alphabetic characters are matched against the lexicon; any other character
+    (digits, punctuation, the space) ends the current word. Words containing characters that
+    are not alphabetic or not in the dictionary are skipped. With ignore_case, words and
+    characters are compared lowercased.
+    """
+
+    def __init__(self, words, character, ignore_case=True, dense_limit=1 << 23):
+        self.character = list(character)
+        self.num_classes = len(self.character)
+        index = {c: i for i, c in enumerate(self.character) if i > 0}
+        fold = (lambda s: s.lower()) if ignore_case else (lambda s: s)
+
+        # class -> trie symbol: the class of the lowercased character when that is in the dictionary
+        self.symbol = np.arange(self.num_classes, dtype=np.int64)
+        for i, c in enumerate(self.character[1:], 1):
+            self.symbol[i] = index.get(fold(c), i)
+        self.word_char = np.array([i > 0 and len(c) == 1 and c.isalpha() for i, c in enumerate(self.character)])
+
+        children = [{}]
+        terminal = [False]
+        self.num_words = 0
+        self.skipped = 0
+        for word in words:
+            word = fold(word.strip())
+            if not word:
+                continue
+            if not all(ch in index and ch.isalpha() for ch in word):
+                self.skipped += 1
+                continue
+            node = 0
+            for ch in word:
+                sym = int(self.symbol[index[ch]])
+                child = children[node].get(sym)
+                if child is None:
+                    child = len(children)
+                    children[node][sym] = child
+                    children.append({})
+                    terminal.append(False)
+                node = child
+            if not terminal[node]:
+                terminal[node] = True
+                self.num_words += 1
+
+        keys = [(node * self.num_classes + sym, child) for node, edges in enumerate(children) for sym, child in edges.items()]
+        keys.sort()
+        self.keys = np.array([k for k, _ in keys], dtype=np.int64)
+        self.children = np.array([c for _, c in keys], dtype=np.int64)
+        self.terminal = np.array(terminal, dtype=bool)
+        self.table = None
+        if self.num_nodes * self.num_classes <= dense_limit:
+            self.table = np.full((self.num_nodes + 1, self.num_classes), -1, dtype=np.int32)  # last row: node -1
+            self.table.ravel()[self.keys] = self.children
+        if self.skipped:
+            logging.warning(f"Lexicon: skipped {self.skipped} words with non-alphabetic or out-of-dictionary characters.")
+
+    @property
+    def num_nodes(self):
+        return len(self.terminal)
+
+    def child(self, nodes, classes):
+        """Child node for every (node, class) pair, -1 where the trie has no such edge (or node is -1)."""
+        if self.table is not None:
+            return self.table[nodes, self.symbol[classes]]
+        query = nodes * self.num_classes + self.symbol[classes]
+        if len(self.keys) == 0:
+            return np.full(query.shape, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, query), len(self.keys) - 1)
+        return np.where((self.keys[pos] == query) & (nodes >= 0), self.children[pos], -1)
+
+    def incomplete(self, nodes):
+        """True where a word ending at this node is a strict prefix of lexicon words but not a word itself."""
+        return (nodes > 0) & ~self.terminal[np.maximum(nodes, 0)]
+
+
+class BatchCTCBeamDecoder:
+    """
+    CTC prefix beam search over a whole [B, T, C] batch, optionally biased towards a lexicon.
+
+    Every row keeps beam_width prefixes. At each timestep a prefix can stay (blank, or a
+    repeat of its last character) or be extended by one of the top_k characters of that
+    timestep, picked for all rows at once with np.argpartition before the loop. Prefixes are
+    identified by a rolling hash; an extension that spells another beam's prefix is merged
+    into it, and the best beam_width of the beam_width * (top_k + 1) candidates per row
+    survive (one argpartition over the batch). All of it is array operations over [B, beams]
+    or [B, beams, top_k], with a Python loop over timesteps only. Timesteps where every row's
+    blank probability is at least blank_skip only update the stay probabilities.
+
+    With a lexicon, each prefix also tracks its node in the LexiconTrie. A word costs
+    lexicon_weight (in log-probability) when it leaves the trie or ends on a node that is
+    not a word; a large weight makes the lexicon a hard constraint, 0 turns it off.
+
+    Output matches BatchCTCDecoder: a list of (text, confidence) tuples. The confidence is on
+    the greedy decoder's scale, so drop_score and the cascade threshold mean the same with
+    either decoder: the mean probability of each character at the frame where the most
+    probable alignment of the decoded text starts it (0.0 for empty lines). Where the text is
+    the greedy one, that is the greedy mean max-probability.
+    """
+
+    def __init__(self, char_dict_path=None, lexicon=None, beam_width=8, lexicon_weight=2.0, top_k=None,
+                 blank_skip=0.999, use_space_char=False, character=None, ignore_case=True):
+        if character is None:
+            if char_dict_path is None:
+                raise ValueError("Either char_dict_path or character must be given.")
+            character = load_char_dict(char_dict_path, use_space_char)
+        self.character = list(character)
+        self.blank_index = 0
+        self.beam_width = beam_width
+        self.top_k = min(top_k or beam_width, self.num_classes - 1)
+        self.lexicon_weight = np.float32(lexicon_weight)
+        self.blank_skip = blank_skip
+
+        self.trie = None
+        if lexicon is not None:
+            if isinstance(lexicon, str):
+                lexicon = load_lexicon(lexicon)
+            self.trie = LexiconTrie(lexicon, self.character, ignore_case)
+            logging.info(f"Lexicon trie: {self.trie.num_words} words, {self.trie.num_nodes} nodes.")
+
+    @property
+    def num_classes(self):
+        return len(self.character)
+
+    def _lexicon_step(self, node, penalty, classes):
+        """Trie node and accumulated penalty after appending `classes` to prefixes at `node`."""
+        word_char = self.trie.word_char[classes]
+        child = self.trie.child(node, classes)
+        left_trie = word_char & (node >= 0) & (child < 0)
+        ended_short = ~word_char & self.trie.incomplete(node)
+        new_node = np.where(word_char, child, 0)
+        return new_node, penalty + self.lexicon_weight * (left_trie | ended_short)
+
+    def __call__(self, preds, return_confidence=True):
+        """
+        Decodes a batch of recognition head outputs.
+
+        Args:
+            preds: [B, T, C] probabilities (softmax output of CTCHead), or a list/tuple whose
+                last element is that array, as CTCLabelDecode accepts.
+            return_confidence: if False, returns only the decoded strings.
+        """
+        if isinstance(preds, (tuple, list)):
+            preds = preds[-1]
+        preds = np.asarray(preds)
+        if preds.ndim != 3:
+            raise ValueError(f"Expected [B, T, C] predictions, got shape {preds.shape}")
+        if preds.shape[2] != self.num_classes:
+            raise ValueError(
+                f"Prediction has {preds.shape[2]} classes but the dictionary has {self.num_classes} "
+                f"(including blank). Check character_dict_path / use_space_char."
+            )
+        batch_size, time_steps, _ = preds.shape
+        if batch_size == 0:
+            return []
+
+        log_probs = np.log(np.maximum(preds, 1e-30), dtype=np.float32)
+        k, width = self.top_k, self.beam_width
+        # top-k non-blank classes of every (row, timestep), picked once for the whole batch
+        top_classes = np.argpartition(-log_probs[:, :, 1:], k - 1, axis=2)[:, :, :k] + 1
+        top_log_probs = np.take_along_axis(log_probs, top_classes, axis=2)
+        blank_only = np.all(preds[:, :, 0] >= self.blank_skip, axis=0)
+
+        rows = np.arange(batch_size)
+        r = rows[:, None]
+        p_blank = np.full((batch_size, width), NEG_INF, dtype=np.float32)
+        p_blank[:, 0] = 0.0
+        p_nonblank = np.full((batch_size, width), NEG_INF, dtype=np.float32)
+        prefix_hash = np.zeros((batch_size, width), dtype=np.uint64)
+        prefix_id = np.full((batch_size, width), -1, dtype=np.int64)  # into the parent/char pool, -1 = empty
+        last = np.zeros((batch_size, width), dtype=np.int64)
+        node = np.zeros((batch_size, width), dtype=np.int64)
+        penalty = np.zeros((batch_size, width), dtype=np.float32)
+        pool_parent, pool_char, pool_size = [], [], 0
+
+        parent_hash = np.full((batch_size, width), NO_PARENT, dtype=np.uint64)
+        prefix_hash[:, 1:] = DEAD_HASH
+
+        for t in range(time_steps):
+            step = log_probs[:, t, :]
+            total = np.logaddexp(p_blank, p_nonblank)
+            last_log_prob = step[r, last]
+            stay_blank = total + step[:, :1]
+            stay_nonblank = np.where(last > 0, p_nonblank + last_log_prob, NEG_INF)
+            if blank_only[t]:
+                p_blank, p_nonblank = stay_blank, stay_nonblank
+                continue
+
+            # Beams are distinct prefixes, so the only duplicates are beam j reached again by extending
+            # the beam i it was extended from: fold those extensions into j's stay probability.
+            child_of = parent_hash[:, :, None] == prefix_hash[:, None, :]  # [B, j, i]
+            has_parent = child_of.any(axis=2)
+            parent = np.argmax(child_of, axis=2)
+            parent_last = last[r, parent]
+            via_parent = np.where(parent_last == last, p_blank[r, parent], total[r, parent]) + last_log_prob
+            stay_nonblank = np.where(has_parent, np.logaddexp(stay_nonblank, via_parent), stay_nonblank)
+
+            classes = np.broadcast_to(top_classes[:, t, None, :], (batch_size, width, k))
+            # a repeated character only extends the prefix across a blank
+            ext_nonblank = np.where(classes == last[:, :, None], p_blank[:, :, None], total[:, :, None]) + top_log_probs[:, t, None, :]
+            b, j, m = np.nonzero(has_parent[:, :, None] & (top_classes[:, t, None, :] == last[:, :, None]))
+            ext_nonblank[b, parent[b, j], m] = NEG_INF  # already counted in beam j
+            ext_node, ext_penalty = node[:, :, None], penalty[:, :, None]
+            if self.trie is not None:
+                ext_node, ext_penalty = self._lexicon_step(ext_node, ext_penalty, classes)
+
+            stay_score = np.logaddexp(stay_blank, stay_nonblank) - penalty
+            ext_score = (ext_nonblank - ext_penalty).reshape(batch_size, width * k)
+            score = np.concatenate([stay_score, ext_score], axis=1)
+            # best `width` candidates of every row: a slot below width keeps beam `slot`, any other
+            # extends beam (slot - width) // k with its ((slot - width) % k)-th top class
+            slot = np.argpartition(-score, width - 1, axis=1)[:, :width]
+            extended = slot >= width
+            ext_slot = np.where(extended, slot - width, 0)
+            beam = np.where(extended, ext_slot // k, slot)
+            char = np.where(extended, top_classes[r, t, ext_slot % k], last[r, beam])
+            dead = score[r, slot] == NEG_INF
+
+            def from_beam(state):
+                return state[r, beam]
+
+            def from_ext(values, stay_values):
+                values = np.broadcast_to(values, (batch_size, width, k)).reshape(batch_size, width * k)
+                return np.where(extended, values[r, ext_slot], from_beam(stay_values))
+
+            p_blank = np.where(extended, NEG_INF, from_beam(stay_blank))
+            p_nonblank = from_ext(ext_nonblank, stay_nonblank)
+            node = from_ext(ext_node, node)
+            penalty = from_ext(ext_penalty, penalty)
+            beam_hash = from_beam(prefix_hash)
+            parent_hash = np.where(dead, NO_PARENT, np.where(extended, beam_hash, from_beam(parent_hash)))
+            prefix_hash = np.where(dead, DEAD_HASH, np.where(extended, beam_hash * HASH_MULT + (char + 1).astype(np.uint64), beam_hash))
+            parent_id = from_beam(prefix_id)  # own id when staying, parent id when extending
+            prefix_id = parent_id.copy()
+            prefix_id[extended] = pool_size + np.arange(int(extended.sum()))
+            pool_parent.append(parent_id[extended])
+            pool_char.append(char[extended])
+            pool_size += int(extended.sum())
+            last = char
+
+        total = np.logaddexp(p_blank, p_nonblank)
+        final_penalty = penalty
+        if self.trie is not None:
+            final_penalty = penalty + self.lexicon_weight * self.trie.incomplete(node)
+        best = np.argmax(total - final_penalty, axis=1)
+
+        parents = np.concatenate(pool_parent) if pool_parent else np.zeros(0, dtype=np.int64)
+        chars = np.concatenate(pool_char) if pool_char else np.zeros(0, dtype=np.int64)
+        labels = []
+        for row, beam in zip(rows, best):
+            row_labels = []
+            pid = prefix_id[row, beam]
+            while pid >= 0:
+                row_labels.append(chars[pid])
+                pid = parents[pid]
+            labels.append(row_labels[::-1])
+        texts = [''.join(self.character[c] for c in row_labels) for row_labels in labels]
+        if not return_confidence:
+            return texts
+        return list(zip(texts, alignment_confidences(preds, log_probs, labels)))
+
+
+def alignment_confidences(preds, log_probs, labels):
+    """
+    Per row, the mean probability of each label at the first frame of its span in the Viterbi
+    (most probable single) CTC alignment of `labels`; 0.0 for an empty label sequence.
+
+    The Viterbi pass runs over the whole batch at once on [B, 2 * max_len + 1] states (labels
+    at the odd states, blanks between them), with a Python loop over timesteps only.
+    """
+    batch_size, time_steps, _ = preds.shape
+    lengths = np.array([len(row) for row in labels], dtype=np.int64)
+    max_len = int(lengths.max()) if batch_size else 0
+    if max_len == 0:
+        return [0.0] * batch_size
+    states = np.zeros((batch_size, 2 * max_len + 1), dtype=np.int64)  # class of every state, blank = 0
+    for b, row in enumerate(labels):
+        states[b, 1:2 * len(row):2] = row
+    rows = np.arange(batch_size)
+    emit = np.take_along_axis(log_probs, np.broadcast_to(states[:, None, :], (batch_size, time_steps, states.shape[1])), axis=2)
+    # a label state may be entered from two states back unless that is the same label (a repeat needs a blank)
+    can_skip = np.zeros(states.shape, dtype=bool)
+    can_skip[:, 3::2] = states[:, 3::2] != states[:, 1:-2:2]
+
+    score = np.full(states.shape, NEG_INF, dtype=np.float32)
+    score[:, :2] = emit[:, 0, :2]
+    back = np.zeros((time_steps,) + states.shape, dtype=np.int8)  # 0 stay, 1 from s-1, 2 from s-2
+    for t in range(1, time_steps):
+        prev1 = np.concatenate([np.full((batch_size, 1), NEG_INF, dtype=np.float32), score[:, :-1]], axis=1)
+        prev2 = np.concatenate([np.full((batch_size, 2), NEG_INF, dtype=np.float32), score[:, :-2]], axis=1)
+        candidates = np.stack([score, prev1, np.where(can_skip, prev2, NEG_INF)])
+        back[t] = np.argmax(candidates, axis=0)
+        score = np.max(candidates, axis=0) + emit[:, t]
+
+    # the alignment ends on the last label or the blank after it
+    last_label, last_blank = 2 * lengths - 1, 2 * lengths
+    state = np.where((lengths == 0) | (score[rows, last_blank] > score[rows, np.maximum(last_label, 0)]), last_blank, last_label)
+    path = np.zeros((batch_size, time_steps), dtype=np.int64)
+    for t in range(time_steps - 1, -1, -1):
+        path[:, t] = state
+        state = state - back[t, rows, state]
+    starts = path % 2 == 1
+    starts[:, 1:] &= path[:, 1:] != path[:, :-1]
+    probs = np.take_along_axis(preds, np.take_along_axis(states, path, axis=1)[:, :, None], axis=2)[:, :, 0]
+    sums = np.where(starts, probs, 0.0).sum(axis=1)
+    return [float(total / n) if n else 0.0 for total, n in zip(sums, lengths)]
+
+
+def synthetic_lexicon_batch(words, character, batch_size, time_steps, confusion=0.1, seed=0):
+    """
+    Synthetic softmax output for lines of lexicon words, with the text each row spells.
+
+    Words are joined with spaces into lines when the dictionary has a space, otherwise every
+    line is a single word. Every character takes one or two frames followed by zero to two
+    blanks (always one between repeated characters). With probability `confusion` a character's frames put a
+    slightly higher peak on another letter, so the greedy path misreads it while the true
+    character stays second best, which is the case a lexicon can fix.
+    """
+    rng = np.random.default_rng(seed)
+    index = {c: i for i, c in enumerate(character) if i > 0}
+    letters = np.array([i for i, c in enumerate(character) if i > 0 and len(c) == 1 and c.isalpha()])
+    words = [w for w in words if w and all(ch in index for ch in w)]
+    logits = rng.normal(scale=0.5, size=(batch_size, time_steps, len(character))).astype(np.float32)
+    texts = []
+    for b in range(batch_size):
+        line = []
+        while True:
+            word = words[rng.integers(len(words))]
+            candidate = ' '.join(line + [word])
+            if line and len(candidate) * 3 > time_steps:
+                break
+            line.append(word)
+            if ' ' not in index or len(candidate) * 3 > time_steps:
+                break
+        text = ' '.join(line)[:time_steps // 3]
+        texts.append(text)
+        peaks = []
+        for i, ch in enumerate(text):
+            if i and text[i - 1] == ch:
+                peaks.append((0, None))
+            target = index[ch]
+            decoy = int(rng.choice(letters)) if ch.isalpha() and rng.random() < confusion else None
+            peaks.extend([(target, decoy)] * int(rng.integers(1, 3)))
+            peaks.extend([(0, None)] * int(rng.integers(0, 3)))
+        peaks = peaks[:time_steps] + [(0, None)] * (time_steps - len(peaks))
+        for t, (target, decoy) in enumerate(peaks):
+            logits[b, t, target] = 9.0
+            if decoy is not None and decoy != target:
+                logits[b, t, decoy] = 9.5
+    logits -= logits.max(axis=2, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=2, keepdims=True)
+    return probs.astype(np.float32), texts
+
+
+def random_lexicon(character, num_words=2000, seed=0):
+    """Random lowercase words over the dictionary's letters, when no word list is given."""
+    rng = np.random.default_rng(seed)
+    letters = sorted({c.lower() for c in character[1:] if len(c) == 1 and c.isalpha()})
+    return [''.join(rng.choice(letters, size=rng.integers(2, 10))) for _ in range(num_words)]
+
+
+def time_decoder(decoder, preds, iterations):
+    decoder(preds)  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        results = decoder(preds)
+    return results, (time.perf_counter() - start) / iterations
+
+
+def benchmark_beam_search(char_dict_path, lexicon_path=None, batch_size=64, time_steps=40, beam_width=8,
+                          lexicon_weight=2.0, top_k=None, iterations=10, budget_ms=1.0, use_space_char=False):
+    """
+    Decode time per line and line accuracy of the lexicon beam search against the greedy
+    decoder, on synthetic lines of lexicon words and on unstructured random output (the
+    worst case: no all-blank timesteps to skip). Returns False if either exceeds budget_ms.
+    """
+    character = load_char_dict(char_dict_path, use_space_char)
+    words = load_lexicon(lexicon_path) if lexicon_path else random_lexicon(character)
+    start = time.perf_counter()
+    beam = BatchCTCBeamDecoder(character=character, lexicon=words, beam_width=beam_width,
+                               lexicon_weight=lexicon_weight, top_k=top_k)
+    logging.info(f"Trie built in {(time.perf_counter() - start) * 1000:.1f} ms")
+    greedy = BatchCTCDecoder(character=character)
+
+    lexicon_preds, texts = synthetic_lexicon_batch(words, character, batch_size, time_steps)
+    random_preds = random_ctc_batch(batch_size, time_steps, len(character))
+    logging.info(f"Batch shape [B, T, C] = [{batch_size}, {time_steps}, {len(character)}], beam width {beam_width}, "
+                 f"top-k {beam.top_k}, lexicon weight {lexicon_weight}, {iterations} iterations")
+
+    within_budget = True
+    for name, preds in (("lexicon lines", lexicon_preds), ("random output", random_preds)):
+        greedy_results, greedy_seconds = time_decoder(greedy, preds, iterations)
+        beam_results, beam_seconds = time_decoder(beam, preds, iterations)
+        per_line = beam_seconds * 1000 / batch_size
+        logging.info(f"{name}:")
+        logging.info(f"  Greedy decoder: {greedy_seconds * 1000 / batch_size:.4f} ms/line")
+        logging.info(f"  Beam decoder:   {per_line:.4f} ms/line ({beam_seconds / greedy_seconds:.1f}x greedy; "
+                     f"budget {budget_ms} ms/line: {'ok' if per_line <= budget_ms else 'EXCEEDED'})")
+        within_budget &= per_line <= budget_ms
+        if name == "lexicon lines":
+            for label, results in (("greedy", greedy_results), ("beam", beam_results)):
+                acc = np.mean([pred == text for (pred, _), text in zip(results, texts)])
+                logging.info(f"  Line accuracy, {label}: {acc:.3f}")
+    return within_budget
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the lexicon-constrained CTC beam search against the greedy decoder.")
+    parser.add_argument("--char_dict", default="/home/jupyter/PaddleOCR_Training/ocr_output/custom_char_dict.txt", help="Path to the character dictionary used by the recognition model.")
+    parser.add_argument("--lexicon", default=None, help="Word list (whitespace-separated words); random words over the dictionary's letters if omitted.")
+    parser.add_argument("--batch_size", type=int, default=64, help="Batch size B (default: 64)")
+    parser.add_argument("--time_steps", type=int, default=40, help="Sequence length T (default: 40, CTCHead output for a 320-wide crop)")
+    parser.add_argument("--beam_width", type=int, default=8, help="Prefixes kept per line (default: 8)")
+    parser.add_argument("--top_k", type=int, default=None, help="Characters tried per timestep (default: beam width)")
+    parser.add_argument("--lexicon_weight", type=float, default=2.0, help="Log-probability cost of a word outside the lexicon (default: 2.0)")
+    parser.add_argument("--iterations", type=int, default=10, help="Timed iterations per decoder (default: 10)")
+    parser.add_argument("--budget_ms", type=float, default=1.0, help="Decode time budget per line for the beam decoder (default: 1.0 ms)")
+    parser.add_argument("--use_space_char", action="store_true", help="Append a space to the dictionary, as Global.use_space_char does.")
+    args = parser.parse_args()
+
+    if not benchmark_beam_search(args.char_dict, args.lexicon, args.batch_size, args.time_steps, args.beam_width,
+                                 args.lexicon_weight, args.top_k, args.iterations, args.budget_ms, args.use_space_char):
+        exit(1)
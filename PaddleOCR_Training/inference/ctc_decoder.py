@@ -0,0 +1,215 @@
+# inference/ctc_decoder.py
+
+import argparse
+import logging
+import time
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+BLANK_TOKEN = "blank"  # CTCLabelDecode puts the CTC blank at index 0
+
+
+def load_char_dict(char_dict_path, use_space_char=False):
+    """
+    Loads a character dictionary exactly the way PaddleOCR's BaseRecLabelDecode does:
+    one entry per line, only the line ending is stripped (so a line holding a single
+    space is the space character), and the CTC blank is prepended at index 0.
+    """
+    characters = []
+    with open(char_dict_path, 'rb') as f:
+        for line in f.readlines():
+            characters.append(line.decode('utf-8').strip("\n").strip("\r\n"))
+    if use_space_char:
+        characters.append(" ")
+    return [BLANK_TOKEN] + characters
+
+
+class BatchCTCDecoder:
+    """
+    Greedy CTC decoder that works on a whole [B, T, C] batch at once.
+
+    argmax, collapse-repeats and blank removal are done as array operations over the
+    batch. Indices are mapped to text through a code point lookup array built once from
+    the character dictionary, so a decoded row is turned into a string by viewing it as
+    a fixed-width numpy unicode array instead of joining characters in Python.
+
+    Output matches CTCLabelDecode: a list of (text, confidence) tuples, where confidence
+    is the mean max-probability over the kept timesteps (0.0 for an empty line).
+    """
+
+    def __init__(self, char_dict_path=None, use_space_char=False, character=None):
+        if character is None:
+            if char_dict_path is None:
+                raise ValueError("Either char_dict_path or character must be given.")
+            character = load_char_dict(char_dict_path, use_space_char)
+        self.character = list(character)
+        self.blank_index = 0
+
+        # The blank is never emitted, so only the real entries need to be single code points
+        # for the fast path. Multi-character entries fall back to an object lookup + join.
+        self.single_codepoint = all(len(c) == 1 for c in self.character[1:])
+        self.codepoint_lookup = np.zeros(len(self.character), dtype=np.uint32)
+        if self.single_codepoint:
+            self.codepoint_lookup[1:] = [ord(c) for c in self.character[1:]]
+        self.object_lookup = np.array(self.character, dtype=object)
+
+    @property
+    def num_classes(self):
+        return len(self.character)
+
+    def selection_mask(self, preds_idx):
+        """Boolean [B, T] mask of the timesteps that survive collapse-repeats and blank removal."""
+        selection = np.ones(preds_idx.shape, dtype=bool)
+        selection[:, 1:] = preds_idx[:, 1:] != preds_idx[:, :-1]
+        selection &= preds_idx != self.blank_index
+        return selection
+
+    def decode_indices(self, preds_idx, selection):
+        """Turns argmax indices plus their selection mask into one string per row."""
+        batch_size, time_steps = preds_idx.shape
+        if batch_size == 0:
+            return []
+        if not self.single_codepoint:
+            counts = selection.sum(axis=1)
+            chars = self.object_lookup[preds_idx[selection]]
+            splits = np.split(chars, np.cumsum(counts)[:-1])
+            return [''.join(row) for row in splits]
+
+        codes = np.where(selection, self.codepoint_lookup[preds_idx], 0).astype(np.uint32)
+        # Move the kept code points to the front of each row (stable, so order is preserved);
+        # the zero padding left at the end is dropped by numpy's unicode dtype.
+        order = np.argsort(~selection, axis=1, kind='stable')
+        codes = np.ascontiguousarray(np.take_along_axis(codes, order, axis=1))
+        return codes.view(f'<U{time_steps}').reshape(batch_size).tolist()
+
+    def decode_confidences(self, preds_prob, selection):
+        """Mean probability over the kept timesteps of every row, 0.0 where nothing was kept."""
+        counts = selection.sum(axis=1)
+        kept = np.split(preds_prob[selection], np.cumsum(counts)[:-1])
+        # np.mean per row keeps the float32 summation order identical to CTCLabelDecode.
+        return [np.mean(row).tolist() if len(row) else 0.0 for row in kept]
+
+    def __call__(self, preds, return_confidence=True):
+        """
+        Decodes a batch of recognition head outputs.
+
+        Args:
+            preds: [B, T, C] probabilities (softmax output of CTCHead), or a list/tuple whose
+                last element is that array, as CTCLabelDecode accepts.
+            return_confidence: if False, returns only the decoded strings.
+        """
+        if isinstance(preds, (tuple, list)):
+            preds = preds[-1]
+        preds = np.asarray(preds)
+        if preds.ndim != 3:
+            raise ValueError(f"Expected [B, T, C] predictions, got shape {preds.shape}")
+        if preds.shape[2] != self.num_classes:
+            raise ValueError(
+                f"Prediction has {preds.shape[2]} classes but the dictionary has {self.num_classes} "
+                f"(including blank). Check character_dict_path / use_space_char."
+            )
+
+        preds_idx = preds.argmax(axis=2)
+        selection = self.selection_mask(preds_idx)
+        texts = self.decode_indices(preds_idx, selection)
+        if not return_confidence:
+            return texts
+
+        preds_prob = np.take_along_axis(preds, preds_idx[:, :, None], axis=2)[:, :, 0]
+        confidences = self.decode_confidences(preds_prob, selection)
+        return list(zip(texts, confidences))
+
+
+def reference_decode(preds, character):
+    """
+    Per-sequence loop decoder with the same semantics as CTCLabelDecode.
+    Used as the parity baseline when PaddleOCR itself is not importable.
+    """
+    preds_idx = preds.argmax(axis=2)
+    preds_prob = preds.max(axis=2)
+    result_list = []
+    for batch_idx in range(len(preds_idx)):
+        selection = np.ones(len(preds_idx[batch_idx]), dtype=bool)
+        selection[1:] = preds_idx[batch_idx][1:] != preds_idx[batch_idx][:-1]
+        selection &= preds_idx[batch_idx] != 0
+        char_list = [character[text_id] for text_id in preds_idx[batch_idx][selection]]
+        conf_list = preds_prob[batch_idx][selection]
+        if len(conf_list) == 0:
+            conf_list = [0]
+        result_list.append((''.join(char_list), np.mean(conf_list).tolist()))
+    return result_list
+
+
+def get_reference_decoder(char_dict_path, use_space_char=False):
+    """Returns PaddleOCR's CTCLabelDecode if available, otherwise the local loop port."""
+    try:
+        import paddleocr  # noqa: F401  (puts ppocr on sys.path)
+        from ppocr.postprocess.rec_postprocess import CTCLabelDecode
+        logging.info("Parity baseline: ppocr.postprocess.rec_postprocess.CTCLabelDecode")
+        return CTCLabelDecode(character_dict_path=char_dict_path, use_space_char=use_space_char)
+    except ImportError:
+        logging.info("PaddleOCR not importable. Parity baseline: local reference_decode port.")
+        character = load_char_dict(char_dict_path, use_space_char)
+        return lambda preds: reference_decode(preds, character)
+
+
+def random_ctc_batch(batch_size, time_steps, num_classes, blank_ratio=0.5, seed=0):
+    """Synthetic softmax output with realistic runs of blanks and repeated characters."""
+    rng = np.random.default_rng(seed)
+    logits = rng.normal(size=(batch_size, time_steps, num_classes)).astype(np.float32)
+    peaks = rng.integers(1, num_classes, size=(batch_size, time_steps))
+    peaks = np.where(rng.random((batch_size, time_steps)) < blank_ratio, 0, peaks)
+    repeat = rng.random((batch_size, time_steps)) < 0.3
+    repeat[:, 0] = False
+    peaks[repeat] = np.roll(peaks, 1, axis=1)[repeat]
+    np.put_along_axis(logits, peaks[:, :, None], 8.0, axis=2)
+    logits -= logits.max(axis=2, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=2, keepdims=True)
+    return probs.astype(np.float32)
+
+
+def benchmark_decoders(char_dict_path, batch_size=64, time_steps=128, iterations=50, use_space_char=False):
+    decoder = BatchCTCDecoder(char_dict_path, use_space_char)
+    reference = get_reference_decoder(char_dict_path, use_space_char)
+    preds = random_ctc_batch(batch_size, time_steps, decoder.num_classes)
+    # Force a few fully-blank rows so the empty-line path is covered by the parity check.
+    preds[: max(1, batch_size // 16), :, :] = 0.0
+    preds[: max(1, batch_size // 16), :, 0] = 1.0
+
+    expected = reference(preds)
+    actual = decoder(preds)
+    mismatches = sum(1 for e, a in zip(expected, actual) if e[0] != a[0] or e[1] != a[1])
+    if mismatches:
+        logging.error(f"Parity check FAILED: {mismatches}/{batch_size} lines differ from the reference decoder.")
+    else:
+        logging.info(f"Parity check passed: {batch_size}/{batch_size} lines identical (text and confidence).")
+
+    timings = {}
+    for name, fn in (("reference", reference), ("batch", decoder)):
+        fn(preds)  # warm-up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(preds)
+        timings[name] = (time.perf_counter() - start) / iterations
+
+    logging.info(f"Batch shape [B, T, C] = [{batch_size}, {time_steps}, {decoder.num_classes}], {iterations} iterations")
+    logging.info(f"  Reference decoder: {timings['reference'] * 1000:.3f} ms/batch")
+    logging.info(f"  Batch decoder:     {timings['batch'] * 1000:.3f} ms/batch")
+    logging.info(f"  Speed-up: {timings['reference'] / timings['batch']:.2f}x")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the batched CTC greedy decoder against CTCLabelDecode and check parity.")
+    parser.add_argument("--char_dict", default="/home/jupyter/PaddleOCR_Training/ocr_output/custom_char_dict.txt", help="Path to the character dictionary used by the recognition model.")
+    parser.add_argument("--batch_size", type=int, default=64, help="Batch size B (default: 64)")
+    parser.add_argument("--time_steps", type=int, default=128, help="Sequence length T (default: 128, the configured max_text_length)")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed iterations per decoder (default: 50)")
+    parser.add_argument("--use_space_char", action="store_true", help="Append a space to the dictionary, as Global.use_space_char does.")
+    args = parser.parse_args()
+
+    if not benchmark_decoders(args.char_dict, args.batch_size, args.time_steps, args.iterations, args.use_space_char):
+        exit(1)
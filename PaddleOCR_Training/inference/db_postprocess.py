@@ -0,0 +1,389 @@
+# inference/db_postprocess.py
+#
+# python inference/db_postprocess.py --pages 20 --lines 150
+# python inference/db_postprocess.py --det_model_dir <exported det model> --image_dir <page images>
+
+import time
+import argparse
+import logging
+
+import cv2
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+
+def rect_points(rects):
+    """cv2.boxPoints for a whole [N, 5] array of (cx, cy, w, h, angle) rotated rects -> [N, 4, 2]."""
+    cx, cy, w, h, angle = (rects[:, i] for i in range(5))
+    theta = np.deg2rad(angle)
+    b, a = np.cos(theta) * 0.5, np.sin(theta) * 0.5
+    p0 = np.stack([cx - a * h - b * w, cy + b * h - a * w], axis=1)
+    p1 = np.stack([cx + a * h - b * w, cy - b * h - a * w], axis=1)
+    center2 = np.stack([2 * cx, 2 * cy], axis=1)
+    return np.stack([p0, p1, center2 - p0, center2 - p1], axis=1)
+
+
+def order_mini_boxes(points):
+    """
+    DBPostProcess.get_mini_boxes corner order for [N, 4, 2] boxes: sorted by x (stably),
+    then the left pair and the right pair each ordered by y, as top-left, top-right,
+    bottom-right, bottom-left.
+    """
+    points = np.take_along_axis(points, np.argsort(points[:, :, 0], axis=1, kind='stable')[:, :, None], axis=1)
+    left_swap = points[:, 1, 1] <= points[:, 0, 1]
+    right_swap = points[:, 3, 1] <= points[:, 2, 1]
+    first = np.where(left_swap, 1, 0)
+    second = np.where(right_swap, 3, 2)
+    order = np.stack([first, second, 5 - second, 1 - first], axis=1)
+    return np.take_along_axis(points, order[:, :, None], axis=1)
+
+
+def quad_row_spans(boxes, height, width):
+    """
+    Rasterizes [N, 4, 2] convex quads exactly like box_score_fast's cv2.fillPoly mask: corners
+    truncated to int inside each box's bounding rectangle (clipped to the map), pixel centres
+    between the edges, plus the outline fillPoly draws with cv2.line. Returns (box, y, x_lo,
+    x_hi) per row of every quad; x_lo > x_hi marks an empty row. Quads that cross the map
+    edge can differ in a few edge pixels, because cv2.line clips an edge before walking it.
+    """
+    xmin = np.clip(np.floor(boxes[:, :, 0].min(axis=1)), 0, width - 1).astype(np.int64)
+    xmax = np.clip(np.ceil(boxes[:, :, 0].max(axis=1)), 0, width - 1).astype(np.int64)
+    ymin = np.clip(np.floor(boxes[:, :, 1].min(axis=1)), 0, height - 1).astype(np.int64)
+    ymax = np.clip(np.ceil(boxes[:, :, 1].max(axis=1)), 0, height - 1).astype(np.int64)
+    offset = np.stack([xmin, ymin], axis=1)[:, None, :]
+    corners = (boxes - offset).astype(np.int32).astype(np.float64) + offset
+
+    counts = ymax - ymin + 1
+    box_of_row = np.repeat(np.arange(len(boxes)), counts)
+    y = ymin[box_of_row] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    left = np.full(len(y), np.inf)
+    right = np.full(len(y), -np.inf)
+    for e in range(4):
+        a, b = corners[box_of_row, e], corners[box_of_row, (e + 1) % 4]
+        dy_ab = b[:, 1] - a[:, 1]
+        in_rows = (y >= np.minimum(a[:, 1], b[:, 1])) & (y <= np.maximum(a[:, 1], b[:, 1]))
+        # interior: pixel centres between the edges
+        x = a[:, 0] + (y - a[:, 1]) * (b[:, 0] - a[:, 0]) / np.where(dy_ab == 0, 1.0, dy_ab)
+        left = np.where(in_rows & (dy_ab != 0), np.minimum(left, np.ceil(x - 1e-9)), left)
+        right = np.where(in_rows & (dy_ab != 0), np.maximum(right, np.floor(x + 1e-9)), right)
+
+        # outline, as cv2.line's Bresenham walk from the left end: the minor coordinate after i
+        # steps along the major axis is round-half-down(i * minor / major)
+        swap = (b[:, 0] < a[:, 0])[:, None]
+        x1, y1 = np.where(swap, b, a).astype(np.int64).T
+        x2, y2 = np.where(swap, a, b).astype(np.int64).T
+        dx, dy = x2 - x1, np.abs(y2 - y1)
+        k = np.abs(y.astype(np.int64) - y1)  # steps from y1 towards y2
+        x_major = dx >= dy
+        safe_dy, safe_dx = np.maximum(dy, 1), np.maximum(dx, 1)
+        run_lo = x1 + np.where(dy == 0, 0, (2 * k - 1) * dx // (2 * safe_dy) + 1)
+        run_hi = x1 + np.where(dy == 0, dx, (2 * k + 1) * dx // (2 * safe_dy))
+        run_lo, run_hi = np.maximum(run_lo, x1), np.minimum(run_hi, x2)
+        step_x = x1 - ((-(2 * dx * k - dy)) // (2 * np.where(x_major, safe_dx, safe_dy)))
+        run_lo = np.where(x_major, run_lo, step_x)
+        run_hi = np.where(x_major, run_hi, step_x)
+        left = np.where(in_rows, np.minimum(left, run_lo), left)
+        right = np.where(in_rows, np.maximum(right, run_hi), right)
+    x_lo = np.maximum(left, xmin[box_of_row])
+    x_hi = np.minimum(right, xmax[box_of_row])
+    return box_of_row, y, x_lo, x_hi
+
+
+def box_scores_fast(pred, boxes):
+    """
+    DBPostProcess.box_score_fast for all [N, 4, 2] boxes at once: the mean of `pred` over
+    each filled quad. The quads are rasterized together as row spans (quad_row_spans) and
+    every span is summed from one integral image, instead of a mask + fillPoly + cv2.mean per
+    box.
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.float64)
+    h, w = pred.shape[:2]
+    box_of_row, y, x_lo, x_hi = quad_row_spans(boxes, h, w)
+    pixels = np.maximum(x_hi - x_lo + 1, 0)
+    lo = np.clip(x_lo, 0, w).astype(np.int64)
+    hi = np.clip(x_hi + 1, 0, w).astype(np.int64)
+    integral = cv2.integral(np.ascontiguousarray(pred, dtype=np.float32), sdepth=cv2.CV_64F)
+    span = (integral[y + 1, hi] - integral[y, hi]) - (integral[y + 1, lo] - integral[y, lo])
+    span = np.where(pixels > 0, span, 0.0)
+    total = np.bincount(box_of_row, weights=span, minlength=len(boxes))
+    area = np.bincount(box_of_row, weights=pixels, minlength=len(boxes))
+    return total / np.maximum(area, 1)
+
+
+class VectorizedDBPostProcess:
+    """
+    Drop-in for ppocr's DBPostProcess with box_type 'quad' and score_mode 'fast' (what the
+    pipeline builds), with the per-box Python work replaced by array operations over all
+    candidates of a map.
+
+    Contours and their minimum-area rectangles still come from OpenCV, one call per contour;
+    after that, boxes are scored in one pass (box_scores_fast), filtered, and unclipped
+    analytically: offsetting a w x h rectangle by d with round joins and taking the minimum
+    area rectangle of the result, as DBPostProcess does with pyclipper + minAreaRect, gives
+    the same rectangle grown to (w + 2d) x (h + 2d), with d = area * unclip_ratio / perimeter.
+    Corners differ from pyclipper's integer polygon by at most about a pixel before scaling.
+
+    Called like DBPostProcess: ({'maps': [B, 1, H, W]}, shape_list) -> [{'points': [N, 4, 2] int32}].
+    """
+
+    def __init__(self, thresh=0.3, box_thresh=0.6, max_candidates=1000, unclip_ratio=1.5, min_size=3):
+        self.thresh = thresh
+        self.box_thresh = box_thresh
+        self.max_candidates = max_candidates
+        self.unclip_ratio = unclip_ratio
+        self.min_size = min_size
+
+    def boxes_from_bitmap(self, pred, bitmap, dest_width, dest_height):
+        height, width = bitmap.shape
+        contours = cv2.findContours((bitmap * 255).astype(np.uint8), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        contours = contours[:self.max_candidates]
+        if not contours:
+            return np.zeros((0, 4, 2), dtype=np.int32), np.zeros(0)
+        rects = np.array([(cx, cy, w, h, angle) for (cx, cy), (w, h), angle in map(cv2.minAreaRect, contours)], dtype=np.float64)
+        keep = np.minimum(rects[:, 2], rects[:, 3]) >= self.min_size
+        rects = rects[keep]
+
+        scores = box_scores_fast(pred, order_mini_boxes(rect_points(rects).astype(np.float32)).astype(np.float64))
+        keep = scores >= self.box_thresh
+        rects, scores = rects[keep], scores[keep]
+
+        rect_w, rect_h = rects[:, 2], rects[:, 3]
+        distance = rect_w * rect_h * self.unclip_ratio / (2 * (rect_w + rect_h))
+        rects[:, 2:4] += 2 * distance[:, None]
+        keep = np.minimum(rects[:, 2], rects[:, 3]) >= self.min_size + 2
+        rects, scores = rects[keep], scores[keep]
+
+        boxes = order_mini_boxes(rect_points(rects).astype(np.float32)).astype(np.float64)
+        boxes[:, :, 0] = np.clip(np.round(boxes[:, :, 0] / width * dest_width), 0, dest_width)
+        boxes[:, :, 1] = np.clip(np.round(boxes[:, :, 1] / height * dest_height), 0, dest_height)
+        return boxes.astype(np.int32), scores
+
+    def __call__(self, outs_dict, shape_list):
+        pred = np.asarray(outs_dict['maps'])[:, 0, :, :]
+        segmentation = pred > self.thresh
+        boxes_batch = []
+        for batch_index in range(pred.shape[0]):
+            src_h, src_w, ratio_h, ratio_w = shape_list[batch_index]
+            boxes, _ = self.boxes_from_bitmap(pred[batch_index], segmentation[batch_index], src_w, src_h)
+            boxes_batch.append({'points': boxes})
+        return boxes_batch
+
+
+def filter_boxes(dt_boxes, image_shape):
+    """
+    filter_det_boxes for a whole [N, 4, 2] array: corners ordered clockwise from the top-left
+    (smallest x + y), clipped to the image, boxes of 3px or less dropped.
+    """
+    boxes = np.asarray(dt_boxes, dtype=np.float32).reshape((-1, 4, 2))
+    if len(boxes) == 0:
+        return boxes
+    img_height, img_width = image_shape[:2]
+    rows = np.arange(len(boxes))[:, None]
+    total = boxes.sum(axis=2)
+    first, third = total.argmin(axis=1), total.argmax(axis=1)
+    diff = boxes[:, :, 1] - boxes[:, :, 0]
+    taken = np.zeros(total.shape, dtype=bool)
+    taken[rows[:, 0], first] = True
+    taken[rows[:, 0], third] = True
+    second = np.where(taken, np.inf, diff).argmin(axis=1)
+    fourth = np.where(taken, -np.inf, diff).argmax(axis=1)
+    boxes = boxes[rows, np.stack([first, second, third, fourth], axis=1)]
+    boxes[:, :, 0] = np.clip(boxes[:, :, 0], 0, img_width - 1).astype(int)
+    boxes[:, :, 1] = np.clip(boxes[:, :, 1], 0, img_height - 1).astype(int)
+    rect_width = np.linalg.norm(boxes[:, 0] - boxes[:, 1], axis=1).astype(int)
+    rect_height = np.linalg.norm(boxes[:, 0] - boxes[:, 3], axis=1).astype(int)
+    return boxes[(rect_width > 3) & (rect_height > 3)]
+
+
+def perspective_to_quads(sizes, quads):
+    """
+    Batched cv2.getPerspectiveTransform from the upright crop rectangles (w, h) to the quads:
+    [N, 3, 3] matrices mapping crop pixel coordinates to page coordinates.
+    """
+    n = len(quads)
+    w, h = sizes[:, 0], sizes[:, 1]
+    src = np.stack([np.zeros(n), np.zeros(n), w, np.zeros(n), w, h, np.zeros(n), h], axis=1).reshape(n, 4, 2)
+    system = np.zeros((n, 8, 8))
+    rhs = np.zeros((n, 8))
+    for i in range(4):
+        x, y = src[:, i, 0], src[:, i, 1]
+        u, v = quads[:, i, 0], quads[:, i, 1]
+        system[:, i, 0], system[:, i, 1], system[:, i, 2] = x, y, 1
+        system[:, i, 6], system[:, i, 7] = -x * u, -y * u
+        system[:, i + 4, 3], system[:, i + 4, 4], system[:, i + 4, 5] = x, y, 1
+        system[:, i + 4, 6], system[:, i + 4, 7] = -x * v, -y * v
+        rhs[:, i], rhs[:, i + 4] = u, v
+    coeffs = np.linalg.solve(system, rhs[:, :, None])[:, :, 0]
+    return np.concatenate([coeffs, np.ones((n, 1))], axis=1).reshape(n, 3, 3)
+
+
+def warp_quads(img, quads, sizes):
+    """
+    Perspective-warps quads to upright (w, h) crops, as get_rotate_crop_image does, with
+    the transforms of all quads solved in one batch. OpenCV has no batched warp, and stacking
+    the crops into one cv2.remap atlas measured ~3x slower on CPU than warpPerspective (the
+    sampling maps cost more to build in numpy than the warp itself), so each crop is one
+    warpPerspective call with its precomputed crop -> page matrix (WARP_INVERSE_MAP).
+    """
+    transforms = perspective_to_quads(sizes.astype(np.float64), quads.astype(np.float64))
+    flags = cv2.INTER_CUBIC | cv2.WARP_INVERSE_MAP
+    return [cv2.warpPerspective(img, m, (int(w), int(h)), flags=flags, borderMode=cv2.BORDER_REPLICATE)
+            for m, (w, h) in zip(transforms, sizes)]
+
+
+def is_axis_aligned(boxes, axis_tolerance=1.0):
+    """True for [N, 4, 2] clockwise boxes whose corners are all within axis_tolerance px of their bounding rectangle."""
+    lo, hi = boxes.min(axis=1), boxes.max(axis=1)
+    rect = np.stack([lo, np.stack([hi[:, 0], lo[:, 1]], axis=1), hi, np.stack([lo[:, 0], hi[:, 1]], axis=1)], axis=1)
+    return np.abs(boxes - rect).max(axis=(1, 2)) <= axis_tolerance
+
+
+def extract_crops(img, dt_boxes, axis_tolerance=1.0):
+    """
+    Upright crops for the clockwise-ordered boxes filter_det_boxes returns, like
+    get_rotate_crop_image on each box.
+
+    A box whose corners are all within axis_tolerance pixels of its bounding rectangle is
+    cut out as an array slice of the page (a view, no copy); with axis_tolerance=0 that is
+    exactly what warping it would give. Only the remaining, genuinely rotated boxes are
+    warped, all together with warp_quads.
+    """
+    boxes = np.asarray(dt_boxes, dtype=np.float32).reshape((-1, 4, 2))
+    crops = [None] * len(boxes)
+    if len(boxes) == 0:
+        return crops
+    lo = boxes.min(axis=1)
+    aligned = is_axis_aligned(boxes, axis_tolerance)
+    # crop size as get_rotate_crop_image computes it
+    widths = np.maximum(np.linalg.norm(boxes[:, 0] - boxes[:, 1], axis=1), np.linalg.norm(boxes[:, 2] - boxes[:, 3], axis=1)).astype(np.int64)
+    heights = np.maximum(np.linalg.norm(boxes[:, 0] - boxes[:, 3], axis=1), np.linalg.norm(boxes[:, 1] - boxes[:, 2], axis=1)).astype(np.int64)
+
+    for i in np.flatnonzero(aligned):
+        x0, y0 = int(lo[i, 0]), int(lo[i, 1])
+        crops[i] = img[y0:y0 + heights[i], x0:x0 + widths[i]]
+    rotated = np.flatnonzero(~aligned)
+    if len(rotated):
+        sizes = np.stack([widths[rotated], heights[rotated]], axis=1)
+        for i, crop in zip(rotated, warp_quads(img, boxes[rotated], sizes)):
+            crops[i] = crop
+    return [np.rot90(crop) if crop.shape[0] * 1.0 / crop.shape[1] >= 1.5 else crop for crop in crops]
+
+
+def synthetic_page(num_lines=150, rotated_fraction=0.2, page_shape=(1600, 1200), map_shape=(960, 736), seed=0):
+    """
+    A page image and a DB probability map with num_lines text-line blobs, a fraction of them
+    tilted by 1-4 degrees. Returns (img, maps [1, 1, H, W], shape) like the det stage.
+    """
+    rng = np.random.default_rng(seed)
+    img = rng.integers(180, 256, size=page_shape + (3,), dtype=np.uint8)
+    prob = np.zeros(map_shape, dtype=np.float32)
+    map_h, map_w = map_shape
+    # two columns of lines
+    rows = np.linspace(12, map_h - 12, (num_lines + 1) // 2)
+    for i in range(num_lines):
+        y, column = rows[i // 2], i % 2
+        line_w = rng.uniform(0.15, 0.4) * map_w
+        cx = map_w * (0.25 + 0.5 * column) + rng.uniform(-0.05, 0.05) * map_w
+        angle = rng.uniform(1, 4) * rng.choice([-1, 1]) if rng.random() < rotated_fraction else 0.0
+        quad = cv2.boxPoints(((cx, y), (line_w, 3.0), angle))
+        cv2.fillPoly(prob, [np.round(quad).astype(np.int32)], float(rng.uniform(0.7, 0.95)))
+    prob = cv2.GaussianBlur(prob, (3, 3), 0)
+    shape = np.array([page_shape[0], page_shape[1], map_h / page_shape[0], map_w / page_shape[1]])
+    return img, prob[None, None], shape
+
+
+def box_agreement(expected, actual):
+    """Fraction of expected boxes matched by an actual box with IoU >= 0.5, and the max corner distance of the matches."""
+    from tiled_detection import axis_aligned
+    if len(expected) == 0 or len(actual) == 0:
+        return float(len(expected) == len(actual)), 0.0
+    e, a = axis_aligned(expected), axis_aligned(actual)
+    ix = np.clip(np.minimum(e[:, None, 2], a[None, :, 2]) - np.maximum(e[:, None, 0], a[None, :, 0]), 0, None)
+    iy = np.clip(np.minimum(e[:, None, 3], a[None, :, 3]) - np.maximum(e[:, None, 1], a[None, :, 1]), 0, None)
+    inter = ix * iy
+    area_e = (e[:, 2] - e[:, 0]) * (e[:, 3] - e[:, 1])
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    iou = inter / (area_e[:, None] + area_a[None, :] - inter + 1e-6)
+    best = iou.argmax(axis=1)
+    matched = iou.max(axis=1) >= 0.5
+    distance = np.abs(np.asarray(expected, dtype=np.float32) - np.asarray(actual, dtype=np.float32)[best]).max(axis=(1, 2))
+    return float(matched.mean()), float(distance[matched].max()) if matched.any() else 0.0
+
+
+def benchmark_page(img, maps, shape, reference_postprocess, vectorized_postprocess, axis_tolerance, repeats=5):
+    """Per-page timings of both engines (postprocess, crops) plus how closely their boxes and crops agree."""
+    from ocr_pipeline import filter_det_boxes, get_rotate_crop_image
+
+    def best_of(fn):
+        result, seconds = None, []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fn()
+            seconds.append(time.perf_counter() - start)
+        return result, min(seconds)
+
+    row = {}
+    ref_boxes, row['ref_post'] = best_of(lambda: filter_det_boxes(reference_postprocess({'maps': maps}, [shape])[0]['points'], img.shape))
+    vec_boxes, row['vec_post'] = best_of(lambda: filter_boxes(vectorized_postprocess({'maps': maps}, [shape])[0]['points'], img.shape))
+    ref_crops, row['ref_crop'] = best_of(lambda: [get_rotate_crop_image(img, box.copy()) for box in ref_boxes])
+    vec_crops, row['vec_crop'] = best_of(lambda: extract_crops(img, ref_boxes, axis_tolerance))
+    row['boxes'] = len(ref_boxes)
+    row['box_match'], row['corner_px'] = box_agreement(ref_boxes, vec_boxes)
+    row['sliced'] = int(is_axis_aligned(ref_boxes, axis_tolerance).sum()) if len(ref_boxes) else 0
+    same_shape = [r.shape == v.shape for r, v in zip(ref_crops, vec_crops)]
+    row['crop_shape_match'] = float(np.mean(same_shape)) if same_shape else 1.0
+    diffs = [np.abs(r.astype(np.int16) - v.astype(np.int16)).mean() for r, v, same in zip(ref_crops, vec_crops, same_shape) if same]
+    row['crop_mean_abs_diff'] = float(np.mean(diffs)) if diffs else 0.0
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized DB postprocess + crop extraction against DBPostProcess and the per-box warp loop.")
+    parser.add_argument("--image_dir", default=None, help="Page images to run the det model on (needs --det_model_dir); synthetic pages if omitted.")
+    parser.add_argument("--det_model_dir", default=None, help="Exported en_PP-OCRv3_det inference model directory.")
+    parser.add_argument("--limit_side_len", type=int, default=960, help="Det size limit (default: 960)")
+    parser.add_argument("--pages", type=int, default=10, help="Number of pages (default: 10)")
+    parser.add_argument("--lines", type=int, default=150, help="Text lines per synthetic page (default: 150)")
+    parser.add_argument("--rotated_fraction", type=float, default=0.2, help="Fraction of tilted lines on synthetic pages (default: 0.2)")
+    parser.add_argument("--axis_tolerance", type=float, default=1.0, help="Max corner offset (px) for a box to be sliced instead of warped (default: 1.0)")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed repeats per page, best kept (default: 5)")
+    args = parser.parse_args()
+
+    from ocr_pipeline import OCRPipeline, det_resize_norm_img, list_image_files
+
+    reference = OCRPipeline._build_det_postprocess('ppocr')
+    vectorized = OCRPipeline._build_det_postprocess('vectorized')
+    if args.image_dir:
+        if not args.det_model_dir:
+            logging.error("--image_dir needs --det_model_dir to produce probability maps.")
+            exit(1)
+        from predictor import StagePredictor
+        predictor = StagePredictor('det', args.det_model_dir)
+
+        def load_pages():
+            for image_path in list_image_files(args.image_dir)[:args.pages]:
+                img = cv2.imread(image_path)
+                norm_img, shape = det_resize_norm_img(img, args.limit_side_len)
+                yield img, predictor.run(norm_img[np.newaxis, :].copy())[0], shape
+    else:
+        def load_pages():
+            for page in range(args.pages):
+                yield synthetic_page(args.lines, args.rotated_fraction, seed=page)
+
+    rows = [benchmark_page(img, maps, shape, reference, vectorized, args.axis_tolerance, args.repeats) for img, maps, shape in load_pages()]
+    if not rows:
+        logging.error("No pages to benchmark.")
+        exit(1)
+    mean = {key: float(np.mean([row[key] for row in rows])) for key in rows[0]}
+    logging.info(f"{len(rows)} pages, {mean['boxes']:.0f} boxes/page on average, {mean['sliced'] / max(1, mean['boxes']):.0%} sliced "
+                 f"(axis tolerance {args.axis_tolerance} px), best of {args.repeats} runs per page")
+    logging.info(f"  Postprocess: DBPostProcess {mean['ref_post'] * 1000:7.2f} ms/page, vectorized {mean['vec_post'] * 1000:7.2f} ms/page "
+                 f"({mean['ref_post'] / mean['vec_post']:.1f}x)")
+    logging.info(f"  Crops:       per-box warp  {mean['ref_crop'] * 1000:7.2f} ms/page, slices+warps   {mean['vec_crop'] * 1000:7.2f} ms/page "
+                 f"({mean['ref_crop'] / mean['vec_crop']:.1f}x)")
+    total_ref, total_vec = mean['ref_post'] + mean['ref_crop'], mean['vec_post'] + mean['vec_crop']
+    logging.info(f"  Total:       {total_ref * 1000:7.2f} -> {total_vec * 1000:7.2f} ms/page ({total_ref / total_vec:.1f}x)")
+    logging.info(f"  Boxes matched at IoU 0.5: {mean['box_match']:.2%} (max corner offset {max(r['corner_px'] for r in rows):.0f} px); "
+                 f"crops of the same shape: {mean['crop_shape_match']:.2%}, mean abs pixel difference {mean['crop_mean_abs_diff']:.2f}")
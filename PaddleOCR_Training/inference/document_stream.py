@@ -0,0 +1,181 @@
+# inference/document_stream.py
+
+import json
+import time
+import tempfile
+import logging
+
+import cv2
+import numpy as np
+
+# Uploads are spooled in memory up to this size and to a temporary file beyond it,
+# so a 500-page bundle never sits in RAM.
+SPOOL_MAX_MEMORY = 16 * 1024 * 1024
+PDF_RENDER_DPI = 200
+
+# Optional PDF backends, preferred in this order. pypdfium2 (the one in requirements.txt) reads
+# the spooled upload through the file object; PyMuPDF needs the whole upload as one bytes object.
+PDF_BACKEND = None
+try:
+    import pypdfium2
+    PDF_BACKEND = 'pypdfium2'
+except ImportError:
+    try:
+        import fitz  # PyMuPDF
+        PDF_BACKEND = 'pymupdf'
+    except ImportError:
+        logging.info("Neither pypdfium2 nor PyMuPDF is installed; PDF uploads will be rejected.")
+
+
+class UnsupportedDocumentError(ValueError):
+    pass
+
+
+async def spool_upload(chunks, max_memory=SPOOL_MAX_MEMORY):
+    """Copies an async byte stream (e.g. request.stream()) into a SpooledTemporaryFile."""
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    async for chunk in chunks:
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def sniff_document_type(fileobj):
+    head = fileobj.read(8)
+    fileobj.seek(0)
+    if head.startswith(b'%PDF'):
+        return 'pdf'
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    return 'image'
+
+
+def iter_tiff_pages(fileobj):
+    """Decodes a multi-page TIFF one frame at a time; only the current page is held in memory."""
+    from PIL import Image
+
+    with Image.open(fileobj) as tiff:
+        for index in range(getattr(tiff, 'n_frames', 1)):
+            tiff.seek(index)
+            page = np.asarray(tiff.convert('RGB'))
+            yield index, cv2.cvtColor(page, cv2.COLOR_RGB2BGR)
+
+
+def iter_pdf_pages(fileobj, dpi=PDF_RENDER_DPI):
+    """
+    Renders PDF pages one at a time with whichever optional backend is installed. With
+    pypdfium2 memory stays bounded by one rendered page whatever the page count; the PyMuPDF
+    fallback also holds the whole upload in memory while the document is open.
+    """
+    if PDF_BACKEND == 'pypdfium2':
+        doc = pypdfium2.PdfDocument(fileobj)
+        try:
+            for index in range(len(doc)):
+                bitmap = doc[index].render(scale=dpi / 72.0)
+                # render() is BGR(x) by default, already the pipeline's channel order; copied so the
+                # page outlives the bitmap's buffer
+                yield index, bitmap.to_numpy()[:, :, :3].copy()
+        finally:
+            doc.close()
+    elif PDF_BACKEND == 'pymupdf':
+        with fitz.open(stream=fileobj.read(), filetype='pdf') as doc:
+            for index, page in enumerate(doc):
+                pix = page.get_pixmap(dpi=dpi)
+                rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)[:, :, :3]
+                yield index, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    else:
+        raise UnsupportedDocumentError("PDF support requires pypdfium2 or PyMuPDF to be installed.")
+
+
+def document_page_megapixels(fileobj):
+    """
+    Per-page pixel counts (in megapixels) of an upload without decoding any page, for admission
+    control. PDF pages are counted at the render DPI assuming Letter size.
+    """
+    doc_type = sniff_document_type(fileobj)
+    try:
+        if doc_type == 'pdf':
+            letter_mp = (8.5 * PDF_RENDER_DPI) * (11 * PDF_RENDER_DPI) / 1e6
+            if PDF_BACKEND == 'pypdfium2':
+                doc = pypdfium2.PdfDocument(fileobj)
+                try:
+                    return [letter_mp] * len(doc)
+                finally:
+                    doc.close()
+            if PDF_BACKEND == 'pymupdf':
+                with fitz.open(stream=fileobj.read(), filetype='pdf') as doc:
+                    return [letter_mp] * doc.page_count
+            return [letter_mp]
+        from PIL import Image
+
+        with Image.open(fileobj) as image:
+            sizes = []
+            for index in range(getattr(image, 'n_frames', 1)):
+                image.seek(index)
+                sizes.append(image.size[0] * image.size[1] / 1e6)
+            return sizes
+    except Exception:
+        return [0.0]
+    finally:
+        fileobj.seek(0)
+
+
+def iter_document_pages(fileobj):
+    """Yields (page_index, BGR page) lazily for a PDF, a (multi-page) TIFF or a single image."""
+    doc_type = sniff_document_type(fileobj)
+    if doc_type == 'pdf':
+        yield from iter_pdf_pages(fileobj)
+    elif doc_type == 'tiff':
+        yield from iter_tiff_pages(fileobj)
+    else:
+        img = cv2.imdecode(np.frombuffer(fileobj.read(), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise UnsupportedDocumentError("Upload is not a PDF, TIFF or decodable image.")
+        yield 0, img
+
+
+def format_event(payload, fmt):
+    body = json.dumps(payload, ensure_ascii=False)
+    if fmt == 'sse':
+        return f"data: {body}\n\n"
+    return body + "\n"
+
+
+def stream_document_results(fileobj, run_page, fmt='ndjson', max_pages=None, on_close=None):
+    """
+    Generator of NDJSON lines / SSE events, one per page as soon as that page is done,
+    followed by a summary event. `run_page(img)` returns the pipeline result dict.
+    The spooled upload is closed, and on_close() called, when the generator finishes or the
+    client disconnects.
+    """
+    start = time.perf_counter()
+    pages = 0
+    try:
+        for index, img in iter_document_pages(fileobj):
+            if max_pages is not None and index >= max_pages:
+                break
+            page_start = time.perf_counter()
+            result = run_page(img)
+            del img
+            pages += 1
+            event = {
+                'page': index,
+                'text': "\n".join(line['text'] for line in result['lines']),
+                'lines': result['lines'],
+                'elapsed_ms': round((time.perf_counter() - page_start) * 1000, 1),
+                'since_start_ms': round((time.perf_counter() - start) * 1000, 1),
+            }
+            if result.get('degraded'):
+                event['degraded'] = True
+            yield format_event(event, fmt)
+        yield format_event({'done': True, 'pages': pages,
+                            'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)}, fmt)
+    except UnsupportedDocumentError as e:
+        yield format_event({'error': str(e), 'pages': pages}, fmt)
+    except Exception as e:
+        logging.error(f"Streaming OCR failed after {pages} pages: {e}", exc_info=True)
+        yield format_event({'error': f"failed after {pages} pages", 'pages': pages}, fmt)
+    finally:
+        fileobj.close()
+        if on_close is not None:
+            on_close()
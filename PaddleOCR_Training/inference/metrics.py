@@ -0,0 +1,365 @@
+# inference/metrics.py
+#
+# Prometheus text-format metrics for the OCR service, plus a sampling profiler that can be
+# switched on and off at runtime. Check a running server with:
+#   python inference/metrics.py http://localhost:5003/metrics
+
+import sys
+import time
+import argparse
+import logging
+import threading
+import traceback
+from bisect import bisect_left
+from collections import Counter as _StackCounter
+from contextlib import contextmanager, nullcontext
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+# Stage latencies span ~1 ms (cls batch) to seconds (layout on a large page).
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 6, 8, 16, 32, 64)
+LINES_PER_PAGE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 200, 400)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[n] for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; each series is [bucket counts..., sum, count]."""
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _render_series(self, key, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), series[:-2]):
+            cumulative += count
+            labels = _format_labels(self.labelnames + ('le',), key + (_format_value(float(bound)),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(float(series[-2]))}")
+        lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []  # callables run at scrape time, for values read from elsewhere
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:
+                logging.warning(f"Metrics collector failed: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class NullMetrics:
+    """Drop-in for OCRMetrics when nothing is being measured (the default for the CLIs)."""
+
+    def time_stage(self, stage):
+        return nullcontext()
+
+    def observe_batch(self, stage, size):
+        pass
+
+    def observe_cascade(self, fast, fallback):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class OCRMetrics:
+    """
+    The OCR service's metrics. OCRPipeline and BucketedRecognizer call time_stage() and
+    observe_batch(); the server records requests and lines per page, AdmissionController the
+    lanes and queueing; cache hit rates are read from the pipeline's OCRResultCache on every scrape.
+    """
+
+    def __init__(self):
+        self.registry = Registry()
+        r = self.registry
+        self.stage_seconds = r.register(Histogram(
+            'ocr_stage_seconds', 'Latency of each pipeline stage.', ('stage',)))
+        self.batch_size = r.register(Histogram(
+            'ocr_batch_size', 'Inputs per model batch.', ('stage',), BATCH_SIZE_BUCKETS))
+        self.lines_per_page = r.register(Histogram(
+            'ocr_lines_per_page', 'Recognized lines returned per page.', (), LINES_PER_PAGE_BUCKETS))
+        self.requests = r.register(Counter(
+            'ocr_requests_total', 'Requests handled, by endpoint and outcome.', ('endpoint', 'status')))
+        self.pages = r.register(Counter('ocr_pages_total', 'Pages run through the pipeline.'))
+        self.cascade_lines = r.register(Counter(
+            'ocr_rec_cascade_lines_total', 'Lines recognized by the rec cascade, by the model whose result was kept.', ('model',)))
+        self.queue_depth = r.register(Gauge(
+            'ocr_queue_depth', 'Pages waiting for the pipeline in this worker, by priority lane.', ('lane',)))
+        self.in_flight = r.register(Gauge('ocr_in_flight', 'Pages currently running through the pipeline.'))
+        self.queue_wait_seconds = r.register(Histogram(
+            'ocr_queue_wait_seconds', 'Time a page waited for the pipeline, by priority lane.', ('lane',)))
+        self.admissions = r.register(Counter(
+            'ocr_admission_total', 'Admission decisions (admitted, degraded, rejected) by lane.', ('lane', 'decision')))
+        self.lane_requests = r.register(Gauge(
+            'ocr_lane_requests', 'Admitted requests not finished yet, by lane.', ('lane',)))
+        self.cache_lookups = r.register(Counter(
+            'ocr_cache_lookups_total', 'Result cache lookups.', ('level',)))
+        self.cache_hits = r.register(Counter(
+            'ocr_cache_hits_total', 'Result cache hits (memory or disk).', ('level',)))
+        self.cache_hit_ratio = r.register(Gauge(
+            'ocr_cache_hit_ratio', 'Result cache hit rate since start.', ('level',)))
+        self.profiler_running = r.register(Gauge(
+            'ocr_profiler_running', '1 while the sampling profiler is collecting.'))
+        self.pipeline = None
+        self.profiler = None
+        # the cache keeps running totals; the counters are advanced by the change since the last scrape
+        self._collected_cache = None
+        self._collected_totals = {}
+        self._collect_lock = threading.Lock()
+        r.collectors.append(self._collect)
+
+    def attach(self, pipeline=None, profiler=None):
+        self.pipeline = pipeline or self.pipeline
+        self.profiler = profiler or self.profiler
+
+    def _collect(self):
+        cache = getattr(self.pipeline, 'cache', None)
+        if cache is not None:
+            with self._collect_lock:
+                if cache is not self._collected_cache:  # a new pipeline's cache counts from zero
+                    self._collected_cache, self._collected_totals = cache, {}
+                for level, s in cache.stats().items():
+                    for field, counter in (('lookups', self.cache_lookups), ('hits', self.cache_hits)):
+                        previous = self._collected_totals.get((level, field), 0)
+                        counter.inc(s[field] - previous, level=level)
+                        self._collected_totals[(level, field)] = s[field]
+                    self.cache_hit_ratio.set(s['hit_rate'], level=level)
+        if self.profiler is not None:
+            self.profiler_running.set(1 if self.profiler.running else 0)
+
+    @contextmanager
+    def time_stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - start, stage=stage)
+
+    def observe_batch(self, stage, size):
+        self.batch_size.observe(size, stage=stage)
+
+    def observe_cascade(self, fast, fallback):
+        self.cascade_lines.inc(fast, model='fast')
+        self.cascade_lines.inc(fallback, model='full')
+
+    def observe_page(self, result):
+        self.pages.inc()
+        self.lines_per_page.observe(len(result['lines']))
+
+    def render(self):
+        return self.registry.render()
+
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler: a daemon thread samples every thread's Python stack
+    every `interval` seconds via sys._current_frames() and counts collapsed stacks
+    ("outer;inner;leaf count" lines, the input format of flamegraph.pl / speedscope).
+    Safe to start and stop while the server is serving.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = _StackCounter()
+        self.sample_count = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        if self.running:
+            return False
+        if interval:
+            self.interval = interval
+        with self._lock:
+            self.samples.clear()
+            self.sample_count = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ocr-sampling-profiler", daemon=True)
+        self._thread.start()
+        logging.info(f"Sampling profiler started ({self.interval * 1000:.1f} ms interval).")
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self._stop.set()
+        self._thread.join()
+        logging.info(f"Sampling profiler stopped after {self.sample_count} samples.")
+        return True
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                summary = traceback.extract_stack(frame, limit=self.max_depth)
+                stacks.append(";".join(f"{f.name} ({f.filename.rsplit('/', 1)[-1]}:{f.lineno})" for f in summary))
+            with self._lock:
+                self.samples.update(stacks)
+                self.sample_count += 1
+
+    def collapsed(self, top=None):
+        with self._lock:
+            items = self.samples.most_common(top)
+        return "\n".join(f"{stack} {count}" for stack, count in items) + "\n"
+
+
+def parse_exposition(text):
+    """Minimal parser for the text format: returns {family: type} and a list of (sample_name, labels, value)."""
+    families, samples = {}, []
+    for line in text.splitlines():
+        if not line:
+            continue
+        if line.startswith('# TYPE '):
+            _, _, name, metric_type = line.split(' ', 3)
+            families[name] = metric_type
+            continue
+        if line.startswith('#'):
+            continue
+        head, value = line.rsplit(' ', 1)
+        name, _, labels = head.partition('{')
+        samples.append((name, labels.rstrip('}'), float(value)))
+    return families, samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape an OCR server's /metrics endpoint and check the exposition format.")
+    parser.add_argument("url", nargs='?', default="http://localhost:5003/metrics", help="Metrics URL (default: http://localhost:5003/metrics)")
+    args = parser.parse_args()
+
+    import urllib.request
+
+    with urllib.request.urlopen(args.url, timeout=10) as response:
+        content_type = response.headers.get('Content-Type', '')
+        text = response.read().decode('utf-8')
+    families, samples = parse_exposition(text)
+    expected = ('ocr_stage_seconds', 'ocr_batch_size', 'ocr_lines_per_page', 'ocr_requests_total',
+                'ocr_queue_depth', 'ocr_queue_wait_seconds', 'ocr_cache_hit_ratio')
+    missing = [name for name in expected if name not in families]
+    problems = []
+    if not content_type.startswith('text/plain'):
+        problems.append(f"unexpected Content-Type {content_type!r}")
+    if missing:
+        problems.append(f"missing metric families: {', '.join(missing)}")
+    for name, labels, value in samples:
+        family = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in families:
+                family = name[:-len(suffix)]
+        if family not in families:
+            problems.append(f"sample {name} has no # TYPE line")
+    if problems:
+        for problem in problems:
+            logging.error(problem)
+        exit(1)
+    stage_counts = {labels: int(v) for name, labels, v in samples if name == 'ocr_stage_seconds_count'}
+    logging.info(f"Scraped {len(samples)} samples from {len(families)} metric families at {args.url}")
+    for labels, count in sorted(stage_counts.items()):
+        logging.info(f"  {labels}: {count} observations")
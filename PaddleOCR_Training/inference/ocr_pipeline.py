@@ -0,0 +1,447 @@
+# inference/ocr_pipeline.py
+
+import os
+import math
+import time
+import argparse
+import logging
+import json
+
+import cv2
+import numpy as np
+
+from ctc_beam_search import BatchCTCBeamDecoder
+from ctc_decoder import BatchCTCDecoder
+from db_postprocess import VectorizedDBPostProcess, extract_crops, filter_boxes
+from metrics import NULL_METRICS
+from predictor import StagePredictor
+from rec_batching import BucketedRecognizer, RecBatchKernel
+from rec_cascade import CascadeRecognizer
+from tiled_detection import TiledDetector
+from upload_ingest import DetInputArena
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif')
+
+DET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+DET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+CLS_IMAGE_SHAPE = (3, 48, 192)
+CLS_LABELS = ('0', '180')
+
+
+def cls_resize_norm_img(img, image_shape=CLS_IMAGE_SHAPE):
+    imgC, imgH, imgW = image_shape
+    h, w = img.shape[:2]
+    ratio = w / float(h)
+    resized_w = imgW if math.ceil(imgH * ratio) > imgW else int(math.ceil(imgH * ratio))
+    resized_image = cv2.resize(img, (resized_w, imgH)).astype('float32')
+    resized_image = resized_image.transpose((2, 0, 1)) / 255
+    resized_image -= 0.5
+    resized_image /= 0.5
+    padding_im = np.zeros((imgC, imgH, imgW), dtype=np.float32)
+    padding_im[:, :, 0:resized_w] = resized_image
+    return padding_im
+
+
+def det_resize_norm_img(img, limit_side_len=960):
+    """DetResizeForTest (limit_type 'max', sides rounded to multiples of 32) + NormalizeImage + ToCHWImage."""
+    h, w = img.shape[:2]
+    ratio = float(limit_side_len) / max(h, w) if max(h, w) > limit_side_len else 1.0
+    resize_h = max(int(round(int(h * ratio) / 32) * 32), 32)
+    resize_w = max(int(round(int(w * ratio) / 32) * 32), 32)
+    resized = cv2.resize(img, (resize_w, resize_h))
+    norm = (resized.astype('float32') * np.float32(1. / 255.) - DET_MEAN) / DET_STD
+    shape = np.array([h, w, resize_h / float(h), resize_w / float(w)])
+    return norm.transpose((2, 0, 1)), shape
+
+
+def order_points_clockwise(pts):
+    rect = np.zeros((4, 2), dtype="float32")
+    s = pts.sum(axis=1)
+    rect[0] = pts[np.argmin(s)]
+    rect[2] = pts[np.argmax(s)]
+    tmp = np.delete(pts, (np.argmin(s), np.argmax(s)), axis=0)
+    diff = np.diff(np.array(tmp), axis=1)
+    rect[1] = tmp[np.argmin(diff)]
+    rect[3] = tmp[np.argmax(diff)]
+    return rect
+
+
+def filter_det_boxes(dt_boxes, image_shape):
+    """Orders box corners clockwise, clips them to the image and drops boxes of 3px or less."""
+    img_height, img_width = image_shape[:2]
+    kept = []
+    for box in dt_boxes:
+        box = order_points_clockwise(np.array(box))
+        box[:, 0] = np.clip(box[:, 0], 0, img_width - 1).astype(int)
+        box[:, 1] = np.clip(box[:, 1], 0, img_height - 1).astype(int)
+        rect_width = int(np.linalg.norm(box[0] - box[1]))
+        rect_height = int(np.linalg.norm(box[0] - box[3]))
+        if rect_width <= 3 or rect_height <= 3:
+            continue
+        kept.append(box)
+    return np.array(kept, dtype=np.float32).reshape((-1, 4, 2))
+
+
+def sorted_boxes(dt_boxes):
+    """Sorts text boxes top to bottom, left to right (same tie-break as PaddleOCR's TextSystem)."""
+    _boxes = sorted(dt_boxes, key=lambda x: (x[0][1], x[0][0]))
+    for i in range(len(_boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(_boxes[j + 1][0][1] - _boxes[j][0][1]) < 10 and _boxes[j + 1][0][0] < _boxes[j][0][0]:
+                _boxes[j], _boxes[j + 1] = _boxes[j + 1], _boxes[j]
+            else:
+                break
+    return _boxes
+
+
+def get_rotate_crop_image(img, points):
+    """Perspective-warps one quadrilateral text box into an upright crop."""
+    points = np.asarray(points, dtype=np.float32)
+    img_crop_width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    img_crop_height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    pts_std = np.float32([[0, 0], [img_crop_width, 0], [img_crop_width, img_crop_height], [0, img_crop_height]])
+    M = cv2.getPerspectiveTransform(points, pts_std)
+    dst_img = cv2.warpPerspective(img, M, (img_crop_width, img_crop_height),
+                                  borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if dst_img.shape[0] * 1.0 / dst_img.shape[1] >= 1.5:
+        dst_img = np.rot90(dst_img)
+    return dst_img
+
+
+def load_layout_predictor(layout_model_dir, layout_dict_path, use_gpu=False, cpu_threads=10):
+    """Builds PaddleOCR's PicoDet layout predictor (picodet_lcnet_x1_0_fgd_layout_infer)."""
+    import paddleocr  # noqa: F401  (puts ppocr / ppstructure / tools on sys.path)
+    from ppstructure.utility import init_args
+    from ppstructure.layout.predict_layout import LayoutPredictor
+
+    args = init_args().parse_args([])
+    args.layout_model_dir = layout_model_dir
+    args.layout_dict_path = layout_dict_path
+    args.use_gpu = use_gpu
+    args.cpu_threads = cpu_threads
+    return LayoutPredictor(args)
+
+
+class OCRPipeline:
+    """
+    Layout -> detection -> direction classification -> recognition, on exported Paddle
+    inference models. Images are BGR uint8 arrays (cv2.imread order), as in training.
+
+    Returns a dict per page:
+        {'lines': [{'text', 'confidence', 'box'}], 'layout': [{'label', 'bbox'}]}
+    """
+
+    def __init__(self, det_model_dir, rec_model_dir, rec_char_dict_path, cls_model_dir=None,
+                 layout_model_dir=None, layout_dict_path=None, use_gpu=False, cpu_threads=10,
+                 enable_mkldnn=False, det_limit_side_len=960, rec_batch_num=6, cls_batch_num=6,
+                 cls_thresh=0.9, drop_score=0.5, rec_batching='bucketed', rec_fixed_width=None,
+                 rec_fast_model_dir=None, rec_cascade_threshold=0.9,
+                 rec_lexicon_path=None, rec_beam_width=8, rec_lexicon_weight=2.0,
+                 det_mode='single', det_tile_size=960, det_tile_overlap=128, det_tile_batch_size=4,
+                 det_postprocess='vectorized', crop_axis_tolerance=1.0, cache=None, model_buffers=None, metrics=None):
+        model_buffers = model_buffers or {}
+        predictor_kwargs = dict(use_gpu=use_gpu, cpu_threads=cpu_threads, enable_mkldnn=enable_mkldnn)
+        self.load_seconds = {}  # per-stage model construction time, reported by warm_start
+
+        def timed(stage, build):
+            start = time.perf_counter()
+            stage_predictor = build()
+            self.load_seconds[stage] = time.perf_counter() - start
+            return stage_predictor
+
+        self.layout_predictor = None
+        if layout_model_dir:
+            self.layout_predictor = timed('layout', lambda: load_layout_predictor(layout_model_dir, layout_dict_path, use_gpu, cpu_threads))
+        self.det_predictor = timed('det', lambda: StagePredictor('det', det_model_dir, model_buffers=model_buffers.get('det'), **predictor_kwargs))
+        self.cls_predictor = None
+        if cls_model_dir:
+            self.cls_predictor = timed('cls', lambda: StagePredictor('cls', cls_model_dir, model_buffers=model_buffers.get('cls'), **predictor_kwargs))
+        self.rec_predictor = timed('rec', lambda: StagePredictor('rec', rec_model_dir, model_buffers=model_buffers.get('rec'), **predictor_kwargs))
+        self.rec_fast_predictor = None
+        if rec_fast_model_dir:
+            self.rec_fast_predictor = timed('rec_fast', lambda: StagePredictor('rec_fast', rec_fast_model_dir, model_buffers=model_buffers.get('rec_fast'), **predictor_kwargs))
+
+        if rec_lexicon_path:
+            self.decoder = BatchCTCBeamDecoder(rec_char_dict_path, lexicon=rec_lexicon_path, beam_width=rec_beam_width,
+                                               lexicon_weight=rec_lexicon_weight)
+        else:
+            self.decoder = BatchCTCDecoder(rec_char_dict_path)
+        if det_postprocess not in ('ppocr', 'vectorized'):
+            raise ValueError(f"Unknown det_postprocess engine: {det_postprocess}")
+        # 'vectorized' scores and unclips all boxes at once and slices axis-aligned crops; 'ppocr' is the per-box loop
+        self.det_postprocess_engine = det_postprocess
+        self.det_postprocess = self._build_det_postprocess(det_postprocess)
+        self.filter_boxes = filter_boxes if det_postprocess == 'vectorized' else filter_det_boxes
+        self.crop_axis_tolerance = crop_axis_tolerance
+        self.det_limit_side_len = det_limit_side_len
+        # reused det input buffers; safe because a pipeline is only ever driven by one thread at a time
+        self.det_arena = DetInputArena(det_limit_side_len, DET_MEAN, DET_STD)
+        if det_mode not in ('single', 'tiled'):
+            raise ValueError(f"Unknown det_mode: {det_mode}")
+        self.det_mode = det_mode
+        self.tiled_detector = TiledDetector(lambda batch: self.det_predictor.run(batch)[0], self.det_postprocess,
+                                            det_tile_size, det_tile_overlap, det_tile_batch_size)
+        self.rec_batch_num = rec_batch_num
+        self.cls_batch_num = cls_batch_num
+        self.cls_thresh = cls_thresh
+        self.drop_score = drop_score
+
+        if rec_batching not in ('bucketed', 'fixed'):
+            raise ValueError(f"Unknown rec_batching mode: {rec_batching}")
+        self.rec_batching = rec_batching
+        self.rec_kernel = RecBatchKernel(max_batch=rec_batch_num)
+        if rec_fixed_width is None:
+            rec_fixed_width = self.rec_predictor.fixed_input_width()
+        self.bucketed_recognizer = BucketedRecognizer(lambda batch: self.rec_predictor.run(batch)[0], self.decoder,
+                                                      batch_size=rec_batch_num, fixed_width=rec_fixed_width)
+        # Cascade mode: the fast model reads every crop, the full model only the low-confidence ones.
+        # Both models must share the character dictionary.
+        self.cascade = None
+        if self.rec_fast_predictor is not None:
+            fast_recognizer = BucketedRecognizer(lambda batch: self.rec_fast_predictor.run(batch)[0], self.decoder,
+                                                 batch_size=rec_batch_num, fixed_width=self.rec_fast_predictor.fixed_input_width())
+            self.cascade = CascadeRecognizer(fast_recognizer, self.recognize_full, rec_cascade_threshold)
+
+        self.set_metrics(metrics)
+
+        self.cache = cache
+        if self.cache is not None:
+            # Results are only valid for the exact models and settings that produced them.
+            model_ids = [det_model_dir, rec_model_dir, rec_char_dict_path, cls_model_dir, layout_model_dir,
+                         layout_dict_path, drop_score, det_limit_side_len, det_mode, rec_batching, rec_fixed_width]
+            if cls_model_dir:
+                model_ids += [cls_thresh]
+            if det_mode == 'tiled':
+                model_ids += [det_tile_size, det_tile_overlap]
+            if det_postprocess != 'ppocr':
+                model_ids += [det_postprocess, crop_axis_tolerance]
+            if self.cascade is not None:
+                model_ids += [rec_fast_model_dir, rec_cascade_threshold]
+            if rec_lexicon_path:
+                model_ids += [rec_lexicon_path, rec_beam_width, rec_lexicon_weight]
+            self.cache.set_namespace(*model_ids)
+
+    def set_metrics(self, metrics):
+        """Where stage latencies and batch sizes are reported (an OCRMetrics); None turns it off."""
+        self.metrics = metrics or NULL_METRICS
+        self.bucketed_recognizer.metrics = self.metrics
+        if self.cascade is not None:
+            self.cascade.metrics = self.metrics
+            self.cascade.fast_recognize.metrics = self.metrics
+
+    @staticmethod
+    def _build_det_postprocess(engine='ppocr'):
+        if engine == 'vectorized':
+            return VectorizedDBPostProcess(thresh=0.3, box_thresh=0.6, max_candidates=1000, unclip_ratio=1.5)
+        import paddleocr  # noqa: F401  (puts ppocr on sys.path)
+        from ppocr.postprocess.db_postprocess import DBPostProcess
+        return DBPostProcess(thresh=0.3, box_thresh=0.6, max_candidates=1000, unclip_ratio=1.5,
+                             use_dilation=False, score_mode='fast', box_type='quad')
+
+    def run_layout(self, img):
+        if self.layout_predictor is None:
+            return []
+        layout_res, _ = self.layout_predictor(img)
+        return [{'label': region['label'], 'bbox': [float(v) for v in region['bbox']]} for region in layout_res]
+
+    def detect(self, img, limit_side_len=None):
+        """limit_side_len lowers the single-shot det resolution for this page (used to shed load)."""
+        if self.det_mode == 'tiled' and limit_side_len is None:
+            with self.metrics.time_stage('det_tiled'):
+                return sorted_boxes(self.filter_boxes(self.tiled_detector(img), img.shape))
+        with self.metrics.time_stage('det_preprocess'):
+            batch, shape = self.det_arena(img, limit_side_len)
+        with self.metrics.time_stage('det_infer'):
+            preds = self.det_predictor.run(batch)
+        with self.metrics.time_stage('det_postprocess'):
+            post_result = self.det_postprocess({'maps': preds[0]}, [shape])
+            dt_boxes = self.filter_boxes(post_result[0]['points'], img.shape)
+            return sorted_boxes(dt_boxes)
+
+    def extract_crops(self, img, dt_boxes):
+        if self.det_postprocess_engine == 'vectorized':
+            return extract_crops(img, dt_boxes, self.crop_axis_tolerance)
+        return [get_rotate_crop_image(img, box.copy()) for box in dt_boxes]
+
+    def classify(self, crops):
+        """Rotates crops the direction classifier reads as upside down (label '180')."""
+        if self.cls_predictor is None or not crops:
+            return crops
+        crops = list(crops)
+        order = np.argsort([c.shape[1] / float(c.shape[0]) for c in crops])
+        for beg in range(0, len(crops), self.cls_batch_num):
+            idx = order[beg:beg + self.cls_batch_num]
+            batch = np.stack([cls_resize_norm_img(crops[i]) for i in idx])
+            self.metrics.observe_batch('cls', len(idx))
+            prob_out = self.cls_predictor.run(batch)[0]
+            for i, probs in zip(idx, prob_out):
+                label = CLS_LABELS[int(probs.argmax())]
+                if label == '180' and probs.max() > self.cls_thresh:
+                    crops[i] = cv2.rotate(crops[i], cv2.ROTATE_180)
+        return crops
+
+    def recognize(self, crops):
+        """Returns one (text, confidence) per crop, in input order."""
+        if self.cascade is not None:
+            return self.cascade(crops)
+        return self.recognize_full(crops)
+
+    def recognize_full(self, crops):
+        """Recognition with the full (fine-tuned) model only."""
+        if self.rec_batching == 'bucketed':
+            return self.bucketed_recognizer(crops)
+        results = [None] * len(crops)
+        order = np.argsort([c.shape[1] / float(c.shape[0]) for c in crops])
+        for beg in range(0, len(crops), self.rec_batch_num):
+            idx = order[beg:beg + self.rec_batch_num]
+            with self.metrics.time_stage('rec_preprocess'):
+                batch = self.rec_kernel.resize_and_pack([crops[i] for i in idx])
+            self.metrics.observe_batch('rec', len(idx))
+            with self.metrics.time_stage('rec_infer'):
+                preds = self.rec_predictor.run(batch)[0]
+            with self.metrics.time_stage('rec_decode'):
+                decoded = self.decoder(preds)
+            for i, res in zip(idx, decoded):
+                results[i] = res
+        return results
+
+    def recognize_with_cache(self, crops):
+        """Recognition that only runs the model on crops the line cache has not seen before."""
+        if self.cache is None:
+            return self.recognize(crops)
+        keys = [self.cache.line_key(crop) for crop in crops]
+        results = [self.cache.get_line(key) for key in keys]
+        # Identical crops on the same page (repeated boilerplate) are recognized once.
+        missing = {}
+        for i, res in enumerate(results):
+            if res is None:
+                missing.setdefault(keys[i], i)
+        if missing:
+            recognized = dict(zip(missing, self.recognize([crops[i] for i in missing.values()])))
+            for key, res in recognized.items():
+                self.cache.put_line(key, res)
+            results = [res if res is not None else recognized[key] for key, res in zip(keys, results)]
+        return results
+
+    def __call__(self, img, use_layout=True, det_limit_side_len=None):
+        """det_limit_side_len: see detect(). Such degraded results are never written to the page cache."""
+        page_key = None
+        if self.cache is not None:
+            page_key = self.cache.page_key(img, use_layout)
+            cached = self.cache.get_page(page_key)
+            if cached is not None:
+                return cached
+
+        layout = []
+        if use_layout:
+            with self.metrics.time_stage('layout'):
+                layout = self.run_layout(img)
+        dt_boxes = self.detect(img, det_limit_side_len)
+        with self.metrics.time_stage('crop'):
+            crops = self.extract_crops(img, dt_boxes)
+        with self.metrics.time_stage('cls'):
+            crops = self.classify(crops)
+        with self.metrics.time_stage('rec'):
+            rec_res = self.recognize_with_cache(crops)
+
+        lines = []
+        for box, (text, score) in zip(dt_boxes, rec_res):
+            if score >= self.drop_score:
+                lines.append({'text': text, 'confidence': float(score), 'box': box.tolist()})
+        result = {'lines': lines, 'layout': layout}
+
+        if page_key is not None and det_limit_side_len is None:
+            self.cache.put_page(page_key, result)
+        return result
+
+
+def add_pipeline_args(parser):
+    """Model/runtime options shared by every entry point that builds an OCRPipeline."""
+    parser.add_argument("--det_model_dir", required=True, help="Exported en_PP-OCRv3_det inference model directory.")
+    parser.add_argument("--rec_model_dir", required=True, help="Exported (fine-tuned) recognition inference model directory.")
+    parser.add_argument("--rec_char_dict_path", default="/home/jupyter/PaddleOCR_Training/ocr_output/custom_char_dict.txt", help="Character dictionary used to train the recognition model.")
+    parser.add_argument("--cls_model_dir", default=None, help="Optional direction classifier inference model directory.")
+    parser.add_argument("--layout_model_dir", default=None, help="Optional PicoDet layout inference model directory.")
+    parser.add_argument("--layout_dict_path", default=None, help="Label dictionary for the layout model.")
+    parser.add_argument("--use_gpu", action="store_true", help="Run the models on GPU.")
+    parser.add_argument("--cpu_threads", type=int, default=10, help="CPU math library threads per model (default: 10)")
+    parser.add_argument("--enable_mkldnn", action="store_true", help="Enable MKL-DNN on CPU.")
+    parser.add_argument("--rec_batch_num", type=int, default=6, help="Recognition batch size (default: 6)")
+    parser.add_argument("--det_mode", choices=['single', 'tiled'], default='single', help="Detect on the whole (downscaled) page or on overlapping full-resolution tiles (default: single)")
+    parser.add_argument("--det_tile_size", type=int, default=960, help="Tile side for --det_mode tiled (default: 960)")
+    parser.add_argument("--det_tile_overlap", type=int, default=128, help="Tile overlap for --det_mode tiled (default: 128)")
+    parser.add_argument("--det_postprocess", choices=['vectorized', 'ppocr'], default='vectorized', help="DB postprocess + crop engine: all boxes at once with sliced axis-aligned crops, or ppocr's per-box loop (default: vectorized)")
+    parser.add_argument("--crop_axis_tolerance", type=float, default=1.0, help="Boxes within this many px of axis-aligned are sliced instead of warped (vectorized engine; default: 1.0)")
+    parser.add_argument("--rec_batching", choices=['bucketed', 'fixed'], default='bucketed', help="Recognition batching: width-bucketed with windows for long lines, or the fixed [3,48,320] shape (default: bucketed)")
+    parser.add_argument("--rec_fixed_width", type=int, default=None, help="Input width of a recognition model exported with a fixed shape (detected from the model if omitted).")
+    parser.add_argument("--rec_fast_model_dir", default=None, help="Optional smaller recognition model run first; only crops it reads below --rec_cascade_threshold go to --rec_model_dir.")
+    parser.add_argument("--rec_cascade_threshold", type=float, default=0.9, help="Confidence below which the fast model's reading is redone by the full model (tune with rec_cascade.py; default: 0.9)")
+    parser.add_argument("--rec_lexicon", default=None, help="Optional word list; recognition is then decoded by lexicon-biased CTC beam search instead of greedily.")
+    parser.add_argument("--rec_beam_width", type=int, default=8, help="Beam width for --rec_lexicon decoding (default: 8)")
+    parser.add_argument("--rec_lexicon_weight", type=float, default=2.0, help="Log-probability cost of a word outside --rec_lexicon (default: 2.0)")
+    parser.add_argument("--drop_score", type=float, default=0.5, help="Drop lines whose recognition confidence is below this (default: 0.5)")
+    parser.add_argument("--page_cache_size", type=int, default=0, help="Enable the result cache with this many pages in memory (default: 0, disabled)")
+    parser.add_argument("--line_cache_size", type=int, default=100000, help="Line crops kept in memory when the cache is enabled (default: 100000)")
+    parser.add_argument("--cache_dir", default=None, help="Optional directory for the on-disk cache tier.")
+    parser.add_argument("--page_hash", choices=['content', 'perceptual'], default='content', help="Page cache key: exact pixel content or perceptual dHash (default: content)")
+    return parser
+
+
+def build_pipeline_from_args(args):
+    cache = None
+    if args.page_cache_size > 0 or args.cache_dir:
+        from result_cache import OCRResultCache
+        cache = OCRResultCache(max_pages=args.page_cache_size, max_lines=args.line_cache_size,
+                               cache_dir=args.cache_dir, page_hash=args.page_hash)
+    return OCRPipeline(args.det_model_dir, args.rec_model_dir, args.rec_char_dict_path,
+                       cls_model_dir=args.cls_model_dir, layout_model_dir=args.layout_model_dir,
+                       layout_dict_path=args.layout_dict_path, use_gpu=args.use_gpu,
+                       cpu_threads=args.cpu_threads, enable_mkldnn=args.enable_mkldnn,
+                       rec_batch_num=args.rec_batch_num, drop_score=args.drop_score,
+                       rec_batching=args.rec_batching, rec_fixed_width=args.rec_fixed_width,
+                       rec_fast_model_dir=args.rec_fast_model_dir, rec_cascade_threshold=args.rec_cascade_threshold,
+                       rec_lexicon_path=args.rec_lexicon, rec_beam_width=args.rec_beam_width, rec_lexicon_weight=args.rec_lexicon_weight,
+                       det_mode=args.det_mode, det_tile_size=args.det_tile_size, det_tile_overlap=args.det_tile_overlap,
+                       det_postprocess=args.det_postprocess, crop_axis_tolerance=args.crop_axis_tolerance,
+                       cache=cache)
+
+
+def list_image_files(image_dir, extensions=IMAGE_EXTENSIONS):
+    image_files = []
+    for root, _, files in os.walk(image_dir):
+        for file in files:
+            if file.lower().endswith(extensions):
+                image_files.append(os.path.join(root, file))
+    image_files.sort()
+    return image_files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the layout/det/cls/rec OCR pipeline over a directory of page images.")
+    parser.add_argument("image_directory", help="Directory containing the page images.")
+    parser.add_argument("output_jsonl", help="Path to write one JSON result per page.")
+    add_pipeline_args(parser)
+    args = parser.parse_args()
+
+    pipeline = build_pipeline_from_args(args)
+    image_files = list_image_files(args.image_directory)
+    if not image_files:
+        logging.error(f"No image files found in {args.image_directory}")
+        exit(1)
+
+    start = time.perf_counter()
+    with open(args.output_jsonl, 'w', encoding='utf-8') as f_out:
+        for image_path in image_files:
+            img = cv2.imread(image_path)
+            if img is None:
+                logging.error(f"Cannot read image: {image_path}")
+                continue
+            result = pipeline(img)
+            f_out.write(json.dumps({'image_path': image_path, **result}, ensure_ascii=False) + "\n")
+    elapsed = time.perf_counter() - start
+    logging.info(f"Processed {len(image_files)} pages in {elapsed:.1f}s ({len(image_files) / elapsed:.2f} pages/s)")
+    if pipeline.cache is not None:
+        pipeline.cache.log_stats()
@@ -0,0 +1,174 @@
+# inference/ocr_server.py
+#
+# Single worker:   uvicorn ocr_server:app --app-dir inference --port 5003
+# Several workers: gunicorn --preload -w 4 -k uvicorn.workers.UvicornWorker --chdir inference ocr_server:app
+#   --preload imports this module (and so reads the models) once in the master before forking.
+#   Workers share the imported modules and the model file bytes, not the weights: each worker's
+#   predictors hold their own copy, so memory grows by one set of weights per worker.
+# Models are configured through OCR_* environment variables, see WarmStart.from_env().
+# Metrics are per worker: scrape each worker (or run one worker per container) and aggregate in Prometheus.
+
+import base64
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from warm_start import WarmStart
+from document_stream import spool_upload, stream_document_results, document_page_megapixels
+from upload_ingest import decode_upload
+from metrics import OCRMetrics, SamplingProfiler
+from admission import AdmissionController, AdmissionRejected, image_megapixels
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+metrics = OCRMetrics()
+profiler = SamplingProfiler()
+metrics.attach(profiler=profiler)
+
+warm_start = WarmStart.from_env(metrics=metrics)
+warm_start.preload()
+
+# One pipeline per worker; Paddle predictors are not safe to call from several threads at once,
+# so pages take turns through the admission controller, in priority-lane order.
+admission = AdmissionController(metrics=metrics)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    warm_start.start_background()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def run_ocr(image_bytes, ticket):
+    with metrics.time_stage('image_decode'):
+        img = decode_upload(image_bytes)
+    if img is None:
+        return ""
+    return "\n".join(line['text'] for line in run_page(img, ticket)['lines'])
+
+
+def run_page(img, ticket):
+    # The pipeline is held per page, so single-image requests interleave with a long document.
+    with admission.page(ticket, img.shape[0] * img.shape[1] / 1e6) as degrade:
+        with metrics.time_stage('page'):
+            if degrade:
+                result = warm_start.pipeline(img, use_layout=False, det_limit_side_len=admission.degrade_limit_side_len)
+                result = dict(result, degraded=True)
+            else:
+                result = warm_start.pipeline(img)
+    metrics.observe_page(result)
+    return result
+
+
+def rejected_response(endpoint, e):
+    metrics.requests.inc(endpoint=endpoint, status="429")
+    return JSONResponse(status_code=429, headers={"Retry-After": str(max(1, int(round(e.retry_after))))},
+                        content={"message": f"overloaded, request rejected ({e.reason})", "lane": e.lane})
+
+
+@app.post("/ocr")
+async def ocr(request: Request):
+    """
+    Performs OCR on document images.
+
+    Request body: {"instances": [{"key": 0, "b64": "<base64 encoded image>"}, ...]}
+    Response body: {"predictions": ["<text of image 0>", ...]}
+    """
+    if not warm_start.ready:
+        metrics.requests.inc(endpoint="/ocr", status="503")
+        return JSONResponse(status_code=503, content={"message": "models are still warming up"})
+    inputs_json = await request.json()
+    images = [base64.b64decode(instance["b64"]) for instance in inputs_json["instances"]]
+    try:
+        ticket = admission.admit(sum(image_megapixels(image_bytes) for image_bytes in images), len(images))
+    except AdmissionRejected as e:
+        return rejected_response("/ocr", e)
+    try:
+        predictions = [await run_in_threadpool(run_ocr, image_bytes, ticket) for image_bytes in images]
+    finally:
+        admission.release(ticket)
+    metrics.requests.inc(endpoint="/ocr", status="200")
+    return {"predictions": predictions}
+
+
+@app.post("/ocr/stream")
+async def ocr_stream(request: Request, format: str = "ndjson", max_pages: int = None):
+    """
+    Performs OCR on a multi-page document (PDF, multi-page TIFF, or a single image) sent as the raw request body.
+
+    Pages are decoded one at a time and each page's result is streamed as soon as it is ready,
+    as NDJSON lines (default) or Server-Sent Events (?format=sse):
+        {"page": 0, "text": "...", "lines": [...], "elapsed_ms": ..., "since_start_ms": ...}
+    followed by {"done": true, "pages": N, "elapsed_ms": ...}, or {"error": ...} on failure.
+    Pages run degraded under load carry "degraded": true; an overloaded worker answers 429.
+    """
+    if not warm_start.ready:
+        metrics.requests.inc(endpoint="/ocr/stream", status="503")
+        return JSONResponse(status_code=503, content={"message": "models are still warming up"})
+    if format not in ("ndjson", "sse"):
+        metrics.requests.inc(endpoint="/ocr/stream", status="400")
+        return JSONResponse(status_code=400, content={"message": "format must be 'ndjson' or 'sse'"})
+    # PDF and TIFF need random access to their page index, so the body is spooled first
+    # (in memory up to a limit, then to a temporary file); pages are then decoded lazily.
+    spool = await spool_upload(request.stream())
+    page_megapixels = document_page_megapixels(spool)
+    if max_pages is not None:
+        page_megapixels = page_megapixels[:max_pages]
+    try:
+        ticket = admission.admit(sum(page_megapixels), len(page_megapixels))
+    except AdmissionRejected as e:
+        spool.close()
+        return rejected_response("/ocr/stream", e)
+    metrics.requests.inc(endpoint="/ocr/stream", status="200")
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    # A sync generator: Starlette iterates it in the threadpool, keeping OCR off the event loop.
+    # The ticket is released when the generator ends, or by the background task if it never starts.
+    results = stream_document_results(spool, lambda img: run_page(img, ticket), format, max_pages,
+                                      on_close=lambda: admission.release(ticket))
+    return StreamingResponse(results, media_type=media_type, background=BackgroundTask(admission.release, ticket))
+
+
+@app.get("/health")
+def health():
+    """Liveness: the process is up (it may still be warming up)."""
+    return {"message": "health ok"}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 only once every configured stage has been loaded and warmed."""
+    status = warm_start.status()
+    return JSONResponse(status_code=200 if status['ready'] else 503, content=status)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of this worker's metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/debug/profiler/start")
+def start_profiler(interval_ms: float = 5.0):
+    """Starts the sampling profiler without restarting the server; samples from a previous run are discarded."""
+    started = profiler.start(interval_ms / 1000.0)
+    return {"running": True, "started": started, "interval_ms": profiler.interval * 1000}
+
+
+@app.post("/debug/profiler/stop")
+def stop_profiler():
+    """Stops the profiler and returns the collected stacks in collapsed (flamegraph) format."""
+    profiler.stop()
+    return PlainTextResponse(profiler.collapsed())
+
+
+@app.get("/debug/profiler")
+def profiler_report(top: int = 50):
+    """The most frequent stacks so far, while running or after a stop."""
+    return PlainTextResponse(profiler.collapsed(top))
@@ -0,0 +1,125 @@
+# inference/predictor.py
+
+import os
+import logging
+
+
+def find_model_files(model_dir):
+    """
+    Returns (model_file, params_file) for an exported Paddle inference model.
+    Accepts both the `inference.*` names written by tools/export_model.py and `model.*`,
+    and both the legacy .pdmodel program and the newer .json (PIR) program format.
+    """
+    for file_name in ("inference", "model"):
+        params_file = os.path.join(model_dir, f"{file_name}.pdiparams")
+        if not os.path.exists(params_file):
+            continue
+        for ext in (".json", ".pdmodel"):
+            model_file = os.path.join(model_dir, file_name + ext)
+            if os.path.exists(model_file):
+                return model_file, params_file
+        raise FileNotFoundError(f"Neither {file_name}.json nor {file_name}.pdmodel was found in {model_dir}")
+    raise FileNotFoundError(f"No inference.pdiparams or model.pdiparams found in {model_dir}")
+
+
+class StagePredictor:
+    """
+    Thin wrapper around a Paddle inference predictor for one pipeline stage (det, cls, rec, ...).
+    Configured the same way as PaddleOCR's tools/infer/utility.create_predictor.
+    """
+
+    def __init__(self, name, model_dir, use_gpu=False, gpu_mem=500, gpu_id=0, cpu_threads=10, enable_mkldnn=False,
+                 model_buffers=None):
+        from paddle import inference  # deferred: paddle is heavy and only needed once a model is loaded
+
+        self.name = name
+        self.model_dir = model_dir
+        model_file, params_file = find_model_files(model_dir)
+
+        if model_buffers is not None and model_file.endswith(".pdmodel"):
+            # Program and weights were already read into memory (see warm_start.preload_model_files).
+            prog_buffer, params_buffer = model_buffers
+            config = inference.Config()
+            config.set_model_buffer(prog_buffer, len(prog_buffer), params_buffer, len(params_buffer))
+        else:
+            config = inference.Config(model_file, params_file)
+        if use_gpu:
+            config.enable_use_gpu(gpu_mem, gpu_id)
+        else:
+            config.disable_gpu()
+            config.set_cpu_math_library_num_threads(cpu_threads)
+            if enable_mkldnn:
+                # cache 10 different shapes for mkldnn to avoid memory leak
+                config.set_mkldnn_cache_capacity(10)
+                config.enable_mkldnn()
+        config.enable_memory_optim()
+        config.disable_glog_info()
+        config.delete_pass("conv_transpose_eltwiseadd_bn_fuse_pass")
+        config.delete_pass("matmul_transpose_reshape_fuse_pass")
+        config.switch_use_feed_fetch_ops(False)
+        config.switch_ir_optim(True)
+
+        self.config = config
+        self.predictor = inference.create_predictor(config)
+        input_names = self.predictor.get_input_names()
+        self.input_handle = self.predictor.get_input_handle(input_names[0])
+        self.output_handles = [self.predictor.get_output_handle(n) for n in self.predictor.get_output_names()]
+        logging.info(f"Loaded {name} model from {model_dir}")
+
+    def fixed_input_width(self):
+        """Input width baked into the exported program, or None if the width is dynamic (-1)."""
+        try:
+            width = int(self.input_handle.shape()[-1])
+        except Exception:
+            return None
+        return width if width > 0 else None
+
+    def run(self, batch):
+        """Runs one batch (an NCHW float32 array) and returns the list of output arrays."""
+        self.input_handle.copy_from_cpu(batch)
+        self.predictor.run()
+        return [handle.copy_to_cpu() for handle in self.output_handles]
+
+
+class OnnxStagePredictor:
+    """
+    Same interface as StagePredictor, on onnxruntime, for models converted with paddle2onnx
+    (inference.onnx or model.onnx in the model directory). onnxruntime is optional.
+    """
+
+    def __init__(self, name, model_dir, cpu_threads=10):
+        import onnxruntime  # deferred: only needed for the onnxruntime backend
+
+        for file_name in ("inference.onnx", "model.onnx"):
+            model_file = os.path.join(model_dir, file_name)
+            if os.path.exists(model_file):
+                break
+        else:
+            raise FileNotFoundError(f"No inference.onnx or model.onnx found in {model_dir}")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = cpu_threads
+        self.name = name
+        self.model_dir = model_dir
+        self.session = onnxruntime.InferenceSession(model_file, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        logging.info(f"Loaded {name} model from {model_file} (onnxruntime)")
+
+    def fixed_input_width(self):
+        width = self.session.get_inputs()[0].shape[-1]
+        return width if isinstance(width, int) and width > 0 else None
+
+    def run(self, batch):
+        return self.session.run(None, {self.input_name: batch})
+
+
+BACKENDS = ('cpu', 'mkldnn', 'gpu', 'onnxruntime')
+
+
+def create_stage_predictor(name, model_dir, backend='cpu', cpu_threads=10):
+    """StagePredictor / OnnxStagePredictor for one of BACKENDS."""
+    if backend == 'onnxruntime':
+        return OnnxStagePredictor(name, model_dir, cpu_threads=cpu_threads)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+    return StagePredictor(name, model_dir, use_gpu=backend == 'gpu', cpu_threads=cpu_threads,
+                          enable_mkldnn=backend == 'mkldnn')
@@ -0,0 +1,349 @@
+# inference/rec_batching.py
+
+import math
+import time
+import argparse
+import logging
+
+import cv2
+import numpy as np
+
+from metrics import NULL_METRICS
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+# Recognition input contract, matching Train/Eval in my_config_rec_ppocrv4_finetune.yml
+REC_IMAGE_SHAPE = (3, 48, 320)
+REC_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape((3, 1, 1))
+REC_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape((3, 1, 1))
+
+
+def resize_to_height(img, image_height=48):
+    """Keep-ratio resize to the recognition height, using the same width rounding as SVTRRecResizeImg."""
+    h, w = img.shape[:2]
+    resized_w = max(1, int(math.ceil(image_height * w / float(h))))
+    return cv2.resize(img, (resized_w, image_height))
+
+
+def rec_norm_padded(resized, imgW):
+    """
+    Normalizes an already height-resized HWC crop into a [3, H, imgW] input, right-padded,
+    with the numerics of SVTRRecResizeImg followed by NormalizeImage in the training config.
+    """
+    imgH, resized_w = resized.shape[:2]
+    img = resized.astype('float32').transpose((2, 0, 1)) / 255
+    img -= 0.5
+    img /= 0.5
+    padding_im = np.zeros((3, imgH, imgW), dtype=np.float32)
+    padding_im[:, :, 0:resized_w] = img
+    return (padding_im * np.float32(1. / 255.) - REC_MEAN) / REC_STD
+
+
+def rec_resize_norm_img(img, image_shape=REC_IMAGE_SHAPE):
+    """
+    The fixed-shape recognition contract of the training config: SVTRRecResizeImg
+    (keep ratio up to imgW, squash anything wider, pad right) + NormalizeImage.
+    """
+    imgC, imgH, imgW = image_shape
+    h, w = img.shape[:2]
+    if math.ceil(imgH * w / float(h)) > imgW:
+        return rec_norm_padded(cv2.resize(img, (imgW, imgH)), imgW)
+    return rec_norm_padded(resize_to_height(img, imgH), imgW)
+
+
+def resize_for_rec(img, image_shape=REC_IMAGE_SHAPE, scratch=None):
+    """
+    The uint8 half of rec_resize_norm_img: keep ratio up to imgW, squash anything wider.
+    Writes into the start of `scratch` (a flat uint8 buffer) if given.
+    """
+    _, imgH, imgW = image_shape
+    h, w = img.shape[:2]
+    resized_w = min(max(1, int(math.ceil(imgH * w / float(h)))), imgW)
+    if scratch is None:
+        return cv2.resize(img, (resized_w, imgH))
+    resized = scratch[:imgH * resized_w * 3].reshape((imgH, resized_w, 3))
+    cv2.resize(img, (resized_w, imgH), dst=resized)
+    return resized
+
+
+def build_rec_norm_lut():
+    """
+    uint8 -> float32 table per channel for the SVTRRecResizeImg + NormalizeImage chain, computed
+    with the same float32 operations in the same order as rec_norm_padded, so looking a pixel
+    up gives bit-identical values. Returns (lut [3, 256], pad [3]), where pad is what the zero
+    padding SVTRRecResizeImg adds becomes after NormalizeImage.
+    """
+    values = np.arange(256, dtype=np.uint8).astype('float32') / 255
+    values -= 0.5
+    values /= 0.5
+    mean, std = REC_MEAN.reshape((3, 1)), REC_STD.reshape((3, 1))
+    lut = (values[np.newaxis, :] * np.float32(1. / 255.) - mean) / std
+    pad = (np.zeros((3, 1), dtype=np.float32) * np.float32(1. / 255.) - mean) / std
+    return lut.astype(np.float32), pad[:, 0].astype(np.float32)
+
+
+class RecBatchKernel:
+    """
+    Batched recognition preprocessing into one reused [B, 3, H, W] float32 buffer.
+
+    Each crop is resized into a reused uint8 scratch buffer and then written channel by channel
+    with np.take over build_rec_norm_lut(): scaling, both mean/std steps and the HWC -> CHW
+    transpose happen in that single pass, and the right padding is filled with its normalized
+    value. Output is bit-identical to stacking rec_resize_norm_img / rec_norm_padded per crop.
+
+    Used by the inference pipeline and by scripts that cache training/eval tensors, so both
+    see the same numerics. Without `out`, the returned batch is a view into the kernel's
+    buffer and is overwritten by the next call.
+    """
+
+    def __init__(self, image_height=48, max_batch=6, max_width=320):
+        self.image_height = image_height
+        self.lut, self.pad = build_rec_norm_lut()
+        self._batch = np.empty((max_batch, 3, image_height, max_width), dtype=np.float32)
+        self._scratch = np.empty(image_height * max_width * 3, dtype=np.uint8)
+        self.allocations = 1
+
+    def _output(self, batch_size, width, out):
+        if out is not None:
+            return out
+        if batch_size > self._batch.shape[0] or width > self._batch.shape[3]:
+            self._batch = np.empty((max(batch_size, self._batch.shape[0]), 3, self.image_height,
+                                    max(width, self._batch.shape[3])), dtype=np.float32)
+            self.allocations += 1
+        # a contiguous [B, 3, H, width] view over the start of the buffer
+        return self._batch.reshape(-1)[:batch_size * 3 * self.image_height * width].reshape(
+            (batch_size, 3, self.image_height, width))
+
+    def _write(self, dst, resized):
+        w = resized.shape[1]
+        for c in range(3):
+            np.take(self.lut[c], resized[:, :, c], out=dst[c, :, :w], mode='clip')
+            dst[c, :, w:] = self.pad[c]
+
+    def pack(self, resized_crops, batch_width, out=None):
+        """Crops already at the model height (windows may be non-contiguous slices), each at most batch_width wide."""
+        batch = self._output(len(resized_crops), batch_width, out)
+        for dst, resized in zip(batch, resized_crops):
+            self._write(dst, resized)
+        return batch
+
+    def resize_and_pack(self, crops, image_shape=REC_IMAGE_SHAPE, out=None):
+        """The fixed-shape contract of rec_resize_norm_img (keep ratio up to imgW, squash wider crops), batched."""
+        _, imgH, imgW = image_shape
+        if imgH != self.image_height:
+            raise ValueError(f"Kernel was built for height {self.image_height}, got {imgH}")
+        batch = self._output(len(crops), imgW, out)
+        if self._scratch.size < imgH * imgW * 3:
+            self._scratch = np.empty(imgH * imgW * 3, dtype=np.uint8)
+            self.allocations += 1
+        for dst, img in zip(batch, crops):
+            self._write(dst, resize_for_rec(img, image_shape, self._scratch))
+        return batch
+
+
+def plan_segments(widths, max_width=320, overlap=64):
+    """
+    Splits every resized crop into windows of at most max_width pixels.
+
+    Returns a list of (crop_index, x0, x1, keep0, keep1): the window [x0, x1) is fed to the
+    model, and only output frames whose centre falls in [keep0, keep1) are kept, with the
+    cut placed in the middle of each overlap so neighbouring windows never both emit a frame.
+    """
+    if overlap >= max_width:
+        raise ValueError(f"overlap ({overlap}) must be smaller than max_width ({max_width})")
+    segments = []
+    step = max_width - overlap
+    for crop_index, width in enumerate(widths):
+        if width <= max_width:
+            segments.append((crop_index, 0, width, 0, width))
+            continue
+        starts = list(range(0, width - max_width, step)) + [width - max_width]
+        for k, x0 in enumerate(starts):
+            x1 = x0 + max_width
+            keep0 = 0 if k == 0 else (x0 + starts[k - 1] + max_width) / 2.0
+            keep1 = width if k == len(starts) - 1 else (starts[k + 1] + x1) / 2.0
+            segments.append((crop_index, x0, x1, keep0, keep1))
+    return segments
+
+
+def plan_batches(segments, batch_size, max_width=320, width_step=32):
+    """
+    Groups segments of similar width: sorts by width, chunks into batches, and gives each
+    batch the smallest width (rounded up to width_step, capped at max_width) that fits it.
+    Returns a list of (batch_width, [segment_index, ...]).
+    """
+    order = sorted(range(len(segments)), key=lambda i: segments[i][2] - segments[i][1])
+    batches = []
+    for beg in range(0, len(order), batch_size):
+        idx = order[beg:beg + batch_size]
+        widest = max(segments[i][2] - segments[i][1] for i in idx)
+        batch_width = min(max_width, int(math.ceil(widest / float(width_step)) * width_step))
+        batches.append((batch_width, idx))
+    return batches
+
+
+def padding_stats(batches, segments):
+    """Fraction of the fed input columns that are padding rather than crop content."""
+    fed = sum(width * len(idx) for width, idx in batches)
+    content = sum(segments[i][2] - segments[i][1] for _, idx in batches for i in idx)
+    return {'fed_columns': fed, 'content_columns': content,
+            'padding_waste': 1.0 - content / float(fed) if fed else 0.0}
+
+
+class BucketedRecognizer:
+    """
+    Recognition with width-sorted batches and crop-aware widths.
+
+    Crops are resized to the model height once, sliced into overlapping windows when they
+    are wider than max_width, batched by width, and run at the narrowest width that fits each
+    batch. Per-window frame probabilities are stitched back into one sequence per crop and
+    the whole set is decoded in a single BatchCTCDecoder call.
+
+    If the model was exported with a fixed input width (algorithm SVTR exports [3, 48, 320]),
+    pass fixed_width: every batch is then padded to it, but long lines still get windows
+    instead of being squashed.
+    """
+
+    def __init__(self, run_model, decoder, batch_size=6, image_height=48, max_width=320,
+                 overlap=64, width_step=32, fixed_width=None):
+        self.run_model = run_model
+        self.decoder = decoder
+        self.batch_size = batch_size
+        self.image_height = image_height
+        self.max_width = fixed_width or max_width
+        self.fixed_width = fixed_width
+        self.overlap = overlap
+        self.width_step = width_step
+        self.kernel = RecBatchKernel(image_height, batch_size, self.max_width)
+        self.metrics = NULL_METRICS
+        self.last_stats = None
+
+    def __call__(self, crops):
+        if not crops:
+            return []
+        with self.metrics.time_stage('rec_preprocess'):
+            resized = [resize_to_height(crop, self.image_height) for crop in crops]
+        segments = plan_segments([r.shape[1] for r in resized], self.max_width, self.overlap)
+        batches = plan_batches(segments, self.batch_size, self.max_width, self.width_step)
+        if self.fixed_width:
+            batches = [(self.fixed_width, idx) for _, idx in batches]
+        self.last_stats = padding_stats(batches, segments)
+
+        frames = [[] for _ in crops]  # (x0, frames) per segment, stitched in x order below
+        for batch_width, idx in batches:
+            with self.metrics.time_stage('rec_preprocess'):
+                batch = self.kernel.pack([resized[segments[i][0]][:, segments[i][1]:segments[i][2]] for i in idx],
+                                         batch_width)
+            self.metrics.observe_batch('rec', len(idx))
+            with self.metrics.time_stage('rec_infer'):
+                preds = self.run_model(batch)
+            stride = batch_width / float(preds.shape[1])
+            centres = (np.arange(preds.shape[1]) + 0.5) * stride
+            for row, i in enumerate(idx):
+                crop_index, x0, x1, keep0, keep1 = segments[i]
+                keep = (centres + x0 >= keep0) & (centres + x0 < keep1)
+                frames[crop_index].append((x0, preds[row][keep]))
+
+        sequences = [np.concatenate([f for _, f in sorted(parts, key=lambda p: p[0])]) for parts in frames]
+        max_t = max(1, max(len(s) for s in sequences))
+        stitched = np.zeros((len(sequences), max_t, sequences[0].shape[1]), dtype=np.float32)
+        stitched[:, :, self.decoder.blank_index] = 1.0  # trailing padding decodes to nothing
+        for i, seq in enumerate(sequences):
+            stitched[i, :len(seq)] = seq
+        with self.metrics.time_stage('rec_decode'):
+            return self.decoder(stitched)
+
+
+def fixed_shape_batches(crops, batch_size, image_width=320):
+    """The [3, 48, 320] baseline: every crop padded (or squashed) to one shape, ratio-sorted batches."""
+    order = np.argsort([c.shape[1] / float(c.shape[0]) for c in crops])
+    return [(image_width, list(order[beg:beg + batch_size])) for beg in range(0, len(crops), batch_size)]
+
+
+def load_crops(label_file, limit=None):
+    crops, texts = [], []
+    with open(label_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if limit is not None and len(crops) >= limit:
+                break
+            image_path, _, text = line.rstrip('\n').partition('\t')
+            img = cv2.imread(image_path)
+            if img is None:
+                logging.warning(f"Cannot read image: {image_path}")
+                continue
+            crops.append(img)
+            texts.append(text)
+    return crops, texts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare width-bucketed recognition batching against the fixed [3, 48, 320] baseline.")
+    parser.add_argument("label_file", help="PaddleOCR label file (image_path<TAB>text), e.g. ocr_output/rec_gt_eval.txt")
+    parser.add_argument("--rec_model_dir", default=None, help="Exported recognition model. If omitted, only padding waste is reported.")
+    parser.add_argument("--rec_char_dict_path", default="/home/jupyter/PaddleOCR_Training/ocr_output/custom_char_dict.txt", help="Character dictionary of the recognition model.")
+    parser.add_argument("--batch_size", type=int, default=16, help="Recognition batch size (default: 16)")
+    parser.add_argument("--limit", type=int, default=2000, help="Number of crops to use (default: 2000)")
+    parser.add_argument("--max_width", type=int, default=320, help="Widest window fed to the model (default: 320)")
+    parser.add_argument("--overlap", type=int, default=64, help="Overlap between windows of long lines (default: 64)")
+    parser.add_argument("--fixed_width", type=int, default=None, help="Set if the model only accepts one input width.")
+    parser.add_argument("--cpu_threads", type=int, default=10, help="CPU math library threads (default: 10)")
+    args = parser.parse_args()
+
+    crops, texts = load_crops(args.label_file, args.limit)
+    if not crops:
+        logging.error(f"No readable crops in {args.label_file}")
+        exit(1)
+
+    widths = [resize_to_height(c).shape[1] for c in crops]
+    baseline_segments = [(i, 0, min(w, 320), 0, min(w, 320)) for i, w in enumerate(widths)]
+    baseline_stats = padding_stats(fixed_shape_batches(crops, args.batch_size), baseline_segments)
+    segments = plan_segments(widths, args.fixed_width or args.max_width, args.overlap)
+    bucketed_stats = padding_stats(plan_batches(segments, args.batch_size, args.fixed_width or args.max_width), segments)
+    logging.info(f"{len(crops)} crops, {sum(w > args.max_width for w in widths)} wider than {args.max_width}px at height 48 (windowed)")
+    logging.info(f"  Fixed [3,48,320] padding waste: {baseline_stats['padding_waste']:.1%}")
+    logging.info(f"  Bucketed padding waste:         {bucketed_stats['padding_waste']:.1%} ({len(segments)} segments)")
+
+    # Preprocessing alone: per-crop rec_resize_norm_img + np.stack vs. the batched kernel
+    kernel = RecBatchKernel(max_batch=args.batch_size)
+    batches = fixed_shape_batches(crops, args.batch_size)
+    for _, idx in batches:
+        if not np.array_equal(np.stack([rec_resize_norm_img(crops[i]) for i in idx]),
+                              kernel.resize_and_pack([crops[i] for i in idx])):
+            logging.error("RecBatchKernel output differs from rec_resize_norm_img")
+            exit(1)
+    start = time.perf_counter()
+    for _, idx in batches:
+        np.stack([rec_resize_norm_img(crops[i]) for i in idx])
+    per_crop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _, idx in batches:
+        kernel.resize_and_pack([crops[i] for i in idx])
+    kernel_time = time.perf_counter() - start
+    logging.info(f"  Preprocessing: per-crop chain {len(crops) / per_crop_time:.0f} crops/s, "
+                 f"batched kernel {len(crops) / kernel_time:.0f} crops/s (bit-identical, {kernel.allocations} buffer allocations)")
+
+    if args.rec_model_dir:
+        from ctc_decoder import BatchCTCDecoder
+        from predictor import StagePredictor
+
+        predictor = StagePredictor('rec', args.rec_model_dir, cpu_threads=args.cpu_threads)
+        decoder = BatchCTCDecoder(args.rec_char_dict_path)
+        run_model = lambda batch: predictor.run(batch)[0]
+
+        start = time.perf_counter()
+        baseline = [None] * len(crops)
+        for _, idx in fixed_shape_batches(crops, args.batch_size):
+            preds = run_model(np.stack([rec_resize_norm_img(crops[i]) for i in idx]))
+            for i, res in zip(idx, decoder(preds)):
+                baseline[i] = res
+        baseline_time = time.perf_counter() - start
+
+        recognizer = BucketedRecognizer(run_model, decoder, args.batch_size, max_width=args.max_width,
+                                        overlap=args.overlap, fixed_width=args.fixed_width)
+        start = time.perf_counter()
+        bucketed = recognizer(crops)
+        bucketed_time = time.perf_counter() - start
+
+        for name, results, elapsed in (("Fixed", baseline, baseline_time), ("Bucketed", bucketed, bucketed_time)):
+            correct = sum(1 for (text, _), gt in zip(results, texts) if text == gt)
+            logging.info(f"  {name}: {len(crops) / elapsed:.1f} lines/s, exact match {correct / len(crops):.2%}")
@@ -0,0 +1,183 @@
+# inference/rec_benchmark.py
+#
+# python inference/rec_benchmark.py --rec_model_dir /home/jupyter/PaddleOCR/inference/my_finetuned_ppocrv4_rec_en_infer \
+#     --batch_sizes 1,8,32 --threads 1,4 --backends cpu,mkldnn --output rec_benchmark.json
+
+import os
+import sys
+import json
+import time
+import string
+import hashlib
+import argparse
+import logging
+import datetime
+
+import numpy as np
+
+from ctc_decoder import BatchCTCDecoder
+from predictor import BACKENDS, create_stage_predictor, find_model_files
+from rec_batching import BucketedRecognizer, RecBatchKernel, load_crops
+from tiled_detection import reset_peak_rss, peak_rss_mb
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+
+class RecMetricPort:
+    """Line-for-line port of ppocr.metrics.rec_metric.RecMetric, used when the PaddleOCR repo is not importable."""
+
+    def __init__(self, ignore_space=True, is_filter=False):
+        from rapidfuzz.distance import Levenshtein
+
+        self.levenshtein = Levenshtein
+        self.ignore_space = ignore_space
+        self.is_filter = is_filter
+        self.eps = 1e-5
+
+    def _normalize_text(self, text):
+        text = "".join(filter(lambda x: x in (string.digits + string.ascii_letters), text))
+        return text.lower()
+
+    def __call__(self, pred_label, *args, **kwargs):
+        preds, labels = pred_label
+        correct_num = 0
+        all_num = 0
+        norm_edit_dis = 0.0
+        for (pred, pred_conf), (target, _) in zip(preds, labels):
+            if self.ignore_space:
+                pred = pred.replace(" ", "")
+                target = target.replace(" ", "")
+            if self.is_filter:
+                pred = self._normalize_text(pred)
+                target = self._normalize_text(target)
+            norm_edit_dis += self.levenshtein.normalized_distance(pred, target)
+            if pred == target:
+                correct_num += 1
+            all_num += 1
+        return {"acc": correct_num / (all_num + self.eps), "norm_edit_dis": 1 - norm_edit_dis / (all_num + self.eps)}
+
+
+def get_rec_metric(paddleocr_dir=None):
+    """PaddleOCR's RecMetric from the cloned repo (the one training reports), else the local port."""
+    if paddleocr_dir and os.path.isdir(paddleocr_dir):
+        sys.path.insert(0, os.path.abspath(paddleocr_dir))
+    try:
+        from ppocr.metrics.rec_metric import RecMetric
+        logging.info("Accuracy metric: ppocr.metrics.rec_metric.RecMetric")
+        return RecMetric()
+    except ImportError:
+        logging.info("ppocr.metrics not importable. Accuracy metric: local RecMetric port.")
+        return RecMetricPort()
+
+
+def model_fingerprint(model_dir):
+    """Identifies the exported model in the results, so runs of different versions can be told apart."""
+    model_file, params_file = find_model_files(model_dir)
+    digest = hashlib.sha256()
+    with open(params_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return {'model_dir': os.path.abspath(model_dir), 'params_sha256': digest.hexdigest()[:16],
+            'params_mtime': datetime.datetime.fromtimestamp(os.path.getmtime(params_file)).isoformat(timespec='seconds')}
+
+
+def make_recognizer(predictor, decoder, batching, batch_size, max_width=320):
+    run_model = lambda batch: predictor.run(batch)[0]
+    if batching == 'bucketed':
+        return BucketedRecognizer(run_model, decoder, batch_size=batch_size, max_width=max_width,
+                                  fixed_width=predictor.fixed_input_width())
+    kernel = RecBatchKernel(max_batch=batch_size)
+    return lambda crops: decoder(run_model(kernel.resize_and_pack(crops)))
+
+
+def benchmark_run(recognizer, crops, texts, batch_size, metric):
+    """
+    Feeds the crops as requests of batch_size lines. Each line is charged its request's
+    latency divided by the lines in it. Returns the run's throughput, latency and accuracy figures.
+    """
+    recognizer(crops[:batch_size])  # warm-up for the first shapes
+    reset_peak_rss()
+    rss_before = peak_rss_mb()
+
+    results, ms_per_line = [], []
+    start = time.perf_counter()
+    for beg in range(0, len(crops), batch_size):
+        chunk = crops[beg:beg + batch_size]
+        chunk_start = time.perf_counter()
+        results.extend(recognizer(chunk))
+        ms_per_line.extend([(time.perf_counter() - chunk_start) * 1000 / len(chunk)] * len(chunk))
+    elapsed = time.perf_counter() - start
+
+    scores = metric([results, [(text, 1.0) for text in texts]])
+    ms = np.array(ms_per_line)
+    return {
+        'lines_per_sec': round(len(crops) / elapsed, 2),
+        'ms_per_line': {'mean': round(float(ms.mean()), 3),
+                        **{f'p{q}': round(float(np.percentile(ms, q)), 3) for q in (50, 90, 95, 99)}},
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'peak_rss_increase_mb': round(peak_rss_mb() - rss_before, 1),
+        'acc': round(float(scores['acc']), 5),
+        'norm_edit_dis': round(float(scores['norm_edit_dis']), 5),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the exported recognition model on a labeled line set: speed, memory and RecMetric accuracy.")
+    parser.add_argument("label_file", nargs='?', default="/home/jupyter/PaddleOCR_Training/ocr_output/rec_gt_eval.txt", help="PaddleOCR label file (image_path<TAB>text). Default: ocr_output/rec_gt_eval.txt")
+    parser.add_argument("--rec_model_dir", required=True, help="Exported recognition inference model directory.")
+    parser.add_argument("--rec_char_dict_path", default="/home/jupyter/PaddleOCR_Training/ocr_output/custom_char_dict.txt", help="Character dictionary of the recognition model.")
+    parser.add_argument("--batch_sizes", default="1,8,32", help="Comma-separated batch sizes (default: 1,8,32)")
+    parser.add_argument("--threads", default="4", help="Comma-separated CPU thread counts (default: 4)")
+    parser.add_argument("--backends", default="cpu", help=f"Comma-separated backends from {', '.join(BACKENDS)} (default: cpu)")
+    parser.add_argument("--batching", choices=['bucketed', 'fixed'], default='bucketed', help="Recognition batching (default: bucketed)")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N lines.")
+    parser.add_argument("--paddleocr_dir", default="/home/jupyter/PaddleOCR", help="Cloned PaddleOCR repo, for RecMetric (a local port is used if missing).")
+    parser.add_argument("--output", default="rec_benchmark.json", help="Where to write the JSON results (default: rec_benchmark.json)")
+    args = parser.parse_args()
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+    thread_counts = [int(t) for t in args.threads.split(',')]
+    backends = args.backends.split(',')
+    unknown = [b for b in backends if b not in BACKENDS]
+    if unknown:
+        logging.error(f"Unknown backends: {', '.join(unknown)}")
+        exit(1)
+
+    crops, texts = load_crops(args.label_file, args.limit)
+    if not crops:
+        logging.error(f"No readable crops in {args.label_file}")
+        exit(1)
+    logging.info(f"Loaded {len(crops)} line crops from {args.label_file}")
+
+    metric = get_rec_metric(args.paddleocr_dir)
+    decoder = BatchCTCDecoder(args.rec_char_dict_path)
+    report = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'model': model_fingerprint(args.rec_model_dir),
+        'label_file': os.path.abspath(args.label_file),
+        'lines': len(crops),
+        'batching': args.batching,
+        'runs': [],
+    }
+
+    for backend in backends:
+        # GPU runs ignore the thread count; one run per batch size is enough there.
+        for threads in (thread_counts[:1] if backend == 'gpu' else thread_counts):
+            try:
+                predictor = create_stage_predictor('rec', args.rec_model_dir, backend, threads)
+            except (ImportError, FileNotFoundError) as e:
+                logging.warning(f"Skipping backend {backend}: {e}")
+                break
+            for batch_size in batch_sizes:
+                run = {'backend': backend, 'threads': threads, 'batch_size': batch_size,
+                       **benchmark_run(make_recognizer(predictor, decoder, args.batching, batch_size),
+                                       crops, texts, batch_size, metric)}
+                report['runs'].append(run)
+                logging.info(f"{backend:>11} threads={threads:<2} batch={batch_size:<3} {run['lines_per_sec']:8.1f} lines/s  "
+                             f"p50 {run['ms_per_line']['p50']:.2f} ms/line  p99 {run['ms_per_line']['p99']:.2f} ms/line  "
+                             f"peak RSS {run['peak_rss_mb']:.0f} MiB  acc {run['acc']:.4f}  norm_edit_dis {run['norm_edit_dis']:.4f}")
+            del predictor
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Results written to {args.output}")
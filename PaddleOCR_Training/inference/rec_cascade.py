@@ -0,0 +1,180 @@
+# inference/rec_cascade.py
+#
+# python inference/rec_cascade.py --fast_model_dir <small/distilled rec model> --full_model_dir <fine-tuned rec model> \
+#     --max_acc_drop 0.002 --output rec_cascade.json
+
+import os
+import json
+import time
+import argparse
+import logging
+import datetime
+
+import numpy as np
+
+from ctc_decoder import BatchCTCDecoder
+from metrics import NULL_METRICS
+from predictor import create_stage_predictor
+from rec_batching import BucketedRecognizer, load_crops
+from rec_benchmark import get_rec_metric, model_fingerprint
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+
+class CascadeRecognizer:
+    """
+    Two-model recognition: every crop goes through the fast recognizer, and only crops whose
+    CTC confidence is below `threshold` are recognized again by the full model, whose result
+    replaces the fast one. Both recognizers take a list of crops and return (text, confidence)
+    per crop, like OCRPipeline.recognize. An empty fast result has confidence 0.0 and always
+    falls back.
+    """
+
+    def __init__(self, fast_recognize, full_recognize, threshold=0.9):
+        self.fast_recognize = fast_recognize
+        self.full_recognize = full_recognize
+        self.threshold = threshold
+        self.metrics = NULL_METRICS
+        self.lines = 0
+        self.fallbacks = 0
+
+    @property
+    def fallback_rate(self):
+        return self.fallbacks / self.lines if self.lines else 0.0
+
+    def __call__(self, crops):
+        if not crops:
+            return []
+        with self.metrics.time_stage('rec_fast'):
+            results = list(self.fast_recognize(crops))
+        fallback = [i for i, (_, confidence) in enumerate(results) if confidence < self.threshold]
+        if fallback:
+            with self.metrics.time_stage('rec_fallback'):
+                for i, res in zip(fallback, self.full_recognize([crops[i] for i in fallback])):
+                    results[i] = res
+        self.lines += len(crops)
+        self.fallbacks += len(fallback)
+        self.metrics.observe_cascade(len(crops) - len(fallback), len(fallback))
+        return results
+
+
+def line_correct(results, texts, ignore_space=True):
+    """Per-line exact match, as RecMetric's acc counts it (spaces ignored by default)."""
+    strip = (lambda s: s.replace(' ', '')) if ignore_space else (lambda s: s)
+    return np.array([strip(pred) == strip(text) for (pred, _), text in zip(results, texts)], dtype=bool)
+
+
+def sweep_thresholds(fast_results, full_results, texts, fast_seconds, full_seconds, thresholds=None):
+    """
+    Simulates the cascade at every threshold from one run of each model over the same lines:
+    a line uses the full model's result iff its fast confidence is below the threshold. Cost
+    per threshold is fast_seconds for all lines plus the full model's per-line time for the
+    fallbacks. Returns one row per threshold (fallback rate, accuracy, estimated lines/s).
+    """
+    confidence = np.array([conf for _, conf in fast_results], dtype=np.float64)
+    fast_ok = line_correct(fast_results, texts)
+    full_ok = line_correct(full_results, texts)
+    if thresholds is None:
+        thresholds = np.round(np.arange(0.0, 1.0001, 0.01), 2)
+    n = len(texts)
+    order = np.argsort(confidence, kind='stable')
+    sorted_conf = confidence[order]
+    # with the k least confident lines falling back: correct = full_ok over them + fast_ok over the rest
+    full_prefix = np.concatenate([[0], np.cumsum(full_ok[order])])
+    fast_suffix = np.concatenate([np.cumsum(fast_ok[order][::-1])[::-1], [0]])
+    full_per_line = full_seconds / max(1, n)
+    rows = []
+    for threshold in thresholds:
+        k = int(np.searchsorted(sorted_conf, threshold, side='left'))
+        seconds = fast_seconds + k * full_per_line
+        rows.append({'threshold': float(threshold), 'fallback_rate': round(k / max(1, n), 5),
+                     'acc': round(float(full_prefix[k] + fast_suffix[k]) / max(1, n), 5),
+                     'est_lines_per_sec': round(n / seconds, 1) if seconds > 0 else None})
+    return rows
+
+
+def pick_threshold(rows, full_acc, max_acc_drop=0.002):
+    """The lowest threshold (fewest fallbacks) whose accuracy is within max_acc_drop of the full model alone."""
+    for row in rows:
+        if row['acc'] >= full_acc - max_acc_drop:
+            return row
+    return rows[-1]
+
+
+def timed_recognize(recognizer, crops, batch_size):
+    """Results and wall seconds of recognizing all crops in requests of batch_size lines."""
+    recognizer(crops[:batch_size])  # warm-up
+    results = []
+    start = time.perf_counter()
+    for beg in range(0, len(crops), batch_size):
+        results.extend(recognizer(crops[beg:beg + batch_size]))
+    return results, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune and measure the confidence-gated rec cascade (fast model first, full model on low confidence).")
+    parser.add_argument("label_file", nargs='?', default="/home/jupyter/PaddleOCR_Training/ocr_output/rec_gt_eval.txt", help="Labeled lines to tune on (default: ocr_output/rec_gt_eval.txt)")
+    parser.add_argument("--fast_model_dir", required=True, help="Exported small/distilled recognition model (same dictionary).")
+    parser.add_argument("--full_model_dir", required=True, help="Exported fine-tuned recognition model.")
+    parser.add_argument("--rec_char_dict_path", default="/home/jupyter/PaddleOCR_Training/ocr_output/custom_char_dict.txt", help="Character dictionary shared by both models.")
+    parser.add_argument("--max_acc_drop", type=float, default=0.002, help="Accuracy the cascade may lose against the full model (default: 0.002)")
+    parser.add_argument("--threshold", type=float, default=None, help="Measure this threshold instead of the tuned one.")
+    parser.add_argument("--batch_size", type=int, default=6, help="Lines per request, as the pipeline batches them (default: 6)")
+    parser.add_argument("--backend", default="cpu", help="Predictor backend for both models (default: cpu)")
+    parser.add_argument("--cpu_threads", type=int, default=4, help="CPU math library threads per model (default: 4)")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N lines.")
+    parser.add_argument("--paddleocr_dir", default="/home/jupyter/PaddleOCR", help="Cloned PaddleOCR repo, for RecMetric (a local port is used if missing).")
+    parser.add_argument("--output", default=None, help="Write the sweep and the measured runs to this JSON file.")
+    args = parser.parse_args()
+
+    crops, texts = load_crops(args.label_file, args.limit)
+    if not crops:
+        logging.error(f"No readable crops in {args.label_file}")
+        exit(1)
+    logging.info(f"Loaded {len(crops)} line crops from {args.label_file}")
+
+    decoder = BatchCTCDecoder(args.rec_char_dict_path)
+    recognizers = {}
+    for name, model_dir in (('fast', args.fast_model_dir), ('full', args.full_model_dir)):
+        predictor = create_stage_predictor('rec', model_dir, args.backend, args.cpu_threads)
+        recognizers[name] = BucketedRecognizer(lambda batch, p=predictor: p.run(batch)[0], decoder,
+                                               batch_size=args.batch_size, fixed_width=predictor.fixed_input_width())
+    metric = get_rec_metric(args.paddleocr_dir)
+    labels = [(text, 1.0) for text in texts]
+
+    runs = {}
+    outputs = {}
+    for name in ('fast', 'full'):
+        outputs[name], seconds = timed_recognize(recognizers[name], crops, args.batch_size)
+        runs[name] = {'seconds': round(seconds, 3), 'lines_per_sec': round(len(crops) / seconds, 1),
+                      'acc': round(float(metric([outputs[name], labels])['acc']), 5), 'fallback_rate': None}
+        logging.info(f"{name:>8} model alone: {runs[name]['lines_per_sec']:8.1f} lines/s  acc {runs[name]['acc']:.4f}")
+
+    rows = sweep_thresholds(outputs['fast'], outputs['full'], texts, runs['fast']['seconds'], runs['full']['seconds'])
+    tuned = pick_threshold(rows, float(line_correct(outputs['full'], texts).mean()), args.max_acc_drop)
+    logging.info("Threshold sweep (simulated from the two runs):")
+    for row in rows[::10] + ([tuned] if tuned not in rows[::10] else []):
+        logging.info(f"  threshold {row['threshold']:.2f}: fallback {row['fallback_rate']:6.1%}  acc {row['acc']:.4f}  "
+                     f"~{row['est_lines_per_sec']} lines/s")
+    threshold = args.threshold if args.threshold is not None else tuned['threshold']
+    logging.info(f"Tuned threshold: {tuned['threshold']:.2f} (lowest within {args.max_acc_drop} of the full model's accuracy)")
+
+    cascade = CascadeRecognizer(recognizers['fast'], recognizers['full'], threshold)
+    results, seconds = timed_recognize(cascade, crops, args.batch_size)
+    # the fast model is deterministic, so its run above tells which lines fell back (the counter also saw the warm-up)
+    fallbacks = sum(conf < threshold for _, conf in outputs['fast'])
+    runs['cascade'] = {'threshold': threshold, 'seconds': round(seconds, 3), 'lines_per_sec': round(len(crops) / seconds, 1),
+                       'acc': round(float(metric([results, labels])['acc']), 5),
+                       'fallback_rate': round(fallbacks / len(crops), 5)}
+    logging.info(f" cascade at {threshold:.2f}: {runs['cascade']['lines_per_sec']:8.1f} lines/s  acc {runs['cascade']['acc']:.4f}  "
+                 f"fallback {runs['cascade']['fallback_rate']:.1%}  "
+                 f"({runs['cascade']['lines_per_sec'] / runs['full']['lines_per_sec']:.2f}x the full model)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                       'label_file': os.path.abspath(args.label_file), 'lines': len(crops),
+                       'fast_model': model_fingerprint(args.fast_model_dir), 'full_model': model_fingerprint(args.full_model_dir),
+                       'max_acc_drop': args.max_acc_drop, 'tuned_threshold': tuned['threshold'],
+                       'runs': runs, 'sweep': rows}, f, indent=2)
+        logging.info(f"Results written to {args.output}")
@@ -0,0 +1,249 @@
+# inference/result_cache.py
+
+import os
+import hashlib
+import logging
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+LINE_KEY_HEIGHT = 48  # crops are normalized to the recognition input height before hashing
+
+
+def content_hash(img, *extra):
+    """Exact hash of an image's pixels and shape (plus any extra key material)."""
+    h = hashlib.blake2b(digest_size=16)
+    for item in extra:
+        h.update(str(item).encode('utf-8'))
+    h.update(str(img.shape).encode('utf-8'))
+    h.update(np.ascontiguousarray(img).data)
+    return h.hexdigest()
+
+
+def perceptual_hash(img, hash_size=16):
+    """
+    Difference hash (dHash) of the grayscale page. Re-scans and re-encodes of the same
+    page map to the same key, so this should only be used where that is acceptable.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return np.packbits(bits).tobytes().hex()
+
+
+def normalize_line_crop(crop, height=LINE_KEY_HEIGHT):
+    """Grayscale crop resized to a fixed height, so identical lines hash identically."""
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    h, w = gray.shape[:2]
+    width = max(1, int(round(w * height / float(h))))
+    return cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+
+
+class LRUCache:
+    """In-memory LRU of pickled values, bounded by entry count and (optionally) total bytes."""
+
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        blob = self._data.get(key)
+        if blob is not None:
+            self._data.move_to_end(key)
+        return blob
+
+    def put(self, key, blob):
+        if self.max_entries <= 0:
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.total_bytes -= len(old)
+        self._data[key] = blob
+        self.total_bytes += len(blob)
+        while self._data and (len(self._data) > self.max_entries or
+                              (self.max_bytes is not None and self.total_bytes > self.max_bytes)):
+            _, evicted = self._data.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+
+class DiskCache:
+    """
+    On-disk tier: one pickle file per key under <cache_dir>/<level>/<key[:2]>/.
+    When max_bytes is set, the least recently written files are removed once it is exceeded.
+    """
+
+    def __init__(self, cache_dir, level, max_bytes=None):
+        self.root = os.path.join(cache_dir, level)
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(p) for p in self._all_files())
+        self._lock = threading.Lock()  # the server's threads share one cache
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".pkl")
+
+    def _all_files(self):
+        for root, _, files in os.walk(self.root):
+            for file in files:
+                if file.endswith(".pkl"):
+                    yield os.path.join(root, file)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, blob):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # a unique temporary file per write: threads and processes writing the same key never share one
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(blob)
+            with self._lock:
+                try:
+                    replaced = os.path.getsize(path)  # an existing entry is overwritten, not added
+                except FileNotFoundError:
+                    replaced = 0
+                os.replace(tmp_path, path)  # atomic, so concurrent readers never see a partial file
+                self.total_bytes += len(blob) - replaced
+                if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+                    self._evict()
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _evict(self):
+        files = sorted(self._all_files(), key=lambda p: os.path.getmtime(p))
+        self.total_bytes = sum(os.path.getsize(p) for p in files)
+        target = int(self.max_bytes * 0.9)
+        for path in files:
+            if self.total_bytes <= target:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self.total_bytes -= size
+            except FileNotFoundError:
+                pass
+
+
+class CacheLevel:
+    """One cache level (pages or lines): memory LRU in front of an optional disk tier, with hit counters."""
+
+    def __init__(self, name, max_entries, max_bytes=None, cache_dir=None, max_disk_bytes=None):
+        self.name = name
+        self.memory = LRUCache(max_entries, max_bytes)
+        self.disk = DiskCache(cache_dir, name, max_disk_bytes) if cache_dir else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            blob = self.memory.get(key)
+            if blob is not None:
+                self.memory_hits += 1
+                return pickle.loads(blob)
+        if self.disk is not None:
+            blob = self.disk.get(key)
+            if blob is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self.memory.put(key, blob)  # promote
+                return pickle.loads(blob)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        # Values are stored pickled: the size bound is exact and callers never share a mutable result.
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self.memory.put(key, blob)
+        if self.disk is not None:
+            self.disk.put(key, blob)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                'lookups': lookups,
+                'hits': hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'entries': len(self.memory),
+                'memory_bytes': self.memory.total_bytes,
+            }
+
+
+class OCRResultCache:
+    """
+    Two-level result cache in front of OCRPipeline.
+
+    Level 1 ('page') maps a page hash to the full page result, skipping every stage.
+    Level 2 ('line') maps a normalized line-crop hash to its (text, confidence), so
+    recognition only runs on crops that have not been seen before.
+    """
+
+    def __init__(self, max_pages=512, max_lines=100000, max_page_bytes=256 * 1024 * 1024,
+                 max_line_bytes=64 * 1024 * 1024, cache_dir=None, max_disk_bytes=None, page_hash='content'):
+        if page_hash not in ('content', 'perceptual'):
+            raise ValueError(f"Unknown page_hash mode: {page_hash}")
+        self.page_hash = page_hash
+        self.namespace = ""
+        self.pages = CacheLevel('page', max_pages, max_page_bytes, cache_dir, max_disk_bytes)
+        self.lines = CacheLevel('line', max_lines, max_line_bytes, cache_dir, max_disk_bytes)
+
+    def set_namespace(self, *model_ids):
+        """Scopes every key to the models in use, so a model upgrade never serves stale results."""
+        self.namespace = hashlib.blake2b("|".join(str(m) for m in model_ids).encode('utf-8'), digest_size=8).hexdigest()
+
+    def page_key(self, img, *variant):
+        """variant: call options that change the page result (OCRPipeline passes use_layout)."""
+        if self.page_hash == 'perceptual':
+            return f"{self.namespace}{''.join(str(v) for v in variant)}{img.shape[0]}x{img.shape[1]}{perceptual_hash(img)}"
+        return self.namespace + content_hash(img, *variant)
+
+    def line_key(self, crop):
+        return self.namespace + content_hash(normalize_line_crop(crop))
+
+    def get_page(self, key):
+        return self.pages.get(key)
+
+    def put_page(self, key, result):
+        self.pages.put(key, result)
+
+    def get_line(self, key):
+        return self.lines.get(key)
+
+    def put_line(self, key, rec_result):
+        self.lines.put(key, rec_result)
+
+    def stats(self):
+        return {'page': self.pages.stats(), 'line': self.lines.stats()}
+
+    def log_stats(self):
+        for level, s in self.stats().items():
+            logging.info(
+                f"Cache [{level}]: {s['hits']}/{s['lookups']} hits ({s['hit_rate']:.1%}; "
+                f"memory {s['memory_hits']}, disk {s['disk_hits']}), {s['entries']} entries, "
+                f"{s['memory_bytes'] / 1024 / 1024:.1f} MiB in memory"
+            )
@@ -0,0 +1,249 @@
+# inference/tiled_detection.py
+
+import os
+import sys
+import time
+import resource
+import argparse
+import logging
+
+import cv2
+import numpy as np
+
+__dir__ = os.path.dirname(os.path.abspath(__file__))
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+DET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+DET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def plan_tiles(height, width, tile_size=960, overlap=128):
+    """
+    Covers the page with tile_size x tile_size tiles overlapping by `overlap` pixels.
+    The last row/column is shifted back to end at the page edge, so every tile is full-size
+    whenever the page is at least one tile large. Returns a list of (y0, x0, y1, x1).
+    """
+    if overlap >= tile_size:
+        raise ValueError(f"overlap ({overlap}) must be smaller than tile_size ({tile_size})")
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        step = tile_size - overlap
+        return list(range(0, length - tile_size, step)) + [length - tile_size]
+
+    return [(y0, x0, min(y0 + tile_size, height), min(x0 + tile_size, width))
+            for y0 in starts(height) for x0 in starts(width)]
+
+
+def normalize_tile(tile, tile_h, tile_w):
+    """NormalizeImage + ToCHWImage for one tile, right/bottom-padded with white to the batch tile shape."""
+    h, w = tile.shape[:2]
+    if (h, w) != (tile_h, tile_w):
+        padded = np.full((tile_h, tile_w, 3), 255, dtype=np.uint8)
+        padded[:h, :w] = tile
+        tile = padded
+    norm = (tile.astype('float32') * np.float32(1. / 255.) - DET_MEAN) / DET_STD
+    return norm.transpose((2, 0, 1))
+
+
+def axis_aligned(boxes):
+    """[N, 4, 2] quads -> [N, 4] (x0, y0, x1, y1) bounds."""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape((-1, 4, 2))
+    return np.concatenate([boxes.min(axis=1), boxes.max(axis=1)], axis=1)
+
+
+def merge_seam_boxes(boxes, tile_ids, min_y_overlap=0.6):
+    """
+    Merges boxes found in different tiles that belong to the same text line.
+
+    Two boxes from different tiles are joined when they intersect horizontally and overlap
+    vertically by at least min_y_overlap of the shorter box: that covers both duplicates
+    (a line fully inside the overlap band, seen by both tiles) and halves of a line cut by
+    a seam. Boxes from the same tile are never merged, since DB already separated them.
+    Merged groups become the min-area rectangle of all their corners.
+    """
+    n = len(boxes)
+    if n == 0:
+        return np.zeros((0, 4, 2), dtype=np.float32)
+    rects = axis_aligned(boxes)
+    x0, y0, x1, y1 = rects.T
+    inter_x = np.minimum(x1[:, None], x1[None, :]) - np.maximum(x0[:, None], x0[None, :])
+    inter_y = np.minimum(y1[:, None], y1[None, :]) - np.maximum(y0[:, None], y0[None, :])
+    heights = y1 - y0
+    min_h = np.maximum(np.minimum(heights[:, None], heights[None, :]), 1e-6)
+    tile_ids = np.asarray(tile_ids)
+    joined = (inter_x > 0) & (inter_y / min_h >= min_y_overlap) & (tile_ids[:, None] != tile_ids[None, :])
+
+    # union-find over the join graph
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in zip(*np.nonzero(np.triu(joined, k=1))):
+        parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+
+    merged = []
+    for members in groups.values():
+        if len(members) == 1:
+            merged.append(np.asarray(boxes[members[0]], dtype=np.float32))
+            continue
+        points = np.concatenate([np.asarray(boxes[i], dtype=np.float32) for i in members])
+        merged.append(cv2.boxPoints(cv2.minAreaRect(points)).astype(np.float32))
+    return np.array(merged, dtype=np.float32)
+
+
+class TiledDetector:
+    """
+    Runs the DB text detector on overlapping full-resolution tiles instead of a downscaled page.
+
+    Tiles share one shape, so they are stacked and run through the det predictor in batches
+    of `batch_size`; each tile's map goes through the usual DB postprocess, boxes are shifted
+    back to page coordinates and those split or duplicated across seams are merged.
+    """
+
+    def __init__(self, run_model, det_postprocess, tile_size=960, overlap=128, batch_size=4):
+        self.run_model = run_model
+        self.det_postprocess = det_postprocess
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+
+    def __call__(self, img):
+        height, width = img.shape[:2]
+        tiles = plan_tiles(height, width, self.tile_size, self.overlap)
+        # batch tile shape: the tile size, or the page itself rounded up to 32 when it is smaller
+        tile_h = int(np.ceil(min(self.tile_size, height) / 32.0) * 32)
+        tile_w = int(np.ceil(min(self.tile_size, width) / 32.0) * 32)
+
+        boxes, tile_ids = [], []
+        for beg in range(0, len(tiles), self.batch_size):
+            batch_tiles = tiles[beg:beg + self.batch_size]
+            batch = np.stack([normalize_tile(img[y0:y1, x0:x1], tile_h, tile_w) for y0, x0, y1, x1 in batch_tiles])
+            maps = self.run_model(batch)
+            shape_list = [np.array([tile_h, tile_w, 1.0, 1.0])] * len(batch_tiles)
+            post_result = self.det_postprocess({'maps': maps}, shape_list)
+            for k, ((y0, x0, y1, x1), res) in enumerate(zip(batch_tiles, post_result)):
+                for box in res['points']:
+                    box = np.asarray(box, dtype=np.float32)
+                    # boxes in the white padding beyond the page edge are dropped
+                    if box[:, 0].min() >= x1 - x0 or box[:, 1].min() >= y1 - y0:
+                        continue
+                    boxes.append(box + np.float32([x0, y0]))
+                    tile_ids.append(beg + k)
+        return merge_seam_boxes(boxes, tile_ids)
+
+
+def load_hocr_line_boxes(hocr_file_path):
+    """Ground-truth line boxes (x0, y0, x1, y1) from a HOCR file, parsed like data_preprocess.py."""
+    sys.path.append(os.path.abspath(os.path.join(__dir__, '..')))
+    from bs4 import BeautifulSoup
+    from data_preprocess import BS_PARSER_TYPE, parse_bbox_from_title, extract_text_from_hocr_element
+
+    with open(hocr_file_path, 'r', encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), BS_PARSER_TYPE)
+    gt_boxes = []
+    for element in soup.find_all('span', class_=['ocr_line', 'ocr_header']):
+        bbox = parse_bbox_from_title(element.get('title', ''))
+        if bbox and bbox[0] < bbox[2] and bbox[1] < bbox[3] and extract_text_from_hocr_element(element):
+            gt_boxes.append(bbox)
+    return np.array(gt_boxes, dtype=np.float32).reshape((-1, 4))
+
+
+def line_recall(gt_rects, det_boxes, iou_thresh=0.5):
+    """Fraction of ground-truth line rectangles matched by a detected box with IoU >= iou_thresh."""
+    if len(gt_rects) == 0:
+        return 1.0
+    if len(det_boxes) == 0:
+        return 0.0
+    det = axis_aligned(det_boxes)
+    ix = np.clip(np.minimum(gt_rects[:, None, 2], det[None, :, 2]) - np.maximum(gt_rects[:, None, 0], det[None, :, 0]), 0, None)
+    iy = np.clip(np.minimum(gt_rects[:, None, 3], det[None, :, 3]) - np.maximum(gt_rects[:, None, 1], det[None, :, 1]), 0, None)
+    inter = ix * iy
+    area_gt = (gt_rects[:, 2] - gt_rects[:, 0]) * (gt_rects[:, 3] - gt_rects[:, 1])
+    area_det = (det[:, 2] - det[:, 0]) * (det[:, 3] - det[:, 1])
+    iou = inter / (area_gt[:, None] + area_det[None, :] - inter + 1e-6)
+    return float((iou.max(axis=1) >= iou_thresh).mean())
+
+
+def reset_peak_rss():
+    """Resets the kernel's peak-RSS counter (Linux); returns False where that is not supported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare tiled detection against single-shot detection on full page scans (latency, peak RSS, line recall).")
+    parser.add_argument("image_directory", help="Directory containing the page images.")
+    parser.add_argument("hocr_directory", help="Directory containing the matching HOCR files (ground-truth lines).")
+    parser.add_argument("--det_model_dir", required=True, help="Exported en_PP-OCRv3_det inference model directory.")
+    parser.add_argument("--limit_side_len", type=int, default=960, help="Single-shot det size limit (default: 960)")
+    parser.add_argument("--tile_size", type=int, default=960, help="Tile side in pixels (default: 960)")
+    parser.add_argument("--tile_overlap", type=int, default=128, help="Overlap between tiles (default: 128)")
+    parser.add_argument("--tile_batch_size", type=int, default=4, help="Tiles per det batch (default: 4)")
+    parser.add_argument("--limit", type=int, default=50, help="Number of pages to use (default: 50)")
+    parser.add_argument("--cpu_threads", type=int, default=10, help="CPU math library threads (default: 10)")
+    args = parser.parse_args()
+
+    from predictor import StagePredictor
+    from ocr_pipeline import OCRPipeline, det_resize_norm_img, filter_det_boxes, list_image_files
+
+    predictor = StagePredictor('det', args.det_model_dir, cpu_threads=args.cpu_threads)
+    det_postprocess = OCRPipeline._build_det_postprocess()
+    run_model = lambda batch: predictor.run(batch)[0]
+    tiled = TiledDetector(run_model, det_postprocess, args.tile_size, args.tile_overlap, args.tile_batch_size)
+
+    def single_shot(img):
+        norm_img, shape = det_resize_norm_img(img, args.limit_side_len)
+        post_result = det_postprocess({'maps': run_model(norm_img[np.newaxis, :].copy())}, [shape])
+        return post_result[0]['points']
+
+    pages = []
+    for image_path in list_image_files(args.image_directory)[:args.limit]:
+        base_name = os.path.splitext(os.path.basename(image_path))[0]
+        hocr_path = os.path.join(args.hocr_directory, base_name + ".hocr")
+        if not os.path.exists(hocr_path):
+            logging.warning(f"HOCR file not found for image {image_path}")
+            continue
+        pages.append((image_path, hocr_path))
+    if not pages:
+        logging.error("No image/HOCR pairs found.")
+        exit(1)
+
+    for name, detect in (("single-shot", single_shot), ("tiled", tiled)):
+        if not reset_peak_rss():
+            logging.warning("Peak RSS cannot be reset on this platform; the second figure includes the first run.")
+        latencies, recalls = [], []
+        for image_path, hocr_path in pages:
+            img = cv2.imread(image_path)
+            start = time.perf_counter()
+            boxes = filter_det_boxes(detect(img), img.shape)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(line_recall(load_hocr_line_boxes(hocr_path), boxes))
+        logging.info(f"{name}: {len(pages)} pages, mean latency {np.mean(latencies) * 1000:.0f} ms "
+                     f"(p95 {np.percentile(latencies, 95) * 1000:.0f} ms), peak RSS {peak_rss_mb():.0f} MiB, "
+                     f"line recall@0.5 {np.mean(recalls):.2%}")
@@ -0,0 +1,171 @@
+# inference/upload_ingest.py
+
+import time
+import argparse
+import logging
+import tracemalloc
+
+import cv2
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+
+def decode_upload(data):
+    """
+    Decodes an uploaded image straight from the request buffer (bytes, bytearray or memoryview).
+    np.frombuffer only wraps the buffer, so the encoded bytes are never copied; the decoded
+    BGR page is the one allocation, and it is kept because crops are later cut from it.
+    Returns None if the bytes are not a decodable image.
+    """
+    return cv2.imdecode(np.frombuffer(memoryview(data), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def build_norm_lut(mean, std):
+    """
+    Per-channel uint8 -> float32 lookup table with exactly NormalizeImage's numerics
+    ((x * 1/255 - mean) / std in float32). A uint8 channel has only 256 possible values, so
+    normalizing a page becomes a table lookup.
+    """
+    values = np.arange(256, dtype=np.uint8).astype('float32') * np.float32(1. / 255.)
+    return np.stack([(values - np.float32(m)) / np.float32(s) for m, s in zip(mean, std)]).astype(np.float32)
+
+
+class DetInputArena:
+    """
+    Builds the detector input for a page without per-request allocations.
+
+    The page is resized (DetResizeForTest, limit_type 'max', sides rounded to 32) into a reused
+    uint8 buffer, then each channel is normalized and written to its CHW plane of a reused
+    [1, 3, H, W] float32 buffer in a single np.take pass over the lookup table, so
+    NormalizeImage and ToCHWImage are fused and no intermediate float arrays exist.
+
+    Both buffers are sized for the largest input once and only grow if a larger shape shows up
+    (counted in `allocations`). The returned batch is a view into the arena and is only valid
+    until the next call, so callers must hold it under the same lock as the predictor (the
+    predictor copies it in copy_from_cpu).
+    """
+
+    def __init__(self, limit_side_len, mean, std):
+        self.limit_side_len = limit_side_len
+        self.lut = build_norm_lut(mean, std)
+        self.allocations = 0
+        self.calls = 0
+        side = int(np.ceil(limit_side_len / 32.0) * 32)
+        self._reserve(side * side)
+
+    def _reserve(self, pixels):
+        self._u8 = np.empty(pixels * 3, dtype=np.uint8)
+        self._f32 = np.empty(pixels * 3, dtype=np.float32)
+        self.allocations += 1
+
+    def __call__(self, img, limit_side_len=None):
+        """limit_side_len overrides the configured limit for this page (a smaller one reuses the same buffers)."""
+        limit_side_len = limit_side_len or self.limit_side_len
+        h, w = img.shape[:2]
+        ratio = float(limit_side_len) / max(h, w) if max(h, w) > limit_side_len else 1.0
+        resize_h = max(int(round(int(h * ratio) / 32) * 32), 32)
+        resize_w = max(int(round(int(w * ratio) / 32) * 32), 32)
+        pixels = resize_h * resize_w
+        if pixels * 3 > self._u8.size:
+            self._reserve(pixels)
+        self.calls += 1
+
+        resized = self._u8[:pixels * 3].reshape(resize_h, resize_w, 3)
+        cv2.resize(img, (resize_w, resize_h), dst=resized)
+        batch = self._f32[:pixels * 3].reshape(1, 3, resize_h, resize_w)
+        for c in range(3):
+            np.take(self.lut[c], resized[:, :, c], out=batch[0, c])
+        shape = np.array([h, w, resize_h / float(h), resize_w / float(w)])
+        return batch, shape
+
+
+def count_new_buffers(outputs, known):
+    """Number of stage outputs whose memory is neither a view of an earlier buffer nor of the arena."""
+    new = 0
+    for out in outputs:
+        if not any(np.shares_memory(out, buf) for buf in known):
+            new += 1
+        known.append(out)
+    return new
+
+
+def baseline_stages(data, limit_side_len, mean, std):
+    """The previous server path, step by step: imdecode, resize, astype, scale, mean, std, CHW, batch copy."""
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    h, w = img.shape[:2]
+    ratio = float(limit_side_len) / max(h, w) if max(h, w) > limit_side_len else 1.0
+    resize_h = max(int(round(int(h * ratio) / 32) * 32), 32)
+    resize_w = max(int(round(int(w * ratio) / 32) * 32), 32)
+    resized = cv2.resize(img, (resize_w, resize_h))
+    as_float = resized.astype('float32')
+    scaled = as_float * np.float32(1. / 255.)
+    centered = scaled - mean
+    norm = centered / std
+    chw = norm.transpose((2, 0, 1))
+    batch = chw[np.newaxis, :].copy()
+    return [img, resized, as_float, scaled, centered, norm, chw, batch]
+
+
+def arena_stages(data, arena):
+    img = decode_upload(data)
+    batch, _ = arena(img)
+    return [img, batch]
+
+
+def measure(fn, iterations):
+    """Mean latency (ms) and the peak of memory traced by tracemalloc (MiB) across iterations."""
+    fn()  # warm-up, so one-time arena allocation is not counted per request
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return elapsed / iterations * 1000, peak / 1024 / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the upload decode + detector-input path: previous per-step path vs. the reused arena.")
+    parser.add_argument("--image", default=None, help="Page image to encode and decode (a synthetic page is used if omitted).")
+    parser.add_argument("--encoding", choices=['.png', '.jpg'], default='.jpg', help="Upload encoding (default: .jpg)")
+    parser.add_argument("--limit_side_len", type=int, default=960, help="Det size limit (default: 960)")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed requests per path (default: 50)")
+    args = parser.parse_args()
+
+    from ocr_pipeline import DET_MEAN, DET_STD
+
+    if args.image:
+        page = cv2.imread(args.image)
+        if page is None:
+            logging.error(f"Cannot read image: {args.image}")
+            exit(1)
+    else:
+        rng = np.random.default_rng(0)
+        page = np.full((2200, 1700, 3), 255, dtype=np.uint8)
+        for y in range(100, 2100, 60):
+            page[y:y + 25, 150:150 + int(rng.integers(400, 1400))] = 30
+    ok, encoded = cv2.imencode(args.encoding, page)
+    data = encoded.tobytes()  # what the server holds after reading / base64-decoding the request
+
+    arena = DetInputArena(args.limit_side_len, DET_MEAN, DET_STD)
+    reference = baseline_stages(data, args.limit_side_len, DET_MEAN, DET_STD)[-1]
+    fused = arena_stages(data, arena)[-1]
+    if not np.array_equal(reference, fused):
+        logging.error(f"Arena output differs from the baseline (max abs diff {np.abs(reference - fused).max():.3g})")
+        exit(1)
+
+    results = {}
+    for name, stages in (("baseline", lambda: baseline_stages(data, args.limit_side_len, DET_MEAN, DET_STD)),
+                         ("arena", lambda: arena_stages(data, arena))):
+        known = [np.frombuffer(data, dtype=np.uint8), arena._u8, arena._f32]
+        new_buffers = count_new_buffers(stages(), known)
+        ms, peak_mib = measure(stages, args.iterations)
+        results[name] = ms
+        logging.info(f"{name}: {new_buffers} new image-sized buffers (= copies of pixel data) per request, "
+                     f"{ms:.2f} ms/request, peak traced memory {peak_mib:.1f} MiB")
+    logging.info(f"Arena grew {arena.allocations - 1} times after the initial reservation over {arena.calls} requests; "
+                 f"outputs are bit-identical; speed-up {results['baseline'] / results['arena']:.2f}x")
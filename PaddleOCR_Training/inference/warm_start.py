@@ -0,0 +1,195 @@
+# inference/warm_start.py
+
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+
+from predictor import find_model_files
+
+STAGES = ('layout', 'det', 'cls', 'rec', 'rec_fast')
+
+# Fixed warm-up shapes: one page at the det size limit, and every rec width bucket the
+# BucketedRecognizer can produce, so no request pays for a first-time shape.
+WARMUP_PAGE_SHAPE = (960, 736, 3)
+WARMUP_REC_WIDTHS = tuple(range(32, 321, 32))
+
+
+def preload_model_files(model_dirs):
+    """
+    Reads every stage's program and weights into memory once.
+
+    Meant to run in the server's master process before workers fork (gunicorn --preload):
+    the bytes objects are then shared copy-on-write by all workers, which build their
+    predictors from memory instead of each re-reading the files from disk. Only the file
+    contents are shared: each worker's predictors copy the weights into their own tensors,
+    so every worker still holds a full set of weights. One worker holds one copy.
+
+    Returns {stage: (prog_bytes, params_bytes)} for the stages that were given a directory.
+    """
+    buffers = {}
+    for stage, model_dir in model_dirs.items():
+        if not model_dir:
+            continue
+        start = time.perf_counter()
+        model_file, params_file = find_model_files(model_dir)
+        with open(model_file, 'rb') as f:
+            prog = f.read()
+        with open(params_file, 'rb') as f:
+            params = f.read()
+        buffers[stage] = (prog, params)
+        logging.info(f"Cold start [{stage}]: read {(len(prog) + len(params)) / 1024 / 1024:.1f} MiB "
+                     f"from {model_dir} in {time.perf_counter() - start:.2f}s")
+    return buffers
+
+
+class WarmStart:
+    """
+    Startup subsystem for the OCR server.
+
+    preload() runs once (in the master when the app is imported with --preload), importing
+    paddle/ppocr and reading the model files; workers inherit those modules and file bytes,
+    not the weights, which each worker's predictors materialize for themselves. build_and_warm() runs in every worker: it builds the
+    OCRPipeline from the preloaded buffers, runs warm-up inferences on fixed shapes for
+    each stage and only then marks the stage warmed. `ready` turns true once every
+    configured stage is warmed. Cold-start time per stage is logged and kept in status().
+    """
+
+    def __init__(self, pipeline_kwargs, metrics=None):
+        self.pipeline_kwargs = dict(pipeline_kwargs)
+        self.metrics = metrics
+        self.model_dirs = {
+            'layout': self.pipeline_kwargs.get('layout_model_dir'),
+            'det': self.pipeline_kwargs.get('det_model_dir'),
+            'cls': self.pipeline_kwargs.get('cls_model_dir'),
+            'rec': self.pipeline_kwargs.get('rec_model_dir'),
+            'rec_fast': self.pipeline_kwargs.get('rec_fast_model_dir'),
+        }
+        self.stages = [s for s in STAGES if self.model_dirs[s]]
+        self.model_buffers = None
+        self.pipeline = None
+        self.error = None
+        self._status = {s: {'loaded': False, 'warmed': False, 'load_seconds': None, 'warmup_seconds': None}
+                        for s in self.stages}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, metrics=None):
+        """Pipeline settings from OCR_* environment variables (the server is started by uvicorn/gunicorn)."""
+        kwargs = {
+            'det_model_dir': os.environ.get('OCR_DET_MODEL_DIR'),
+            'rec_model_dir': os.environ.get('OCR_REC_MODEL_DIR'),
+            'rec_char_dict_path': os.environ.get('OCR_REC_CHAR_DICT_PATH', '/home/jupyter/PaddleOCR_Training/ocr_output/custom_char_dict.txt'),
+            'cls_model_dir': os.environ.get('OCR_CLS_MODEL_DIR'),
+            'layout_model_dir': os.environ.get('OCR_LAYOUT_MODEL_DIR'),
+            'layout_dict_path': os.environ.get('OCR_LAYOUT_DICT_PATH'),
+            'use_gpu': os.environ.get('OCR_USE_GPU', '0') == '1',
+            'cpu_threads': int(os.environ.get('OCR_CPU_THREADS', '4')),
+            'enable_mkldnn': os.environ.get('OCR_ENABLE_MKLDNN', '0') == '1',
+            'rec_batch_num': int(os.environ.get('OCR_REC_BATCH_NUM', '6')),
+            'rec_fast_model_dir': os.environ.get('OCR_REC_FAST_MODEL_DIR'),
+            'rec_cascade_threshold': float(os.environ.get('OCR_REC_CASCADE_THRESHOLD', '0.9')),
+            'det_postprocess': os.environ.get('OCR_DET_POSTPROCESS', 'vectorized'),
+            'rec_lexicon_path': os.environ.get('OCR_REC_LEXICON'),
+            'rec_beam_width': int(os.environ.get('OCR_REC_BEAM_WIDTH', '8')),
+            'rec_lexicon_weight': float(os.environ.get('OCR_REC_LEXICON_WEIGHT', '2.0')),
+        }
+        return cls(kwargs, metrics)
+
+    @property
+    def ready(self):
+        with self._lock:
+            return self.pipeline is not None and all(s['warmed'] for s in self._status.values())
+
+    def status(self):
+        with self._lock:
+            return {'ready': self.pipeline is not None and all(s['warmed'] for s in self._status.values()),
+                    'error': self.error,
+                    'stages': {name: dict(s) for name, s in self._status.items()}}
+
+    def _update(self, stage, **fields):
+        with self._lock:
+            self._status[stage].update(fields)
+
+    def preload(self):
+        """Master-side: import the runtime and read model files once. No-op after the first call."""
+        if self.model_buffers is None:
+            start = time.perf_counter()
+            # Importing paddle/ppocr here means forked workers inherit the loaded modules.
+            import paddle.inference  # noqa: F401
+            import paddleocr  # noqa: F401
+            from ppocr.postprocess.db_postprocess import DBPostProcess  # noqa: F401
+            logging.info(f"Cold start [imports]: paddle and ppocr imported in {time.perf_counter() - start:.2f}s")
+            self.model_buffers = preload_model_files({s: self.model_dirs[s] for s in ('det', 'cls', 'rec', 'rec_fast')})
+            if self.model_dirs['layout']:
+                # The layout predictor is built by PaddleOCR from paths; reading its files here
+                # still pulls them into the shared page cache before the workers start.
+                preload_model_files({'layout': self.model_dirs['layout']})
+
+    def build_and_warm(self):
+        """Worker-side: build the pipeline from the preloaded buffers, then warm every stage."""
+        try:
+            self.preload()
+            from ocr_pipeline import OCRPipeline
+
+            start = time.perf_counter()
+            pipeline = OCRPipeline(model_buffers=self.model_buffers, **self.pipeline_kwargs)
+            for stage in self.stages:
+                load_seconds = pipeline.load_seconds.get(stage, 0.0)
+                self._update(stage, loaded=True, load_seconds=round(load_seconds, 3))
+                logging.info(f"Cold start [{stage}]: predictor built in {load_seconds:.2f}s")
+            logging.info(f"Cold start: pipeline constructed in {time.perf_counter() - start:.2f}s")
+
+            self._warm(pipeline)
+            if self.metrics is not None:
+                # attached after warm-up, so warm-up runs do not show up in the latency histograms
+                pipeline.set_metrics(self.metrics)
+                self.metrics.attach(pipeline=pipeline)
+            with self._lock:
+                self.pipeline = pipeline
+            logging.info("Cold start: all stages warmed, worker is ready.")
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+            logging.error(f"Warm start failed: {e}", exc_info=True)
+
+    def start_background(self):
+        """Runs build_and_warm() on a thread so health checks answer while the worker warms up."""
+        thread = threading.Thread(target=self.build_and_warm, name="ocr-warm-start", daemon=True)
+        thread.start()
+        return thread
+
+    def _timed(self, stage, fn):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        self._update(stage, warmed=True, warmup_seconds=round(elapsed, 3))
+        logging.info(f"Cold start [{stage}]: warm-up took {elapsed:.2f}s")
+
+    def _warm(self, pipeline):
+        page = np.full(WARMUP_PAGE_SHAPE, 255, dtype=np.uint8)
+        line = np.full((48, 320, 3), 255, dtype=np.uint8)
+        if 'layout' in self.stages:
+            self._timed('layout', lambda: pipeline.run_layout(page))
+        self._timed('det', lambda: pipeline.detect(page))
+        if 'cls' in self.stages:
+            self._timed('cls', lambda: pipeline.classify([line] * pipeline.cls_batch_num))
+
+        def warm_rec():
+            recognizer = pipeline.bucketed_recognizer
+            widths = (recognizer.fixed_width,) if recognizer.fixed_width else WARMUP_REC_WIDTHS
+            if pipeline.rec_batching == 'fixed':
+                widths = (320,)
+            for width in widths:
+                pipeline.recognize_full([np.full((48, width, 3), 255, dtype=np.uint8)] * pipeline.rec_batch_num)
+        self._timed('rec', warm_rec)
+
+        def warm_rec_fast():
+            # the cascade's first model, always run bucketed
+            recognizer = pipeline.cascade.fast_recognize
+            for width in ((recognizer.fixed_width,) if recognizer.fixed_width else WARMUP_REC_WIDTHS):
+                recognizer([np.full((48, width, 3), 255, dtype=np.uint8)] * pipeline.rec_batch_num)
+        if 'rec_fast' in self.stages:
+            self._timed('rec_fast', warm_rec_fast)
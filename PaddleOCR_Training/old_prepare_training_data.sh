@@ -24,49 +24,27 @@ CHAR_DICT_FILE="${OCR_OUTPUT_DIR}/custom_char_dict.txt"
 
 # --- Script Execution ---
 
-echo "--- Running Data Preprocessing (HOCR to Line Labels CSV) ---"
-# Call data_preprocess.py with the required arguments
-python "${SCRIPTS_DIR}/../data_preprocess.py" \
-    "$IMAGE_DIR" \
-    "$HOCR_DIR" \
-    "$LINE_LABELS_CSV"
-# Note: Assuming data_preprocess.py is one level up from SCRIPTS_DIR, in the main PaddleOCR_Training dir.
-# If data_preprocess.py is in SCRIPTS_DIR, change the path to:
-# python3 "${SCRIPTS_DIR}/data_preprocess.py" ...
-
-if [ ! -f "$LINE_LABELS_CSV" ]; then
-    echo "Error: data_preprocess.py did not create $LINE_LABELS_CSV. Exiting."
-    exit 1
-fi
-echo "data_preprocess.py completed. Output CSV: $LINE_LABELS_CSV"
-echo ""
-
-echo "--- Calculating Maximum Text Length ---"
-# get_max_length.py captures its output to a variable
-MAX_TEXT_LENGTH=$(python3 "${SCRIPTS_DIR}/get_max_length.py" "$LINE_LABELS_CSV")
+echo "--- Preprocessing, Calculating Maximum Text Length, Generating Character Dictionary and Converting Labels ---"
+# One ocrprep chain (one interpreter start, pandas etc. imported once); it stops at the first
+# step that fails. Only max-length prints to stdout, so its number is the last line captured.
+OCRPREP_OUTPUT=$(python "${SCRIPTS_DIR}/ocrprep.py" \
+    preprocess "$IMAGE_DIR" "$HOCR_DIR" "$LINE_LABELS_CSV" \
+    + max-length "$LINE_LABELS_CSV" \
+    + char-dict "$LINE_LABELS_CSV" "$CHAR_DICT_FILE" \
+    + convert "$LINE_LABELS_CSV" "$OCR_OUTPUT_DIR" --char_dict "$CHAR_DICT_FILE")
+MAX_TEXT_LENGTH=$(echo "$OCRPREP_OUTPUT" | tail -n 1)
 if [ -z "$MAX_TEXT_LENGTH" ] || [ "$MAX_TEXT_LENGTH" -lt "0" ]; then
     echo "Error: Failed to get max text length or invalid value received: '$MAX_TEXT_LENGTH'. Exiting."
     exit 1
 fi
-echo "Maximum text length found: $MAX_TEXT_LENGTH"
-echo ""
-
-echo "--- Generating Character Dictionary ---"
-python "${SCRIPTS_DIR}/generate_char_dict.py" "$LINE_LABELS_CSV" "$CHAR_DICT_FILE"
 if [ ! -f "$CHAR_DICT_FILE" ]; then
-    echo "Error: generate_char_dict.py did not create $CHAR_DICT_FILE. Exiting."
+    echo "Error: the char-dict step did not create $CHAR_DICT_FILE. Exiting."
     exit 1
 fi
+echo "Maximum text length found: $MAX_TEXT_LENGTH"
 echo "Character dictionary created: $CHAR_DICT_FILE"
 echo ""
 
-echo "--- Converting CSV to PaddleOCR Label Format ---"
-python "${SCRIPTS_DIR}/convert_csv_to_paddle_labels.py" \
-    "$LINE_LABELS_CSV" \
-    "$OCR_OUTPUT_DIR" \
-    --char_dict "$CHAR_DICT_FILE"
-echo ""
-
 echo "--- Data Preparation for PaddleOCR Training Complete ---"
 echo "Outputs are in: $OCR_OUTPUT_DIR"
 echo "Key files created:"
@@ -5,6 +5,9 @@
 # Uses a predefined character dictionary and max_text_length.
 # Current User: lolkabash
 # Current Date: 2025-05-25
+#
+# scripts/run_pipeline.py runs these steps and run_finetuning_pipeline.sh's as cached stages,
+# skipping any whose inputs have not changed since the last run.
 
 # Exit on any error
 set -e
@@ -22,6 +25,10 @@ SCRIPTS_DIR="/home/jupyter/PaddleOCR_Training/scripts" # Where your Python helpe
 # Path to the CSV file generated by data_preprocess.py
 LINE_LABELS_CSV="${OCR_OUTPUT_DIR}/line_labels.csv"
 
+# Near-duplicate dedup (same text, near-identical crop); set MAX_PER_DUP_GROUP=0 to skip
+DEDUP_LABELS_CSV="${OCR_OUTPUT_DIR}/line_labels_dedup.csv"
+MAX_PER_DUP_GROUP=${MAX_PER_DUP_GROUP:-3}
+
 # Path to your predefined character dictionary (source)
 # IMPORTANT: Place your char.txt (with 96 characters) at this location
 PREDEFINED_CHAR_DICT_SOURCE_PATH="${SCRIPTS_DIR}/char.txt"
@@ -34,29 +41,13 @@ MAX_TEXT_LENGTH=128
 
 # --- Script Execution ---
 
-echo "--- Running Data Preprocessing (HOCR to Line Labels CSV) ---"
-# Call data_preprocess.py with the required arguments
-python "${SCRIPTS_DIR}/../data_preprocess.py" \
-    "$IMAGE_DIR" \
-    "$HOCR_DIR" \
-    "$LINE_LABELS_CSV"
-# Note: Assuming data_preprocess.py is one level up from SCRIPTS_DIR, in the main PaddleOCR_Training dir.
-# If data_preprocess.py is in SCRIPTS_DIR, change the path to:
-# python3 "${SCRIPTS_DIR}/data_preprocess.py" ...
-
-if [ ! -f "$LINE_LABELS_CSV" ]; then
-    echo "Error: data_preprocess.py did not create $LINE_LABELS_CSV. Exiting."
-    exit 1
-fi
-echo "data_preprocess.py completed. Output CSV: $LINE_LABELS_CSV"
-echo ""
-
 echo "--- Using Predefined Character Dictionary ---"
 if [ ! -f "$PREDEFINED_CHAR_DICT_SOURCE_PATH" ]; then
     echo "Error: Predefined character dictionary not found at $PREDEFINED_CHAR_DICT_SOURCE_PATH."
     echo "Please place your char.txt file there."
     exit 1
 fi
+mkdir -p "$OCR_OUTPUT_DIR"
 cp "$PREDEFINED_CHAR_DICT_SOURCE_PATH" "$CHAR_DICT_FILE"
 if [ ! -f "$CHAR_DICT_FILE" ]; then
     echo "Error: Failed to copy predefined character dictionary to $CHAR_DICT_FILE. Exiting."
@@ -70,12 +61,28 @@ echo "--- Using Predefined Maximum Text Length ---"
 echo "Maximum text length set to: $MAX_TEXT_LENGTH"
 echo ""
 
-echo "--- Converting CSV to PaddleOCR Label Format ---"
-python "${SCRIPTS_DIR}/convert_csv_to_paddle_labels.py" \
-    "$LINE_LABELS_CSV" \
-    "$OCR_OUTPUT_DIR" \
-    --char_dict "$CHAR_DICT_FILE" \
-    --max_text_length "$MAX_TEXT_LENGTH" # Pass max_text_length if your script supports it
+# Preprocessing (HOCR to line labels CSV), near-duplicate removal and the conversion to PaddleOCR
+# label format run as one ocrprep chain: one interpreter start, and pandas etc. imported once.
+# The chain stops at the first step that fails.
+OCRPREP_CHAIN=(preprocess "$IMAGE_DIR" "$HOCR_DIR" "$LINE_LABELS_CSV")
+if [ "$MAX_PER_DUP_GROUP" -gt 0 ]; then
+    OCRPREP_CHAIN+=(+ dedup "$LINE_LABELS_CSV" "$DEDUP_LABELS_CSV" --max_per_group "$MAX_PER_DUP_GROUP")
+    LABELS_CSV_FOR_SPLIT="$DEDUP_LABELS_CSV"
+else
+    echo "Dedup disabled (MAX_PER_DUP_GROUP=0)."
+    LABELS_CSV_FOR_SPLIT="$LINE_LABELS_CSV"
+fi
+OCRPREP_CHAIN+=(+ convert "$LABELS_CSV_FOR_SPLIT" "$OCR_OUTPUT_DIR"
+                --char_dict "$CHAR_DICT_FILE" --max_text_length "$MAX_TEXT_LENGTH")
+
+echo "--- Preprocessing, Removing Near-Duplicate Lines and Converting to PaddleOCR Label Format ---"
+python "${SCRIPTS_DIR}/ocrprep.py" "${OCRPREP_CHAIN[@]}"
+
+if [ ! -f "$LINE_LABELS_CSV" ]; then
+    echo "Error: preprocessing did not create $LINE_LABELS_CSV. Exiting."
+    exit 1
+fi
+echo "Line labels CSV: $LINE_LABELS_CSV"
 echo ""
 
 echo "--- Data Preparation for PaddleOCR Training Complete ---"
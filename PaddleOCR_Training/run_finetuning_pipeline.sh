@@ -1,6 +1,9 @@
 #!/bin/bash
 set -e 
 
+# For an unattended run that skips unchanged stages (no prompt, config paths read with a YAML
+# parser), use: python scripts/run_pipeline.py --config "$PADDLE_OCR_CONFIG_FILE"
+
 # --- Configuration - ADJUST THESE PATHS IF DIFFERENT FROM DEFAULTS ---
 # Directory where your pre-processed data (custom_char_dict.txt, rec_gt_train.txt, rec_gt_eval.txt, line_images/) is stored
 export PROCESSED_DATA_DIR="/home/jupyter/PaddleOCR_Training/ocr_output"
@@ -20,6 +23,11 @@ export PADDLE_OCR_CONFIG_FILE="${PADDLE_OCR_REPO_PATH}/configs/rec/my_config_rec
 # This variable is mainly for user reference here.
 export PRETRAINED_MODEL_PARENT_DIR="/home/jupyter/PaddleOCR_Training/pretrained_models" 
 
+# Set FAST_EVAL=1 to train through scripts/train_fast_eval.py: the eval set is preprocessed once
+# into a tensor cache (Eval.tensor_cache in the YAML) instead of being re-decoded at every eval step.
+FAST_EVAL="${FAST_EVAL:-0}"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
 echo "--- Script Configuration ---"
 echo "Processed Data Directory: ${PROCESSED_DATA_DIR}"
 echo "Character Dictionary: ${CHAR_DICT_FILE_PATH}"
@@ -63,7 +71,11 @@ cd "$PADDLE_OCR_REPO_PATH"
 echo "Starting training..."
 # Ensure you are in the PaddleOCR virtual environment (e.g., ocr_env)
 # The training command assumes your YAML is correctly configured.
-python tools/train.py -c "$PADDLE_OCR_CONFIG_FILE"
+if [ "$FAST_EVAL" = "1" ]; then
+    python "${SCRIPT_DIR}/scripts/train_fast_eval.py" --paddleocr_dir "$PADDLE_OCR_REPO_PATH" -c "$PADDLE_OCR_CONFIG_FILE"
+else
+    python tools/train.py -c "$PADDLE_OCR_CONFIG_FILE"
+fi
 
 # Note: The actual save_model_dir is read from the YAML during the export step.
 # This is just an informational message.
@@ -1,9 +1,11 @@
 import pandas as pd
 import argparse
 import os
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, GroupShuffleSplit
 import logging
 
+from label_index import label_index_paths, write_label_index
+
 # Modified by Copilot for lolkabash
 # Current User: lolkabash
 # Current Date (UTC): 2025-05-25 00:34:45 (as per user context)
@@ -15,7 +17,7 @@ def convert_labels(csv_file_path, output_dir, train_ratio=0.9, char_dict_path=No
 
     try:
         try:
-            df = pd.read_csv(csv_file_path, usecols=['image_path', 'text'])
+            df = pd.read_csv(csv_file_path, usecols=lambda c: c in ('image_path', 'text', 'dup_group'))
         except ValueError:
             df = pd.read_csv(csv_file_path)
             if 'image_path' not in df.columns or 'text' not in df.columns:
@@ -122,7 +124,14 @@ def convert_labels(csv_file_path, output_dir, train_ratio=0.9, char_dict_path=No
             logging.error("Error: No data to process for splitting into train/eval sets after all filtering.")
             return False
 
-        train_df, eval_df = train_test_split(df, train_size=train_ratio, random_state=42, shuffle=True)
+        if 'dup_group' in df.columns:
+            # CSV from scripts/dedup_lines.py: near-duplicates of a line must not end up on both sides
+            splitter = GroupShuffleSplit(n_splits=1, train_size=train_ratio, random_state=42)
+            train_idx, eval_idx = next(splitter.split(df, groups=df['dup_group']))
+            train_df, eval_df = df.iloc[train_idx], df.iloc[eval_idx]
+            logging.info(f"Split by dup_group: {df['dup_group'].nunique()} groups, none shared between train and eval.")
+        else:
+            train_df, eval_df = train_test_split(df, train_size=train_ratio, random_state=42, shuffle=True)
         
         os.makedirs(output_dir, exist_ok=True)
         train_label_path = os.path.join(output_dir, "rec_gt_train.txt")
@@ -139,6 +148,10 @@ def convert_labels(csv_file_path, output_dir, train_ratio=0.9, char_dict_path=No
         logging.info(f"PaddleOCR training labels created:")
         logging.info(f"  Train: {train_label_path} ({len(train_df)} lines)")
         logging.info(f"  Eval: {eval_label_path} ({len(eval_df)} lines)")
+
+        # memory-mapped copy of the train labels, shared by all loader workers (scripts/label_index.py)
+        write_label_index(train_label_path)
+        logging.info(f"  Train label index: {', '.join(label_index_paths(train_label_path))}")
         return True
 
     except FileNotFoundError:
@@ -0,0 +1,200 @@
+# scripts/dedup_lines.py
+#
+# Near-duplicate line removal between data_preprocess.py and convert_csv_to_paddle_labels.py.
+# Lines are grouped when their text is identical and their crops have nearly the same
+# perceptual hash; each group keeps at most --max_per_group crops, and the group id is written
+# to a `dup_group` column that the converter uses to keep every group on one side of the
+# train/eval split.
+
+import argparse
+import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from PIL import Image, UnidentifiedImageError
+from tqdm import tqdm
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+HASH_SIZE = 8  # dHash of 8x8 = 64 bits
+
+
+def dhash(image_path, hash_size=HASH_SIZE):
+    """
+    Difference hash of a crop: grayscale, resized to (hash_size + 1) x hash_size, one bit per
+    horizontally adjacent pixel pair. Robust to re-encoding, slight crop jitter and contrast
+    changes; returned as a Python int (None if the image cannot be read).
+    """
+    try:
+        with Image.open(image_path) as img:
+            small = img.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return None
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def _hash_chunk(paths):
+    return [dhash(p) for p in paths]
+
+
+def compute_hashes(image_paths, num_workers=None, chunk_size=256):
+    chunks = [image_paths[i:i + chunk_size] for i in range(0, len(image_paths), chunk_size)]
+    hashes = []
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for result in tqdm(executor.map(_hash_chunk, chunks), total=len(chunks), desc="Hashing line crops"):
+            hashes.extend(result)
+    return hashes
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def group_near_duplicates(texts, hashes, max_distance=6, hash_bits=HASH_SIZE * HASH_SIZE):
+    """
+    Group ids for lines with identical text whose hashes differ in at most max_distance bits
+    (transitively: near-duplicates of near-duplicates share a group).
+
+    Lines with the same text and the same hash are collapsed into one node first. Then LSH by
+    band splitting: the hash is cut into max_distance + 1 bands, and two hashes within
+    max_distance bits must agree exactly on at least one band (pigeonhole). So candidates come
+    from a dict keyed on (text, band, band value). Within a bucket, a line is compared with the
+    groups seen so far rather than with every earlier line: against each group's first hash,
+    and only if that is close enough for some member to be in reach (the group's radius around
+    that hash bounds it), against the group's other hashes. Lines without a hash are grouped by
+    text alone; lines whose text is None (missing) are never grouped.
+    """
+    n = len(texts)
+    uf = UnionFind(n)
+    bands = max_distance + 1
+    band_width = -(-hash_bits // bands)
+    index = defaultdict(list)
+    first = {}  # (text, hash) -> first line with it; hash None groups by text alone
+    for i, (text, h) in enumerate(zip(texts, hashes)):
+        if text is None:
+            continue
+        if (text, h) in first:
+            uf.union(first[(text, h)], i)
+            continue
+        first[(text, h)] = i
+        if h is None:
+            continue
+        for band in range(bands):
+            index[(text, band, (h >> (band * band_width)) & ((1 << band_width) - 1))].append(i)
+
+    def distance(a, b):
+        return bin(a ^ b).count('1')
+
+    compared = 0
+    for members in index.values():
+        if len(members) < 2:
+            continue
+        groups = []  # per group in this bucket: [first line, its hash, radius around it, member hashes]
+        for i in members:
+            h = hashes[i]
+            joined = []
+            for group in groups:
+                if uf.find(group[0]) != uf.find(i):
+                    compared += 1
+                    to_first = distance(h, group[1])
+                    if to_first - group[2] > max_distance:
+                        continue  # no member of the group can be in reach
+                    if to_first > max_distance:
+                        compared += len(group[3]) - 1
+                        if all(distance(h, other) > max_distance for other in group[3][1:]):
+                            continue
+                    uf.union(i, group[0])
+                joined.append(group)
+            if not joined:
+                groups.append([i, h, 0, [h]])
+                continue
+            group = joined[0]
+            added = [h] + [other for merged in joined[1:] for other in merged[3]]
+            group[3].extend(added)
+            group[2] = max(group[2], max(distance(group[1], other) for other in added))
+            groups = [g for g in groups if not any(g is merged for merged in joined[1:])]
+    logging.info(f"Compared {compared} candidate hash pairs from the band index.")
+    return np.array([uf.find(i) for i in range(n)])
+
+
+def cap_groups(groups, max_per_group):
+    """Boolean keep-mask: the first max_per_group lines (in input order) of every group."""
+    seen = defaultdict(int)
+    keep = np.zeros(len(groups), dtype=bool)
+    for i, g in enumerate(groups):
+        seen[g] += 1
+        keep[i] = seen[g] <= max_per_group
+    return keep
+
+
+def dedup_line_labels(input_csv, output_csv, max_per_group=3, max_distance=6, num_workers=None,
+                      samples_per_sec=None, epochs=100):
+    # keep_default_na=False: a line reading "NA" or "nan" stays text, and a missing text is ''
+    # rather than NaN, which astype(str) would turn into one big "nan" group
+    df = pd.read_csv(input_csv, keep_default_na=False)
+    df['text'] = df['text'].astype(str)
+    df['image_path'] = df['image_path'].astype(str)
+    logging.info(f"Loaded {len(df)} lines from {input_csv}")
+
+    hashes = compute_hashes(df['image_path'].tolist(), num_workers)
+    unreadable = sum(h is None for h in hashes)
+    if unreadable:
+        logging.warning(f"{unreadable} crops could not be read; they are grouped by text only.")
+    missing = int((df['text'].str.strip() == '').sum())
+    if missing:
+        logging.warning(f"{missing} lines have no text; each is left in a group of its own.")
+    texts = [text if text.strip() else None for text in df['text']]
+    groups = group_near_duplicates(texts, hashes, max_distance)
+    keep = cap_groups(groups, max_per_group)
+
+    df['dup_group'] = groups
+    out = df[keep]
+    out.to_csv(output_csv, index=False, encoding='utf-8')
+
+    sizes = pd.Series(groups).value_counts()
+    dropped = len(df) - len(out)
+    logging.info(f"{len(sizes)} groups, {int((sizes > 1).sum())} with near-duplicates (largest: {int(sizes.max())} lines).")
+    logging.info(f"Kept {len(out)} of {len(df)} lines (at most {max_per_group} per group); {dropped} dropped "
+                 f"({dropped / max(1, len(df)):.1%}).")
+    top = df.loc[~df.duplicated('dup_group')].set_index('dup_group')['text']
+    for group, size in sizes.head(5).items():
+        logging.info(f"  {size:6d} x {top[group][:70]!r}")
+    if samples_per_sec:
+        # the converter trains on roughly train_ratio of what is kept; report on the whole set
+        per_epoch = dropped / samples_per_sec
+        logging.info(f"Saved {dropped} samples and {per_epoch:.0f} s per epoch at {samples_per_sec} samples/s "
+                     f"({per_epoch * epochs / 3600:.1f} h over {epochs} epochs).")
+    logging.info(f"Deduplicated labels written to {output_csv}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Group near-duplicate line crops (same text, similar image) and cap each group before the train/eval split.")
+    parser.add_argument("input_csv", help="line_labels.csv from data_preprocess.py")
+    parser.add_argument("output_csv", help="Deduplicated CSV with a dup_group column, for convert_csv_to_paddle_labels.py")
+    parser.add_argument("--max_per_group", type=int, default=3, help="Lines kept per near-duplicate group (default: 3)")
+    parser.add_argument("--max_distance", type=int, default=6, help="Max differing dHash bits (of 64) for two crops to count as the same (default: 6)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to CPU count if None.")
+    parser.add_argument("--samples_per_sec", type=float, default=None, help="Training throughput (the 'ips' PaddleOCR logs), to report epoch-seconds saved.")
+    parser.add_argument("--epochs", type=int, default=100, help="Epochs to total the saving over (default: 100, epoch_num in the config)")
+    args = parser.parse_args()
+
+    if not dedup_line_labels(args.input_csv, args.output_csv, args.max_per_group, args.max_distance, args.workers,
+                             args.samples_per_sec, args.epochs):
+        exit(1)
@@ -0,0 +1,262 @@
+# scripts/distill_rec.py
+#
+# Distills the fine-tuned recognizer into smaller students for CPU serving: for every student in
+# the Distill section of the config, trains it against the frozen teacher's CTC outputs with
+# PaddleOCR's DistillationModel, exports it with the same custom_char_dict.txt, and benchmarks
+# teacher and students on the eval set into one latency-vs-accuracy table.
+#   python scripts/distill_rec.py --config config/rec/my_config_rec_ppocrv4_distill.yml
+#   python scripts/distill_rec.py --cpu_test --students scale035    # CPU, small subset, 1 epoch
+#   python scripts/distill_rec.py --skip_train                      # re-export and re-benchmark only
+
+import os
+import sys
+import copy
+import json
+import shutil
+import argparse
+import logging
+import datetime
+import subprocess
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inference'))
+from ctc_decoder import BatchCTCDecoder, load_char_dict  # noqa: E402
+from predictor import create_stage_predictor, find_model_files  # noqa: E402
+from rec_batching import load_crops  # noqa: E402
+from rec_benchmark import benchmark_run, get_rec_metric, make_recognizer, model_fingerprint  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+
+def set_resize_width(config, width):
+    """Sets the SVTRRecResizeImg width of the Train and Eval transforms (export reads Eval's)."""
+    for mode in ('Train', 'Eval'):
+        for op in config[mode]['dataset']['transforms']:
+            if 'SVTRRecResizeImg' in op:
+                op['SVTRRecResizeImg']['image_shape'][2] = width
+
+
+def student_config(base_config, student, work_dir):
+    """
+    The PaddleOCR config of one student run: the Student backbone at student['scale'], the
+    input at student['image_width'] if given, checkpoints and export under work_dir/<name>.
+    A student with the teacher's backbone scale starts from the teacher's weights.
+    """
+    config = copy.deepcopy(base_config)
+    config.pop('Distill', None)
+    models = config['Architecture']['Models']
+    teacher, student_arch = models['Teacher'], models['Student']
+    student_arch['Backbone']['scale'] = student['scale']
+    if student['scale'] == teacher['Backbone']['scale'] and not student_arch.get('pretrained'):
+        student_arch['pretrained'] = teacher['pretrained']
+    if student.get('image_width'):
+        set_resize_width(config, student['image_width'])
+    out_dir = os.path.join(work_dir, student['name'])
+    # tools/train.py runs from the PaddleOCR repo, so every path is made absolute
+    config['Global']['save_model_dir'] = os.path.join(out_dir, 'train')
+    config['Global']['save_inference_dir'] = os.path.join(out_dir, 'export')
+    return config
+
+
+def write_subset(label_file, out_file, lines):
+    with open(label_file, 'r', encoding='utf-8') as src, open(out_file, 'w', encoding='utf-8') as dst:
+        for i, line in enumerate(src):
+            if i >= lines:
+                break
+            dst.write(line)
+    return out_file
+
+
+def apply_cpu_test(config, subset_dir, train_lines, epochs):
+    """
+    Small-subset CPU mode, to check the whole run end to end on a machine without a GPU: the
+    first train_lines train lines (and a quarter as many eval lines), tiny batches, no loader
+    workers, and an evaluation (which saves best_accuracy) twice per epoch.
+    """
+    os.makedirs(subset_dir, exist_ok=True)
+    batch_size = 8
+    for mode, lines in (('Train', train_lines), ('Eval', max(batch_size, train_lines // 4))):
+        dataset = config[mode]['dataset']
+        dataset['label_file_list'] = [write_subset(label_file, os.path.join(subset_dir, f"{mode.lower()}_{i}.txt"), lines)
+                                      for i, label_file in enumerate(dataset['label_file_list'])]
+        dataset['ratio_list'] = [1.0] * len(dataset['label_file_list'])
+        config[mode]['loader'].update({'batch_size_per_card': batch_size, 'num_workers': 0})
+    steps_per_epoch = max(1, train_lines // batch_size)
+    config['Global'].update({'use_gpu': False, 'epoch_num': epochs, 'print_batch_step': 1, 'save_epoch_step': 1,
+                             'eval_batch_step': [0, max(1, steps_per_epoch // 2)]})
+    return config
+
+
+def run_logged(command, log_path, cwd):
+    """Runs a PaddleOCR tool with its output in log_path; True on success."""
+    logging.info(f"Running {' '.join(command[1:3])} (log: {log_path})")
+    with open(log_path, 'w', encoding='utf-8') as log:
+        result = subprocess.run(command, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        logging.error(f"{os.path.basename(command[1])} exited with {result.returncode}, see {log_path}")
+    return result.returncode == 0
+
+
+def train_student(config_path, paddleocr_dir, out_dir):
+    return run_logged([sys.executable, 'tools/train.py', '-c', config_path], os.path.join(out_dir, 'train.log'), paddleocr_dir)
+
+
+def export_student(config_path, config, paddleocr_dir, out_dir):
+    """
+    Exports the best checkpoint (the latest one if no evaluation saved a best yet). Distillation
+    models are exported per sub-model; the student lands in <save_inference_dir>/Student, and
+    the dictionary it was trained with is copied next to it. Returns the student model dir.
+    """
+    save_model_dir = config['Global']['save_model_dir']
+    checkpoint = os.path.join(save_model_dir, 'best_accuracy')
+    if not os.path.exists(checkpoint + '.pdparams'):
+        checkpoint = os.path.join(save_model_dir, 'latest')
+    if not os.path.exists(checkpoint + '.pdparams'):
+        logging.error(f"No checkpoint in {save_model_dir}")
+        return None
+    export_dir = config['Global']['save_inference_dir']
+    if not run_logged([sys.executable, 'tools/export_model.py', '-c', config_path,
+                       '-o', f"Global.pretrained_model={checkpoint}", f"Global.save_inference_dir={export_dir}"],
+                      os.path.join(out_dir, 'export.log'), paddleocr_dir):
+        return None
+    model_dir = os.path.join(export_dir, 'Student')
+    shutil.copyfile(config['Global']['character_dict_path'], os.path.join(model_dir, 'custom_char_dict.txt'))
+    return model_dir
+
+
+def check_num_classes(model_dir, num_classes, image_shape):
+    """The exported model must output one score per dictionary entry plus the blank, as the teacher does."""
+    predictor = create_stage_predictor('rec', model_dir, 'cpu', 1)
+    width = predictor.fixed_input_width() or image_shape[2]
+    out = predictor.run(np.zeros((1, image_shape[0], image_shape[1], width), dtype=np.float32))[0]
+    return out.shape[-1] == num_classes
+
+
+def params_mib(model_dir):
+    return os.path.getsize(find_model_files(model_dir)[1]) / 1024 / 1024
+
+
+def format_table(rows):
+    """Markdown table of the benchmark rows, teacher first, with speed and accuracy relative to it."""
+    teacher = rows[0] if rows and rows[0]['name'] == 'teacher' else None
+    lines = ["| model | scale | input width | params MiB | p50 ms/line | lines/s | acc | acc vs teacher | speed vs teacher |",
+             "|---|---|---|---|---|---|---|---|---|"]
+    for row in rows:
+        d_acc = f"{row['acc'] - teacher['acc']:+.4f}" if teacher else '-'
+        speed = f"{row['lines_per_sec'] / teacher['lines_per_sec']:.2f}x" if teacher else '-'
+        lines.append(f"| {row['name']} | {row['scale']} | {row['image_width']} | {row['params_mib']:.1f} | "
+                     f"{row['ms_per_line']['p50']:.2f} | {row['lines_per_sec']:.1f} | {row['acc']:.4f} | {d_acc} | {speed} |")
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train, export and benchmark distilled student recognizers against the fine-tuned teacher.")
+    parser.add_argument("--config", default="/home/jupyter/PaddleOCR_Training/config/rec/my_config_rec_ppocrv4_distill.yml", help="Distillation config with a Distill section")
+    parser.add_argument("--paddleocr_dir", default=os.environ.get("PADDLE_OCR_REPO_PATH", "/home/jupyter/PaddleOCR"), help="Cloned PaddleOCR repo (default: $PADDLE_OCR_REPO_PATH or /home/jupyter/PaddleOCR)")
+    parser.add_argument("--students", nargs='+', default=None, help="Names of the students to run (default: all in Distill.students)")
+    parser.add_argument("--skip_train", action="store_true", help="Export and benchmark the existing checkpoints only.")
+    parser.add_argument("--cpu_test", action="store_true", help="CPU run on a small subset of the labels, to test the pipeline end to end.")
+    parser.add_argument("--subset_lines", type=int, default=256, help="Train lines in --cpu_test mode (default: 256)")
+    parser.add_argument("--epochs", type=int, default=1, help="Epochs in --cpu_test mode (default: 1)")
+    parser.add_argument("--bench_label_file", default=None, help="Labeled lines for the table (default: the config's Eval label file)")
+    parser.add_argument("--bench_limit", type=int, default=None, help="Only benchmark the first N lines (default: all; 64 with --cpu_test)")
+    parser.add_argument("--batch_size", type=int, default=6, help="Lines per recognition request, as the pipeline batches them (default: 6)")
+    parser.add_argument("--backend", default="cpu", help="Predictor backend for the table (default: cpu)")
+    parser.add_argument("--cpu_threads", type=int, default=4, help="CPU math library threads (default: 4)")
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        base_config = yaml.safe_load(f)
+    distill = base_config.get('Distill') or {}
+    students = distill.get('students', [])
+    if args.students:
+        unknown = set(args.students) - {s['name'] for s in students}
+        if unknown:
+            logging.error(f"Unknown students: {', '.join(sorted(unknown))}")
+            exit(1)
+        students = [s for s in students if s['name'] in args.students]
+    if not students:
+        logging.error(f"No students configured in the Distill section of {args.config}")
+        exit(1)
+    work_dir = os.path.abspath(distill.get('work_dir', 'distill'))
+    if args.cpu_test:
+        work_dir = os.path.join(work_dir, 'cpu_test')
+    os.makedirs(work_dir, exist_ok=True)
+    paddleocr_dir = os.path.abspath(args.paddleocr_dir)
+
+    global_config = base_config['Global']
+    char_dict_path = global_config['character_dict_path']
+    num_classes = len(load_char_dict(char_dict_path, global_config.get('use_space_char', False)))
+    base_shape = next(op['SVTRRecResizeImg']['image_shape'] for op in base_config['Eval']['dataset']['transforms']
+                      if 'SVTRRecResizeImg' in op)
+
+    exported = {}
+    for student in students:
+        out_dir = os.path.join(work_dir, student['name'])
+        os.makedirs(out_dir, exist_ok=True)
+        config = student_config(base_config, student, work_dir)
+        if args.cpu_test:
+            apply_cpu_test(config, os.path.join(out_dir, 'subset'), args.subset_lines, args.epochs)
+        config_path = os.path.join(out_dir, 'config.yml')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(config, f, sort_keys=False)
+        logging.info(f"[{student['name']}] scale {student['scale']}, input width {student.get('image_width', base_shape[2])}: {config_path}")
+
+        if not args.skip_train and not train_student(config_path, paddleocr_dir, out_dir):
+            continue
+        model_dir = export_student(config_path, config, paddleocr_dir, out_dir)
+        if model_dir is None:
+            continue
+        image_shape = list(base_shape[:2]) + [student.get('image_width', base_shape[2])]
+        if not check_num_classes(model_dir, num_classes, image_shape):
+            logging.error(f"[{student['name']}] exported model does not output {num_classes} classes for {char_dict_path}")
+            continue
+        exported[student['name']] = (student, model_dir)
+        logging.info(f"[{student['name']}] exported to {model_dir} ({params_mib(model_dir):.1f} MiB of weights)")
+
+    bench_label_file = args.bench_label_file or base_config['Eval']['dataset']['label_file_list'][0]
+    bench_limit = args.bench_limit if args.bench_limit is not None else (64 if args.cpu_test else None)
+    crops, texts = load_crops(bench_label_file, bench_limit)
+    if not crops:
+        logging.error(f"No readable crops in {bench_label_file}")
+        exit(1)
+    logging.info(f"Benchmarking on {len(crops)} lines of {bench_label_file} ({args.backend}, {args.cpu_threads} threads, "
+                 f"batches of {args.batch_size})")
+
+    metric = get_rec_metric(paddleocr_dir)
+    decoder = BatchCTCDecoder(char_dict_path, global_config.get('use_space_char', False))
+    candidates = []
+    teacher_dir = distill.get('teacher_model_dir')
+    if teacher_dir and os.path.isdir(teacher_dir):
+        teacher_scale = base_config['Architecture']['Models']['Teacher']['Backbone']['scale']
+        candidates.append(('teacher', {'scale': teacher_scale}, teacher_dir))
+    else:
+        logging.warning(f"Teacher model not found at {teacher_dir}; the table has no reference row.")
+    candidates += [(name, student, model_dir) for name, (student, model_dir) in exported.items()]
+
+    rows = []
+    for name, student, model_dir in candidates:
+        predictor = create_stage_predictor('rec', model_dir, args.backend, args.cpu_threads)
+        # the export takes any width; lines are windowed at the width the model was trained at
+        image_width = student.get('image_width', base_shape[2])
+        run = benchmark_run(make_recognizer(predictor, decoder, 'bucketed', args.batch_size, max_width=image_width),
+                            crops, texts, args.batch_size, metric)
+        rows.append({'name': name, 'scale': student['scale'], 'image_width': image_width,
+                     'params_mib': round(params_mib(model_dir), 2), 'model': model_fingerprint(model_dir), **run})
+        logging.info(f"{name:>14}: {run['lines_per_sec']:8.1f} lines/s  p50 {run['ms_per_line']['p50']:.2f} ms/line  acc {run['acc']:.4f}")
+        del predictor
+
+    table = format_table(rows)
+    logging.info("Latency vs accuracy:\n" + table)
+    with open(os.path.join(work_dir, 'distill_table.md'), 'w', encoding='utf-8') as f:
+        f.write(table + '\n')
+    with open(os.path.join(work_dir, 'distill_table.json'), 'w', encoding='utf-8') as f:
+        json.dump({'created': datetime.datetime.now().isoformat(timespec='seconds'), 'config': os.path.abspath(args.config),
+                   'cpu_test': args.cpu_test, 'label_file': os.path.abspath(bench_label_file), 'lines': len(crops),
+                   'backend': args.backend, 'cpu_threads': args.cpu_threads, 'batch_size': args.batch_size,
+                   'rows': rows}, f, indent=2)
+    logging.info(f"Table written to {os.path.join(work_dir, 'distill_table.md')} and distill_table.json")
+    if len(exported) < len(students):
+        exit(1)
@@ -0,0 +1,360 @@
+# scripts/eval_tensor_cache.py
+#
+# Preprocesses the recognition eval set once into an on-disk tensor cache, so evaluations during
+# training read ready-made batches instead of re-decoding and re-resizing every PNG.
+# Used by scripts/train_fast_eval.py; run directly to (re)build the cache and compare speeds:
+#   python scripts/eval_tensor_cache.py --config config/rec/my_config_rec_ppocrv4_finetune.yml --verify 200
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import logging
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+import yaml
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inference'))
+from ctc_decoder import load_char_dict  # noqa: E402
+from rec_batching import RecBatchKernel, resize_for_rec, rec_resize_norm_img, REC_MEAN, REC_STD  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+CACHE_VERSION = 1
+CACHED_KEYS = ('image', 'label', 'length')
+
+
+class UnsupportedEvalConfig(ValueError):
+    pass
+
+
+def eval_cache_settings(config, mode='Eval'):
+    """
+    Reads what the cache needs from a PaddleOCR config dict and checks that the transforms are
+    the chain the cache reproduces (DecodeImage BGR, CTCLabelEncode, SVTRRecResizeImg,
+    NormalizeImage with the ImageNet statistics, KeepKeys of image/label/length).
+    Raises UnsupportedEvalConfig otherwise, so the caller can keep the normal loader.
+    """
+    global_config = config['Global']
+    dataset = config[mode]['dataset']
+    ops = {}
+    for op in dataset['transforms']:
+        name, params = next(iter(op.items()))
+        ops[name] = params or {}
+    unknown = set(ops) - {'DecodeImage', 'CTCLabelEncode', 'SVTRRecResizeImg', 'NormalizeImage', 'ToCHWImage', 'KeepKeys'}
+    if unknown:
+        raise UnsupportedEvalConfig(f"transforms not reproduced by the cache: {', '.join(sorted(unknown))}")
+    if 'SVTRRecResizeImg' not in ops or 'CTCLabelEncode' not in ops:
+        raise UnsupportedEvalConfig("the cache needs SVTRRecResizeImg and CTCLabelEncode in the transforms")
+    if ops.get('DecodeImage', {}).get('img_mode', 'RGB') != 'BGR':
+        raise UnsupportedEvalConfig("the cache decodes images as BGR")
+    norm = ops.get('NormalizeImage', {})
+    scale = norm.get('scale', 1.0 / 255.0)
+    scale = eval(scale) if isinstance(scale, str) else scale  # NormalizeImage evaluates '1./255.' the same way
+    if (not np.allclose(norm.get('mean'), REC_MEAN.ravel()) or not np.allclose(norm.get('std'), REC_STD.ravel())
+            or not np.isclose(scale, 1.0 / 255.0)):
+        raise UnsupportedEvalConfig("NormalizeImage differs from the recognition contract (scale 1./255., ImageNet mean/std)")
+    keep_keys = ops.get('KeepKeys', {}).get('keep_keys', list(CACHED_KEYS))
+    if set(keep_keys) - set(CACHED_KEYS):
+        raise UnsupportedEvalConfig(f"the cache only provides {', '.join(CACHED_KEYS)}")
+
+    tensor_cache = config[mode].get('tensor_cache') or {}
+    return {
+        'label_files': list(dataset['label_file_list']),
+        'data_dir': dataset.get('data_dir', ''),
+        'delimiter': dataset.get('delimiter', '\t'),
+        'image_shape': tuple(ops['SVTRRecResizeImg']['image_shape']),
+        'keep_keys': keep_keys,
+        'char_dict_path': global_config['character_dict_path'],
+        'use_space_char': global_config.get('use_space_char', False),
+        'max_text_length': global_config['max_text_length'],
+        'batch_size': config[mode]['loader']['batch_size_per_card'],
+        'num_workers': config[mode]['loader'].get('num_workers', 4),
+        'cache_root': tensor_cache.get('cache_dir', '/home/jupyter/PaddleOCR_Training/ocr_output/eval_cache'),
+        'in_memory': tensor_cache.get('in_memory', False),
+        'subset_ratio': tensor_cache.get('subset_ratio', 0.0),
+        'subset_seed': tensor_cache.get('subset_seed', 2025),
+    }
+
+
+def cache_fingerprint(settings):
+    """Changes whenever the label files, the dictionary or the input contract change."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([CACHE_VERSION, settings['image_shape'], settings['max_text_length'],
+                              settings['use_space_char'], settings['data_dir'], settings['delimiter']]).encode('utf-8'))
+    for path in [settings['char_dict_path']] + settings['label_files']:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def encode_label(text, char_to_index, max_text_length):
+    """CTCLabelEncode: dictionary indices (blank is 0), unknown characters dropped; None if the line is unusable."""
+    if len(text) == 0 or len(text) > max_text_length:
+        return None
+    indices = [char_to_index[c] for c in text if c in char_to_index]
+    return indices or None
+
+
+def _load_resized(task):
+    """Pool worker: DecodeImage (BGR) + the uint8 half of SVTRRecResizeImg for one line image."""
+    image_path, image_shape = task
+    try:
+        with open(image_path, 'rb') as f:
+            img = cv2.imdecode(np.frombuffer(f.read(), dtype=np.uint8), cv2.IMREAD_COLOR)
+    except OSError:
+        return None
+    if img is None:
+        return None
+    return resize_for_rec(img, image_shape)
+
+
+def read_label_lines(settings):
+    samples = []
+    for label_file in settings['label_files']:
+        with open(label_file, 'rb') as f:
+            for line in f:
+                parts = line.decode('utf-8').strip('\n').split(settings['delimiter'])
+                if len(parts) >= 2:
+                    samples.append((os.path.join(settings['data_dir'], parts[0]), parts[1]))
+    return samples
+
+
+def build_eval_cache(settings, cache_dir):
+    """
+    Writes the cache into cache_dir: images.npy holds every line at the model height as uint8,
+    right-padded to imgW ([N, H, W, 3], memory-mappable), with its real width in widths.npy;
+    labels.npy / lengths.npy hold the CTCLabelEncode outputs. Normalization is not cached: it is
+    a lookup-table pass at batch time (RecBatchKernel), which keeps the cache at 1 byte per
+    value and the tensors bit-identical to the Eval transforms. meta.json is written last and
+    the directory is moved into place only when complete.
+    """
+    _, imgH, imgW = settings['image_shape']
+    characters = load_char_dict(settings['char_dict_path'], settings['use_space_char'])
+    char_to_index = {c: i for i, c in enumerate(characters)}
+    samples = read_label_lines(settings)
+
+    tmp_dir = cache_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    images = np.lib.format.open_memmap(os.path.join(tmp_dir, 'images.npy'), mode='w+', dtype=np.uint8,
+                                       shape=(len(samples), imgH, imgW, 3))
+    widths = np.zeros(len(samples), dtype=np.int16)
+    labels = np.zeros((len(samples), settings['max_text_length']), dtype=np.int64)
+    lengths = np.zeros(len(samples), dtype=np.int64)
+
+    encoded = [encode_label(text, char_to_index, settings['max_text_length']) for _, text in samples]
+    tasks = [(path, settings['image_shape']) for (path, _), enc in zip(samples, encoded) if enc is not None]
+    kept = [enc for enc in encoded if enc is not None]
+    skipped_labels = len(samples) - len(tasks)
+
+    count = skipped_images = 0
+    start = time.perf_counter()
+    with Pool(max(1, settings['num_workers'])) as pool:
+        for resized, label in tqdm(zip(pool.imap(_load_resized, tasks, chunksize=64), kept),
+                                   total=len(tasks), desc="Caching eval set"):
+            if resized is None:
+                skipped_images += 1
+                continue
+            w = resized.shape[1]
+            images[count, :, :w] = resized
+            widths[count] = w
+            labels[count, :len(label)] = label
+            lengths[count] = len(label)
+            count += 1
+    images.flush()
+    del images
+
+    np.save(os.path.join(tmp_dir, 'widths.npy'), widths[:count])
+    np.save(os.path.join(tmp_dir, 'labels.npy'), labels[:count])
+    np.save(os.path.join(tmp_dir, 'lengths.npy'), lengths[:count])
+    meta = {'version': CACHE_VERSION, 'count': count, 'image_shape': list(settings['image_shape']),
+            'label_files': settings['label_files'], 'skipped_labels': skipped_labels,
+            'skipped_images': skipped_images, 'build_seconds': round(time.perf_counter() - start, 1)}
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    logging.info(f"Cached {count} eval lines in {meta['build_seconds']}s at {cache_dir} "
+                 f"(skipped {skipped_labels} unusable labels, {skipped_images} unreadable images)")
+    return meta
+
+
+def get_or_build_cache(settings, rebuild=False):
+    cache_dir = os.path.join(settings['cache_root'], cache_fingerprint(settings))
+    if rebuild or not os.path.exists(os.path.join(cache_dir, 'meta.json')):
+        build_eval_cache(settings, cache_dir)
+    else:
+        logging.info(f"Using eval tensor cache {cache_dir}")
+    return cache_dir
+
+
+class EvalTensorCache:
+    """A built cache, memory-mapped (default) or read fully into RAM with in_memory=True."""
+
+    def __init__(self, cache_dir, in_memory=False):
+        with open(os.path.join(cache_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.count = self.meta['count']
+        self.image_shape = tuple(self.meta['image_shape'])
+        images = np.load(os.path.join(cache_dir, 'images.npy'), mmap_mode=None if in_memory else 'r')
+        self.images = images[:self.count]
+        self.widths = np.load(os.path.join(cache_dir, 'widths.npy'))
+        self.labels = np.load(os.path.join(cache_dir, 'labels.npy'))
+        self.lengths = np.load(os.path.join(cache_dir, 'lengths.npy'))
+
+    def __len__(self):
+        return self.count
+
+    def batch(self, indices, kernel, out=None):
+        """{'image', 'label', 'length'} arrays for the given rows; images are packed by the kernel (into out if given)."""
+        crops = [self.images[i, :, :self.widths[i]] for i in indices]
+        return {'image': kernel.pack(crops, self.image_shape[2], out=out),
+                'label': self.labels[indices], 'length': self.lengths[indices]}
+
+
+def stratified_subset(lengths, ratio, seed=2025, num_buckets=10):
+    """
+    A fixed subset of about ratio x len(lengths) rows, drawn per label-length bucket (quantiles
+    of the label length), so short and long lines keep their share. Returns sorted row indices.
+    """
+    lengths = np.asarray(lengths)
+    edges = np.unique(np.quantile(lengths, np.linspace(0, 1, num_buckets + 1)[1:-1]))
+    buckets = np.searchsorted(edges, lengths, side='right')
+    rng = np.random.default_rng(seed)
+    chosen = []
+    for bucket in np.unique(buckets):
+        rows = np.flatnonzero(buckets == bucket)
+        chosen.append(rng.choice(rows, size=max(1, int(round(len(rows) * ratio))), replace=False))
+    return np.sort(np.concatenate(chosen))
+
+
+class CachedEvalLoader:
+    """
+    Drop-in for the Eval DataLoader that program.eval() iterates: yields the keep_keys as paddle
+    tensors, batch_size rows at a time, in label-file order. With use_subset set, only the
+    stratified subset rows are served (len() follows, so the progress bar is right).
+    """
+
+    def __init__(self, cache, batch_size, keep_keys=CACHED_KEYS, subset=None):
+        self.cache = cache
+        self.batch_size = batch_size
+        self.keep_keys = list(keep_keys)
+        self.subset = subset
+        self.use_subset = False
+        self.kernel = RecBatchKernel(cache.image_shape[1], batch_size, cache.image_shape[2])
+        self._out = np.empty((batch_size,) + cache.image_shape, dtype=np.float32)
+
+    def rows(self):
+        if self.use_subset and self.subset is not None:
+            return self.subset
+        return np.arange(len(self.cache))
+
+    def __len__(self):
+        return (len(self.rows()) + self.batch_size - 1) // self.batch_size
+
+    def iter_arrays(self):
+        rows = self.rows()
+        for beg in range(0, len(rows), self.batch_size):
+            indices = rows[beg:beg + self.batch_size]
+            yield self.cache.batch(indices, self.kernel, out=self._out[:len(indices)])
+
+    def __iter__(self):
+        import paddle
+
+        for arrays in self.iter_arrays():
+            # to_tensor copies, so the reused output buffer can be overwritten by the next batch
+            yield [paddle.to_tensor(arrays[key]) for key in self.keep_keys]
+
+
+def verify_against_ppocr(config, cache, num_lines, mode='Eval'):
+    """Runs the first num_lines through PaddleOCR's own Eval transforms and compares them with the cache."""
+    import paddleocr  # noqa: F401  (puts ppocr on sys.path)
+    from ppocr.data.imaug import create_operators, transform
+
+    settings = eval_cache_settings(config, mode)
+    ops = create_operators(config[mode]['dataset']['transforms'], config['Global'])
+    kernel = RecBatchKernel(cache.image_shape[1], 1, cache.image_shape[2])
+    row = mismatches = 0
+    for image_path, text in read_label_lines(settings):
+        if row >= min(num_lines, len(cache)):
+            break
+        if not os.path.exists(image_path):
+            continue
+        with open(image_path, 'rb') as f:
+            outs = transform({'image': f.read(), 'label': text}, ops)
+        if outs is None:
+            continue  # dropped by the transforms, as it was when the cache was built
+        cached = cache.batch([row], kernel)
+        expected = dict(zip(settings['keep_keys'], outs))
+        if not all(np.array_equal(expected[key], cached[key][0]) for key in settings['keep_keys']):
+            mismatches += 1
+        row += 1
+    return row, mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the recognition eval tensor cache from a training config and compare eval input speed with and without it.")
+    parser.add_argument("--config", default="/home/jupyter/PaddleOCR_Training/config/rec/my_config_rec_ppocrv4_finetune.yml", help="PaddleOCR training config")
+    parser.add_argument("--cache_dir", default=None, help="Cache root (default: Eval.tensor_cache.cache_dir in the config)")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild even if a cache for the current labels exists.")
+    parser.add_argument("--in_memory", action="store_true", help="Read the cache into RAM instead of memory-mapping it.")
+    parser.add_argument("--subset_ratio", type=float, default=None, help="Stratified subset size (default: Eval.tensor_cache.subset_ratio)")
+    parser.add_argument("--verify", type=int, default=0, help="Compare the first N cached lines with PaddleOCR's Eval transforms (needs ppocr).")
+    parser.add_argument("--benchmark_lines", type=int, default=1000, help="Lines timed through the uncached decode + transforms path (default: 1000)")
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    try:
+        settings = eval_cache_settings(config)
+    except UnsupportedEvalConfig as e:
+        logging.error(f"Eval config cannot be cached: {e}")
+        exit(1)
+    if args.cache_dir:
+        settings['cache_root'] = args.cache_dir
+    if args.subset_ratio is not None:
+        settings['subset_ratio'] = args.subset_ratio
+
+    cache = EvalTensorCache(get_or_build_cache(settings, args.rebuild), in_memory=args.in_memory)
+    size_mb = cache.images.nbytes / 1024 / 1024
+    logging.info(f"Cache: {len(cache)} lines, {size_mb:.0f} MiB of uint8 images")
+
+    if args.verify:
+        checked, mismatches = verify_against_ppocr(config, cache, args.verify)
+        if mismatches:
+            logging.error(f"{mismatches} of {checked} cached lines differ from the Eval transforms")
+            exit(1)
+        logging.info(f"{checked} cached lines are identical to PaddleOCR's Eval transforms")
+
+    # uncached: what every evaluation costs today, per line (decode + resize + normalize)
+    samples = read_label_lines(settings)[:args.benchmark_lines]
+    start = time.perf_counter()
+    for image_path, _ in samples:
+        img = cv2.imread(image_path)
+        if img is not None:
+            rec_resize_norm_img(img, settings['image_shape'])
+    uncached_per_line = (time.perf_counter() - start) / max(1, len(samples))
+
+    loader = CachedEvalLoader(cache, settings['batch_size'], settings['keep_keys'])
+    start = time.perf_counter()
+    for _ in loader.iter_arrays():
+        pass
+    full_pass = time.perf_counter() - start
+    logging.info(f"Full eval input pass: uncached ~{uncached_per_line * len(cache):.1f}s "
+                 f"(single process, from {len(samples)} lines), cached {full_pass:.1f}s "
+                 f"({uncached_per_line * len(cache) / max(full_pass, 1e-9):.1f}x)")
+    if settings['subset_ratio']:
+        loader.subset = stratified_subset(cache.lengths, settings['subset_ratio'], settings['subset_seed'])
+        loader.use_subset = True
+        start = time.perf_counter()
+        for _ in loader.iter_arrays():
+            pass
+        logging.info(f"Stratified subset: {len(loader.subset)} lines ({settings['subset_ratio']:.0%}), "
+                     f"input pass {time.perf_counter() - start:.2f}s")
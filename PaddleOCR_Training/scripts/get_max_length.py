@@ -1,4 +1,4 @@
-import pandas as pd
+import csv
 import argparse
 import logging
 import os
@@ -7,26 +7,22 @@ logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
 def get_max_text_length(csv_file_path):
     try:
-        # Read only the 'text' column
-        try:
-            df = pd.read_csv(csv_file_path, usecols=['text'])
-        except ValueError:
-            df = pd.read_csv(csv_file_path)
-            if 'text' not in df.columns:
+        # A max over one column: stream it with the csv module rather than loading a DataFrame
+        # (importing pandas alone costs more than the scan for typical label files).
+        with open(csv_file_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            if 'text' not in header:
                 logging.error(f"'text' column not found in {csv_file_path}")
                 return -1 # Indicate error
+            text_idx = header.index('text')
+            # Empty cells are what read_csv + dropna skipped
+            max_len = max((len(row[text_idx]) for row in reader if text_idx < len(row) and row[text_idx]), default=None)
 
-        df.dropna(subset=['text'], inplace=True)
-        df['text'] = df['text'].astype(str)
-        
-        if df.empty or df['text'].empty:
+        if max_len is None:
             logging.warning("No text data found in CSV to calculate max length.")
             return 0 
 
-        # Calculate max length efficiently
-        max_len = df['text'].map(len).max()
-        
-        # print(f"Maximum text length found: {max_len}") # Standard output for shell script to capture
         return int(max_len) # Ensure it's an int
         
     except FileNotFoundError:
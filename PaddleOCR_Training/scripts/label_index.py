@@ -0,0 +1,332 @@
+# scripts/label_index.py
+#
+# Compact, memory-mapped index of a recognition label file (rec_gt_train.txt): an int64 offsets
+# array plus one packed UTF-8 blob of the lines, written next to the label file by
+# convert_labels. Every DataLoader worker maps the same two files instead of holding its own
+# Python list of the lines. Build one by hand, or measure per-worker memory against the list:
+#   python scripts/label_index.py ocr_output/rec_gt_train.txt
+#   python scripts/label_index.py --measure_lines 5000000 --workers 4
+
+import os
+import mmap
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import tempfile
+import subprocess
+from array import array
+from multiprocessing import get_context
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+
+def label_index_paths(label_file):
+    """(offsets, blob) paths of the index of label_file: rec_gt_train.txt -> rec_gt_train.offsets.npy, rec_gt_train.blob."""
+    stem = os.path.splitext(label_file)[0]
+    return stem + '.offsets.npy', stem + '.blob'
+
+
+def write_label_index(label_file):
+    """
+    Writes the index of label_file and returns its line count. Entry i is line i of the file
+    without its line break (empty lines are skipped), so it decodes and splits exactly like the
+    lines SimpleDataSet reads; offsets[i]:offsets[i + 1] is its byte range in the blob. Both
+    files are written under temporary names and moved into place, so a reader never sees a
+    half-written index.
+    """
+    offsets_path, blob_path = label_index_paths(label_file)
+    suffix = f'.tmp{os.getpid()}'
+    offsets = array('q', [0])
+    with open(label_file, 'rb') as src, open(blob_path + suffix, 'wb') as blob:
+        for line in src:
+            line = line.rstrip(b'\r\n')
+            if not line:
+                continue
+            blob.write(line)
+            offsets.append(offsets[-1] + len(line))
+    with open(offsets_path + suffix, 'wb') as f:
+        np.save(f, np.frombuffer(offsets, dtype=np.int64))
+    os.replace(blob_path + suffix, blob_path)
+    os.replace(offsets_path + suffix, offsets_path)
+    return len(offsets) - 1
+
+
+def label_index_is_current(label_file):
+    """True if the index exists, is not older than label_file and its blob is complete."""
+    offsets_path, blob_path = label_index_paths(label_file)
+    if not (os.path.exists(offsets_path) and os.path.exists(blob_path)):
+        return False
+    if min(os.path.getmtime(offsets_path), os.path.getmtime(blob_path)) < os.path.getmtime(label_file):
+        return False
+    offsets = np.load(offsets_path, mmap_mode='r')
+    return int(offsets[-1]) == os.path.getsize(blob_path)
+
+
+def ensure_label_index(label_file):
+    if not label_index_is_current(label_file):
+        start = time.perf_counter()
+        count = write_label_index(label_file)
+        logging.info(f"Indexed {count} lines of {label_file} in {time.perf_counter() - start:.1f}s")
+
+
+class LabelIndex:
+    """Random access to the lines of one indexed label file; index[i] is the line as UTF-8 bytes."""
+
+    def __init__(self, label_file):
+        offsets_path, blob_path = label_index_paths(label_file)
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        self.blob = b''  # mmap refuses empty files
+        if self.offsets[-1]:
+            with open(blob_path, 'rb') as f:
+                self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        beg, end = self.offsets[i:i + 2].tolist()
+        return self.blob[beg:end]
+
+
+class IndexedLines:
+    """
+    The lines of several label indexes as one sequence, in the order of the `rows` array
+    (global line numbers: the lines of file k come after those of files 0..k-1). Stands in for
+    SimpleDataSet.data_lines: a numpy array of rows instead of a list of bytes objects.
+    """
+
+    def __init__(self, indexes, rows=None):
+        self.indexes = indexes
+        self.bases = np.cumsum([0] + [len(index) for index in indexes])
+        self.rows = np.arange(self.bases[-1], dtype=np.int64) if rows is None else rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        row = int(self.rows[i])
+        if len(self.indexes) == 1:
+            return self.indexes[0][row]
+        k = int(np.searchsorted(self.bases, row, side='right')) - 1
+        return self.indexes[k][row - int(self.bases[k])]
+
+
+def sample_indexed_lines(label_files, ratio_list, sample, seed=None):
+    """
+    SimpleDataSet.get_image_info_list over label indexes: round(n x ratio) lines of each file,
+    drawn without replacement when `sample` is set (training) or the ratio is below 1.
+    """
+    indexes = [LabelIndex(label_file) for label_file in label_files]
+    lines = IndexedLines(indexes)
+    rng = np.random.default_rng(seed)
+    rows = []
+    for base, index, ratio in zip(lines.bases, indexes, ratio_list):
+        if sample or ratio < 1.0:
+            rows.append(base + rng.choice(len(index), size=round(len(index) * ratio), replace=False))
+        else:
+            rows.append(base + np.arange(len(index)))
+    lines.rows = np.concatenate(rows).astype(np.int64) if rows else np.zeros(0, dtype=np.int64)
+    return lines
+
+
+_indexed_dataset_class = None
+
+
+def indexed_dataset_class():
+    """
+    IndexedLabelDataSet: ppocr's SimpleDataSet with its label lines served from the label
+    indexes (built first if missing or stale) and its index order kept as a numpy array.
+    Reading, transforms and error handling are SimpleDataSet's own.
+    """
+    global _indexed_dataset_class
+    if _indexed_dataset_class is not None:
+        return _indexed_dataset_class
+    from ppocr.data.simple_dataset import SimpleDataSet
+
+    class IndexedLabelDataSet(SimpleDataSet):
+        def __init__(self, config, mode, logger, seed=None):
+            super().__init__(config, mode, logger, seed)
+            # SimpleDataSet keeps list(range(n)); every worker touching it copies its pages
+            self.data_idx_order_list = np.arange(len(self.data_lines), dtype=np.int64)
+
+        def get_image_info_list(self, file_list, ratio_list):
+            if isinstance(file_list, str):
+                file_list = [file_list]
+            for label_file in file_list:
+                ensure_label_index(label_file)
+            return sample_indexed_lines(file_list, ratio_list, self.mode == "train", self.seed)
+
+        def shuffle_data_random(self):
+            np.random.default_rng(self.seed).shuffle(self.data_lines.rows)
+
+    _indexed_dataset_class = IndexedLabelDataSet
+    return IndexedLabelDataSet
+
+
+def install_label_index(data_module, modules, modes):
+    """
+    Makes build_dataloader create IndexedLabelDataSet for the given modes only (the config
+    sections that set label_index), wherever they name SimpleDataSet; every other mode, Eval
+    in particular, keeps the plain SimpleDataSet. ppocr's build_dataloader accepts only its
+    own dataset names and looks the class up in its module namespace, so SimpleDataSet is
+    rebound there for the duration of those calls. `modules` are the modules that imported
+    build_dataloader by name (tools/train.py, tools/program.py); each gets the wrapper.
+    """
+    indexed = indexed_dataset_class()
+    data_module.IndexedLabelDataSet = indexed
+
+    for module in modules:
+        original_build_dataloader = module.build_dataloader
+
+        def build_dataloader(config, mode, device, logger, seed=None, _original=original_build_dataloader):
+            if mode not in modes or config[mode]['dataset']['name'] != 'SimpleDataSet':
+                return _original(config, mode, device, logger, seed)
+            simple = data_module.SimpleDataSet
+            data_module.SimpleDataSet = indexed
+            try:
+                return _original(config, mode, device, logger, seed)
+            finally:
+                data_module.SimpleDataSet = simple
+
+        module.build_dataloader = build_dataloader
+
+
+def synthetic_label_file(path, num_lines, seed=0):
+    """num_lines lines shaped like rec_gt_train.txt (absolute image path, tab, 20-60 characters of text)."""
+    rng = random.Random(seed)
+    words = ['the', 'signal', 'intercept', 'protocol', 'network', 'agent', 'secure', 'channel',
+             'operation', 'analysis', 'report', 'field', 'transmission', 'of', 'and', 'to']
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(num_lines):
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 8)))
+            f.write(f"/home/jupyter/PaddleOCR_Training/ocr_output/line_images/sample_{i // 60}_line_{i % 60}_"
+                    f"{rng.randint(0, 3000)}_{rng.randint(0, 4000)}.png\t{text}\n")
+
+
+def memory_kib():
+    """(RSS, unique set size) of this process in KiB; USS counts only pages no other process shares."""
+    rss = uss = 0
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    uss += int(line.split()[1])
+    except OSError:
+        uss = None
+    return rss, uss
+
+
+class _ListLines:
+    """What SimpleDataSet holds per worker: the lines as a list of bytes, and list(range(n)) as the order."""
+
+    def __init__(self, label_file, seed=0):
+        with open(label_file, 'rb') as f:
+            self.data_lines = f.readlines()
+        random.seed(seed)
+        random.shuffle(self.data_lines)
+        self.data_idx_order_list = list(range(len(self.data_lines)))
+
+
+class _IndexedLines:
+    def __init__(self, label_file, seed=0):
+        self.data_lines = sample_indexed_lines([label_file], [1.0], True, seed)
+        self.data_idx_order_list = np.arange(len(self.data_lines), dtype=np.int64)
+
+
+_dataset = None
+
+
+def _read_share(task):
+    """Worker: parses every line of its share (i::num_workers, as the loader hands out batches), then reports its memory."""
+    worker, num_workers = task
+    chars = 0
+    for idx in range(worker, len(_dataset.data_idx_order_list), num_workers):
+        line = _dataset.data_lines[_dataset.data_idx_order_list[idx]]
+        chars += len(line.decode('utf-8').strip('\n').split('\t')[1])
+    return memory_kib() + (chars,)
+
+
+def measure_worker_memory(label_file, mode, num_workers):
+    """
+    Loads the labels the way `mode` ('list' or 'index') does in the main process, forks
+    num_workers workers (as paddle's DataLoader does) that each read their share once, and
+    returns the parent's and every worker's memory. Run in a fresh process per mode so one
+    does not inherit the other's heap.
+    """
+    global _dataset
+    before = memory_kib()[0]
+    start = time.perf_counter()
+    _dataset = (_ListLines if mode == 'list' else _IndexedLines)(label_file)
+    load_seconds = time.perf_counter() - start
+    parent = memory_kib()[0]
+    start = time.perf_counter()
+    with get_context('fork').Pool(num_workers) as pool:
+        workers = pool.map(_read_share, [(w, num_workers) for w in range(num_workers)], chunksize=1)
+    return {'mode': mode, 'lines': len(_dataset.data_idx_order_list), 'load_seconds': round(load_seconds, 2),
+            'read_seconds': round(time.perf_counter() - start, 2), 'parent_labels_mib': round((parent - before) / 1024, 1),
+            'worker_rss_mib': [round(rss / 1024, 1) for rss, _, _ in workers],
+            'worker_uss_mib': [round(uss / 1024, 1) if uss is not None else None for _, uss, _ in workers]}
+
+
+def _measure_in_subprocess(label_file, mode, num_workers):
+    command = [sys.executable, os.path.abspath(__file__), '--measure_file', label_file, '--measure_mode', mode,
+               '--workers', str(num_workers)]
+    out = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mapped label index of a label file, or measure per-worker memory with and without it.")
+    parser.add_argument("label_files", nargs='*', help="Label files to index (e.g. ocr_output/rec_gt_train.txt)")
+    parser.add_argument("--measure_lines", type=int, default=0, help="Measure per-worker memory on a synthetic label file of this many lines (e.g. 5000000).")
+    parser.add_argument("--measure_file", default=None, help="Measure on this label file instead of a synthetic one.")
+    parser.add_argument("--workers", type=int, default=4, help="Loader workers to fork for the measurement (default: 4, as num_workers in the config)")
+    parser.add_argument("--measure_mode", choices=['list', 'index'], default=None, help=argparse.SUPPRESS)  # one side of the measurement, run in a fresh process
+    args = parser.parse_args()
+
+    if args.measure_mode:
+        print(json.dumps(measure_worker_memory(args.measure_file, args.measure_mode, args.workers)))
+        exit(0)
+
+    for label_file in args.label_files:
+        if not os.path.exists(label_file):
+            logging.error(f"Label file not found: {label_file}")
+            exit(1)
+        start = time.perf_counter()
+        count = write_label_index(label_file)
+        offsets_path, blob_path = label_index_paths(label_file)
+        logging.info(f"Indexed {count} lines in {time.perf_counter() - start:.1f}s: {offsets_path} "
+                     f"({os.path.getsize(offsets_path) / 1024 / 1024:.1f} MiB), {blob_path} ({os.path.getsize(blob_path) / 1024 / 1024:.1f} MiB)")
+
+    if args.measure_lines or args.measure_file:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            label_file = args.measure_file
+            if label_file is None:
+                label_file = os.path.join(tmp_dir, 'rec_gt_train.txt')
+                synthetic_label_file(label_file, args.measure_lines)
+            else:
+                label_file = os.path.abspath(label_file)
+            ensure_label_index(label_file)
+            logging.info(f"Label file: {os.path.getsize(label_file) / 1024 / 1024:.0f} MiB; index: "
+                         f"{sum(os.path.getsize(p) for p in label_index_paths(label_file)) / 1024 / 1024:.0f} MiB on disk, "
+                         f"{args.workers} forked workers")
+            results = {mode: _measure_in_subprocess(label_file, mode, args.workers) for mode in ('list', 'index')}
+        for mode, result in results.items():
+            rss, uss = result['worker_rss_mib'], result['worker_uss_mib']
+            uss_note = f", private {max(uss):7.1f} MiB" if None not in uss else ''
+            logging.info(f"  {mode:>5}: {result['lines']} lines, labels take {result['parent_labels_mib']:7.1f} MiB in the parent "
+                         f"(loaded in {result['load_seconds']}s); per worker after one pass: RSS {max(rss):7.1f} MiB{uss_note} "
+                         f"(pass {result['read_seconds']}s)")
+        list_uss, index_uss = max(results['list']['worker_uss_mib'] or [0]), max(results['index']['worker_uss_mib'] or [0])
+        if list_uss and index_uss:
+            logging.info(f"Private memory per worker: {list_uss:.0f} -> {index_uss:.0f} MiB "
+                         f"(x{args.workers} workers: {list_uss * args.workers:.0f} -> {index_uss * args.workers:.0f} MiB)")
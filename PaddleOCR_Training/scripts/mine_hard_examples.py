@@ -0,0 +1,358 @@
+# scripts/mine_hard_examples.py
+#
+# Hard-example mining for recognition fine-tuning: the current model reads every line of
+# rec_gt_train.txt (batched, CPU) through the training resize, and the lines it gets wrong or
+# reads with low confidence are kept in full while the easy ones are subsampled.
+#   python scripts/mine_hard_examples.py mine --rec_model_dir <exported model> --output_dir ocr_output/mined
+#   python scripts/mine_hard_examples.py loop -c <config> --rounds 5 --epochs_per_round 5
+#   python scripts/mine_hard_examples.py report --baseline_log <full run>/train.log --mined_log <mined run>/train.log --target_acc 0.95
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import datetime
+import subprocess
+
+import cv2
+import numpy as np
+import yaml
+from rapidfuzz.distance import Levenshtein
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inference'))
+from ctc_decoder import BatchCTCDecoder  # noqa: E402
+from predictor import create_stage_predictor  # noqa: E402
+from rec_batching import REC_IMAGE_SHAPE, RecBatchKernel  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+CHUNK_LINES = 2048  # crops decoded and held in memory at a time
+
+
+def read_label_lines(label_file):
+    """Raw label lines (image_path<TAB>text), in file order, as PaddleOCR's SimpleDataSet reads them."""
+    with open(label_file, 'rb') as f:
+        return [line.decode('utf-8').rstrip('\n') for line in f if line.strip()]
+
+
+def training_view_recognizer(run_model, decoder, image_shape=REC_IMAGE_SHAPE, batch_size=64):
+    """
+    Recognizer that sees each line as the trainer does: SVTRRecResizeImg at the config's fixed
+    image_shape (long lines squashed to its width, not cut into windows like the serving
+    pipeline's BucketedRecognizer), so lines are ranked by the input they are trained on.
+    """
+    kernel = RecBatchKernel(image_shape[1], batch_size, image_shape[2])
+
+    def recognize(crops):
+        results = []
+        for beg in range(0, len(crops), batch_size):
+            results.extend(decoder(run_model(kernel.resize_and_pack(crops[beg:beg + batch_size], image_shape))))
+        return results
+    return recognize
+
+
+def train_image_shape(config):
+    """image_shape of the Train.dataset SVTRRecResizeImg transform."""
+    for op in config['Train']['dataset']['transforms']:
+        if 'SVTRRecResizeImg' in op:
+            return tuple(op['SVTRRecResizeImg']['image_shape'])
+    raise ValueError("Train.dataset.transforms has no SVTRRecResizeImg")
+
+
+def score_lines(lines, recognizer, batch_size=64, ignore_space=True):
+    """
+    Runs the recognizer over the label lines in chunks and returns one record per line:
+    prediction, CTC confidence and normalized edit distance to the label (spaces ignored,
+    like RecMetric). Unreadable crops get ned None and are neither hard nor easy.
+    """
+    records = []
+    start = time.perf_counter()
+    for beg in range(0, len(lines), CHUNK_LINES):
+        chunk = [line.partition('\t') for line in lines[beg:beg + CHUNK_LINES]]
+        crops, readable = [], []
+        for i, (image_path, _, _) in enumerate(chunk):
+            img = cv2.imread(image_path)
+            if img is not None:
+                crops.append(img)
+                readable.append(i)
+        results = []
+        for b in range(0, len(crops), batch_size * 16):
+            results.extend(recognizer(crops[b:b + batch_size * 16]))
+        predicted = dict(zip(readable, results))
+        for i, (image_path, _, text) in enumerate(chunk):
+            if i not in predicted:
+                records.append({'image_path': image_path, 'label': text, 'pred': None, 'conf': None, 'ned': None})
+                continue
+            pred, conf = predicted[i]
+            a, b = (pred.replace(' ', ''), text.replace(' ', '')) if ignore_space else (pred, text)
+            records.append({'image_path': image_path, 'label': text, 'pred': pred, 'conf': float(conf),
+                            'ned': float(Levenshtein.normalized_distance(a, b))})
+        done = min(beg + CHUNK_LINES, len(lines))
+        logging.info(f"Scored {done}/{len(lines)} lines ({done / (time.perf_counter() - start):.0f} lines/s)")
+    return records
+
+
+def split_hard(records, min_confidence=0.9):
+    """Hard = misread (ned > 0) or read with confidence below min_confidence. Returns (hard, easy) index lists."""
+    hard, easy = [], []
+    for i, r in enumerate(records):
+        if r['ned'] is None:
+            continue
+        (hard if r['ned'] > 0 or r['conf'] < min_confidence else easy).append(i)
+    return hard, easy
+
+
+def write_mined_lists(records, lines, hard, easy, output_dir, easy_ratio=0.2, hard_weight=2, seed=2025):
+    """
+    Writes the mining results to output_dir:
+      hard.txt / easy.txt  - for label_file_list: [hard.txt, easy.txt], ratio_list: [1.0, easy_ratio].
+                             SimpleDataSet re-samples a list with ratio < 1 every epoch, so a different
+                             easy subset is seen each epoch.
+      weighted.txt         - one self-contained list: hard lines repeated hard_weight times plus a
+                             fixed easy_ratio sample of the easy lines (ratio_list cannot go above 1.0).
+      scores.tsv           - per-line prediction, confidence and edit distance, hardest first.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {name: os.path.join(output_dir, name) for name in ('hard.txt', 'easy.txt', 'weighted.txt', 'scores.tsv')}
+    for name, indices in (('hard.txt', hard), ('easy.txt', easy)):
+        with open(paths[name], 'w', encoding='utf-8') as f:
+            f.writelines(lines[i] + '\n' for i in indices)
+
+    easy_sample = random.Random(seed).sample(easy, round(len(easy) * easy_ratio))
+    weighted = [lines[i] for i in hard] * hard_weight + [lines[i] for i in easy_sample]
+    random.Random(seed).shuffle(weighted)
+    with open(paths['weighted.txt'], 'w', encoding='utf-8') as f:
+        f.writelines(line + '\n' for line in weighted)
+
+    order = sorted((i for i, r in enumerate(records) if r['ned'] is not None),
+                   key=lambda i: (-records[i]['ned'], records[i]['conf']))
+    with open(paths['scores.tsv'], 'w', encoding='utf-8') as f:
+        f.write('image_path\tlabel\tpred\tconf\tned\n')
+        for i in order:
+            r = records[i]
+            f.write(f"{r['image_path']}\t{r['label']}\t{r['pred']}\t{r['conf']:.4f}\t{r['ned']:.4f}\n")
+    return paths, len(weighted)
+
+
+def mine(label_file, rec_model_dir, char_dict_path, output_dir, min_confidence=0.9, easy_ratio=0.2,
+         hard_weight=2, batch_size=64, cpu_threads=10, limit=None, seed=2025, image_shape=REC_IMAGE_SHAPE):
+    lines = read_label_lines(label_file)[:limit]
+    predictor = create_stage_predictor('rec', rec_model_dir, 'cpu', cpu_threads)
+    fixed_width = predictor.fixed_input_width()
+    if fixed_width and fixed_width != image_shape[2]:
+        raise ValueError(f"{rec_model_dir} was exported at width {fixed_width}, the training input is {image_shape}")
+    recognizer = training_view_recognizer(lambda batch: predictor.run(batch)[0], BatchCTCDecoder(char_dict_path),
+                                          image_shape, batch_size)
+    logging.info(f"Scoring {len(lines)} lines of {label_file} with {rec_model_dir} at the training input {list(image_shape)}")
+    start = time.perf_counter()
+    records = score_lines(lines, recognizer, batch_size)
+    elapsed = time.perf_counter() - start
+
+    hard, easy = split_hard(records, min_confidence)
+    paths, weighted_lines = write_mined_lists(records, lines, hard, easy, output_dir, easy_ratio, hard_weight, seed)
+    scored = len(hard) + len(easy)
+    misread = sum(records[i]['ned'] > 0 for i in hard)
+    per_epoch = len(hard) + round(len(easy) * easy_ratio)
+    summary = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'label_file': os.path.abspath(label_file),
+        'rec_model_dir': os.path.abspath(rec_model_dir),
+        'image_shape': list(image_shape),
+        'lines': len(lines), 'unreadable': len(lines) - scored,
+        'hard': len(hard), 'misread': misread, 'low_confidence': len(hard) - misread, 'easy': len(easy),
+        'train_acc': round(1 - misread / max(1, scored), 5),
+        'min_confidence': min_confidence, 'easy_ratio': easy_ratio, 'hard_weight': hard_weight,
+        'ratio_list_lines_per_epoch': per_epoch, 'weighted_lines': weighted_lines,
+        'scoring_seconds': round(elapsed, 1), 'lines_per_sec': round(len(lines) / max(elapsed, 1e-9), 1),
+        'overrides': [f"Train.dataset.label_file_list=['{paths['hard.txt']}','{paths['easy.txt']}']",
+                      f"Train.dataset.ratio_list=[1.0,{easy_ratio}]"],
+        **{name.replace('.', '_'): path for name, path in paths.items()},
+    }
+    with open(os.path.join(output_dir, 'mining.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+    logging.info(f"Scored {scored} lines in {elapsed:.1f} s ({summary['lines_per_sec']:.0f} lines/s), "
+                 f"{summary['unreadable']} unreadable. Train accuracy {summary['train_acc']:.4f}.")
+    logging.info(f"Hard: {len(hard)} ({misread} misread, {len(hard) - misread} below confidence {min_confidence}); easy: {len(easy)}.")
+    logging.info(f"An epoch over hard.txt + {easy_ratio:.0%} of easy.txt is {per_epoch} lines "
+                 f"({per_epoch / max(1, scored):.1%} of the full list). Train with:")
+    for override in summary['overrides']:
+        logging.info(f"  -o {override}")
+    logging.info(f"or the single weighted list ({weighted_lines} lines): {paths['weighted.txt']}")
+    return summary
+
+
+LOG_TIME = re.compile(r'^\[(\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2})\]')
+LOG_STEP = re.compile(r'epoch: \[(\d+)/\d+\], global_step: (\d+),.*?avg_samples: ([\d.]+)')
+LOG_METRIC = re.compile(r'cur metric, (.*)')
+
+
+def parse_train_log(log_path):
+    """
+    Evaluations from a PaddleOCR train.log: one dict per 'cur metric' line with the epoch,
+    global step, samples trained so far (summed from the step lines) and wall time since the
+    first logged line. A log appended to by resumed runs reads as one continuous run.
+    """
+    evals, samples, last_step, epoch, step, first_time = [], 0.0, 0, 0, 0, None
+    with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = LOG_TIME.match(line)
+            now = datetime.datetime.strptime(match.group(1), '%Y/%m/%d %H:%M:%S') if match else None
+            if now and first_time is None:
+                first_time = now
+            match = LOG_STEP.search(line)
+            if match:
+                epoch, step = int(match.group(1)), int(match.group(2))
+                # avg_samples is per step, averaged over the print_batch_step steps since the last line
+                samples += float(match.group(3)) * max(0, step - last_step)
+                last_step = step
+                continue
+            match = LOG_METRIC.search(line)
+            if match:
+                metric = {}
+                for item in match.group(1).split(', '):
+                    key, _, value = item.partition(': ')
+                    try:
+                        metric[key.strip()] = float(value)
+                    except ValueError:
+                        pass
+                evals.append({'epoch': epoch, 'global_step': step, 'samples': samples,
+                              'hours': (now - first_time).total_seconds() / 3600 if now and first_time else None,
+                              **metric})
+    return evals
+
+
+def epochs_to_target(evals, target, full_set_lines, indicator='acc'):
+    """First evaluation reaching target: its epoch, full-set-equivalent epochs (samples / full set size) and hours."""
+    for e in evals:
+        if e.get(indicator, float('-inf')) >= target:
+            return {'epoch': e['epoch'], 'full_set_epochs': round(e['samples'] / full_set_lines, 2),
+                    'samples': int(e['samples']), 'hours': round(e['hours'], 2) if e['hours'] is not None else None,
+                    indicator: e[indicator]}
+    best = max((e.get(indicator, float('-inf')) for e in evals), default=None)
+    return {'epoch': None, 'best': best}
+
+
+def report(baseline_log, mined_logs, target, full_set_lines, indicator='acc'):
+    rows = {'baseline': epochs_to_target(parse_train_log(baseline_log), target, full_set_lines, indicator)}
+    for log in mined_logs:
+        rows[log] = epochs_to_target(parse_train_log(log), target, full_set_lines, indicator)
+    logging.info(f"Reaching {indicator} >= {target} (full set: {full_set_lines} lines):")
+    for name, row in rows.items():
+        if row['epoch'] is None:
+            logging.info(f"  {name}: not reached (best {row['best']})")
+        else:
+            logging.info(f"  {name}: epoch {row['epoch']}, {row['full_set_epochs']} full-set epochs of samples, "
+                         f"{row['hours']} h")
+    base = rows['baseline']
+    if base['epoch'] is not None:
+        for name, row in list(rows.items())[1:]:
+            if row['epoch'] is not None:
+                logging.info(f"  {name}: {row['full_set_epochs'] / base['full_set_epochs']:.2f}x the baseline's training samples")
+    return rows
+
+
+def latest_checkpoint(save_model_dir):
+    for prefix in ('latest', 'best_accuracy'):
+        if os.path.exists(os.path.join(save_model_dir, prefix + '.pdparams')):
+            return os.path.join(save_model_dir, prefix)
+    return None
+
+
+def mining_loop(config_path, paddleocr_dir, rounds, epochs_per_round, output_dir, min_confidence, easy_ratio,
+                batch_size, cpu_threads, extra_opts=()):
+    """
+    Alternates mining and training: export the latest checkpoint, mine the train list with it,
+    then resume tools/train.py for epochs_per_round more epochs on hard.txt + the easy sample.
+    The first round mines with Global.pretrained_model. Runs from the PaddleOCR repo root, like
+    run_finetuning_pipeline.sh, so relative save_model_dir paths resolve the same way.
+    """
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    paddleocr_dir = os.path.abspath(paddleocr_dir)
+    save_model_dir = os.path.join(paddleocr_dir, config['Global']['save_model_dir'])
+    label_file = config['Train']['dataset']['label_file_list'][0]
+    char_dict_path = config['Global']['character_dict_path']
+    summaries = []
+
+    for round_index in range(rounds):
+        round_dir = os.path.abspath(os.path.join(output_dir, f"round_{round_index:02d}"))
+        checkpoint = latest_checkpoint(save_model_dir) or config['Global']['pretrained_model']
+        infer_dir = os.path.join(round_dir, 'inference')
+        logging.info(f"Round {round_index}: exporting {checkpoint}")
+        subprocess.run([sys.executable, 'tools/export_model.py', '-c', config_path,
+                        '-o', f'Global.pretrained_model={checkpoint}', f'Global.save_inference_dir={infer_dir}'],
+                       cwd=paddleocr_dir, check=True)
+
+        summary = mine(label_file, infer_dir, char_dict_path, round_dir, min_confidence, easy_ratio,
+                       batch_size=batch_size, cpu_threads=cpu_threads, image_shape=train_image_shape(config))
+        summaries.append(summary)
+
+        resume = latest_checkpoint(save_model_dir)
+        opts = summary['overrides'] + [f"Global.epoch_num={(round_index + 1) * epochs_per_round}"]
+        if resume:
+            opts.append(f"Global.checkpoints={resume}")
+        logging.info(f"Round {round_index}: training to epoch {(round_index + 1) * epochs_per_round}")
+        subprocess.run([sys.executable, 'tools/train.py', '-c', config_path, '-o', *opts, *extra_opts],
+                       cwd=paddleocr_dir, check=True)
+
+    with open(os.path.join(output_dir, 'loop.json'), 'w', encoding='utf-8') as f:
+        json.dump({'rounds': summaries, 'train_log': os.path.join(save_model_dir, 'train.log')}, f, indent=2)
+    logging.info(f"Training log for `report --mined_log`: {os.path.join(save_model_dir, 'train.log')}")
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mine hard training lines with the current recognition model and train on them.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    mine_parser = subparsers.add_parser("mine", help="Score the train list with an exported model and write hard/easy lists.")
+    mine_parser.add_argument("label_file", nargs='?', default="/home/jupyter/PaddleOCR_Training/ocr_output/rec_gt_train.txt", help="Training label file (default: ocr_output/rec_gt_train.txt)")
+    mine_parser.add_argument("--rec_model_dir", required=True, help="Exported recognition inference model (tools/export_model.py output).")
+    mine_parser.add_argument("--rec_char_dict_path", default="/home/jupyter/PaddleOCR_Training/ocr_output/custom_char_dict.txt", help="Character dictionary of the recognition model.")
+    mine_parser.add_argument("--output_dir", default="/home/jupyter/PaddleOCR_Training/ocr_output/mined", help="Where the mined lists go (default: ocr_output/mined)")
+    mine_parser.add_argument("--limit", type=int, default=None, help="Only score the first N lines.")
+    mine_parser.add_argument("--rec_image_shape", default="3,48,320", help="Train.dataset SVTRRecResizeImg image_shape the model is trained at (default: 3,48,320)")
+
+    loop_parser = subparsers.add_parser("loop", help="Alternate export, mining and tools/train.py rounds.")
+    loop_parser.add_argument("-c", "--config", default="/home/jupyter/PaddleOCR/configs/rec/my_config_rec_ppocrv4_finetune.yml", help="PaddleOCR training config")
+    loop_parser.add_argument("--paddleocr_dir", default=os.environ.get("PADDLE_OCR_REPO_PATH", "/home/jupyter/PaddleOCR"), help="Cloned PaddleOCR repo (default: $PADDLE_OCR_REPO_PATH or /home/jupyter/PaddleOCR)")
+    loop_parser.add_argument("--rounds", type=int, default=5, help="Mining rounds (default: 5)")
+    loop_parser.add_argument("--epochs_per_round", type=int, default=5, help="Training epochs between minings (default: 5)")
+    loop_parser.add_argument("--output_dir", default="/home/jupyter/PaddleOCR_Training/ocr_output/mined", help="Per-round mined lists and exports (default: ocr_output/mined)")
+    loop_parser.add_argument("-o", "--opt", nargs='+', default=[], help="Extra tools/train.py overrides.")
+
+    for sub in (mine_parser, loop_parser):
+        sub.add_argument("--min_confidence", type=float, default=0.9, help="Correct lines below this CTC confidence also count as hard (default: 0.9)")
+        sub.add_argument("--easy_ratio", type=float, default=0.2, help="Fraction of easy lines kept per epoch (default: 0.2)")
+        sub.add_argument("--batch_size", type=int, default=64, help="Recognition batch size for scoring (default: 64)")
+        sub.add_argument("--cpu_threads", type=int, default=10, help="CPU math library threads (default: 10)")
+    mine_parser.add_argument("--hard_weight", type=int, default=2, help="Repeats of each hard line in weighted.txt (default: 2)")
+
+    report_parser = subparsers.add_parser("report", help="Epochs to a target accuracy: mined runs against the full-set baseline.")
+    report_parser.add_argument("--baseline_log", required=True, help="train.log of a run on the full rec_gt_train.txt")
+    report_parser.add_argument("--mined_log", nargs='+', required=True, help="train.log of one or more mined runs")
+    report_parser.add_argument("--target_acc", type=float, required=True, help="Target value of the main indicator")
+    report_parser.add_argument("--indicator", default="acc", help="Metric to compare (default: acc)")
+    report_parser.add_argument("--full_set_label_file", default="/home/jupyter/PaddleOCR_Training/ocr_output/rec_gt_train.txt", help="Full training list, for full-set-equivalent epochs.")
+    report_parser.add_argument("--output", default=None, help="Write the comparison to this JSON file.")
+    args = parser.parse_args()
+
+    if args.command == "mine":
+        mine(args.label_file, args.rec_model_dir, args.rec_char_dict_path, args.output_dir, args.min_confidence,
+             args.easy_ratio, args.hard_weight, args.batch_size, args.cpu_threads, args.limit,
+             image_shape=tuple(int(v) for v in args.rec_image_shape.split(',')))
+    elif args.command == "loop":
+        mining_loop(args.config, args.paddleocr_dir, args.rounds, args.epochs_per_round, args.output_dir,
+                    args.min_confidence, args.easy_ratio, args.batch_size, args.cpu_threads, args.opt)
+    else:
+        rows = report(args.baseline_log, args.mined_log, args.target_acc,
+                      len(read_label_lines(args.full_set_label_file)), args.indicator)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(rows, f, indent=2)
+            logging.info(f"Results written to {args.output}")
@@ -0,0 +1,253 @@
+# scripts/ocrprep.py
+#
+# One entry point for the data-prep helpers. Each subcommand imports its helper module (and so
+# pandas, sklearn, bs4, ...) only when it runs, and several subcommands joined with `+` run in
+# one process, paying the interpreter start and every import once:
+#   python scripts/ocrprep.py max-length ocr_output/line_labels.csv + char-dict ocr_output/line_labels.csv ocr_output/custom_char_dict.txt \
+#       + convert ocr_output/line_labels.csv ocr_output --char_dict ocr_output/custom_char_dict.txt --max_text_length 128
+#   for i in 0 1 2 3; do python scripts/ocrprep.py preprocess <pages> <hocr> ocr_output/line_labels.csv --shard $i/4 & done; wait
+#   python scripts/ocrprep.py merge-shards ocr_output/line_labels.csv ocr_output/line_labels.shard-*.manifest.json
+#   python scripts/ocrprep.py bench-startup --csv ocr_output/line_labels.csv --output ocrprep_startup.jsonl
+
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import importlib
+import statistics
+import subprocess
+import tempfile
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# data_preprocess.py sits one level up, next to the shell scripts
+sys.path[:0] = [SCRIPTS_DIR, os.path.dirname(SCRIPTS_DIR)]
+
+CHAIN_SEPARATOR = '+'
+
+
+def run_preprocess(args):
+    module = importlib.import_module('data_preprocess')
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_csv)), exist_ok=True)
+    shard = module.parse_shard(args.shard) if args.shard else None
+    return module.create_line_labels_csv(args.image_directory, args.hocr_directory, args.output_csv, args.workers, shard)
+
+
+def run_merge_shards(args):
+    module = importlib.import_module('data_preprocess')
+    return module.merge_line_label_shards(args.manifests, args.output_csv, args.relocate_dir)
+
+
+def run_dedup(args):
+    module = importlib.import_module('dedup_lines')
+    return module.dedup_line_labels(args.input_csv, args.output_csv, args.max_per_group, args.max_distance, args.workers,
+                                    args.samples_per_sec, args.epochs)
+
+
+def run_max_length(args):
+    module = importlib.import_module('get_max_length')
+    max_length = module.get_max_text_length(args.csv_file)
+    if max_length < 0:
+        return False
+    print(max_length)
+    return True
+
+
+def run_diagnose_chars(args):
+    module = importlib.import_module('diagnose_chars')
+    module.check_csv_chars(args.csv_file)
+    return True
+
+
+def run_char_dict(args):
+    module = importlib.import_module('generate_char_dict')
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_dict_file)), exist_ok=True)
+    return module.generate_dictionary(args.csv_file, args.output_dict_file)
+
+
+def run_convert(args):
+    module = importlib.import_module('convert_csv_to_paddle_labels')
+    os.makedirs(args.output_dir, exist_ok=True)
+    return module.convert_labels(args.csv_file, args.output_dir, args.train_ratio, args.char_dict, args.max_text_length)
+
+
+# subcommand -> the helper module it imports, for the startup benchmark
+SUBCOMMAND_MODULES = {
+    'preprocess': 'data_preprocess',
+    'merge-shards': 'data_preprocess',
+    'dedup': 'dedup_lines',
+    'max-length': 'get_max_length',
+    'diagnose-chars': 'diagnose_chars',
+    'char-dict': 'generate_char_dict',
+    'convert': 'convert_csv_to_paddle_labels',
+}
+
+
+def _timed_run(cmd, repeats):
+    """Median wall seconds of running cmd to completion (output discarded)."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def import_profile(module, top=5):
+    """
+    `python -X importtime` of one helper module: its cumulative import seconds and the slowest
+    packages it imports directly.
+    """
+    code = f"import sys; sys.path[:0] = {[SCRIPTS_DIR, os.path.dirname(SCRIPTS_DIR)]!r}; import {module}"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+    total, children, pending = 0.0, {}, {}
+    # a module's line comes after the lines of everything it imported, one indent level deeper
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, field = line[len('import time:'):].split('|')
+        name = field.strip()
+        depth = (len(field) - len(field.lstrip()) - 1) // 2
+        if depth == 1:
+            pending[name] = int(cumulative) / 1e6
+        elif depth == 0:
+            if name == module:
+                total, children = int(cumulative) / 1e6, pending
+            pending = {}
+    slowest = sorted(children.items(), key=lambda p: -p[1])[:top]
+    return {'seconds': round(total, 4), 'slowest': {name: round(sec, 4) for name, sec in slowest}}
+
+
+def bench_startup(csv_file=None, repeats=5, output=None):
+    """
+    Startup costs: a bare interpreter, `ocrprep --help` (no helper imported), each subcommand's
+    import time, and, given a line_labels CSV, the old one-process-per-script sequence
+    (max length, diagnose, dict, convert) against the same four steps chained in one ocrprep process.
+    Results are printed and, with output, appended as one JSON line so runs can be compared over time.
+    """
+    this = os.path.abspath(__file__)
+    result = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'interpreter_seconds': round(_timed_run([sys.executable, '-c', 'pass'], repeats), 4),
+        'ocrprep_help_seconds': round(_timed_run([sys.executable, this, '--help'], repeats), 4),
+        'imports': {name: import_profile(module) for name, module in SUBCOMMAND_MODULES.items()},
+    }
+    print(f"Interpreter start: {result['interpreter_seconds'] * 1000:.0f} ms; ocrprep --help: {result['ocrprep_help_seconds'] * 1000:.0f} ms")
+    for name, profile in result['imports'].items():
+        slowest = ', '.join(f"{pkg} {sec * 1000:.0f} ms" for pkg, sec in profile['slowest'].items())
+        print(f"  {name:>15}: imports {profile['seconds'] * 1000:6.0f} ms  ({slowest})")
+
+    if csv_file:
+        with tempfile.TemporaryDirectory() as out_dir:
+            dict_path = os.path.join(out_dir, 'custom_char_dict.txt')
+            steps = [['get_max_length.py', 'max-length', csv_file],
+                     ['diagnose_chars.py', 'diagnose-chars', csv_file],
+                     ['generate_char_dict.py', 'char-dict', csv_file, dict_path],
+                     ['convert_csv_to_paddle_labels.py', 'convert', csv_file, out_dir, '--char_dict', dict_path]]
+            separate = 0.0
+            for script, _, *script_args in steps:
+                separate += _timed_run([sys.executable, os.path.join(SCRIPTS_DIR, script), *script_args], repeats)
+            chain = []
+            for _, subcommand, *script_args in steps:
+                chain += [CHAIN_SEPARATOR, subcommand, *script_args]
+            chained = _timed_run([sys.executable, this, *chain[1:]], repeats)
+        result['pipeline'] = {'csv': os.path.abspath(csv_file), 'separate_processes_seconds': round(separate, 3),
+                              'ocrprep_chain_seconds': round(chained, 3)}
+        print(f"max-length + diagnose-chars + char-dict + convert on {csv_file}: "
+              f"{separate:.2f} s as 4 processes, {chained:.2f} s chained in one ocrprep process "
+              f"({separate / chained:.1f}x)")
+
+    if output:
+        with open(output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+        print(f"Results appended to {output}")
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ocrprep', description=f"Data-prep helpers in one command. Join subcommands with '{CHAIN_SEPARATOR}' to run them in one process.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sub = subparsers.add_parser("preprocess", help="HOCR + page images to line crops and line_labels.csv (data_preprocess.py)")
+    sub.add_argument("image_directory", help="Directory containing the original full-page image files.")
+    sub.add_argument("hocr_directory", help="Directory containing the HOCR files.")
+    sub.add_argument("output_csv", help="Path to save the output CSV file.")
+    sub.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to CPU count if None.")
+    sub.add_argument("--shard", default=None, help="Only pages hashed to shard i of N (i/N); writes a shard CSV and manifest next to output_csv.")
+    sub.set_defaults(run=run_preprocess)
+
+    sub = subparsers.add_parser("merge-shards", help="Check and combine preprocess --shard outputs into one line_labels.csv")
+    sub.add_argument("output_csv", help="Merged labels CSV, ordered as an unsharded run would write it.")
+    sub.add_argument("manifests", nargs='+', help="The .manifest.json of every shard")
+    sub.add_argument("--relocate_dir", default=None, help="Folder the crops of all shards were gathered into; image paths are rewritten to it.")
+    sub.set_defaults(run=run_merge_shards)
+
+    sub = subparsers.add_parser("dedup", help="Cap near-duplicate lines before the split (dedup_lines.py)")
+    sub.add_argument("input_csv", help="line_labels.csv from preprocess")
+    sub.add_argument("output_csv", help="Deduplicated CSV with a dup_group column")
+    sub.add_argument("--max_per_group", type=int, default=3, help="Lines kept per near-duplicate group (default: 3)")
+    sub.add_argument("--max_distance", type=int, default=6, help="Max differing dHash bits (of 64) (default: 6)")
+    sub.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to CPU count if None.")
+    sub.add_argument("--samples_per_sec", type=float, default=None, help="Training throughput, to report epoch-seconds saved.")
+    sub.add_argument("--epochs", type=int, default=100, help="Epochs to total the saving over (default: 100)")
+    sub.set_defaults(run=run_dedup)
+
+    sub = subparsers.add_parser("max-length", help="Print the longest text in the CSV (get_max_length.py)")
+    sub.add_argument("csv_file", help="Path to the input CSV file.")
+    sub.set_defaults(run=run_max_length)
+
+    sub = subparsers.add_parser("diagnose-chars", help="Print every character in the text column (diagnose_chars.py)")
+    sub.add_argument("csv_file", help="Path to the input CSV file.")
+    sub.set_defaults(run=run_diagnose_chars)
+
+    sub = subparsers.add_parser("char-dict", help="Write a character dictionary from the CSV (generate_char_dict.py)")
+    sub.add_argument("csv_file", help="Path to the input CSV file.")
+    sub.add_argument("output_dict_file", help="Path to save the generated character dictionary.")
+    sub.set_defaults(run=run_char_dict)
+
+    sub = subparsers.add_parser("convert", help="CSV to rec_gt_train.txt / rec_gt_eval.txt (convert_csv_to_paddle_labels.py)")
+    sub.add_argument("csv_file", help="Path to the input CSV file.")
+    sub.add_argument("output_dir", help="Directory to save rec_gt_train.txt and rec_gt_eval.txt.")
+    sub.add_argument("--train_ratio", type=float, default=0.9, help="Ratio for training (default: 0.9)")
+    sub.add_argument("--char_dict", type=str, default=None, help="Path to character dictionary for filtering.")
+    sub.add_argument("--max_text_length", type=int, default=None, help="Maximum allowed text length for filtering (default: None, no filtering).")
+    sub.set_defaults(run=run_convert)
+
+    sub = subparsers.add_parser("bench-startup", help="Measure interpreter and import costs of the subcommands")
+    sub.add_argument("--csv", default=None, help="line_labels.csv to also time the separate-script sequence against one chained ocrprep run.")
+    sub.add_argument("--repeats", type=int, default=5, help="Runs per measurement, median reported (default: 5)")
+    sub.add_argument("--output", default=None, help="Append the results as a JSON line to this file.")
+    sub.set_defaults(run=lambda args: bool(bench_startup(args.csv, args.repeats, args.output)))
+    return parser
+
+
+def split_chain(argv):
+    chain, current = [], []
+    for arg in argv:
+        if arg == CHAIN_SEPARATOR:
+            chain.append(current)
+            current = []
+        else:
+            current.append(arg)
+    chain.append(current)
+    return [segment for segment in chain if segment]
+
+
+def main(argv=None):
+    parser = build_parser()
+    # parse every segment first, so a typo in the last one fails before the first has run
+    commands = [parser.parse_args(segment) for segment in split_chain(sys.argv[1:] if argv is None else argv)]
+    if not commands:
+        parser.print_help()
+        return 1
+    for args in commands:
+        if not args.run(args):
+            print(f"ocrprep: {args.command} failed.", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+# scripts/profile_dataloader.py
+#
+# Measures how fast the configured Train.dataset transforms can feed the trainer, without
+# building the model (runs on a CPU-only machine): samples/s per transform, then a sweep over
+# loader worker counts with the knee point.
+#   python scripts/profile_dataloader.py --config config/rec/my_config_rec_ppocrv4_finetune.yml --step_ms 180
+
+import os
+import sys
+import copy
+import json
+import time
+import random
+import argparse
+import logging
+from multiprocessing import Pool
+
+import numpy as np
+import yaml
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+_worker_ops = None
+
+
+def import_ppocr_transforms(paddleocr_dir=None):
+    """create_operators / transform from the cloned PaddleOCR repo (what training runs), else from the paddleocr package."""
+    if paddleocr_dir and os.path.isdir(paddleocr_dir):
+        sys.path.insert(0, os.path.abspath(paddleocr_dir))
+    try:
+        from ppocr.data.imaug import create_operators, transform
+    except ImportError:
+        import paddleocr  # noqa: F401  (puts ppocr on sys.path)
+        from ppocr.data.imaug import create_operators, transform
+    return create_operators, transform
+
+
+def apply_overrides(config, overrides):
+    """PaddleOCR-style -o Key.sub=value overrides (values parsed as YAML)."""
+    for item in overrides or []:
+        key, _, value = item.partition('=')
+        node = config
+        parts = key.split('.')
+        for part in parts[:-1]:
+            node = node[part]
+        node[parts[-1]] = yaml.safe_load(value)
+    return config
+
+
+def build_ops(config, mode, paddleocr_dir=None):
+    create_operators, _ = import_ppocr_transforms(paddleocr_dir)
+    # create_operators merges Global into each op's params in place, so give it a copy
+    return create_operators(copy.deepcopy(config[mode]['dataset']['transforms']), copy.deepcopy(config['Global']))
+
+
+def read_samples(config, mode, limit, seed=0):
+    dataset = config[mode]['dataset']
+    delimiter = dataset.get('delimiter', '\t')
+    samples = []
+    for label_file in dataset['label_file_list']:
+        with open(label_file, 'rb') as f:
+            for line in f:
+                parts = line.decode('utf-8').strip('\n').split(delimiter)
+                if len(parts) >= 2:
+                    samples.append((os.path.join(dataset.get('data_dir', ''), parts[0]), parts[1]))
+    random.Random(seed).shuffle(samples)
+    return samples[:limit] if limit else samples
+
+
+def profile_transforms(ops, samples):
+    """
+    Runs every sample through the ops one at a time.
+    Returns {stage: total seconds}, the number of images actually read and how many of them the ops kept.
+    """
+    totals = {'read': 0.0}
+    for op in ops:
+        totals.setdefault(type(op).__name__, 0.0)
+    read, kept = 0, 0
+    for image_path, label in samples:
+        start = time.perf_counter()
+        try:
+            with open(image_path, 'rb') as f:
+                data = {'img_path': image_path, 'label': label, 'image': f.read()}
+        except OSError:
+            continue
+        totals['read'] += time.perf_counter() - start
+        read += 1
+        for op in ops:
+            start = time.perf_counter()
+            data = op(data)
+            totals[type(op).__name__] += time.perf_counter() - start
+            if data is None:
+                break
+        else:
+            kept += 1
+    return totals, read, kept
+
+
+def _init_worker(config, mode, paddleocr_dir):
+    global _worker_ops
+    _worker_ops = build_ops(config, mode, paddleocr_dir)
+
+
+def _load_batch(batch):
+    """One loader batch, as a DataLoader worker produces it: read, transform, collate."""
+    from ppocr.data.imaug import transform
+
+    outs = []
+    for image_path, label in batch:
+        try:
+            with open(image_path, 'rb') as f:
+                data = {'img_path': image_path, 'label': label, 'image': f.read()}
+        except OSError:
+            continue
+        out = transform(data, _worker_ops)
+        if out is not None:
+            outs.append(out)
+    if not outs:
+        return 0
+    for column in zip(*outs):
+        np.stack(column)  # the default collate
+    return len(outs)
+
+
+def measure_workers(config, mode, samples, batch_size, num_workers, paddleocr_dir=None):
+    """Samples/s with num_workers processes producing batches (0 = in the main process, like the loader)."""
+    batches = [samples[beg:beg + batch_size] for beg in range(0, len(samples), batch_size)]
+    if num_workers == 0:
+        _init_worker(config, mode, paddleocr_dir)
+        _load_batch(batches[0])  # warm-up
+        start = time.perf_counter()
+        produced = sum(_load_batch(batch) for batch in batches)
+        return produced / (time.perf_counter() - start)
+    pool = Pool(num_workers, initializer=_init_worker, initargs=(config, mode, paddleocr_dir))
+    try:
+        pool.map(_load_batch, batches[:num_workers], chunksize=1)  # workers started and warmed up
+        start = time.perf_counter()
+        produced = sum(pool.imap_unordered(_load_batch, batches, chunksize=1))
+        return produced / (time.perf_counter() - start)
+    finally:
+        # close + join rather than the context manager's terminate(): paddle's signal
+        # handler in the workers reports SIGTERM as a fatal error
+        pool.close()
+        pool.join()
+
+
+def find_knee(throughputs, fraction=0.9):
+    """Smallest worker count reaching `fraction` of the best measured throughput."""
+    best = max(throughputs.values())
+    return min(n for n, rate in throughputs.items() if rate >= fraction * best)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the training data pipeline: per-transform throughput and a loader worker sweep (no model, CPU only).")
+    parser.add_argument("--config", default="/home/jupyter/PaddleOCR_Training/config/rec/my_config_rec_ppocrv4_finetune.yml", help="PaddleOCR training config")
+    parser.add_argument("-o", "--opt", nargs='+', default=None, help="Config overrides, e.g. Global.character_dict_path=/path/dict.txt")
+    parser.add_argument("--mode", default="Train", choices=['Train', 'Eval'], help="Dataset section to profile (default: Train)")
+    parser.add_argument("--samples", type=int, default=2000, help="Random label lines to use (default: 2000)")
+    parser.add_argument("--workers", default=None, help="Comma-separated worker counts to sweep (default: 0,1,2,4,... up to the core count, plus the configured value)")
+    parser.add_argument("--step_ms", type=float, default=None, help="Measured trainer step time in ms, to tell whether the loader keeps up.")
+    parser.add_argument("--paddleocr_dir", default="/home/jupyter/PaddleOCR", help="Cloned PaddleOCR repo (the paddleocr package is used if missing).")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')  # the transforms never need a GPU
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = apply_overrides(yaml.safe_load(f), args.opt)
+    loader_config = config[args.mode]['loader']
+    batch_size = loader_config['batch_size_per_card']
+    configured_workers = loader_config.get('num_workers', 0)
+
+    samples = read_samples(config, args.mode, args.samples)
+    if not samples:
+        logging.error("No label lines found in the configured label_file_list.")
+        exit(1)
+    logging.info(f"Profiling {args.mode}.dataset transforms on {len(samples)} lines (batch size {batch_size}, configured num_workers {configured_workers})")
+
+    totals, read, kept = profile_transforms(build_ops(config, args.mode, args.paddleocr_dir), samples)
+    if not read:
+        logging.error(f"None of the {len(samples)} sampled images could be read; check the dataset's data_dir and label paths.")
+        exit(1)
+    if read < len(samples):
+        logging.warning(f"{len(samples) - read} of {len(samples)} sampled images could not be read; figures are per image read.")
+    chain = sum(totals.values())
+    logging.info("Per-transform cost, one process:")
+    for name, seconds in totals.items():
+        logging.info(f"  {name:>18}: {seconds / read * 1000:7.3f} ms/sample  "
+                     f"{read / seconds if seconds else float('inf'):9.0f} samples/s  {seconds / chain if chain else 0.0:6.1%}")
+    logging.info(f"  {'whole chain':>18}: {chain / read * 1000:7.3f} ms/sample  {read / chain if chain else float('inf'):9.0f} samples/s "
+                 f"({read - kept} lines dropped by the transforms)")
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        worker_counts = sorted({int(n) for n in args.workers.split(',')})
+    else:
+        worker_counts, n = [0, 1], 2
+        while n <= cores:
+            worker_counts.append(n)
+            n *= 2
+        worker_counts = sorted(set(worker_counts + [cores, configured_workers]))
+    throughputs = {}
+    for n in worker_counts:
+        throughputs[n] = measure_workers(config, args.mode, samples, batch_size, n, args.paddleocr_dir)
+        logging.info(f"  num_workers={n:<3} {throughputs[n]:9.0f} samples/s  {throughputs[n] / batch_size:7.1f} batches/s")
+
+    knee = find_knee(throughputs)
+    logging.info(f"Knee: {knee} workers reach 90% of the best throughput ({max(throughputs.values()):.0f} samples/s) on {cores} cores.")
+    if configured_workers in throughputs:
+        logging.info(f"Configured num_workers={configured_workers}: {throughputs[configured_workers]:.0f} samples/s.")
+    verdict = None
+    if args.step_ms:
+        needed = batch_size / (args.step_ms / 1000.0)
+        rate = throughputs.get(configured_workers, max(throughputs.values()))
+        verdict = 'starved' if rate < needed else 'keeps up'
+        logging.info(f"The trainer consumes {needed:.0f} samples/s at {args.step_ms} ms/step: the loader {verdict} "
+                     f"({rate / needed:.2f}x of what the trainer needs).")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': os.path.abspath(args.config), 'mode': args.mode, 'samples': len(samples), 'samples_read': read,
+                       'batch_size': batch_size, 'cores': cores,
+                       'transform_ms_per_sample': {k: v / read * 1000 for k, v in totals.items()},
+                       'workers_samples_per_sec': throughputs, 'knee_workers': knee, 'verdict': verdict}, f, indent=2)
+        logging.info(f"Results written to {args.output}")
@@ -0,0 +1,328 @@
+# scripts/rec_eval_metrics.py
+#
+# Scores recognition output against a label file: CER, WER, exact match, a per-character
+# confusion matrix over custom_char_dict.txt and breakdowns by text length, computed in
+# parallel batches. Predictions use the label-file format (image_path<TAB>text):
+#   python scripts/rec_eval_metrics.py predictions.txt ocr_output/rec_gt_eval.txt --output rec_eval_metrics.json
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inference'))
+from ctc_decoder import load_char_dict  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+try:
+    from rapidfuzz.distance import Levenshtein
+    from rapidfuzz.process import cpdist
+    HAVE_RAPIDFUZZ = True
+except ImportError:
+    HAVE_RAPIDFUZZ = False
+    logging.info("rapidfuzz not installed; using the numpy edit distance and Python alignment.")
+
+# Upper bounds (inclusive) of the reference-length buckets; the last bucket is open-ended.
+LENGTH_BUCKETS = (5, 10, 20, 40, 80)
+DP_BATCH = 256
+
+
+def bucket_names(bounds=LENGTH_BUCKETS):
+    names, low = [], 0
+    for high in bounds:
+        names.append(f"{low}-{high}")
+        low = high + 1
+    names.append(f"{low}+")
+    return names
+
+
+def _encode(sequences, pad):
+    """Sequences of ints -> [n, max_len] int64 array padded with `pad`, plus lengths."""
+    lengths = np.array([len(s) for s in sequences], dtype=np.int64)
+    out = np.full((len(sequences), max(1, int(lengths.max(initial=0)))), pad, dtype=np.int64)
+    for row, s in enumerate(sequences):
+        out[row, :len(s)] = s
+    return out, lengths
+
+
+def levenshtein_batch(refs, hyps):
+    """
+    Edit distances of many (ref, hyp) pairs at once; refs/hyps are sequences of ints.
+
+    One DP row per reference position for the whole batch: the substitution/deletion terms
+    are elementwise, and the insertion chain new[j] = min(tmp[j], new[j-1] + 1) is
+    j + cummin(tmp[k] - k), i.e. one np.minimum.accumulate. Rows past a reference's own
+    length are frozen, so each pair reads its distance at (len(ref), len(hyp)).
+    """
+    if not refs:
+        return np.zeros(0, dtype=np.int64)
+    a, la = _encode(refs, -1)
+    b, lb = _encode(hyps, -2)  # different pads never match each other
+    n, width = len(refs), b.shape[1] + 1
+    cols = np.arange(width, dtype=np.int64)
+    prev = np.tile(cols, (n, 1))
+    tmp = np.empty_like(prev)
+    for i in range(1, a.shape[1] + 1):
+        cost = (a[:, i - 1, np.newaxis] != b).astype(np.int64)
+        tmp[:, 0] = i
+        np.minimum(prev[:, 1:] + 1, prev[:, :-1] + cost, out=tmp[:, 1:])
+        new = np.minimum.accumulate(tmp - cols, axis=1) + cols
+        prev = np.where((i <= la)[:, np.newaxis], new, prev)
+    return prev[np.arange(n), lb]
+
+
+def align(ref, hyp):
+    """Pure-Python Levenshtein alignment: list of (op, ref_pos, hyp_pos) like rapidfuzz's editops."""
+    rows, cols = len(ref) + 1, len(hyp) + 1
+    d = [[0] * cols for _ in range(rows)]
+    for i in range(rows):
+        d[i][0] = i
+    for j in range(cols):
+        d[0][j] = j
+    for i in range(1, rows):
+        for j in range(1, cols):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (ref[i - 1] != hyp[j - 1]))
+    ops, i, j = [], len(ref), len(hyp)
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and d[i][j] == d[i - 1][j - 1] + (ref[i - 1] != hyp[j - 1]):
+            if ref[i - 1] != hyp[j - 1]:
+                ops.append(('replace', i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif i > 0 and d[i][j] == d[i - 1][j] + 1:
+            ops.append(('delete', i - 1, j))
+            i -= 1
+        else:
+            ops.append(('insert', i, j - 1))
+            j -= 1
+    return ops[::-1]
+
+
+def code_points(texts):
+    """All texts as one uint32 array of code points (a single encode call) and the split offsets."""
+    cps = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32)
+    offsets = np.cumsum([len(t) for t in texts])[:-1]
+    return cps, offsets
+
+
+def _distances(refs, hyps):
+    """Edit distances of parallel lists of strings (or of word lists)."""
+    if HAVE_RAPIDFUZZ:
+        return cpdist(refs, hyps, scorer=Levenshtein.distance, workers=1).astype(np.int64)
+    if refs and isinstance(refs[0], list):
+        vocab = {}
+        refs = [[vocab.setdefault(w, len(vocab)) for w in r] for r in refs]
+        hyps = [[vocab.setdefault(w, len(vocab)) for w in h] for h in hyps]
+    else:
+        refs = np.split(*code_points(refs))
+        hyps = np.split(*code_points(hyps))
+    order = np.argsort([len(r) for r in refs])  # similar lengths per DP batch keep the padding small
+    out = np.zeros(len(refs), dtype=np.int64)
+    for beg in range(0, len(order), DP_BATCH):
+        idx = order[beg:beg + DP_BATCH]
+        out[idx] = levenshtein_batch([refs[i] for i in idx], [hyps[i] for i in idx])
+    return out
+
+
+class ScoreChunk:
+    """Picklable worker task: scores one chunk of pairs and returns additive counts."""
+
+    def __init__(self, characters, bounds, confusion):
+        self.size = len(characters) + 1  # dictionary indices, plus one slot for characters not in it
+        self.unknown = len(characters)
+        single = [(ord(c), i) for i, c in enumerate(characters) if len(c) == 1 and i > 0]
+        self.lut = np.full(max(cp for cp, _ in single) + 2, self.unknown, dtype=np.int64)
+        for cp, i in single:
+            self.lut[cp] = i
+        self.bounds = np.array(bounds)
+        self.confusion = confusion
+
+    def _indices(self, cps):
+        """Code points -> dictionary indices; everything beyond the table is unknown."""
+        return self.lut[np.minimum(cps, len(self.lut) - 1)]
+
+    def __call__(self, pairs):
+        refs = [r for r, _ in pairs]
+        hyps = [h for _, h in pairs]
+        char_dist = _distances(refs, hyps)
+        ref_words = [r.split() for r in refs]
+        word_dist = _distances(ref_words, [h.split() for h in hyps])
+
+        ref_len = np.array([len(r) for r in refs], dtype=np.int64)
+        exact = np.array([r == h for r, h in pairs], dtype=np.int64)
+        buckets = np.searchsorted(self.bounds, ref_len, side='left')
+        n_buckets = len(self.bounds) + 1
+        counts = {
+            'lines': len(pairs),
+            'char_errors': int(char_dist.sum()), 'chars': int(ref_len.sum()),
+            'word_errors': int(word_dist.sum()), 'words': sum(len(w) for w in ref_words),
+            'exact': int(exact.sum()),
+            'bucket_lines': np.bincount(buckets, minlength=n_buckets),
+            'bucket_char_errors': np.bincount(buckets, weights=char_dist, minlength=n_buckets),
+            'bucket_chars': np.bincount(buckets, weights=ref_len, minlength=n_buckets),
+            'bucket_exact': np.bincount(buckets, weights=exact, minlength=n_buckets),
+        }
+        if self.confusion:
+            counts['confusion'] = self._confusion(refs, hyps, char_dist)
+        return counts
+
+    def _confusion(self, refs, hyps, char_dist):
+        """
+        [ref char, hyp char] counts along one optimal alignment per line; row/column 0 (the CTC
+        blank slot) stands for a missing character. Every reference character starts on the
+        diagonal (one bincount); only the edit operations of lines with errors are walked.
+        """
+        size = self.size
+        ref_cps, ref_offsets = code_points(refs)
+        hyp_cps, hyp_offsets = code_points(hyps)
+        ref_idx, hyp_idx = self._indices(ref_cps), self._indices(hyp_cps)
+        ref_starts = np.concatenate([[0], ref_offsets]).astype(np.int64)
+        hyp_starts = np.concatenate([[0], hyp_offsets]).astype(np.int64)
+        flat = np.bincount(ref_idx * (size + 1), minlength=size * size)
+
+        cells, unmatched = [], []
+        for line in np.flatnonzero(char_dist):
+            ref, hyp = refs[line], hyps[line]
+            r0, h0 = int(ref_starts[line]), int(hyp_starts[line])
+            ops = Levenshtein.editops(ref, hyp).as_list() if HAVE_RAPIDFUZZ else align(ref, hyp)
+            for op, i, j in ops:
+                if op == 'replace':
+                    cells.append(ref_idx[r0 + i] * size + hyp_idx[h0 + j])
+                    unmatched.append(r0 + i)
+                elif op == 'delete':
+                    cells.append(ref_idx[r0 + i] * size)
+                    unmatched.append(r0 + i)
+                else:
+                    cells.append(hyp_idx[h0 + j])
+        if cells:
+            flat = flat + np.bincount(np.array(cells, dtype=np.int64), minlength=size * size)
+            flat = flat - np.bincount(ref_idx[np.array(unmatched, dtype=np.int64)] * (size + 1), minlength=size * size)
+        return flat.reshape(size, size)
+
+
+def score(refs, hyps, characters, workers=None, chunk_size=20000, bounds=LENGTH_BUCKETS,
+          confusion=True, ignore_space=False):
+    """
+    CER, WER, exact match and per-length-bucket figures for parallel lists of reference and
+    hypothesis strings, plus the character confusion matrix. Chunks are scored in worker
+    processes (workers=None: one per core, 1: in this process) and their counts summed.
+    ignore_space drops spaces from both sides first, as RecMetric does.
+    """
+    if ignore_space:
+        refs = [r.replace(" ", "") for r in refs]
+        hyps = [h.replace(" ", "") for h in hyps]
+    pairs = list(zip(refs, hyps))
+    chunks = [pairs[beg:beg + chunk_size] for beg in range(0, len(pairs), chunk_size)]
+    task = ScoreChunk(characters, bounds, confusion)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) <= 1:
+        parts = [task(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(task, chunks))
+
+    total = {}
+    for part in parts:
+        for key, value in part.items():
+            total[key] = total[key] + value if key in total else value
+    if not total:
+        raise ValueError("No pairs to score")
+
+    lines = total['lines']
+    report = {
+        'lines': lines,
+        'cer': total['char_errors'] / max(1, total['chars']),
+        'wer': total['word_errors'] / max(1, total['words']),
+        'exact_match': total['exact'] / lines,
+        'char_errors': total['char_errors'], 'chars': total['chars'],
+        'word_errors': total['word_errors'], 'words': total['words'],
+        'length_buckets': {
+            name: {'lines': int(n), 'cer': float(e / c) if c else 0.0, 'exact_match': float(x / n) if n else 0.0}
+            for name, n, e, c, x in zip(bucket_names(bounds), total['bucket_lines'], total['bucket_char_errors'],
+                                        total['bucket_chars'], total['bucket_exact'])
+        },
+    }
+    if confusion:
+        report['confusion'] = total['confusion']
+    return report
+
+
+def confusion_summary(matrix, characters, top=20):
+    """Per-character recall/precision and the most frequent confusions, with readable labels."""
+    labels = ['<none>'] + characters[1:] + ['<unknown>']
+    diag = np.diag(matrix)
+    ref_totals, hyp_totals = matrix.sum(axis=1), matrix.sum(axis=0)
+    per_char = {
+        labels[i]: {'count': int(ref_totals[i]), 'recall': float(diag[i] / ref_totals[i]),
+                    'precision': float(diag[i] / hyp_totals[i]) if hyp_totals[i] else 0.0}
+        for i in range(1, len(labels)) if ref_totals[i]
+    }
+    off = matrix.copy()
+    np.fill_diagonal(off, 0)
+    flat = np.argsort(off, axis=None)[::-1][:top]
+    confusions = [{'ref': labels[i], 'hyp': labels[j], 'count': int(off[i, j])}
+                  for i, j in zip(*np.unravel_index(flat, off.shape)) if off[i, j]]
+    return per_char, confusions
+
+
+def read_label_file(path):
+    entries = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            image_path, sep, text = line.rstrip('\n').partition('\t')
+            if sep:
+                entries[image_path] = text
+    return entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CER / WER / exact match / character confusion of recognition output against a label file.")
+    parser.add_argument("predictions", help="Recognition output, one image_path<TAB>text per line.")
+    parser.add_argument("label_file", nargs='?', default="/home/jupyter/PaddleOCR_Training/ocr_output/rec_gt_eval.txt", help="Ground truth label file (default: ocr_output/rec_gt_eval.txt)")
+    parser.add_argument("--char_dict_path", default="/home/jupyter/PaddleOCR_Training/ocr_output/custom_char_dict.txt", help="Character dictionary the confusion matrix is keyed to.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--chunk_size", type=int, default=20000, help="Lines per worker task (default: 20000)")
+    parser.add_argument("--ignore_space", action="store_true", help="Drop spaces before scoring, as RecMetric does.")
+    parser.add_argument("--top", type=int, default=20, help="Most frequent confusions to report (default: 20)")
+    parser.add_argument("--output", default=None, help="Write the full report (including the confusion matrix) to this JSON file.")
+    args = parser.parse_args()
+
+    predictions = read_label_file(args.predictions)
+    labels = read_label_file(args.label_file)
+    keys = [k for k in labels if k in predictions]
+    missing = len(labels) - len(keys)
+    if missing:
+        logging.warning(f"{missing} labeled lines have no prediction and are scored as empty output.")
+    keys += [k for k in labels if k not in predictions]
+    refs = [labels[k] for k in keys]
+    hyps = [predictions.get(k, "") for k in keys]
+    characters = load_char_dict(args.char_dict_path)
+
+    start = time.perf_counter()
+    report = score(refs, hyps, characters, args.workers, args.chunk_size, ignore_space=args.ignore_space)
+    elapsed = time.perf_counter() - start
+    logging.info(f"Scored {report['lines']} lines in {elapsed:.2f}s ({report['lines'] / elapsed:.0f} lines/s, "
+                 f"{'rapidfuzz' if HAVE_RAPIDFUZZ else 'numpy'} edit distance)")
+    logging.info(f"CER {report['cer']:.4f}  WER {report['wer']:.4f}  exact match {report['exact_match']:.4f}")
+    for name, bucket in report['length_buckets'].items():
+        if bucket['lines']:
+            logging.info(f"  length {name:>7}: {bucket['lines']:7d} lines, CER {bucket['cer']:.4f}, exact {bucket['exact_match']:.4f}")
+
+    per_char, confusions = confusion_summary(report['confusion'], characters, args.top)
+    logging.info("Most frequent confusions (ref -> hyp):")
+    for c in confusions:
+        logging.info(f"  {c['ref']!r:>12} -> {c['hyp']!r:<12} {c['count']}")
+
+    if args.output:
+        report['confusion'] = {'labels': ['<none>'] + characters[1:] + ['<unknown>'],
+                               'matrix': report['confusion'].tolist()}
+        report['per_char'] = per_char
+        report['top_confusions'] = confusions
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logging.info(f"Report written to {args.output}")
@@ -0,0 +1,380 @@
+# scripts/run_pipeline.py
+#
+# Data preparation, fine-tuning and export as one DAG of stages (what prepare_training_data.sh
+# and run_finetuning_pipeline.sh do, in order). Each stage declares its inputs and outputs; a
+# stage whose input fingerprint matches its last successful run, and whose outputs still exist,
+# is skipped. Stages whose dependencies are done run concurrently (--jobs).
+#   python scripts/run_pipeline.py                          # everything, skipping unchanged stages
+#   python scripts/run_pipeline.py --until convert          # data preparation only
+#   python scripts/run_pipeline.py --force train --fast_eval
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import logging
+import datetime
+import threading
+import subprocess
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import yaml
+
+from label_index import label_index_paths
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_VERSION = 1
+
+
+class Stage:
+    """
+    One pipeline step. `command` is run as a subprocess (output to logs/<name>.log); `action` is
+    called in-process with the stage and must write the outputs. `params` are extra values that
+    belong in the fingerprint (thresholds, flags) without being files.
+    """
+
+    def __init__(self, name, inputs, outputs, command=None, action=None, deps=(), params=None, cwd=None):
+        self.name = name
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.command = command
+        self.action = action
+        self.deps = list(deps)
+        self.params = params or {}
+        self.cwd = cwd
+
+
+class Fingerprinter:
+    """
+    Fingerprints of stage inputs. Files are content-hashed, with the hash reused while their
+    size and mtime are unchanged (so a multi-GB label file is hashed once). Directories (page
+    archives, crop folders) are fingerprinted by their listing of relative path, size and mtime.
+    """
+
+    def __init__(self, file_hashes=None):
+        self.file_hashes = dict(file_hashes or {})
+        self.lock = threading.Lock()
+
+    def file(self, path):
+        st = os.stat(path)
+        with self.lock:
+            cached = self.file_hashes.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        with self.lock:
+            self.file_hashes[path] = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    @staticmethod
+    def directory(path):
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                st = os.stat(full)
+                digest.update(f"{os.path.relpath(full, path)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode('utf-8'))
+        return 'dir:' + digest.hexdigest()
+
+    def stage(self, stage):
+        digest = hashlib.sha256()
+        digest.update(json.dumps([STATE_VERSION, stage.command, stage.params], sort_keys=True, default=str).encode('utf-8'))
+        for path in stage.inputs:
+            if os.path.isdir(path):
+                value = self.directory(path)
+            elif os.path.isfile(path):
+                value = self.file(path)
+            else:
+                value = 'missing'
+            digest.update(f"{path}\0{value}\n".encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+
+def outputs_exist(stage):
+    return all(os.path.exists(path) for path in stage.outputs)
+
+
+def run_stage(stage, log_dir):
+    """Runs one stage; raises on failure (with the tail of the stage log for commands)."""
+    if stage.action is not None:
+        stage.action(stage)
+    else:
+        log_path = os.path.join(log_dir, f"{stage.name}.log")
+        with open(log_path, 'w', encoding='utf-8') as log:
+            returncode = subprocess.run(stage.command, cwd=stage.cwd, stdout=log, stderr=subprocess.STDOUT).returncode
+        if returncode != 0:
+            with open(log_path, 'r', encoding='utf-8', errors='replace') as log:
+                tail = ''.join(log.readlines()[-15:])
+            raise RuntimeError(f"exit code {returncode}, see {log_path}:\n{tail}")
+    missing = [path for path in stage.outputs if not os.path.exists(path)]
+    if missing:
+        raise RuntimeError(f"finished without writing {', '.join(missing)}")
+
+
+def run_pipeline(stages, state_path, log_dir, jobs=2, force=()):
+    """
+    Runs the stages in dependency order, up to `jobs` at a time. Returns the per-stage report
+    (status ran / cached / failed / blocked, seconds); fingerprints of successful stages are
+    saved to state_path as soon as each one finishes, so an interrupted run resumes where it stopped.
+    """
+    state = {'version': STATE_VERSION, 'stages': {}, 'file_hashes': {}}
+    if os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            loaded = json.load(f)
+        if loaded.get('version') == STATE_VERSION:
+            state = loaded
+    fingerprinter = Fingerprinter(state['file_hashes'])
+    os.makedirs(log_dir, exist_ok=True)
+
+    by_name = {stage.name: stage for stage in stages}
+    report, pending, running = {}, list(stages), {}
+    state_lock = threading.Lock()
+
+    def save_state():
+        state['file_hashes'] = fingerprinter.file_hashes
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, state_path)
+
+    def execute(stage):
+        start = time.perf_counter()
+        fingerprint = fingerprinter.stage(stage)
+        previous = state['stages'].get(stage.name, {})
+        if stage.name not in force and previous.get('fingerprint') == fingerprint and outputs_exist(stage):
+            return {'status': 'cached', 'seconds': round(time.perf_counter() - start, 3), 'fingerprint': fingerprint,
+                    'last_run_seconds': previous.get('seconds')}
+        logging.info(f"[{stage.name}] running")
+        run_stage(stage, log_dir)
+        seconds = round(time.perf_counter() - start, 3)
+        with state_lock:
+            state['stages'][stage.name] = {'fingerprint': fingerprint, 'seconds': seconds,
+                                           'finished': datetime.datetime.now().isoformat(timespec='seconds')}
+            save_state()
+        return {'status': 'ran', 'seconds': seconds, 'fingerprint': fingerprint}
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            for stage in list(pending):
+                dep_status = [report.get(dep, {}).get('status') for dep in stage.deps if dep in by_name]
+                if any(status in ('failed', 'blocked') for status in dep_status):
+                    report[stage.name] = {'status': 'blocked', 'seconds': 0.0}
+                    logging.warning(f"[{stage.name}] not run: a dependency failed")
+                    pending.remove(stage)
+                elif all(status in ('ran', 'cached') for status in dep_status):
+                    running[executor.submit(execute, stage)] = stage
+                    pending.remove(stage)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    report[stage.name] = future.result()
+                    logging.info(f"[{stage.name}] {report[stage.name]['status']} in {report[stage.name]['seconds']:.1f} s")
+                except Exception as e:
+                    report[stage.name] = {'status': 'failed', 'seconds': 0.0, 'error': str(e)}
+                    logging.error(f"[{stage.name}] failed: {e}")
+    with state_lock:
+        save_state()
+    return {stage.name: report[stage.name] for stage in stages}
+
+
+# --- in-process stage actions ---
+
+def read_text_column(csv_path):
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        text_idx = header.index('text')
+        return [row[text_idx] for row in reader if text_idx < len(row) and row[text_idx]]
+
+
+def copy_char_dict(stage):
+    source, target = stage.inputs[0], stage.outputs[0]
+    shutil.copyfile(source, target)
+
+
+def validate_char_dict(stage):
+    """Dictionary sanity (empty or duplicate entries) and the CSV characters it does not cover."""
+    dict_path, csv_path = stage.inputs[:2]
+    with open(dict_path, 'rb') as f:
+        entries = [line.decode('utf-8').strip('\n').strip('\r\n') for line in f]
+    counts = Counter(entries)
+    char_counts = Counter()
+    for text in read_text_column(csv_path):
+        char_counts.update(text)
+    entry_set = set(entries)
+    missing = {c: n for c, n in char_counts.most_common() if c not in entry_set}
+    result = {'entries': len(entries), 'empty_entries': counts.get('', 0),
+              'duplicates': sorted(c for c, n in counts.items() if n > 1 and c),
+              'csv_chars_not_in_dict': missing,
+              'lines_with_unknown_chars': sum(1 for text in read_text_column(csv_path) if set(text) - entry_set)}
+    with open(stage.outputs[0], 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    if not entries:
+        raise RuntimeError(f"character dictionary {dict_path} is empty")
+    if result['duplicates'] or result['empty_entries']:
+        logging.warning(f"[{stage.name}] {dict_path}: {len(result['duplicates'])} duplicate and {result['empty_entries']} empty entries")
+    if missing:
+        logging.warning(f"[{stage.name}] {len(missing)} characters in the CSV are not in the dictionary; "
+                        f"{result['lines_with_unknown_chars']} lines will be filtered by convert")
+
+
+def length_stats(stage):
+    """Text length distribution of the CSV, and how many lines max_text_length would drop."""
+    lengths = sorted(len(text) for text in read_text_column(stage.inputs[0]))
+    max_text_length = stage.params['max_text_length']
+    pick = lambda q: lengths[min(len(lengths) - 1, int(q * len(lengths)))] if lengths else 0
+    result = {'lines': len(lengths), 'max': lengths[-1] if lengths else 0,
+              'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99),
+              'max_text_length': max_text_length,
+              'over_max_text_length': sum(1 for n in lengths if n > max_text_length)}
+    with open(stage.outputs[0], 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    if result['over_max_text_length']:
+        logging.warning(f"[{stage.name}] {result['over_max_text_length']} lines are longer than max_text_length={max_text_length} "
+                        f"(longest {result['max']})")
+
+
+def build_stages(args):
+    """The stages of prepare_training_data.sh followed by those of run_finetuning_pipeline.sh."""
+    out = args.ocr_output_dir
+    script = lambda name: os.path.join(SCRIPTS_DIR, name)
+    ocrprep = [sys.executable, script('ocrprep.py')]
+    # every stage lists the code it runs among its inputs, so editing a script re-runs its stage
+    this_script = os.path.abspath(__file__)  # the in-process actions
+    line_labels = os.path.join(out, 'line_labels.csv')
+    line_images = os.path.join(out, 'line_images')
+    char_dict = os.path.join(out, 'custom_char_dict.txt')
+    train_labels = os.path.join(out, 'rec_gt_train.txt')
+    eval_labels = os.path.join(out, 'rec_gt_eval.txt')
+
+    stages = [
+        Stage('preprocess', [args.image_dir, args.hocr_dir, ocrprep[1],
+                             os.path.join(os.path.dirname(SCRIPTS_DIR), 'data_preprocess.py')],
+              [line_labels, line_images],
+              command=ocrprep + ['preprocess', args.image_dir, args.hocr_dir, line_labels]),
+    ]
+    split_csv = line_labels
+    if args.max_per_dup_group > 0:
+        split_csv = os.path.join(out, 'line_labels_dedup.csv')
+        stages.append(Stage('dedup', [line_labels, line_images, ocrprep[1], script('dedup_lines.py')], [split_csv],
+                            deps=['preprocess'],
+                            command=ocrprep + ['dedup', line_labels, split_csv, '--max_per_group', str(args.max_per_dup_group)]))
+    split_dep = 'dedup' if args.max_per_dup_group > 0 else 'preprocess'
+    stages += [
+        Stage('char_dict', [args.char_dict_source, this_script], [char_dict], action=copy_char_dict),
+        Stage('validate_dict', [char_dict, split_csv, this_script], [os.path.join(out, 'dict_report.json')],
+              deps=['char_dict', split_dep], action=validate_char_dict),
+        Stage('length_stats', [split_csv, this_script], [os.path.join(out, 'length_stats.json')], deps=[split_dep],
+              params={'max_text_length': args.max_text_length}, action=length_stats),
+        Stage('convert', [split_csv, char_dict, ocrprep[1], script('convert_csv_to_paddle_labels.py'), script('label_index.py')],
+              [train_labels, eval_labels] + list(label_index_paths(train_labels)),
+              deps=['char_dict', split_dep],
+              command=ocrprep + ['convert', split_csv, out, '--char_dict', char_dict,
+                                 '--max_text_length', str(args.max_text_length)]),
+    ]
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    global_config = config['Global']
+    # tools/train.py and export_model.py run from the repo root: relative paths in the config resolve there
+    in_repo = lambda path: os.path.normpath(os.path.join(args.paddleocr_dir, path))
+    save_model_dir = in_repo(global_config['save_model_dir'])
+    best_params = os.path.join(save_model_dir, 'best_accuracy.pdparams')
+    train_inputs = [args.config, train_labels, eval_labels, char_dict, line_images, in_repo('tools/train.py')]
+    if global_config.get('pretrained_model'):
+        train_inputs.append(in_repo(global_config['pretrained_model']) + '.pdparams')
+    if args.fast_eval:
+        train_command = [sys.executable, script('train_fast_eval.py'),
+                         '--paddleocr_dir', args.paddleocr_dir, '-c', args.config]
+        train_inputs += [script('train_fast_eval.py'), script('eval_tensor_cache.py'), script('label_index.py')]
+    else:
+        train_command = [sys.executable, 'tools/train.py', '-c', args.config]
+    stages += [
+        Stage('train', train_inputs, [best_params], deps=['convert', 'validate_dict', 'length_stats'],
+              command=train_command, cwd=args.paddleocr_dir),
+        Stage('export', [args.config, best_params, in_repo('tools/export_model.py')],
+              [in_repo(global_config['save_inference_dir'])], deps=['train'],
+              command=[sys.executable, 'tools/export_model.py', '-c', args.config,
+                       '-o', f"Global.pretrained_model={os.path.splitext(best_params)[0]}",
+                       f"Global.save_inference_dir={in_repo(global_config['save_inference_dir'])}"],
+              cwd=args.paddleocr_dir),
+    ]
+    return stages
+
+
+def select_stages(stages, until=None):
+    """`until` keeps that stage and everything it depends on, transitively."""
+    if until is None:
+        return stages
+    by_name = {stage.name: stage for stage in stages}
+    keep, todo = set(), [until]
+    while todo:
+        name = todo.pop()
+        if name in by_name and name not in keep:
+            keep.add(name)
+            todo.extend(by_name[name].deps)
+    return [stage for stage in stages if stage.name in keep]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run data preparation, fine-tuning and export as cached, concurrent stages.")
+    parser.add_argument("--image_dir", default="/home/jupyter/advanced/ocr", help="Page images (default: /home/jupyter/advanced/ocr)")
+    parser.add_argument("--hocr_dir", default="/home/jupyter/advanced/ocr", help="HOCR files (default: /home/jupyter/advanced/ocr)")
+    parser.add_argument("--ocr_output_dir", default="/home/jupyter/PaddleOCR_Training/ocr_output", help="Labels, crops, dictionary and reports (default: ocr_output)")
+    parser.add_argument("--char_dict_source", default=os.path.join(SCRIPTS_DIR, "char.txt"), help="Predefined character dictionary (default: scripts/char.txt)")
+    parser.add_argument("--max_text_length", type=int, default=128, help="Lines longer than this are dropped by convert (default: 128)")
+    parser.add_argument("--max_per_dup_group", type=int, default=3, help="Near-duplicate lines kept per group; 0 skips the dedup stage (default: 3)")
+    parser.add_argument("--paddleocr_dir", default=os.environ.get("PADDLE_OCR_REPO_PATH", "/home/jupyter/PaddleOCR"), help="Cloned PaddleOCR repo (default: $PADDLE_OCR_REPO_PATH or /home/jupyter/PaddleOCR)")
+    parser.add_argument("--config", default="/home/jupyter/PaddleOCR/configs/rec/my_config_rec_ppocrv4_finetune.yml", help="PaddleOCR training config")
+    parser.add_argument("--fast_eval", action="store_true", help="Train through scripts/train_fast_eval.py (cached eval set).")
+    parser.add_argument("--until", default=None, help="Stop after this stage (runs only what it depends on), e.g. convert")
+    parser.add_argument("--force", nargs='+', default=[], help="Re-run these stages even if their inputs are unchanged ('all' for every stage).")
+    parser.add_argument("--jobs", type=int, default=2, help="Stages run at the same time (default: 2)")
+    parser.add_argument("--list", action="store_true", help="Print the stages with their inputs and outputs, and exit.")
+    args = parser.parse_args()
+
+    args.paddleocr_dir = os.path.abspath(args.paddleocr_dir)
+    args.config = os.path.abspath(args.config)
+    os.makedirs(args.ocr_output_dir, exist_ok=True)
+    stages = select_stages(build_stages(args), args.until)
+    if args.until and not stages:
+        logging.error(f"Unknown stage: {args.until}")
+        exit(1)
+    if args.list:
+        for stage in stages:
+            print(f"{stage.name}  (after: {', '.join(stage.deps) or '-'})")
+            print(f"  in:  {', '.join(stage.inputs)}")
+            print(f"  out: {', '.join(stage.outputs)}")
+        exit(0)
+
+    force = {stage.name for stage in stages} if 'all' in args.force else set(args.force)
+    start = time.perf_counter()
+    report = run_pipeline(stages, os.path.join(args.ocr_output_dir, 'pipeline_state.json'),
+                          os.path.join(args.ocr_output_dir, 'logs'), args.jobs, force)
+    elapsed = time.perf_counter() - start
+
+    logging.info("Stage summary:")
+    for name, entry in report.items():
+        note = f" (last run took {entry['last_run_seconds']:.1f} s)" if entry.get('last_run_seconds') else ''
+        logging.info(f"  {name:>14}: {entry['status']:<7} {entry['seconds']:8.1f} s{note}")
+    cached = sum(entry['status'] == 'cached' for entry in report.values())
+    logging.info(f"{len(report)} stages in {elapsed:.1f} s, {cached} cache hits.")
+    with open(os.path.join(args.ocr_output_dir, 'pipeline_runs.jsonl'), 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'finished': datetime.datetime.now().isoformat(timespec='seconds'),
+                            'seconds': round(elapsed, 3), 'stages': report}) + '\n')
+    if any(entry['status'] in ('failed', 'blocked') for entry in report.values()):
+        exit(1)
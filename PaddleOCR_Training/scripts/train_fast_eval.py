@@ -0,0 +1,138 @@
+# scripts/train_fast_eval.py
+#
+# Drop-in for `python tools/train.py -c <config>` with the fast evaluation mode: the eval set is
+# served from the tensor cache of scripts/eval_tensor_cache.py, and, if
+# Eval.tensor_cache.subset_ratio is set, intermediate evaluations use a fixed stratified subset
+# while the first evaluation after each finished epoch uses the full set. With label_index set
+# in the Train (or Eval) section, that section's labels are read from the memory-mapped index of
+# scripts/label_index.py; the other section keeps SimpleDataSet.
+#   python scripts/train_fast_eval.py --paddleocr_dir /home/jupyter/PaddleOCR -c <config> [-o Key=Value ...]
+
+import os
+import sys
+import argparse
+import logging
+
+from eval_tensor_cache import (CachedEvalLoader, EvalTensorCache, UnsupportedEvalConfig, eval_cache_settings,
+                               get_or_build_cache, stratified_subset)
+from label_index import install_label_index
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+
+class EpochCountingLoader:
+    """Wraps the Train loader to count epochs (one __iter__ per epoch); everything else is passed through."""
+
+    def __init__(self, loader, schedule):
+        self.loader = loader
+        self.schedule = schedule
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        self.schedule.epochs_started += 1
+        return iter(self.loader)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class EvalSchedule:
+    """
+    Decides, per evaluation, whether the cached loader serves the subset or the full set.
+    program.train() evaluates every eval_batch_step steps and has no epoch-end evaluation, so
+    "full set at epoch ends" is the first evaluation after an epoch has finished.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.epochs_started = 0
+        self.full_after_epoch = 0  # finished epochs covered by the last full evaluation
+
+    def next_is_full(self):
+        if self.loader.subset is None:
+            return True
+        finished = max(0, self.epochs_started - 1)
+        if finished > self.full_after_epoch:
+            self.full_after_epoch = finished
+            return True
+        return False
+
+
+def install_fast_eval(program_module, train_module, config, rebuild_cache=False):
+    """
+    Patches tools/train.py and tools/program.py in place: build_dataloader returns the cached
+    Eval loader (and epoch-counting Train loaders), and eval() switches between subset and full
+    passes. Subset results are reported as subset_<metric> with the main indicator at -inf,
+    so a subset score never replaces best_accuracy, which stays a full-set decision.
+    Returns False (and leaves everything untouched) if the Eval config cannot be cached.
+    """
+    try:
+        settings = eval_cache_settings(config)
+    except UnsupportedEvalConfig as e:
+        logging.warning(f"Fast eval disabled, using the normal Eval loader: {e}")
+        return False
+
+    cache = EvalTensorCache(get_or_build_cache(settings, rebuild_cache), in_memory=settings['in_memory'])
+    subset = None
+    if settings['subset_ratio']:
+        subset = stratified_subset(cache.lengths, settings['subset_ratio'], settings['subset_seed'])
+        logging.info(f"Intermediate evals on a stratified subset of {len(subset)} / {len(cache)} lines; "
+                     f"full set at the first eval after each epoch.")
+    eval_loader = CachedEvalLoader(cache, settings['batch_size'], settings['keep_keys'], subset)
+    schedule = EvalSchedule(eval_loader)
+
+    original_build_dataloader = program_module.build_dataloader
+    original_eval = program_module.eval
+
+    def build_dataloader(config, mode, device, logger, seed=None):
+        if mode == 'Eval':
+            return eval_loader
+        loader = original_build_dataloader(config, mode, device, logger, seed)
+        return EpochCountingLoader(loader, schedule) if mode == 'Train' else loader
+
+    def eval(model, valid_dataloader, post_process_class, eval_class, *args, **kwargs):
+        if valid_dataloader is not eval_loader:
+            return original_eval(model, valid_dataloader, post_process_class, eval_class, *args, **kwargs)
+        full = schedule.next_is_full()
+        eval_loader.use_subset = not full
+        metric = original_eval(model, valid_dataloader, post_process_class, eval_class, *args, **kwargs)
+        if full:
+            return metric
+        subset_metric = {f"subset_{key}": value for key, value in metric.items()}
+        subset_metric[eval_class.main_indicator] = float('-inf')
+        return subset_metric
+
+    train_module.build_dataloader = build_dataloader
+    program_module.build_dataloader = build_dataloader
+    program_module.eval = eval
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run PaddleOCR training with the cached (and optionally subset) evaluation mode. Other arguments go to tools/train.py.")
+    parser.add_argument("--paddleocr_dir", default=os.environ.get("PADDLE_OCR_REPO_PATH", "/home/jupyter/PaddleOCR"), help="Cloned PaddleOCR repo (default: $PADDLE_OCR_REPO_PATH or /home/jupyter/PaddleOCR)")
+    parser.add_argument("--rebuild_cache", action="store_true", help="Rebuild the eval tensor cache even if it is current.")
+    args, train_argv = parser.parse_known_args()
+
+    # tools/train.py is run from the repo root: config paths such as save_model_dir are relative to it.
+    paddleocr_dir = os.path.abspath(args.paddleocr_dir)
+    os.chdir(paddleocr_dir)
+    sys.path.insert(0, paddleocr_dir)
+    sys.argv = [os.path.join(paddleocr_dir, "tools", "train.py")] + train_argv
+
+    from tools import program
+    from tools import train
+    from ppocr import data
+    from ppocr.utils.utility import set_seed
+
+    config, device, logger, vdl_writer = program.preprocess(is_train=True)
+    index_modes = [mode for mode in ('Train', 'Eval') if config.get(mode, {}).get('label_index')]
+    if index_modes:
+        install_label_index(data, [program, train], index_modes)
+        logging.info(f"{' and '.join(index_modes)} labels are read from the memory-mapped label index.")
+    install_fast_eval(program, train, config, args.rebuild_cache)
+    seed = config["Global"]["seed"] if "seed" in config["Global"] else 1024
+    set_seed(seed)
+    train.main(config, device, logger, vdl_writer, seed)
@@ -0,0 +1,12 @@
+# tests/conftest.py
+#
+# The inference/ and scripts/ modules import their siblings by name (they are run from inside
+# those directories), so both are put on sys.path for the tests, with the top level for
+# data_preprocess.py.
+#   python -m pytest -q tests
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'inference'), os.path.join(ROOT, 'scripts'), ROOT]
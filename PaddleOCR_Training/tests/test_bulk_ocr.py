@@ -0,0 +1,94 @@
+# tests/test_bulk_ocr.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import bulk_ocr
+from bulk_ocr import ResumeJournal
+
+
+def test_failed_files_are_requeued_only_with_retry(tmp_path):
+    journal = ResumeJournal(str(tmp_path / "out.jsonl.journal"))
+    journal.commit(['a.png', 'b.png', 'c.pdf'], failed=['b.png', 'c.pdf'], output_offset=10)
+
+    resumed = ResumeJournal(journal.journal_path)
+    assert resumed.done_files() == {'a.png', 'b.png', 'c.pdf'}
+    assert resumed.failed_files() == {'b.png', 'c.pdf'}
+    assert resumed.done_files(retry_failed=True) == {'a.png'}
+
+    # the retry fixes b.png, c.pdf fails again
+    resumed.commit(['b.png', 'c.pdf'], failed=['c.pdf'], output_offset=20)
+    resumed = ResumeJournal(journal.journal_path)
+    assert resumed.failed_files() == {'c.pdf'}
+    assert resumed.done_files(retry_failed=True) == {'a.png', 'b.png'}
+    assert resumed.last('output_offset', 0) == 20
+
+
+def test_journal_without_failed_lists(tmp_path):
+    journal_path = tmp_path / "out.jsonl.journal"
+    journal_path.write_text('{"files": ["a.png", "b.png"], "output_offset": 10}\n', encoding='utf-8')
+    journal = ResumeJournal(str(journal_path))
+    assert journal.failed_files() == set()
+    assert journal.done_files(retry_failed=True) == {'a.png', 'b.png'}
+
+
+class FlakyPipeline:
+    """Stub pipeline that fails on pages filled with 1."""
+
+    def __call__(self, img):
+        if img[0, 0, 0] == 1:
+            raise RuntimeError("pipeline failed")
+        return {'lines': [{'text': 'ok', 'confidence': 0.9, 'box': []}], 'layout': []}
+
+
+def fake_pages(pages_by_name):
+    def iter_document_pages(f):
+        for page, value in enumerate(pages_by_name[os.path.basename(f.name)]):
+            yield page, np.full((4, 4, 3), value, dtype=np.uint8)
+    return iter_document_pages
+
+
+def test_partly_failed_file_keeps_only_its_error_record(tmp_path, monkeypatch):
+    import document_stream
+
+    for name in ('good.pdf', 'bad.pdf'):
+        (tmp_path / name).write_bytes(b'')
+    monkeypatch.setattr(document_stream, 'iter_document_pages', fake_pages({'good.pdf': [0, 0], 'bad.pdf': [0, 1, 0]}))
+    monkeypatch.setattr(bulk_ocr, '_worker_pipeline', FlakyPipeline())
+
+    _, records, pages, _ = bulk_ocr.process_shard([str(tmp_path / 'good.pdf'), str(tmp_path / 'bad.pdf')])
+    assert pages == 2
+    assert [(os.path.basename(r['image_path']), r.get('page'), 'error' in r) for r in records] == [
+        ('good.pdf', 0, False), ('good.pdf', 1, False), ('bad.pdf', None, True)]
+
+
+def test_failed_shard_fails_the_run(tmp_path, monkeypatch):
+    image_dir = tmp_path / 'images'
+    image_dir.mkdir()
+    for name in ('a.png', 'b.png'):
+        (image_dir / name).write_bytes(b'')
+
+    def process_shard(shard):
+        if any(path.endswith('b.png') for path in shard):
+            raise RuntimeError("worker died")
+        return 0, [{'image_path': path, 'page': 0, 'lines': []} for path in shard], len(shard), 0.0
+
+    monkeypatch.setattr(bulk_ocr, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(bulk_ocr, 'init_worker', lambda pipeline_args: None)
+    monkeypatch.setattr(bulk_ocr, 'process_shard', process_shard)
+    output = str(tmp_path / 'out.jsonl')
+    assert bulk_ocr.bulk_ocr(str(image_dir), output, {}, num_workers=1, shard_size=1) is False
+    assert ResumeJournal(output + '.journal').done_files() == {str(image_dir / 'a.png')}
+
+
+def test_resume_with_another_format_is_refused(tmp_path):
+    image_dir = tmp_path / 'images'
+    image_dir.mkdir()
+    (image_dir / 'a.png').write_bytes(b'')
+    (image_dir / 'b.png').write_bytes(b'')
+    output = tmp_path / 'out.jsonl'
+    journal = ResumeJournal(str(output) + '.journal')
+    journal.commit([str(image_dir / 'a.png')], failed=[], output_offset=0)
+    assert bulk_ocr.bulk_ocr(str(image_dir), str(output), {}, output_format='parquet') is False
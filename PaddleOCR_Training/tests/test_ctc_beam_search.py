@@ -0,0 +1,90 @@
+# tests/test_ctc_beam_search.py
+
+import numpy as np
+import pytest
+
+from ctc_beam_search import BatchCTCBeamDecoder, LexiconTrie, random_lexicon, synthetic_lexicon_batch
+from ctc_decoder import BatchCTCDecoder
+
+CHARACTER = ['blank'] + list('abcdefghijklmnopqrstuvwxyz') + list('ABC') + ['1', '.']
+
+
+def frames(classes, peak):
+    """[1, T, C] softmax output with `peak` on the given class of every frame and the rest spread evenly."""
+    out = np.full((len(classes), len(CHARACTER)), (1 - peak) / (len(CHARACTER) - 1), dtype=np.float32)
+    out[np.arange(len(classes)), classes] = peak
+    return out[None]
+
+
+def idx(ch):
+    return CHARACTER.index(ch)
+
+
+def walk(trie, word):
+    node = np.array([0])
+    for ch in word:
+        node = trie.child(node, np.array([idx(ch)]))
+    return int(node[0])
+
+
+@pytest.mark.parametrize('dense_limit', [1 << 23, 0])
+def test_lexicon_trie(dense_limit):
+    trie = LexiconTrie(['cab', 'ca', 'Abc', 'a1', 'x.y'], CHARACTER, dense_limit=dense_limit)
+    assert (trie.table is None) == (dense_limit == 0)
+    assert trie.num_words == 3 and trie.skipped == 2  # a1 and x.y have non-alphabetic characters
+    assert walk(trie, 'cab') > 0 and trie.terminal[walk(trie, 'cab')]
+    assert walk(trie, 'ABC') == walk(trie, 'abc')  # case folded
+    assert walk(trie, 'cb') == -1
+    assert walk(trie, 'cbz') == -1  # stays out once it left
+    nodes = np.array([walk(trie, 'c'), walk(trie, 'ca'), 0])
+    assert list(trie.incomplete(nodes)) == [True, False, False]
+
+
+def test_beam_matches_greedy_confidence_on_unambiguous_input():
+    blank = 0
+    line = [idx('a'), idx('a'), blank, idx('b'), blank, idx('b'), idx('c'), blank]
+    for peak in (0.9, 0.97):
+        preds = frames(line, peak)
+        [(greedy_text, greedy_conf)] = BatchCTCDecoder(character=CHARACTER)(preds)
+        [(beam_text, beam_conf)] = BatchCTCBeamDecoder(character=CHARACTER)(preds)
+        assert beam_text == greedy_text == 'abbc'
+        assert beam_conf == pytest.approx(greedy_conf, abs=1e-6)
+        assert beam_conf == pytest.approx(peak, abs=1e-6)
+
+
+def test_empty_line_has_zero_confidence():
+    preds = np.concatenate([frames([0, 0, 0], 0.99), frames([idx('a'), 0, 0], 0.99)])
+    assert BatchCTCBeamDecoder(character=CHARACTER)(preds) == [('', 0.0), ('a', pytest.approx(0.99))]
+
+
+def test_lexicon_fixes_a_near_miss():
+    # "cab" where the middle frame prefers 'o' (not a word) with 'a' a close second
+    preds = frames([idx('c'), 0, idx('o'), 0, idx('b')], 0.9)
+    preds[0, 2, idx('a')] = 0.3
+    preds[0, 2] /= preds[0, 2].sum()
+    [(plain, _)] = BatchCTCBeamDecoder(character=CHARACTER)(preds)
+    [(text, conf)] = BatchCTCBeamDecoder(character=CHARACTER, lexicon=['cab', 'cat'])(preds)
+    assert plain == 'cob'
+    assert text == 'cab'
+    assert 0 < conf < 0.9  # charged the lower probability of the corrected character
+
+
+def test_lexicon_beam_beats_greedy_on_synthetic_lines():
+    character = ['blank'] + list('abcdefghijklmnopqrstuvwxyz')
+    words = random_lexicon(character, num_words=200)
+    preds, texts = synthetic_lexicon_batch(words, character, 32, 40)
+    assert all(' ' not in text for text in texts)  # no space in the dictionary: one word per line
+    greedy = BatchCTCDecoder(character=character)(preds)
+    beam = BatchCTCBeamDecoder(character=character, lexicon=words)(preds)
+    greedy_acc = np.mean([text == t for (text, _), t in zip(greedy, texts)])
+    beam_acc = np.mean([text == t for (text, _), t in zip(beam, texts)])
+    assert beam_acc > greedy_acc
+    for (greedy_text, greedy_conf), (beam_text, beam_conf) in zip(greedy, beam):
+        if beam_text == greedy_text:  # same reading, same confidence scale
+            assert beam_conf == pytest.approx(greedy_conf, abs=1e-5)
+
+
+def test_synthetic_lines_are_joined_with_spaces_when_the_dictionary_has_one():
+    character = ['blank'] + list('abcdefghijklmnopqrstuvwxyz') + [' ']
+    _, texts = synthetic_lexicon_batch(['ab', 'cd', 'ef'], character, 16, 40)
+    assert any(' ' in text for text in texts)
@@ -0,0 +1,109 @@
+# tests/test_data_preprocess.py
+
+import json
+import os
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+from data_preprocess import create_line_labels_csv, merge_line_label_shards, page_shard, parse_shard, shard_output_paths
+
+NUM_SHARDS = 3
+
+
+def hocr(lines):
+    spans = "".join(
+        f"<span class='ocr_line' id='line_{i}' title='bbox {x0} {y0} {x1} {y1}'>"
+        + "".join(f"<span class='ocrx_word'>{word}</span> " for word in text.split()) + "</span>"
+        for i, (text, (x0, y0, x1, y1)) in enumerate(lines))
+    return f"<?xml version='1.0' encoding='UTF-8'?><html xmlns='http://www.w3.org/1999/xhtml'><body>{spans}</body></html>"
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """Eight pages in two folders, two or three lines each; one page has no HOCR file."""
+    image_dir, hocr_dir = tmp_path / 'pages', tmp_path / 'hocr'
+    hocr_dir.mkdir()
+    for n in range(8):
+        folder = image_dir / f"box{n % 2}"
+        folder.mkdir(parents=True, exist_ok=True)
+        Image.new('RGB', (200, 100), 'white').save(folder / f"page{n}.png")
+        if n == 5:
+            continue
+        lines = [(f"page {n} line {k}", (10, 10 + 30 * k, 190, 35 + 30 * k)) for k in range(2 + n % 2)]
+        (hocr_dir / f"page{n}.hocr").write_text(hocr(lines), encoding='utf-8')
+    return str(image_dir), str(hocr_dir), tmp_path / 'out'
+
+
+def test_parse_shard():
+    assert parse_shard('2/4') == (2, 4)
+    for spec in ('4/4', '-1/4', '0/0'):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+def test_page_shard_is_stable_and_separator_independent():
+    pages = [f"box{n % 2}/page{n}.png" for n in range(200)]
+    shards = [page_shard(page, NUM_SHARDS) for page in pages]
+    assert set(shards) == set(range(NUM_SHARDS))
+    assert shards == [page_shard(page, NUM_SHARDS) for page in pages]
+    if os.sep != '/':
+        assert page_shard(pages[0].replace('/', os.sep), NUM_SHARDS) == shards[0]
+
+
+def run_shards(archive, output_csv):
+    image_dir, hocr_dir, _ = archive
+    manifests = []
+    for index in range(NUM_SHARDS):
+        assert create_line_labels_csv(image_dir, hocr_dir, output_csv, num_workers=1, shard=(index, NUM_SHARDS))
+        manifests.append(shard_output_paths(output_csv, (index, NUM_SHARDS))[1])
+    return manifests
+
+
+def test_merged_shards_equal_an_unsharded_run(archive):
+    image_dir, hocr_dir, out = archive
+    out.mkdir()
+    unsharded = str(out / 'line_labels.csv')
+    assert create_line_labels_csv(image_dir, hocr_dir, unsharded, num_workers=1)
+
+    manifests = run_shards(archive, unsharded)
+    assert sum(json.load(open(m, encoding='utf-8'))['pages'] for m in manifests) == 8
+    merged = str(out / 'merged.csv')
+    assert merge_line_label_shards(manifests, merged)
+
+    expected = pd.read_csv(unsharded, keep_default_na=False)
+    assert len(expected) == 7 * 2 + 3  # page5 has no HOCR: pages 1, 3, 7 have three lines
+    pd.testing.assert_frame_equal(pd.read_csv(merged, keep_default_na=False), expected)
+
+
+def test_merge_relocates_crops(archive):
+    _, _, out = archive
+    out.mkdir()
+    manifests = run_shards(archive, str(out / 'line_labels.csv'))
+    merged = str(out / 'merged.csv')
+    assert merge_line_label_shards(manifests, merged, relocate_dir='/gathered')
+    paths = pd.read_csv(merged)['image_path']
+    assert all(os.path.dirname(path) == '/gathered' for path in paths)
+
+
+def test_merge_rejects_incomplete_or_mixed_shards(archive, tmp_path):
+    _, _, out = archive
+    out.mkdir()
+    manifests = run_shards(archive, str(out / 'line_labels.csv'))
+    merged = str(out / 'merged.csv')
+    assert not merge_line_label_shards(manifests[:-1], merged)  # a shard missing
+    assert not merge_line_label_shards(manifests + manifests[:1], merged)  # a shard twice
+
+    other = json.load(open(manifests[0], encoding='utf-8'))
+    other['all_pages_sha256'] = '0' * 64  # produced from another page list
+    other_path = tmp_path / 'other.manifest.json'
+    other_path.write_text(json.dumps(other), encoding='utf-8')
+    assert not merge_line_label_shards([str(other_path)] + manifests[1:], merged)
+
+    short = json.load(open(manifests[1], encoding='utf-8'))
+    short['lines'] += 1  # the CSV does not match its manifest
+    short_path = tmp_path / 'short.manifest.json'
+    short_path.write_text(json.dumps(short), encoding='utf-8')
+    assert not merge_line_label_shards([manifests[0], str(short_path), manifests[2]], merged)
+    assert not os.path.exists(merged)
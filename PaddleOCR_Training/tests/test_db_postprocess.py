@@ -0,0 +1,83 @@
+# tests/test_db_postprocess.py
+
+import cv2
+import numpy as np
+import pytest
+
+from db_postprocess import (box_agreement, box_scores_fast, extract_crops, filter_boxes, order_mini_boxes, rect_points,
+                            synthetic_page)
+from ocr_pipeline import OCRPipeline, filter_det_boxes, get_rotate_crop_image
+
+pytest.importorskip('paddleocr')  # the reference is ppocr's DBPostProcess
+
+
+@pytest.fixture(scope='module')
+def reference():
+    return OCRPipeline._build_det_postprocess('ppocr')
+
+
+def random_rects(n, height, width, seed=0, margin=0):
+    """(cx, cy, w, h, angle) rects; with margin > 0 they stay that far inside the map."""
+    rng = np.random.default_rng(seed)
+    w, h = rng.uniform(3, 120, n), rng.uniform(3, 25, n)
+    reach = np.hypot(w, h) / 2 + margin
+    cx = rng.uniform(reach, width - reach) if margin else rng.uniform(-10, width + 10, n)
+    cy = rng.uniform(reach, height - reach) if margin else rng.uniform(-10, height + 10, n)
+    angle = np.where(rng.random(n) < 0.5, 90.0, rng.uniform(0, 90, n))
+    return np.stack([cx, cy, w, h, angle], axis=1)
+
+
+def test_rect_points_and_corner_order_match_opencv_and_ppocr(reference):
+    rects = random_rects(300, 400, 600)
+    points = rect_points(rects)
+    for rect, quad in zip(rects, points):
+        assert quad == pytest.approx(cv2.boxPoints(((rect[0], rect[1]), (rect[2], rect[3]), rect[4])), abs=1e-3)
+
+    ordered = order_mini_boxes(points.astype(np.float32))
+    for quad, box in zip(points.astype(np.float32), ordered):
+        expected, _ = reference.get_mini_boxes(quad.reshape(-1, 1, 2))
+        assert box == pytest.approx(np.array(expected), abs=1e-3)
+
+
+def test_box_scores_match_box_score_fast_inside_the_map(reference):
+    height, width = 300, 500
+    pred = np.random.default_rng(1).random((height, width), dtype=np.float32)
+    boxes = order_mini_boxes(rect_points(random_rects(400, height, width, seed=2, margin=2)).astype(np.float32))
+    expected = [reference.box_score_fast(pred, box.reshape(-1, 2)) for box in boxes.astype(np.float32)]
+    assert box_scores_fast(pred, boxes.astype(np.float64)) == pytest.approx(expected, abs=1e-6)
+    assert len(box_scores_fast(pred, np.zeros((0, 4, 2)))) == 0
+
+
+def test_box_scores_differ_only_for_quads_crossing_the_edge(reference):
+    # cv2.line clips an edge before walking it, so quads crossing the map edge can differ in a few pixels
+    height, width = 200, 300
+    pred = np.random.default_rng(3).random((height, width), dtype=np.float32)
+    boxes = order_mini_boxes(rect_points(random_rects(300, height, width, seed=4)).astype(np.float32))
+    expected = np.array([reference.box_score_fast(pred, box.reshape(-1, 2)) for box in boxes])
+    differs = np.abs(box_scores_fast(pred, boxes.astype(np.float64)) - expected) > 1e-6
+    crosses = ((boxes.min(axis=1) < 0).any(axis=1) | (boxes[:, :, 0].max(axis=1) >= width - 1) |
+               (boxes[:, :, 1].max(axis=1) >= height - 1))
+    assert 0 < crosses.sum() < len(boxes)
+    assert not (differs & ~crosses).any()
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_vectorized_postprocess_matches_db_postprocess(reference, seed):
+    img, maps, shape = synthetic_page(num_lines=80, rotated_fraction=0.3, seed=seed)
+    vectorized = OCRPipeline._build_det_postprocess('vectorized')
+    expected = filter_det_boxes(reference({'maps': maps}, [shape])[0]['points'], img.shape)
+    actual = filter_boxes(vectorized({'maps': maps}, [shape])[0]['points'], img.shape)
+    assert len(actual) == len(expected) > 40
+    matched, corner_px = box_agreement(expected, actual)
+    assert matched == 1.0
+    assert corner_px <= 3  # about a pixel on the map, scaled to the page
+
+
+def test_extract_crops_match_the_per_box_warp(reference):
+    img, maps, shape = synthetic_page(num_lines=40, rotated_fraction=0.5, seed=5)
+    boxes = filter_det_boxes(reference({'maps': maps}, [shape])[0]['points'], img.shape)
+    crops = extract_crops(img, boxes, axis_tolerance=0)
+    for box, crop in zip(boxes, crops):
+        expected = get_rotate_crop_image(img, box.copy())
+        assert crop.shape == expected.shape
+        assert np.abs(crop.astype(np.int16) - expected.astype(np.int16)).mean() < 1.0
@@ -0,0 +1,79 @@
+# tests/test_dedup_lines.py
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from dedup_lines import dedup_line_labels, group_near_duplicates
+
+
+def bits(*positions):
+    return sum(1 << p for p in positions)
+
+
+def test_member_in_reach_of_a_non_representative_joins_its_group():
+    # j is 5 bits from r, i is 5 bits from j but 10 from r: all three belong together
+    r, j = 0, bits(0, 10, 20, 30, 40)
+    i = j | bits(1, 11, 21, 31, 41)
+    groups = group_near_duplicates(['same text'] * 3, [r, j, i], max_distance=6)
+    assert len(set(groups)) == 1
+
+
+def test_missing_text_is_not_one_group(tmp_path):
+    csv = tmp_path / 'line_labels.csv'
+    csv.write_text("image_path,text\n/missing/a.png,\n/missing/b.png,\n/missing/c.png,NA\n/missing/d.png,NA\n",
+                   encoding='utf-8')
+    out = tmp_path / 'dedup.csv'
+    assert dedup_line_labels(str(csv), str(out), max_per_group=1, num_workers=1)
+    result = pd.read_csv(out, keep_default_na=False)
+    # the two text-less lines stay apart; the two "NA" lines are one (unhashable) group capped to 1
+    assert list(result['image_path']) == ['/missing/a.png', '/missing/b.png', '/missing/c.png']
+
+
+def pairwise_groups(texts, hashes, max_distance):
+    """Reference grouping: every pair compared, transitively closed."""
+    groups = list(range(len(texts)))
+
+    def find(x):
+        while groups[x] != x:
+            x = groups[x]
+        return x
+
+    for i in range(len(texts)):
+        for j in range(i):
+            if texts[i] is None or texts[i] != texts[j]:
+                continue
+            if hashes[i] is None or hashes[j] is None:
+                near = hashes[i] is None and hashes[j] is None
+            else:
+                near = bin(hashes[i] ^ hashes[j]).count('1') <= max_distance
+            if near:
+                groups[max(find(i), find(j))] = min(find(i), find(j))
+    return [find(i) for i in range(len(texts))]
+
+
+def test_matches_pairwise_grouping():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        n = int(rng.integers(1, 60))
+        bases = [int(b) for b in rng.integers(0, 1 << 62, size=3)]
+        texts = [[None, 'a', 'b'][k] for k in rng.integers(0, 3, size=n)]
+        hashes = []
+        for _ in range(n):
+            h = bases[int(rng.integers(3))]
+            for bit in rng.integers(0, 64, size=int(rng.integers(0, 9))):
+                h ^= 1 << int(bit)
+            hashes.append(None if rng.random() < 0.1 else h)
+        groups = group_near_duplicates(texts, hashes, max_distance=6)
+        expected = pairwise_groups(texts, hashes, 6)
+        # the same partition, whatever the ids
+        assert len(set(zip(groups, expected))) == len(set(groups)) == len(set(expected))
+
+
+def test_repeated_lines_are_not_compared_pairwise(caplog):
+    hashes = [bits(3), bits(3, 40)] * 2500
+    with caplog.at_level(logging.INFO):
+        groups = group_near_duplicates(['OK'] * 5000, hashes, max_distance=6)
+    assert len(set(groups)) == 1
+    assert "Compared 1 candidate hash pairs" in caplog.text  # the two distinct hashes, once
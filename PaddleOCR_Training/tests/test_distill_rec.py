@@ -0,0 +1,91 @@
+# tests/test_distill_rec.py
+
+import os
+import subprocess
+import sys
+
+import pytest
+import yaml
+
+from distill_rec import apply_cpu_test, student_config
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      'config', 'rec', 'my_config_rec_ppocrv4_distill.yml')
+PADDLEOCR_DIR = os.environ.get('PADDLE_OCR_REPO_PATH', '/home/jupyter/PaddleOCR')
+
+
+def load_config():
+    with open(CONFIG, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def resize_widths(config):
+    return [op['SVTRRecResizeImg']['image_shape'][2] for mode in ('Train', 'Eval')
+            for op in config[mode]['dataset']['transforms'] if 'SVTRRecResizeImg' in op]
+
+
+def test_student_config(tmp_path):
+    base = load_config()
+    teacher = base['Architecture']['Models']['Teacher']
+
+    small = student_config(base, {'name': 'scale035', 'scale': 0.35}, str(tmp_path))
+    assert 'Distill' not in small
+    assert small['Architecture']['Models']['Student']['Backbone']['scale'] == 0.35
+    assert not small['Architecture']['Models']['Student']['pretrained']  # smaller than the teacher: from scratch
+    assert small['Global']['save_model_dir'] == str(tmp_path / 'scale035' / 'train')
+    assert small['Global']['save_inference_dir'] == str(tmp_path / 'scale035' / 'export')
+    assert resize_widths(small) == [320, 320]
+
+    narrow = student_config(base, {'name': 'w160', 'scale': teacher['Backbone']['scale'], 'image_width': 160}, str(tmp_path))
+    assert narrow['Architecture']['Models']['Student']['pretrained'] == teacher['pretrained']
+    assert resize_widths(narrow) == [160, 160]
+    assert resize_widths(base) == [320, 320]  # the base config is not modified
+    assert 'Distill' in base
+
+
+def test_sub_models_export_at_dynamic_width():
+    # export_model.py exports Distillation sub-models without an input shape: SVTR cannot be exported that way
+    for model in load_config()['Architecture']['Models'].values():
+        assert model['algorithm'] == 'SVTR_LCNet'
+
+
+def test_apply_cpu_test(tmp_path):
+    label_file = tmp_path / 'labels.txt'
+    label_file.write_text(''.join(f"/img/{i}.png\tline {i}\n" for i in range(100)), encoding='utf-8')
+    config = load_config()
+    for mode in ('Train', 'Eval'):
+        config[mode]['dataset']['label_file_list'] = [str(label_file)]
+
+    apply_cpu_test(config, str(tmp_path / 'subset'), train_lines=40, epochs=2)
+    train, eval_ = config['Train'], config['Eval']
+    with open(train['dataset']['label_file_list'][0], encoding='utf-8') as f:
+        assert len(f.readlines()) == 40
+    with open(eval_['dataset']['label_file_list'][0], encoding='utf-8') as f:
+        assert len(f.readlines()) == 10
+    assert train['dataset']['ratio_list'] == [1.0]
+    assert train['loader']['batch_size_per_card'] == eval_['loader']['batch_size_per_card'] == 8
+    assert train['loader']['num_workers'] == 0
+    assert config['Global']['use_gpu'] is False
+    assert config['Global']['epoch_num'] == 2
+    assert config['Global']['eval_batch_step'] == [0, 2]  # 5 steps per epoch, evaluated twice
+
+
+@pytest.mark.skipif(not os.path.exists(os.path.join(PADDLEOCR_DIR, 'tools', 'export_model.py')),
+                    reason="needs a PaddleOCR checkout (PADDLE_OCR_REPO_PATH)")
+def test_export_tiny_config(tmp_path):
+    char_dict = tmp_path / 'dict.txt'
+    char_dict.write_text('a\nb\nc\n', encoding='utf-8')
+    config = student_config(load_config(), {'name': 'tiny', 'scale': 0.35}, str(tmp_path))
+    config['Global'].update({'use_gpu': False, 'character_dict_path': str(char_dict), 'pretrained_model': None})
+    for model in config['Architecture']['Models'].values():
+        model['pretrained'] = None  # random weights are enough to export
+    config_path = tmp_path / 'config.yml'
+    config_path.write_text(yaml.safe_dump(config, sort_keys=False), encoding='utf-8')
+
+    result = subprocess.run([sys.executable, 'tools/export_model.py', '-c', str(config_path)],
+                            cwd=PADDLEOCR_DIR, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout[-2000:] + result.stderr[-2000:]
+    for name in ('Teacher', 'Student'):
+        files = os.listdir(os.path.join(config['Global']['save_inference_dir'], name))
+        assert 'inference.pdiparams' in files
+        assert 'inference.pdmodel' in files or 'inference.json' in files
@@ -0,0 +1,59 @@
+# tests/test_document_stream.py
+
+import io
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pypdfium2')
+Image = pytest.importorskip('PIL.Image')
+
+import document_stream  # noqa: E402
+from document_stream import iter_document_pages  # noqa: E402
+
+
+def two_colour_pdf(width_pt=72, height_pt=72):
+    """A one-page PDF: left half pure red, right half pure blue (so a channel swap changes both)."""
+    half = width_pt // 2
+    content = (f"1 0 0 rg 0 0 {half} {height_pt} re f "
+               f"0 0 1 rg {half} 0 {width_pt - half} {height_pt} re f").encode('ascii')
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+               f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt} {height_pt}] /Contents 4 0 R >>".encode('ascii'),
+               b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream"]
+    out, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+def two_colour_tiff(width_px, height_px):
+    rgb = np.zeros((height_px, width_px, 3), dtype=np.uint8)
+    rgb[:, :width_px // 2, 0] = 255
+    rgb[:, width_px // 2:, 2] = 255
+    buf = io.BytesIO()
+    Image.fromarray(rgb).save(buf, format='TIFF')
+    buf.seek(0)
+    return buf
+
+
+def test_pdf_pages_match_tiff_pages_in_bgr():
+    if document_stream.PDF_BACKEND != 'pypdfium2':
+        pytest.skip("pypdfium2 is not the active PDF backend")
+    pages = list(iter_document_pages(io.BytesIO(two_colour_pdf())))
+    assert len(pages) == 1
+    pdf_page = pages[0][1]
+    # 72 pt at PDF_RENDER_DPI
+    assert pdf_page.shape == (document_stream.PDF_RENDER_DPI, document_stream.PDF_RENDER_DPI, 3)
+
+    (_, tiff_page), = iter_document_pages(two_colour_tiff(pdf_page.shape[1], pdf_page.shape[0]))
+    assert tiff_page.shape == pdf_page.shape
+    # red on the left is (0, 0, 255) in BGR, blue on the right (255, 0, 0)
+    assert tuple(pdf_page[10, 10]) == (0, 0, 255)
+    assert tuple(pdf_page[10, -10]) == (255, 0, 0)
+    assert np.abs(pdf_page.astype(int) - tiff_page.astype(int)).mean() < 1.0
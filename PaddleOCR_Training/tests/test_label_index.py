@@ -0,0 +1,70 @@
+# tests/test_label_index.py
+
+import logging
+import types
+
+import numpy as np
+import pytest
+
+from label_index import (IndexedLines, LabelIndex, install_label_index, label_index_is_current, sample_indexed_lines,
+                         write_label_index)
+
+
+def write_labels(path, lines, newline="\n"):
+    path.write_bytes("".join(line + newline for line in lines).encode('utf-8'))
+    return str(path)
+
+
+def test_label_index_round_trip(tmp_path):
+    lines = ["img/0.png\tHello", "img/1.png\tGrüße, 東京", "", "img/2.png\t"]
+    label_file = write_labels(tmp_path / 'rec_gt_train.txt', lines, newline="\r\n")
+    assert not label_index_is_current(label_file)
+
+    assert write_label_index(label_file) == 3  # the empty line is skipped
+    assert label_index_is_current(label_file)
+    index = LabelIndex(label_file)
+    assert [index[i].decode('utf-8') for i in range(len(index))] == [line for line in lines if line]
+
+
+def test_empty_label_file(tmp_path):
+    label_file = write_labels(tmp_path / 'empty.txt', [])
+    assert write_label_index(label_file) == 0
+    assert len(LabelIndex(label_file)) == 0
+
+
+def test_indexed_lines_span_files(tmp_path):
+    first = write_labels(tmp_path / 'a.txt', [f"a/{i}.png\t{i}" for i in range(3)])
+    second = write_labels(tmp_path / 'b.txt', [f"b/{i}.png\t{i}" for i in range(4)])
+    for label_file in (first, second):
+        write_label_index(label_file)
+    lines = IndexedLines([LabelIndex(first), LabelIndex(second)], rows=np.array([6, 0, 3]))
+    assert [lines[i] for i in range(len(lines))] == [b"b/3.png\t3", b"a/0.png\t0", b"b/0.png\t0"]
+
+    sampled = sample_indexed_lines([first, second], [1.0, 0.5], sample=True, seed=0)
+    picked = [sampled[i] for i in range(len(sampled))]
+    assert len(picked) == 3 + 2
+    assert sum(line.startswith(b"a/") for line in picked) == 3
+    assert len(set(picked)) == len(picked)  # without replacement
+    assert len(sample_indexed_lines([first, second], [1.0, 1.0], sample=False)) == 7
+
+
+def test_label_index_is_installed_per_mode(tmp_path):
+    pytest.importorskip('paddleocr')  # puts ppocr on the path
+    import ppocr.data as data
+    from ppocr.data.simple_dataset import SimpleDataSet
+
+    label_file = write_labels(tmp_path / 'labels.txt', [f"{i}.png\tline {i}" for i in range(5)])
+    section = {'dataset': {'name': 'SimpleDataSet', 'data_dir': str(tmp_path), 'label_file_list': [label_file],
+                           'transforms': [{'DecodeImage': {'img_mode': 'BGR'}}, {'KeepKeys': {'keep_keys': ['image']}}]},
+               'loader': {'shuffle': False, 'batch_size_per_card': 2, 'drop_last': False, 'num_workers': 0}}
+    config = {'Global': {}, 'Train': section, 'Eval': section}
+    program = types.SimpleNamespace(build_dataloader=data.build_dataloader)
+
+    install_label_index(data, [program], ['Train'])
+    logger = logging.getLogger(__name__)
+    train_loader = program.build_dataloader(config, 'Train', 'cpu', logger)
+    eval_loader = program.build_dataloader(config, 'Eval', 'cpu', logger)
+    assert type(train_loader.dataset) is data.IndexedLabelDataSet
+    assert type(eval_loader.dataset) is SimpleDataSet
+    assert data.SimpleDataSet is SimpleDataSet  # only rebound while the Train loader is built
+    assert len(train_loader.dataset) == len(eval_loader.dataset) == 5
@@ -0,0 +1,48 @@
+# tests/test_mine_hard_examples.py
+
+import numpy as np
+import pytest
+
+from mine_hard_examples import epochs_to_target, split_hard, train_image_shape, training_view_recognizer
+from rec_batching import rec_resize_norm_img
+
+
+def test_recognizer_sees_the_training_input():
+    seen = []
+
+    def run_model(batch):
+        seen.append(batch.copy())
+        return np.zeros((len(batch), 40, 3), dtype=np.float32)
+
+    decoder = lambda preds: [('', 0.0)] * len(preds)  # noqa: E731
+    crops = [np.full((32, 1200, 3), 200, dtype=np.uint8), np.full((30, 60, 3), 50, dtype=np.uint8)] * 3
+    results = training_view_recognizer(run_model, decoder, (3, 48, 320), batch_size=4)(crops)
+    assert len(results) == 6
+    assert [b.shape for b in seen] == [(4, 3, 48, 320), (2, 3, 48, 320)]
+    # the long line is squashed to 320 like SVTRRecResizeImg, not windowed
+    np.testing.assert_allclose(seen[0][0], rec_resize_norm_img(crops[0]), atol=1e-5)
+    np.testing.assert_allclose(seen[0][1], rec_resize_norm_img(crops[1]), atol=1e-5)
+
+
+def test_train_image_shape():
+    config = {'Train': {'dataset': {'transforms': [{'DecodeImage': {}},
+                                                   {'SVTRRecResizeImg': {'image_shape': [3, 48, 160]}}]}}}
+    assert train_image_shape(config) == (3, 48, 160)
+    with pytest.raises(ValueError):
+        train_image_shape({'Train': {'dataset': {'transforms': []}}})
+
+
+def test_split_hard():
+    records = [{'ned': 0.0, 'conf': 0.95}, {'ned': 0.2, 'conf': 0.99}, {'ned': 0.0, 'conf': 0.5},
+               {'ned': None, 'conf': None}]
+    assert split_hard(records, min_confidence=0.9) == ([1, 2], [0])
+
+
+def test_epochs_to_target():
+    evals = [{'epoch': 1, 'samples': 1000.0, 'hours': 0.5, 'acc': 0.8},
+             {'epoch': 2, 'samples': 1500.0, 'hours': 1.0, 'acc': 0.96},
+             {'epoch': 3, 'samples': 2000.0, 'hours': 1.5, 'acc': 0.97}]
+    assert epochs_to_target(evals, 0.95, full_set_lines=1000) == {
+        'epoch': 2, 'full_set_epochs': 1.5, 'samples': 1500, 'hours': 1.0, 'acc': 0.96}
+    assert epochs_to_target(evals, 0.99, full_set_lines=1000) == {'epoch': None, 'best': 0.97}
+    assert epochs_to_target([], 0.9, full_set_lines=1000) == {'epoch': None, 'best': None}
@@ -0,0 +1,150 @@
+# tests/test_ocr_server_metrics.py
+#
+# Scrapes the FastAPI app in-process with a stub pipeline in place of the Paddle models.
+
+import base64
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import ocr_server
+from admission import AdmissionController
+from metrics import OCRMetrics, SamplingProfiler, parse_exposition
+from result_cache import OCRResultCache
+from warm_start import WarmStart
+
+
+class StubPipeline:
+    """Times the stages through the metrics and answers from an OCRResultCache like OCRPipeline does."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.cache = OCRResultCache()
+
+    def __call__(self, img, use_layout=True, det_limit_side_len=None):
+        key = self.cache.page_key(img)
+        cached = self.cache.get_page(key)
+        if cached is not None:
+            return cached
+        with self.metrics.time_stage('det'):
+            boxes = [[0, 0, img.shape[1], img.shape[0]]]
+        with self.metrics.time_stage('rec'):
+            lines = [{'text': 'hello', 'confidence': 0.99, 'box': box} for box in boxes]
+        self.metrics.observe_batch('rec', len(lines))
+        result = {'lines': lines}
+        self.cache.put_page(key, result)
+        return result
+
+
+@pytest.fixture
+def server(monkeypatch):
+    metrics = OCRMetrics()
+    profiler = SamplingProfiler()
+    metrics.attach(profiler=profiler)
+    pipeline = StubPipeline(metrics)
+    metrics.attach(pipeline=pipeline)
+    warm_start = WarmStart({}, metrics)  # no model dirs: no stages to warm
+    warm_start.pipeline = pipeline
+    monkeypatch.setattr(warm_start, 'start_background', lambda: None)
+    monkeypatch.setattr(ocr_server, 'metrics', metrics)
+    monkeypatch.setattr(ocr_server, 'profiler', profiler)
+    monkeypatch.setattr(ocr_server, 'warm_start', warm_start)
+    monkeypatch.setattr(ocr_server, 'admission', AdmissionController(metrics=metrics))
+    with TestClient(ocr_server.app) as client:
+        yield client, profiler
+    profiler.stop()
+
+
+def encode_page():
+    img = np.full((64, 256, 3), 255, dtype=np.uint8)
+    cv2.putText(img, "hello", (8, 44), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+    ok, png = cv2.imencode('.png', img)
+    assert ok
+    return base64.b64encode(png.tobytes()).decode('ascii')
+
+
+def test_metrics_after_one_ocr_request(server):
+    client, _ = server
+    page = encode_page()
+    # the same page twice: the second one is served from the page cache
+    response = client.post("/ocr", json={"instances": [{"key": 0, "b64": page}, {"key": 1, "b64": page}]})
+    assert response.status_code == 200
+    assert response.json() == {"predictions": ["hello", "hello"]}
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith("text/plain; version=0.0.4")
+    text = response.text
+    families, samples = parse_exposition(text)
+    for name, metric_type in families.items():
+        assert f"# HELP {name} " in text
+    assert families['ocr_stage_seconds'] == 'histogram'
+    assert families['ocr_requests_total'] == 'counter'
+    assert families['ocr_cache_hit_ratio'] == 'gauge'
+    # every sample belongs to a family with a TYPE line
+    for name, _, _ in samples:
+        family = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and families.get(name[:-len(suffix)]) == 'histogram':
+                family = name[:-len(suffix)]
+        assert family in families, name
+
+    values = {(name, labels): value for name, labels, value in samples}
+    for stage, count in (('image_decode', 2), ('page', 2), ('det', 1), ('rec', 1)):
+        assert values[('ocr_stage_seconds_count', f'stage="{stage}"')] == count
+        assert ('ocr_stage_seconds_sum', f'stage="{stage}"') in values
+        assert values[('ocr_stage_seconds_bucket', f'stage="{stage}",le="+Inf"')] == count
+    buckets = [value for (name, labels), value in values.items()
+               if name == 'ocr_stage_seconds_bucket' and labels.startswith('stage="page",')]
+    assert buckets == sorted(buckets)  # cumulative
+    assert values[('ocr_requests_total', 'endpoint="/ocr",status="200"')] == 1
+    assert values[('ocr_pages_total', '')] == 2
+    assert families['ocr_cache_lookups_total'] == 'counter'
+    assert values[('ocr_cache_lookups_total', 'level="page"')] == 2
+    assert values[('ocr_cache_hits_total', 'level="page"')] == 1
+    assert values[('ocr_cache_hit_ratio', 'level="page"')] == 0.5
+
+
+def test_cache_counters_advance_between_scrapes(server):
+    client, _ = server
+
+    def cache_counters():
+        _, samples = parse_exposition(client.get("/metrics").text)
+        values = {(name, labels): value for name, labels, value in samples}
+        return values[('ocr_cache_lookups_total', 'level="page"')], values[('ocr_cache_hits_total', 'level="page"')]
+
+    page = encode_page()
+    client.post("/ocr", json={"instances": [{"key": 0, "b64": page}]})
+    assert cache_counters() == (1, 0)
+    assert cache_counters() == (1, 0)  # a scrape alone does not count again
+    client.post("/ocr", json={"instances": [{"key": 0, "b64": page}, {"key": 1, "b64": page}]})
+    assert cache_counters() == (3, 2)
+
+
+def test_profiler_toggles_at_runtime(server):
+    client, profiler = server
+
+    def profiler_gauge():
+        _, samples = parse_exposition(client.get("/metrics").text)
+        return {name: value for name, _, value in samples}['ocr_profiler_running']
+
+    assert not profiler.running
+    assert profiler_gauge() == 0
+
+    response = client.post("/debug/profiler/start", params={"interval_ms": 1})
+    assert response.json() == {"running": True, "started": True, "interval_ms": 1.0}
+    assert profiler.running
+    assert profiler_gauge() == 1
+    assert client.post("/debug/profiler/start").json()['started'] is False  # already running
+
+    client.post("/ocr", json={"instances": [{"key": 0, "b64": encode_page()}]})
+    response = client.post("/debug/profiler/stop")
+    assert response.status_code == 200
+    assert not profiler.running
+    assert profiler_gauge() == 0
+    assert profiler.sample_count > 0
+    for line in response.text.splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert stack and int(count) > 0
@@ -0,0 +1,25 @@
+# tests/test_profile_dataloader.py
+
+from profile_dataloader import profile_transforms
+
+
+class DropEmpty:
+    def __call__(self, data):
+        return data if data['image'] else None
+
+
+def test_profile_transforms_counts_only_images_read(tmp_path):
+    good, empty = tmp_path / "good.png", tmp_path / "empty.png"
+    good.write_bytes(b"not really a png")
+    empty.write_bytes(b"")
+    samples = [(str(good), "a"), (str(tmp_path / "missing.png"), "b"), (str(empty), "c")]
+
+    totals, read, kept = profile_transforms([DropEmpty()], samples)
+    assert (read, kept) == (2, 1)
+    assert set(totals) == {'read', 'DropEmpty'}
+
+
+def test_profile_transforms_nothing_readable(tmp_path):
+    totals, read, kept = profile_transforms([DropEmpty()], [(str(tmp_path / "missing.png"), "a")])
+    assert (read, kept) == (0, 0)
+    assert totals == {'read': 0.0, 'DropEmpty': 0.0}
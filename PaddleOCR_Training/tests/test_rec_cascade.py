@@ -0,0 +1,50 @@
+# tests/test_rec_cascade.py
+
+import numpy as np
+import pytest
+
+from rec_cascade import CascadeRecognizer, line_correct, pick_threshold, sweep_thresholds
+
+
+def synthetic_runs(n=400, seed=0):
+    """Fast results that are right more often the more confident they are, and a full model right 95% of the time."""
+    rng = np.random.default_rng(seed)
+    texts = [f"line {i}" for i in range(n)]
+    confidence = np.round(rng.uniform(0.5, 1.0, n), 3)
+    confidence[:5] = 0.9  # ties at a threshold
+    fast = [(text if rng.random() < conf else 'x', float(conf)) for text, conf in zip(texts, confidence)]
+    full = [(text if rng.random() < 0.95 else 'y', 0.99) for text in texts]
+    return fast, full, texts
+
+
+def test_line_correct_ignores_spaces():
+    results = [('ab c', 0.9), ('abc', 0.9), ('abd', 0.9)]
+    assert list(line_correct(results, ['abc'] * 3)) == [True, True, False]
+    assert list(line_correct(results, ['abc'] * 3, ignore_space=False)) == [False, True, False]
+
+
+def test_sweep_matches_running_the_cascade():
+    fast, full, texts = synthetic_runs()
+    crops = list(range(len(texts)))  # the stub recognizers look results up by crop
+    rows = sweep_thresholds(fast, full, texts, fast_seconds=2.0, full_seconds=8.0,
+                            thresholds=[0.0, 0.6, 0.9, 0.95, 1.0, 1.01])
+    for row in rows:
+        cascade = CascadeRecognizer(lambda batch: [fast[i] for i in batch], lambda batch: [full[i] for i in batch],
+                                    threshold=row['threshold'])
+        results = cascade(crops)
+        assert row['fallback_rate'] == pytest.approx(cascade.fallback_rate, abs=1e-5)
+        assert row['acc'] == pytest.approx(line_correct(results, texts).mean(), abs=1e-5)
+        seconds = 2.0 + 8.0 * cascade.fallbacks / len(texts)
+        assert row['est_lines_per_sec'] == pytest.approx(len(texts) / seconds, abs=0.1)
+    assert rows[0]['fallback_rate'] == 0 and rows[-1]['fallback_rate'] == 1
+    assert rows[-1]['acc'] == pytest.approx(line_correct(full, texts).mean())
+
+
+def test_pick_threshold_takes_the_fewest_fallbacks_within_the_drop():
+    fast, full, texts = synthetic_runs(seed=1)
+    rows = sweep_thresholds(fast, full, texts, 1.0, 4.0)
+    full_acc = float(line_correct(full, texts).mean())
+    row = pick_threshold(rows, full_acc, max_acc_drop=0.02)
+    assert row['acc'] >= full_acc - 0.02
+    assert all(r['acc'] < full_acc - 0.02 for r in rows if r['threshold'] < row['threshold'])
+    assert pick_threshold(rows, 2.0) is rows[-1]  # out of reach: everything falls back
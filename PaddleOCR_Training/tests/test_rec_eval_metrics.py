@@ -0,0 +1,90 @@
+# tests/test_rec_eval_metrics.py
+
+import random
+
+import numpy as np
+import pytest
+
+import rec_eval_metrics
+from rec_eval_metrics import align, levenshtein_batch, score
+
+CHARACTERS = ['blank'] + list('abcdef') + [' ']
+
+
+def edit_distance(ref, hyp):
+    """Reference Levenshtein distance, one DP cell at a time."""
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i]
+        for j, h in enumerate(hyp, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h)))
+        prev = cur
+    return prev[-1]
+
+
+def random_pairs(count, seed=0):
+    rng = random.Random(seed)
+    word = lambda: ''.join(rng.choice('abcdef') for _ in range(rng.randint(0, 12)))
+    return [(word(), word()) for _ in range(count)]
+
+
+def apply_ops(ref, hyp, ops):
+    """Applies (op, ref_pos, hyp_pos) edit operations to ref, back to front so positions stay valid."""
+    out = list(ref)
+    for op, i, j in reversed(ops):
+        if op == 'replace':
+            out[i] = hyp[j]
+        elif op == 'delete':
+            del out[i]
+        else:
+            out.insert(i, hyp[j])
+    return ''.join(out)
+
+
+def test_levenshtein_batch_matches_the_reference():
+    pairs = random_pairs(300) + [('', ''), ('', 'abc'), ('abc', ''), ('abc', 'abc')]
+    refs = [[ord(c) for c in r] for r, _ in pairs]
+    hyps = [[ord(c) for c in h] for _, h in pairs]
+    assert list(levenshtein_batch(refs, hyps)) == [edit_distance(r, h) for r, h in pairs]
+    assert len(levenshtein_batch([], [])) == 0
+
+
+def test_align_is_a_minimal_edit_script():
+    for ref, hyp in random_pairs(200, seed=1):
+        ops = align(ref, hyp)
+        assert len(ops) == edit_distance(ref, hyp)
+        assert apply_ops(ref, hyp, ops) == hyp
+
+
+def test_score_without_rapidfuzz_matches_with_it(monkeypatch):
+    pairs = random_pairs(500, seed=2) + [('ab cd', 'ab ce'), ('ab', 'ab'), ('a b', 'ab')]
+    refs, hyps = [r for r, _ in pairs], [h for _, h in pairs]
+    reports = []
+    for have_rapidfuzz in (True, False):
+        if not have_rapidfuzz or rec_eval_metrics.HAVE_RAPIDFUZZ:
+            monkeypatch.setattr(rec_eval_metrics, 'HAVE_RAPIDFUZZ', have_rapidfuzz)
+            reports.append(score(refs, hyps, CHARACTERS, workers=1, chunk_size=128))
+    report = reports[-1]
+    assert report['char_errors'] == sum(edit_distance(r, h) for r, h in pairs)
+    assert report['word_errors'] == sum(edit_distance(r.split(), h.split()) for r, h in pairs)
+    assert report['exact_match'] == pytest.approx(np.mean([r == h for r, h in pairs]))
+    assert sum(b['lines'] for b in report['length_buckets'].values()) == len(pairs)
+    # every reference character lands once in its row, every hypothesis character once in its column
+    confusion = report['confusion']
+    assert confusion[1:].sum() == sum(len(r) for r in refs)
+    assert confusion[:, 1:].sum() == sum(len(h) for h in hyps)
+    for other in reports[:-1]:
+        assert other['char_errors'] == report['char_errors'] and other['word_errors'] == report['word_errors']
+        # ties between optimal alignments may place edits differently, not change the marginals
+        assert (other['confusion'].sum(axis=1)[1:] == confusion.sum(axis=1)[1:]).all()
+        assert (other['confusion'].sum(axis=0)[1:] == confusion.sum(axis=0)[1:]).all()
+
+
+def test_confusion_cells():
+    report = score(['abc', 'ab'], ['abd', 'abz'], CHARACTERS, workers=1)
+    confusion = report['confusion']
+    idx = CHARACTERS.index
+    assert confusion[idx('a'), idx('a')] == 2 and confusion[idx('b'), idx('b')] == 2
+    assert confusion[idx('c'), idx('d')] == 1  # substitution
+    assert confusion[0, len(CHARACTERS)] == 1  # 'z' is not in the dictionary: inserted as unknown
+    assert confusion[idx('c'), idx('c')] == 0
@@ -0,0 +1,57 @@
+# tests/test_result_cache.py
+
+import os
+import threading
+
+import numpy as np
+
+from result_cache import DiskCache, OCRResultCache
+
+
+def test_disk_cache_overwrite_keeps_size_exact(tmp_path):
+    cache = DiskCache(str(tmp_path), 'page')
+    cache.put('abcd', b'x' * 100)
+    cache.put('abcd', b'y' * 40)
+    cache.put('ef01', b'z' * 10)
+    assert cache.get('abcd') == b'y' * 40
+    assert cache.total_bytes == 50
+    assert DiskCache(str(tmp_path), 'page').total_bytes == 50
+
+
+def test_disk_cache_rewrites_do_not_trigger_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), 'line', max_bytes=250)
+    cache.put('aaaa', b'a' * 100)
+    cache.put('bbbb', b'b' * 100)
+    for _ in range(5):
+        cache.put('aaaa', b'a' * 100)  # same entry written again, e.g. by another worker
+    assert cache.get('bbbb') == b'b' * 100
+    assert cache.total_bytes == 200
+    assert not [f for _, _, files in os.walk(tmp_path) for f in files if f.endswith('.tmp')]
+
+
+def test_disk_cache_concurrent_writers(tmp_path):
+    cache = DiskCache(str(tmp_path), 'page')
+    blobs = [bytes([i]) * (1000 + i) for i in range(8)]
+
+    def write(blob):
+        for _ in range(50):
+            cache.put('abcd', blob)
+            cache.put(f'k{blob[0]:03d}', blob)
+
+    threads = [threading.Thread(target=write, args=(blob,)) for blob in blobs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.get('abcd') in blobs  # one writer's whole blob, never a mix
+    files = [os.path.join(root, f) for root, _, names in os.walk(tmp_path) for f in names]
+    assert not [f for f in files if f.endswith('.tmp')]
+    assert cache.total_bytes == sum(os.path.getsize(f) for f in files)
+
+
+def test_page_key_depends_on_variant():
+    page = np.full((32, 32, 3), 255, dtype=np.uint8)
+    for page_hash in ('content', 'perceptual'):
+        cache = OCRResultCache(page_hash=page_hash)
+        assert cache.page_key(page, True) != cache.page_key(page, False)
+        assert cache.page_key(page, True) == cache.page_key(page.copy(), True)
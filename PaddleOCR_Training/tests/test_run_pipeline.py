@@ -0,0 +1,58 @@
+# tests/test_run_pipeline.py
+
+import argparse
+import os
+
+import yaml
+
+import run_pipeline
+from run_pipeline import Fingerprinter, build_stages
+
+SCRIPTS_DIR = run_pipeline.SCRIPTS_DIR
+
+
+def pipeline_args(tmp_path, **overrides):
+    config = tmp_path / 'config.yml'
+    config.write_text(yaml.safe_dump({'Global': {'save_model_dir': './output/rec', 'save_inference_dir': './inference/rec'}}),
+                      encoding='utf-8')
+    args = {'image_dir': str(tmp_path / 'pages'), 'hocr_dir': str(tmp_path / 'pages'),
+            'ocr_output_dir': str(tmp_path / 'out'), 'char_dict_source': os.path.join(SCRIPTS_DIR, 'char.txt'),
+            'max_text_length': 128, 'max_per_dup_group': 3, 'paddleocr_dir': str(tmp_path / 'PaddleOCR'),
+            'config': str(config), 'fast_eval': False}
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def test_every_stage_fingerprints_its_code(tmp_path):
+    expected = {
+        'preprocess': ['ocrprep.py', 'data_preprocess.py'],
+        'dedup': ['ocrprep.py', 'dedup_lines.py'],
+        'char_dict': ['run_pipeline.py'],
+        'validate_dict': ['run_pipeline.py'],
+        'length_stats': ['run_pipeline.py'],
+        'convert': ['ocrprep.py', 'convert_csv_to_paddle_labels.py', 'label_index.py'],
+        'train': ['train.py'],
+        'export': ['export_model.py'],
+    }
+    stages = {stage.name: stage for stage in build_stages(pipeline_args(tmp_path))}
+    assert set(stages) == set(expected)
+    for name, scripts in expected.items():
+        listed = {os.path.basename(path) for path in stages[name].inputs}
+        assert set(scripts) <= listed, name
+
+    fast = {stage.name: stage for stage in build_stages(pipeline_args(tmp_path, fast_eval=True))}
+    listed = {os.path.basename(path) for path in fast['train'].inputs}
+    assert {'train.py', 'train_fast_eval.py', 'eval_tensor_cache.py', 'label_index.py'} <= listed
+
+
+def test_editing_a_script_changes_the_fingerprint(tmp_path, monkeypatch):
+    scripts = tmp_path / 'scripts'
+    scripts.mkdir()
+    for name in ('ocrprep.py', 'dedup_lines.py'):
+        (scripts / name).write_text("# v1\n", encoding='utf-8')
+    monkeypatch.setattr(run_pipeline, 'SCRIPTS_DIR', str(scripts))
+    dedup = {stage.name: stage for stage in build_stages(pipeline_args(tmp_path))}['dedup']
+
+    before = Fingerprinter().stage(dedup)
+    (scripts / 'dedup_lines.py').write_text("# v2\n", encoding='utf-8')
+    assert Fingerprinter().stage(dedup) != before